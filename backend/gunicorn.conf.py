@@ -0,0 +1,13 @@
+"""
+Gunicorn settings loaded automatically from the working directory.
+
+Prometheus multiprocess mode: export PROMETHEUS_MULTIPROC_DIR pointing at an
+empty directory before starting gunicorn so every worker's samples are
+aggregated by /api/metrics.
+"""
+
+
+def child_exit(server, worker):
+    # Remove the exited worker's live gauges (e.g. requests_in_flight)
+    from src.routes.metrics_routes import mark_worker_dead
+    mark_worker_dead(worker.pid)
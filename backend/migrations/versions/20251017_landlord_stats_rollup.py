@@ -0,0 +1,43 @@
+"""create landlord_stats_rollup table
+
+Revision ID: 20251017_landlord_stats_rollup
+Revises: 20250903_merge_heads
+Create Date: 2025-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251017_landlord_stats_rollup'
+down_revision = '20250903_merge_heads'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'landlord_stats_rollup',
+        sa.Column('landlord_id', sa.Integer(), nullable=False),
+        sa.Column('property_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unit_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('occupied_units', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('tenant_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue_current_month', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('outstanding_rent', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('open_maintenance_requests', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('expiring_leases', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('computed_on', sa.Date(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['landlord_id'], ['user.id'],
+                                name='fk_landlord_stats_rollup_landlord_id_user',
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('landlord_id', name='pk_landlord_stats_rollup')
+    )
+    # Populate with `flask rebuild-stats-rollup` after upgrading; rows missing
+    # until then are computed lazily on first read.
+
+
+def downgrade():
+    op.drop_table('landlord_stats_rollup')
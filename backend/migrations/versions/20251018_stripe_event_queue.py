@@ -0,0 +1,39 @@
+"""queue columns on stripe_events for asynchronous webhook processing
+
+Revision ID: 20251018_stripe_event_queue
+Revises: 20251017_landlord_stats_rollup
+Create Date: 2025-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251018_stripe_event_queue'
+down_revision = '20251017_landlord_stats_rollup'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Events recorded before this revision were handled synchronously
+    with op.batch_alter_table('stripe_events') as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=False,
+                                      server_default='processed'))
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('locked_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_error', sa.Text(), nullable=True))
+        batch_op.create_index('ix_stripe_events_status_next_attempt',
+                              ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stripe_events') as batch_op:
+        batch_op.drop_index('ix_stripe_events_status_next_attempt')
+        batch_op.drop_column('last_error')
+        batch_op.drop_column('locked_at')
+        batch_op.drop_column('next_attempt_at')
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('status')
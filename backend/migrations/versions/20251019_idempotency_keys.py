@@ -0,0 +1,34 @@
+"""create idempotency_keys table for webhook deduplication
+
+Revision ID: 20251019_idempotency_keys
+Revises: 20251018_stripe_event_queue
+Create Date: 2025-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251019_idempotency_keys'
+down_revision = '20251018_stripe_event_queue'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='processing'),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key', name='pk_idempotency_keys')
+    )
+    op.create_index('ix_idempotency_keys_completed_at', 'idempotency_keys', ['completed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_idempotency_keys_completed_at', table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
@@ -0,0 +1,29 @@
+"""add expires_at to token_blocklist so expired revocations can be purged
+
+Revision ID: 20251020_token_blocklist_expiry
+Revises: 20251019_idempotency_keys
+Create Date: 2025-10-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251020_token_blocklist_expiry'
+down_revision = '20251019_idempotency_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep a NULL expiry and are purged by created_at instead
+    with op.batch_alter_table('token_blocklist') as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_token_blocklist_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_blocklist') as batch_op:
+        batch_op.drop_index('ix_token_blocklist_expires_at')
+        batch_op.drop_column('expires_at')
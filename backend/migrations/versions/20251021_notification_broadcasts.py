@@ -0,0 +1,46 @@
+"""create notification_broadcasts table for background fan-out jobs
+
+Revision ID: 20251021_notification_broadcasts
+Revises: 20251020_token_blocklist_expiry
+Create Date: 2025-10-21 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251021_notification_broadcasts'
+down_revision = '20251020_token_blocklist_expiry'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notification_broadcasts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('target_role', sa.String(length=20), nullable=False, server_default='all'),
+        sa.Column('type', sa.String(length=50), nullable=False, server_default='system'),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('resource_type', sa.String(length=50), nullable=True),
+        sa.Column('resource_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_user_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['user.id'],
+                                name='fk_notification_broadcasts_created_by_user',
+                                ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id', name='pk_notification_broadcasts')
+    )
+
+
+def downgrade():
+    op.drop_table('notification_broadcasts')
@@ -0,0 +1,39 @@
+"""add a denormalized unread notification counter to user
+
+Revision ID: 20251022_unread_notification_count
+Revises: 20251021_notification_broadcasts
+Create Date: 2025-10-22 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251022_unread_notification_count'
+down_revision = '20251021_notification_broadcasts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('unread_notification_count', sa.Integer(), nullable=False,
+                                      server_default='0'))
+
+    # Seed the counters from the existing notifications
+    op.execute(
+        """
+        UPDATE "user" SET unread_notification_count = (
+            SELECT COUNT(*) FROM notifications
+            WHERE notifications.user_id = "user".id
+              AND COALESCE(notifications.read, false) = false
+              AND COALESCE(notifications.is_read, false) = false
+        )
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('unread_notification_count')
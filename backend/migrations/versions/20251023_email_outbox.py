@@ -0,0 +1,49 @@
+"""create email_outbox table for queued outbound email
+
+Revision ID: 20251023_email_outbox
+Revises: 20251022_unread_notification_count
+Create Date: 2025-10-23 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251023_email_outbox'
+down_revision = '20251022_unread_notification_count'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('to_address', sa.String(length=255), nullable=False),
+        sa.Column('from_address', sa.String(length=255), nullable=True),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('html_body', sa.Text(), nullable=True),
+        sa.Column('text_body', sa.Text(), nullable=True),
+        sa.Column('message_stream', sa.String(length=50), nullable=True),
+        sa.Column('tag', sa.String(length=50), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('claim_token', sa.String(length=32), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('provider_message_id', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id', name='pk_email_outbox')
+    )
+    op.create_index('ix_email_outbox_status_next_attempt', 'email_outbox',
+                    ['status', 'next_attempt_at'], unique=False)
+    op.create_index('ix_email_outbox_claim_token', 'email_outbox', ['claim_token'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_claim_token', table_name='email_outbox')
+    op.drop_index('ix_email_outbox_status_next_attempt', table_name='email_outbox')
+    op.drop_table('email_outbox')
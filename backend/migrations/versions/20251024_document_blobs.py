@@ -0,0 +1,39 @@
+"""content-addressed document blobs with reference counts
+
+Revision ID: 20251024_document_blobs
+Revises: 20251023_email_outbox
+Create Date: 2025-10-24 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251024_document_blobs'
+down_revision = '20251023_email_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stored_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('storage_key', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(length=255), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('sha256', name='pk_stored_blobs')
+    )
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_documents_content_hash', ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.drop_index('ix_documents_content_hash')
+        batch_op.drop_column('content_hash')
+    op.drop_table('stored_blobs')
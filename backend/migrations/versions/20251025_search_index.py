@@ -0,0 +1,96 @@
+"""full-text search index for users, properties and documents
+
+Revision ID: 20251025_search_index
+Revises: 20251024_document_blobs
+Create Date: 2025-10-25 00:00:00.000000
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251025_search_index'
+down_revision = '20251024_document_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'search_documents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity_type', sa.String(length=20), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False, server_default=''),
+        sa.PrimaryKeyConstraint('id', name='pk_search_documents'),
+        sa.UniqueConstraint('entity_type', 'entity_id', name='uq_search_documents_entity')
+    )
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "ALTER TABLE search_documents ADD COLUMN tsv tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+        )
+        op.execute("CREATE INDEX ix_search_documents_tsv ON search_documents USING GIN (tsv)")
+        op.execute("CREATE INDEX ix_search_documents_trgm ON search_documents USING GIN (content gin_trgm_ops)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE search_documents_fts USING fts5("
+            "content, content='search_documents', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute(
+            "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(search_documents_fts, rowid, content) "
+            "VALUES ('delete', old.id, old.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(search_documents_fts, rowid, content) "
+            "VALUES ('delete', old.id, old.content); "
+            "INSERT INTO search_documents_fts(rowid, content) VALUES (new.id, new.content); END"
+        )
+
+    # Index the existing rows; `flask rebuild-search-index` does the same.
+    # Users are split like search_service._user_text, which SQL REPLACE can't
+    users = op.get_bind().execute(sa.text('SELECT id, name, email FROM "user"')).all()
+    if users:
+        search_documents = sa.table(
+            'search_documents',
+            sa.column('entity_type', sa.String), sa.column('entity_id', sa.Integer), sa.column('content', sa.Text),
+        )
+        op.bulk_insert(search_documents, [
+            {'entity_type': 'user', 'entity_id': user_id,
+             'content': ' '.join(value for value in (name, email, re.sub(r'[@.+_-]', ' ', email or '')) if value)}
+            for user_id, name, email in users
+        ])
+    op.execute(
+        """
+        INSERT INTO search_documents (entity_type, entity_id, content)
+        SELECT 'property', id, COALESCE(name, '') || ' ' || COALESCE(address, '') || ' ' || COALESCE(city, '')
+        FROM properties
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO search_documents (entity_type, entity_id, content)
+        SELECT 'document', id, COALESCE(title, '') || ' ' || COALESCE(name, '') || ' ' ||
+               COALESCE(original_name, '') || ' ' || COALESCE(description, '')
+        FROM documents
+        """
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS search_documents_fts")
+    op.drop_table('search_documents')
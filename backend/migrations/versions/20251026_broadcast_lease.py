@@ -0,0 +1,28 @@
+"""add a worker lease to notification_broadcasts
+
+Revision ID: 20251026_broadcast_lease
+Revises: 20251025_search_index
+Create Date: 2025-10-26 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20251026_broadcast_lease'
+down_revision = '20251025_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notification_broadcasts') as batch_op:
+        batch_op.add_column(sa.Column('locked_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_notification_broadcasts_status', ['status'])
+
+
+def downgrade():
+    with op.batch_alter_table('notification_broadcasts') as batch_op:
+        batch_op.drop_index('ix_notification_broadcasts_status')
+        batch_op.drop_column('locked_at')
@@ -34,6 +34,7 @@ from .extensions import (
     limiter,
     init_extensions
 )
+from .utils.log_masker import PiiFilter, queue_logging_handler, stop_queue_logging
 
 
 def create_app(config_name: Optional[str] = None) -> Flask:
@@ -166,6 +167,59 @@ def create_app(config_name: Optional[str] = None) -> Flask:
     # Register blueprints
     register_blueprints(app)
     
+    # Keep the per-landlord dashboard rollup in sync with writes
+    from .services.stats_rollup_service import init_stats_rollup
+    init_stats_rollup(app)
+
+    # Evict tagged cached responses when their rows change
+    from .services.cache_invalidation_service import init_cache_invalidation
+    init_cache_invalidation(app)
+
+    # Denormalized per-user unread notification counters
+    from .services.notification_counter_service import init_notification_counters
+    init_notification_counters(app)
+
+    # Prometheus request metrics, labeled by route template
+    if app.config.get('METRICS_ENABLED'):
+        from .routes.metrics_routes import init_metrics
+        init_metrics(app)
+
+    # Per-request SQL statement counts, Server-Timing and N+1 warnings
+    from .utils.performance import init_query_budget
+    init_query_budget(app)
+
+    # Queued Stripe webhook events: worker pool and CLI commands
+    from .webhooks.stripe_worker import init_stripe_events
+    init_stripe_events(app)
+
+    # Broadcast fan-out: resume interrupted jobs, CLI command
+    from .services.notification_fanout_service import init_notification_fanout
+    init_notification_fanout(app)
+
+    # Outbound email queue: worker pool and CLI commands
+    from .services.email_outbox_service import init_email_outbox
+    init_email_outbox(app)
+
+    # Compiled email templates
+    from .services.email_templates import init_email_templates
+    init_email_templates(app)
+
+    # Webhook idempotency key maintenance
+    from .utils.idempotency import init_idempotency
+    init_idempotency(app)
+
+    # Cached JWT revocation checks and blocklist purging
+    from .utils.token_revocation import init_token_revocation
+    init_token_revocation(app)
+
+    # Content-addressed document blob maintenance
+    from .services.document_store import init_document_store
+    init_document_store(app)
+
+    # Full-text search index upkeep
+    from .services.search_service import init_search
+    init_search(app)
+    
     # Log application startup
     app.logger.info(f"Application started with {app.config.get('ENV')} configuration")
 
@@ -490,6 +544,13 @@ def register_error_handlers(app: Flask) -> None:
         """Add security and trace headers to responses."""
         if hasattr(request, 'trace_id'):
             response.headers['X-Trace-ID'] = request.trace_id
+
+        # Responses carrying validators (see utils/conditional.py) may be stored
+        # by the browser but must be revalidated; everything else stays no-store
+        if 'Cache-Control' not in response.headers and (
+            'ETag' in response.headers or 'Last-Modified' in response.headers
+        ):
+            response.headers['Cache-Control'] = 'private, no-cache'
         
         # Add security headers if in production and not already set by Talisman
         if app.config.get('ENV') == 'production':
@@ -694,7 +755,7 @@ def configure_logging(app: Flask) -> None:
     log_level = getattr(logging, log_level_name.upper(), logging.INFO)
     
     # Clear existing handlers to avoid duplication
-    for handler in app.logger.handlers:
+    for handler in list(app.logger.handlers):
         app.logger.removeHandler(handler)
     
     # Set log level (default to INFO)
@@ -703,14 +764,8 @@ def configure_logging(app: Flask) -> None:
     # Create a custom JSON formatter for structured logging
     class JsonFormatter(logging.Formatter):
         def format(self, record):
-            # Get trace ID from request context if available
-            trace_id = None
-            try:
-                from flask import has_request_context, request
-                if has_request_context() and hasattr(request, 'trace_id'):
-                    trace_id = request.trace_id
-            except Exception:
-                pass
+            # Trace ID stamped in the request thread, else from the request context
+            trace_id = getattr(record, 'trace_id', None) or _request_trace_id()
             
             # Create structured log record
             log_record = {
@@ -731,7 +786,7 @@ def configure_logging(app: Flask) -> None:
                     
             # Add exception info with full stack trace if present
             if record.exc_info:
-                log_record['exception'] = self.formatException(record.exc_info)
+                log_record['exception'] = record.exc_text or self.formatException(record.exc_info)
                 log_record['exception_type'] = record.exc_info[0].__name__
                 
             # Add any additional context from record
@@ -749,15 +804,45 @@ def configure_logging(app: Flask) -> None:
     # Create a handler that outputs to stdout (not stderr)
     handler = logging.StreamHandler()
     handler.setFormatter(JsonFormatter())
+    
+    # Masking, formatting and the write happen on a listener thread; the
+    # request thread only captures its trace ID and enqueues the record
+    if app.config.get('LOG_QUEUE', True):
+        handler = queue_logging_handler(handler)
+        handler.addFilter(_stamp_trace_id)
+    else:
+        handler.addFilter(PiiFilter())
     app.logger.addHandler(handler)
     
     # Set the root logger to use our configuration
     root_logger = logging.getLogger()
+    for previous in root_logger.handlers:
+        stop_queue_logging(previous)
     root_logger.handlers = []
     root_logger.addHandler(handler)
     root_logger.setLevel(log_level)
 
 
+def _request_trace_id():
+    """Trace ID of the current request, if any"""
+    try:
+        from flask import has_request_context, request
+        if has_request_context() and hasattr(request, 'trace_id'):
+            return request.trace_id
+    except Exception:
+        pass
+    return None
+
+
+def _stamp_trace_id(record):
+    """Copy the request's trace ID onto the record before it leaves the request thread"""
+    if not hasattr(record, 'trace_id'):
+        trace_id = _request_trace_id()
+        if trace_id:
+            record.trace_id = trace_id
+    return True
+
+
 def configure_proxy_fix(app: Flask) -> None:
     """
     Configure ProxyFix middleware for proper handling of proxy headers.
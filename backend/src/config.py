@@ -8,6 +8,7 @@ from __future__ import annotations
 
 import os
 import secrets
+import tempfile
 from typing import Any, Dict, Optional, Union
 
 
@@ -124,6 +125,8 @@ class BaseConfig:
     RATELIMIT_DEFAULT = "100 per minute"
     RATELIMIT_STORAGE_URL = os.environ.get("REDIS_URL", "memory://")
     RATELIMIT_KEY_PREFIX = "assetanchor-limiter"
+    # utils/rate_limit.py: keys kept by the per-process limiter (LRU beyond this)
+    RATELIMIT_LOCAL_MAX_KEYS = get_env_int("RATELIMIT_LOCAL_MAX_KEYS", 100000)
     
     # Mail
     MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
@@ -137,6 +140,14 @@ class BaseConfig:
     # Redis
     REDIS_URL = os.environ.get("REDIS_URL", "")
     
+    # Response cache (utils/cache.py); backend is "memory" or "redis", auto-detected when unset
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "")
+    CACHE_MAX_ENTRIES = get_env_int("CACHE_MAX_ENTRIES", 1024)
+    CACHE_MAX_BYTES = get_env_int("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    CACHE_KEY_PREFIX = os.environ.get("CACHE_KEY_PREFIX", "assetanchor-cache:")
+    CACHE_TAG_TTL = get_env_int("CACHE_TAG_TTL", 24 * 60 * 60)
+    CACHE_INVALIDATION_CHANNEL = os.environ.get("CACHE_INVALIDATION_CHANNEL", "assetanchor-cache-invalidate")
+    
     # Security
     FORCE_HTTPS = get_env_bool("FORCE_HTTPS", True)
     SESSION_COOKIE_SECURE = get_env_bool("SESSION_COOKIE_SECURE", True)
@@ -144,9 +155,105 @@ class BaseConfig:
     CSP_REPORT_URI = get_env("CSP_REPORT_URI", "")
     EXTRA_CSP_DOMAINS = get_env_dict("EXTRA_CSP_DOMAINS", {})
     
+    # Analytics
+    STATS_ROLLUP_ENABLED = get_env_bool("STATS_ROLLUP_ENABLED", True)
+    
+    # Prometheus metrics at /api/metrics (routes/metrics_routes.py); bucket bounds are comma-separated
+    METRICS_ENABLED = get_env_bool("METRICS_ENABLED", False)
+    METRICS_LATENCY_BUCKETS = get_env("METRICS_LATENCY_BUCKETS", "")
+    METRICS_SIZE_BUCKETS = get_env("METRICS_SIZE_BUCKETS", "")
+    
+    # Per-request query budget (utils/performance.py)
+    QUERY_BUDGET_ENABLED = get_env_bool("QUERY_BUDGET_ENABLED", False)
+    QUERY_BUDGET_STRICT = get_env_bool("QUERY_BUDGET_STRICT", False)
+    QUERY_REPEAT_THRESHOLD = get_env_int("QUERY_REPEAT_THRESHOLD", 5)
+    SLOW_QUERY_LOG_DIR = get_env("LOG_DIR", "logs")
+    
+    # Stripe webhook queue (webhooks/stripe_worker.py); 0 workers leaves
+    # processing to `flask stripe-events-worker`
+    STRIPE_EVENTS_INLINE = get_env_bool("STRIPE_EVENTS_INLINE", False)
+    STRIPE_EVENTS_WORKERS = get_env_int("STRIPE_EVENTS_WORKERS", 2)
+    STRIPE_EVENTS_MAX_ATTEMPTS = get_env_int("STRIPE_EVENTS_MAX_ATTEMPTS", 8)
+    STRIPE_EVENTS_RETRY_BASE_SECONDS = get_env_int("STRIPE_EVENTS_RETRY_BASE_SECONDS", 30)
+    STRIPE_EVENTS_RETRY_MAX_SECONDS = get_env_int("STRIPE_EVENTS_RETRY_MAX_SECONDS", 3600)
+    STRIPE_EVENTS_POLL_SECONDS = get_env_int("STRIPE_EVENTS_POLL_SECONDS", 5)
+    STRIPE_EVENTS_LEASE_SECONDS = get_env_int("STRIPE_EVENTS_LEASE_SECONDS", 300)
+    
+    # Webhook idempotency keys (utils/idempotency.py): Redis when REDIS_URL is
+    # reachable, else the idempotency_keys table
+    IDEMPOTENCY_TTL_SECONDS = get_env_int("IDEMPOTENCY_TTL_SECONDS", 7 * 24 * 60 * 60)
+    IDEMPOTENCY_LEASE_SECONDS = get_env_int("IDEMPOTENCY_LEASE_SECONDS", 60)
+    IDEMPOTENCY_LOCAL_MAX_ENTRIES = get_env_int("IDEMPOTENCY_LOCAL_MAX_ENTRIES", 10000)
+    IDEMPOTENCY_KEY_PREFIX = get_env("IDEMPOTENCY_KEY_PREFIX", "assetanchor-idem:")
+    
+    # JWT revocation checks (utils/token_revocation.py); a JTI seen valid is
+    # trusted for NEGATIVE_TTL seconds unless a revocation is published
+    TOKEN_REVOCATION_NEGATIVE_TTL = get_env_int("TOKEN_REVOCATION_NEGATIVE_TTL", 30)
+    TOKEN_REVOCATION_CACHE_SIZE = get_env_int("TOKEN_REVOCATION_CACHE_SIZE", 10000)
+    TOKEN_REVOCATION_KEY_PREFIX = get_env("TOKEN_REVOCATION_KEY_PREFIX", "assetanchor-revoked:")
+    TOKEN_REVOCATION_CHANNEL = get_env("TOKEN_REVOCATION_CHANNEL", "assetanchor-token-revoked")
+    TOKEN_BLOCKLIST_PURGE_INTERVAL = get_env_int("TOKEN_BLOCKLIST_PURGE_INTERVAL", 60 * 60)
+    
+    # Login lockout counters (utils/account_security.py): Redis when REDIS_URL
+    # is reachable, else a per-process LRU of at most LOCAL_MAX_ENTRIES emails
+    LOCKOUT_KEY_PREFIX = get_env("LOCKOUT_KEY_PREFIX", "assetanchor-lockout:")
+    LOCKOUT_LOCAL_MAX_ENTRIES = get_env_int("LOCKOUT_LOCAL_MAX_ENTRIES", 10000)
+    
+    # Password hashing (utils/password.py): werkzeug method string, e.g.
+    # "scrypt:32768:8:1" (empty: werkzeug's default); stored hashes made with
+    # other parameters are upgraded on the next login
+    PASSWORD_HASH_METHOD = get_env("PASSWORD_HASH_METHOD", "")
+    PASSWORD_HASH_WORKERS = get_env_int("PASSWORD_HASH_WORKERS", 4)
+    
+    # Broadcast/announcement fan-out (services/notification_fanout_service.py)
+    NOTIFICATION_FANOUT_INLINE = get_env_bool("NOTIFICATION_FANOUT_INLINE", False)
+    NOTIFICATION_FANOUT_WORKERS = get_env_int("NOTIFICATION_FANOUT_WORKERS", 2)
+    NOTIFICATION_FANOUT_CHUNK_SIZE = get_env_int("NOTIFICATION_FANOUT_CHUNK_SIZE", 1000)
+    NOTIFICATION_FANOUT_LEASE_SECONDS = get_env_int("NOTIFICATION_FANOUT_LEASE_SECONDS", 300)
+    # Requeue interrupted broadcasts on the first request of each process
+    NOTIFICATION_FANOUT_RESUME_ON_START = get_env_bool("NOTIFICATION_FANOUT_RESUME_ON_START", True)
+    
+    # Outbound email (services/email_outbox_service.py): provider is smtp
+    # (Flask-Mail), postmark, sendgrid or stub; 0 workers leaves delivery to
+    # `flask email-outbox-worker`
+    EMAIL_PROVIDER = get_env("EMAIL_PROVIDER", "smtp")
+    EMAIL_API_KEY = get_env("EMAIL_API_KEY", "")
+    EMAIL_FROM = get_env("EMAIL_FROM", "")
+    EMAIL_RATE_LIMIT_PER_SECOND = get_env_int("EMAIL_RATE_LIMIT_PER_SECOND", 10)
+    EMAIL_HTTP_CONNECT_TIMEOUT = get_env_int("EMAIL_HTTP_CONNECT_TIMEOUT", 5)
+    EMAIL_HTTP_READ_TIMEOUT = get_env_int("EMAIL_HTTP_READ_TIMEOUT", 30)
+    EMAIL_OUTBOX_INLINE = get_env_bool("EMAIL_OUTBOX_INLINE", False)
+    EMAIL_OUTBOX_WORKERS = get_env_int("EMAIL_OUTBOX_WORKERS", 1)
+    EMAIL_OUTBOX_BATCH_SIZE = get_env_int("EMAIL_OUTBOX_BATCH_SIZE", 100)
+    EMAIL_OUTBOX_MAX_ATTEMPTS = get_env_int("EMAIL_OUTBOX_MAX_ATTEMPTS", 6)
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS = get_env_int("EMAIL_OUTBOX_RETRY_BASE_SECONDS", 60)
+    EMAIL_OUTBOX_RETRY_MAX_SECONDS = get_env_int("EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600)
+    EMAIL_OUTBOX_POLL_SECONDS = get_env_int("EMAIL_OUTBOX_POLL_SECONDS", 5)
+    EMAIL_OUTBOX_LEASE_SECONDS = get_env_int("EMAIL_OUTBOX_LEASE_SECONDS", 300)
+    # Compile templates/email and their plain-text twins at startup
+    EMAIL_TEMPLATES_PRECOMPILE = get_env_bool("EMAIL_TEMPLATES_PRECOMPILE", True)
+    
+    # Write logs from a background listener thread (utils/log_masker.py)
+    # instead of the request thread
+    LOG_QUEUE = get_env_bool("LOG_QUEUE", True)
+    
     # Uploads
     UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "uploads")
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    
+    # Document store (services/document_store.py): "local" keeps blobs under
+    # DOCUMENT_STORE_ROOT (default <UPLOAD_FOLDER>/blobs), "s3" uses boto3
+    # against DOCUMENT_STORE_S3_ENDPOINT, "s3-local" is the on-disk S3 stand-in
+    DOCUMENT_STORE_BACKEND = get_env("DOCUMENT_STORE_BACKEND", "local")
+    DOCUMENT_STORE_ROOT = get_env("DOCUMENT_STORE_ROOT", "")
+    DOCUMENT_STORE_S3_BUCKET = get_env("DOCUMENT_STORE_S3_BUCKET", "")
+    DOCUMENT_STORE_S3_ENDPOINT = get_env("DOCUMENT_STORE_S3_ENDPOINT", "")
+    DOCUMENT_STORE_S3_PREFIX = get_env("DOCUMENT_STORE_S3_PREFIX", "blobs")
+    # Hand downloads to the reverse proxy: "" streams from the app,
+    # "x-accel" (nginx, internal location at DOCUMENT_ACCEL_REDIRECT_PREFIX)
+    # or "x-sendfile" (Apache/lighttpd, local backend only)
+    DOCUMENT_DOWNLOAD_OFFLOAD = get_env("DOCUMENT_DOWNLOAD_OFFLOAD", "")
+    DOCUMENT_ACCEL_REDIRECT_PREFIX = get_env("DOCUMENT_ACCEL_REDIRECT_PREFIX", "/protected/blobs")
 
 
 class DevelopmentConfig(BaseConfig):
@@ -158,6 +265,9 @@ class DevelopmentConfig(BaseConfig):
     FORCE_HTTPS = False
     SESSION_COOKIE_SECURE = False
     
+    # Surface N+1 patterns and Server-Timing while developing
+    QUERY_BUDGET_ENABLED = get_env_bool("QUERY_BUDGET_ENABLED", True)
+    
     # Defensive defaults for development
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key-change-in-production")
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "dev-jwt-key-change-in-production")
@@ -237,6 +347,28 @@ class TestingConfig(BaseConfig):
     # Disable Sentry in tests
     SENTRY_DSN = None
     
+    # Fail tests when a view exceeds its declared @query_budget
+    QUERY_BUDGET_ENABLED = True
+    QUERY_BUDGET_STRICT = True
+    # N+1 warnings stay out of the working tree; tests read them with caplog
+    SLOW_QUERY_LOG_DIR = None
+    
+    # Apply Stripe events within the webhook request
+    STRIPE_EVENTS_INLINE = True
+    
+    # No background blocklist purge thread
+    TOKEN_BLOCKLIST_PURGE_INTERVAL = 0
+    
+    # Run broadcasts within the request
+    NOTIFICATION_FANOUT_INLINE = True
+    
+    # Deliver queued email within the request, to the recording stub
+    EMAIL_PROVIDER = "stub"
+    EMAIL_OUTBOX_INLINE = True
+    
+    # Keep test uploads out of the working tree
+    DOCUMENT_STORE_ROOT = os.path.join(tempfile.gettempdir(), "test_document_store")
+    
     # Minimal password requirements for faster tests
     PASSWORD_MIN_LENGTH = 4
     PASSWORD_REQUIRE_UPPERCASE = False
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func, or_, desc, case
+from sqlalchemy import func, desc, case
 from datetime import datetime, timedelta
 
 from ..models.user import User
@@ -11,19 +11,34 @@ from ..models.payment import Payment
 from ..models.invoice import Invoice
 from ..models.maintenance_request import MaintenanceRequest
 from ..models.tenant_property import TenantProperty
-from ..models.notification import Notification
 from ..models.landlord_profile import LandlordProfile
 from ..models.tenant_profile import TenantProfile
 from ..extensions import db
 from ..utils.role_required import role_required
+from ..services.notification_fanout_service import NotificationFanoutService
+from ..services.property_service import PropertyService
+from ..services.search_service import apply_search, search_criterion
+from ..utils.cursor_pagination import InvalidCursor, cursor_params, keyset_paginate, wants_cursor
 
 admin_bp = Blueprint('admin', __name__)
 
+def _admin_user_dict(user):
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "role": user.role,
+        "is_verified": user.is_verified,
+        "phone": user.phone,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "last_login": user.last_login.isoformat() if user.last_login else None
+    }
+
 @admin_bp.route('/users', methods=['GET'])
 @jwt_required()
 @role_required('admin')
 def get_users():
-    """Get all users with filters and pagination"""
+    """Get all users with filters and pagination (page/per_page, or keyset via ?cursor=)"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
@@ -36,30 +51,26 @@ def get_users():
         if role_filter:
             query = query.filter(User.role == role_filter)
             
+        if wants_cursor():
+            # Keyset pages are newest users first; search only narrows them
+            match = search_criterion('user', User.id, search)
+            if match is not None:
+                query = query.filter(match)
+            try:
+                page_data = keyset_paginate(query, (User.id.desc(),),
+                                            scope=f"admin-users:{role_filter}:{search}", **cursor_params(10))
+            except InvalidCursor as e:
+                return jsonify({"error": str(e)}), 400
+            page_data["users"] = [_admin_user_dict(user) for user in page_data.pop("items")]
+            return jsonify(page_data), 200
+
         if search:
-            query = query.filter(
-                or_(
-                    User.name.ilike(f'%{search}%'),
-                    User.email.ilike(f'%{search}%')
-                )
-            )
+            query = apply_search(query, 'user', User.id, search)
             
         # Paginate results
         paginated_users = query.paginate(page=page, per_page=per_page)
         
-        users_data = []
-        for user in paginated_users.items:
-            user_data = {
-                "id": user.id,
-                "name": user.name,
-                "email": user.email,
-                "role": user.role,
-                "is_verified": user.is_verified,
-                "phone": user.phone,
-                "created_at": user.created_at.isoformat() if user.created_at else None,
-                "last_login": user.last_login.isoformat() if user.last_login else None
-            }
-            users_data.append(user_data)
+        users_data = [_admin_user_dict(user) for user in paginated_users.items]
         
         result = {
             "users": users_data,
@@ -222,39 +233,20 @@ def get_properties():
         status_filter = request.args.get('status')
         search = request.args.get('search')
         
-        query = Property.query
-        
-        # Apply filters
-        if status_filter:
-            query = query.filter(Property.status == status_filter)
-            
-        if search:
-            query = query.filter(
-                or_(
-                    Property.name.ilike(f'%{search}%'),
-                    Property.address.ilike(f'%{search}%'),
-                    Property.city.ilike(f'%{search}%')
-                )
-            )
+        query = PropertyService.listing_query(filters={'status': status_filter, 'search': search})
             
         # Paginate results
         paginated_properties = query.paginate(page=page, per_page=per_page)
         
+        # Counts and landlord names for the whole page, one query each
+        listings = PropertyService.with_counts(paginated_properties.items)
+        landlord_ids = {prop.landlord_id for prop in listings}
+        landlord_names = dict(
+            db.session.query(User.id, User.name).filter(User.id.in_(landlord_ids))
+        ) if landlord_ids else {}
+        
         properties_data = []
-        for prop in paginated_properties.items:
-            # Get landlord name
-            landlord = db.session.get(User, prop.landlord_id)
-            landlord_name = landlord.name if landlord else "Unknown"
-            
-            # Get unit count
-            unit_count = Unit.query.filter_by(property_id=prop.id).count()
-            
-            # Get tenant count
-            tenant_count = TenantProperty.query.filter_by(
-                property_id=prop.id, 
-                status='active'
-            ).count()
-            
+        for prop in listings:
             prop_data = {
                 "id": prop.id,
                 "name": prop.name,
@@ -265,9 +257,9 @@ def get_properties():
                 "property_type": prop.property_type,
                 "status": prop.status,
                 "landlord_id": prop.landlord_id,
-                "landlord_name": landlord_name,
-                "unit_count": unit_count,
-                "tenant_count": tenant_count,
+                "landlord_name": landlord_names.get(prop.landlord_id, "Unknown"),
+                "unit_count": prop.unit_count,
+                "tenant_count": prop.tenant_count,
                 "created_at": prop.created_at.isoformat() if prop.created_at else None
             }
             properties_data.append(prop_data)
@@ -300,12 +292,7 @@ def get_tenants():
         
         # Apply search filter
         if search:
-            query = query.filter(
-                or_(
-                    User.name.ilike(f'%{search}%'),
-                    User.email.ilike(f'%{search}%')
-                )
-            )
+            query = apply_search(query, 'user', User.id, search)
             
         # Paginate results
         paginated_tenants = query.paginate(page=page, per_page=per_page)
@@ -600,32 +587,22 @@ def create_announcement():
         if target_role and target_role not in ['all', 'tenant', 'landlord']:
             return jsonify({"error": "Invalid target role"}), 400
             
-        # Get users based on target role
-        if not target_role or target_role == 'all':
-            users = User.query.all()
-        else:
-            users = User.query.filter_by(role=target_role).all()
-            
-        # Create notifications for each user
-        notifications_created = 0
-        for user in users:
-            notification = Notification(
-                user_id=user.id,
-                type='system',
-                title=data['title'],
-                message=data['message'],
-                read=False,
-                created_at=datetime.now()
-            )
-            db.session.add(notification)
-            notifications_created += 1
-            
-        db.session.commit()
+        # Fan out in the background; progress at GET /announcements/<id>
+        broadcast, error = NotificationFanoutService.start_broadcast(
+            created_by=current_user_id,
+            target_role=target_role or 'all',
+            title=data['title'],
+            message=data['message'],
+            notification_type='system'
+        )
+        if error:
+            return jsonify({"error": error}), 500
         
         return jsonify({
             "message": "Announcement created successfully",
-            "notifications_sent": notifications_created
-        }), 201
+            "notifications_sent": broadcast.sent,
+            "broadcast": broadcast.to_dict()
+        }), 202
         
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -634,6 +611,16 @@ def create_announcement():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@admin_bp.route('/announcements/<int:broadcast_id>', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def get_announcement(broadcast_id):
+    """Get the delivery progress of an announcement"""
+    broadcast, error = NotificationFanoutService.get_broadcast(broadcast_id)
+    if error:
+        return jsonify({"error": error}), 404
+    return jsonify(broadcast.to_dict()), 200
+
 @admin_bp.route('/verification-requests', methods=['GET'])
 @jwt_required()
 @role_required('admin')
@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, extract
+from sqlalchemy import func, and_, extract, case
 from sqlalchemy.exc import SQLAlchemyError
 from flask import jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
@@ -8,14 +8,28 @@ from src.extensions import db
 from src.models.property import Property
 from src.models.unit import Unit
 from src.models.payment import Payment
-from src.models.invoice import Invoice
 from src.models.maintenance_request import MaintenanceRequest
 from src.models.tenant_profile import TenantProfile
 from src.models.tenant_property import TenantProperty
 from src.models.user import User
+from src.services.stats_rollup_service import StatsRollupService
+from src.utils.sql_time import date_bucket, bucket_range, to_bucket_date
 
 logger = logging.getLogger(__name__)
 
+
+def _display_period(period_start, period):
+    """Human-readable label for the bucket starting at `period_start`"""
+    if period == 'weekly':
+        iso_year, iso_week, _ = period_start.isocalendar()
+        return f"Week {iso_week}, {iso_year}"
+    if period == 'quarterly':
+        return f"Q{(period_start.month - 1) // 3 + 1} {period_start.year}"
+    if period == 'daily':
+        return period_start.strftime('%b %d, %Y')
+    return period_start.strftime('%b %Y')
+
+
 @jwt_required()
 def get_dashboard_stats():
     """
@@ -27,80 +41,27 @@ def get_dashboard_stats():
     try:
         user_id = get_jwt_identity()
         
-        # Get landlord's properties
-        properties = Property.query.filter_by(landlord_id=user_id).all()
-        property_ids = [p.id for p in properties]
-        
-        if not property_ids:
-            return jsonify({"stats": {
-                "property_count": 0,
-                "unit_count": 0,
-                "occupied_units": 0,
-                "vacancy_rate": 0,
-                "tenant_count": 0,
-                "revenue_current_month": 0,
-                "outstanding_rent": 0,
-                "open_maintenance_requests": 0
-            }}), 200
+        # Single primary-key lookup on the per-landlord rollup
+        stats = StatsRollupService.get_stats(user_id) or {}
         
-        # Count units
-        unit_count = Unit.query.filter(Unit.property_id.in_(property_ids)).count()
-        
-        # Count occupied units
-        occupied_units = Unit.query.filter(
-            Unit.property_id.in_(property_ids),
-            Unit.status == 'occupied'
-        ).count()
+        unit_count = stats.get("unit_count", 0)
+        occupied_units = stats.get("occupied_units", 0)
         
         # Calculate vacancy rate
         vacancy_rate = 0
         if unit_count > 0:
             vacancy_rate = round(((unit_count - occupied_units) / unit_count) * 100, 1)
         
-        # Count tenants
-        tenant_count = TenantProperty.query.filter(
-            TenantProperty.property_id.in_(property_ids),
-            TenantProperty.status == 'active'
-        ).count()
-        
-        # Calculate revenue for current month
-        current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        current_month_end = (current_month_start.replace(month=current_month_start.month+1) if current_month_start.month < 12 
-                            else current_month_start.replace(year=current_month_start.year+1, month=1)) - timedelta(seconds=1)
-        
-        revenue_current_month = db.session.query(
-            func.sum(Payment.amount)
-        ).filter(
-            Payment.landlord_id == user_id,
-            Payment.status == "completed",
-            Payment.created_at.between(current_month_start, current_month_end)
-        ).scalar() or 0
-        
-        # Calculate outstanding rent
-        outstanding_rent = db.session.query(
-            func.sum(Invoice.amount)
-        ).filter(
-            Invoice.landlord_id == user_id,
-            Invoice.status.in_(["pending", "due", "overdue"]),
-            Invoice.due_date <= datetime.utcnow()
-        ).scalar() or 0
-        
-        # Count open maintenance requests
-        open_requests = MaintenanceRequest.query.filter(
-            MaintenanceRequest.property_id.in_(property_ids),
-            MaintenanceRequest.status.in_(["pending", "in_progress"])
-        ).count()
-        
         return jsonify({
             "stats": {
-                "property_count": len(properties),
+                "property_count": stats.get("property_count", 0),
                 "unit_count": unit_count,
                 "occupied_units": occupied_units,
                 "vacancy_rate": vacancy_rate,
-                "tenant_count": tenant_count,
-                "revenue_current_month": float(revenue_current_month),
-                "outstanding_rent": float(outstanding_rent),
-                "open_maintenance_requests": open_requests
+                "tenant_count": stats.get("tenant_count", 0),
+                "revenue_current_month": float(stats.get("revenue_current_month", 0)),
+                "outstanding_rent": float(stats.get("outstanding_rent", 0)),
+                "open_maintenance_requests": stats.get("open_maintenance_requests", 0)
             }
         }), 200
     except SQLAlchemyError as e:
@@ -119,69 +80,45 @@ def get_revenue_stats():
         user_id = get_jwt_identity()
         period = request.args.get('period', 'monthly')
         
-        # Get landlord's properties
-        properties = Property.query.filter_by(landlord_id=user_id).all()
-        property_ids = [p.id for p in properties]
-        
-        if not property_ids:
+        # Only landlords with properties get a revenue series
+        if not db.session.query(Property.id).filter_by(landlord_id=user_id).first():
             return jsonify({"revenue_data": []}), 200
         
         # Calculate date range
         end_date = datetime.utcnow()
-        if period == 'monthly':
-            start_date = end_date - timedelta(days=365)  # Last 12 months
-            date_trunc = 'month'
-            date_format = '%b %Y'
-        elif period == 'weekly':
+        if period == 'weekly':
             start_date = end_date - timedelta(days=12*7)  # Last 12 weeks
-            date_trunc = 'week'
-            date_format = 'Week %W, %Y'
         elif period == 'quarterly':
-            start_date = end_date - timedelta(days=4*365/4)  # Last 4 quarters
-            date_trunc = 'quarter'
-            date_format = 'Q%q %Y'
+            start_date = end_date - timedelta(days=365)  # Last 4 quarters
+        elif period == 'daily':
+            start_date = end_date - timedelta(days=30)  # Last 30 days
         else:
-            start_date = end_date - timedelta(days=365)
-            date_trunc = 'month'
-            date_format = '%b %Y'
+            period = 'monthly'
+            start_date = end_date - timedelta(days=365)  # Last 12 months
         
-        # Query revenue data
-        payments = Payment.query.filter(
+        # Aggregate per period in the database; only one row per period comes back
+        bucket = date_bucket(period, Payment.created_at).label('bucket')
+        rows = db.session.query(
+            bucket,
+            func.sum(Payment.amount).label('revenue'),
+            func.count(Payment.id).label('payment_count')
+        ).filter(
             Payment.landlord_id == user_id,
             Payment.status == "completed",
             Payment.created_at.between(start_date, end_date)
-        ).all()
-        
-        # Group by period
-        period_data = {}
-        for payment in payments:
-            if period == 'monthly':
-                period_key = payment.created_at.strftime('%Y-%m')
-                display_period = payment.created_at.strftime('%b %Y')
-            elif period == 'weekly':
-                period_key = f"{payment.created_at.year}-{payment.created_at.isocalendar()[1]}"
-                display_period = f"Week {payment.created_at.isocalendar()[1]}, {payment.created_at.year}"
-            elif period == 'quarterly':
-                quarter = (payment.created_at.month - 1) // 3 + 1
-                period_key = f"{payment.created_at.year}-Q{quarter}"
-                display_period = f"Q{quarter} {payment.created_at.year}"
-            else:
-                period_key = payment.created_at.strftime('%Y-%m')
-                display_period = payment.created_at.strftime('%b %Y')
-                
-            if period_key not in period_data:
-                period_data[period_key] = {
-                    'period': display_period,
-                    'revenue': 0,
-                    'payment_count': 0
-                }
-            
-            period_data[period_key]['revenue'] += float(payment.amount)
-            period_data[period_key]['payment_count'] += 1
-        
-        # Convert to list and sort
-        revenue_data = list(period_data.values())
-        revenue_data.sort(key=lambda x: x['period'])
+        ).group_by(bucket).all()
+        
+        totals = {to_bucket_date(row.bucket): row for row in rows}
+        
+        # Chronological series with empty periods zero-filled
+        revenue_data = []
+        for period_start in bucket_range(start_date, end_date, period):
+            row = totals.get(period_start)
+            revenue_data.append({
+                'period': _display_period(period_start, period),
+                'revenue': float(row.revenue) if row else 0.0,
+                'payment_count': row.payment_count if row else 0
+            })
         
         return jsonify({"revenue_data": revenue_data}), 200
     except SQLAlchemyError as e:
@@ -199,23 +136,26 @@ def get_occupancy_stats():
     try:
         user_id = get_jwt_identity()
         
-        # Get landlord's properties
-        properties = Property.query.filter_by(landlord_id=user_id).all()
-        
-        if not properties:
-            return jsonify({"occupancy_data": []}), 200
+        # Unit counts for every property in one grouped query; the outer join
+        # keeps properties without units
+        rows = db.session.query(
+            Property.id,
+            Property.name,
+            func.count(Unit.id).label('unit_count'),
+            func.sum(case((Unit.status == 'occupied', 1), else_=0)).label('occupied_units')
+        ).outerjoin(
+            Unit, Unit.property_id == Property.id
+        ).filter(
+            Property.landlord_id == user_id
+        ).group_by(
+            Property.id, Property.name
+        ).order_by(Property.id).all()
         
         occupancy_data = []
         
-        for prop in properties:
-            # Count units for this property
-            unit_count = Unit.query.filter_by(property_id=prop.id).count()
-            
-            # Count occupied units
-            occupied_units = Unit.query.filter(
-                Unit.property_id == prop.id,
-                Unit.status == 'occupied'
-            ).count()
+        for row in rows:
+            unit_count = row.unit_count
+            occupied_units = int(row.occupied_units or 0)
             
             # Calculate occupancy rate
             occupancy_rate = 0
@@ -223,8 +163,8 @@ def get_occupancy_stats():
                 occupancy_rate = round((occupied_units / unit_count) * 100, 1)
             
             occupancy_data.append({
-                "property_id": prop.id,
-                "property_name": prop.name,
+                "property_id": row.id,
+                "property_name": row.name,
                 "occupancy_rate": occupancy_rate,
                 "total_units": unit_count,
                 "occupied_units": occupied_units
@@ -396,37 +336,47 @@ def get_tenant_stats():
     try:
         user_id = get_jwt_identity()
         
-        # Get landlord's properties
-        properties = Property.query.filter_by(landlord_id=user_id).all()
-        property_ids = [p.id for p in properties]
+        # Count tenants per property in one grouped query
+        rows = db.session.query(
+            Property.id,
+            Property.name,
+            func.count(TenantProperty.id).label('tenant_count')
+        ).outerjoin(
+            TenantProperty, TenantProperty.property_id == Property.id
+        ).filter(
+            Property.landlord_id == user_id
+        ).group_by(
+            Property.id, Property.name
+        ).order_by(Property.id).all()
         
-        if not property_ids:
+        if not rows:
             return jsonify({"tenant_data": []}), 200
         
-        # Count tenants per property
-        tenant_counts = []
-        for prop in properties:
-            tenant_count = TenantProperty.query.filter(
-                TenantProperty.property_id == prop.id
-            ).count()
-            
-            tenant_counts.append({
-                "property_id": prop.id,
-                "property_name": prop.name,
-                "tenant_count": tenant_count
-            })
-        
-        # Count total tenants
-        total_tenant_count = TenantProperty.query.filter(
-            TenantProperty.property_id.in_(property_ids)
-        ).distinct(TenantProperty.tenant_id).count()
+        tenant_counts = [
+            {
+                "property_id": row.id,
+                "property_name": row.name,
+                "tenant_count": row.tenant_count
+            }
+            for row in rows
+        ]
+        
+        # Total distinct tenants and tenants with leases expiring in next 90 days
+        now = datetime.utcnow()
+        totals = db.session.query(
+            func.count(func.distinct(TenantProperty.tenant_id)).label('total_tenants'),
+            func.sum(case(
+                (TenantProperty.end_date.between(now, now + timedelta(days=90)), 1),
+                else_=0
+            )).label('expiring_soon')
+        ).join(
+            Property, Property.id == TenantProperty.property_id
+        ).filter(
+            Property.landlord_id == user_id
+        ).one()
         
-        # Count tenants with leases expiring in next 90 days
-        expiring_soon_count = TenantProperty.query.filter(
-            TenantProperty.property_id.in_(property_ids),
-            TenantProperty.end_date.isnot(None),
-            TenantProperty.end_date.between(datetime.utcnow(), datetime.utcnow() + timedelta(days=90))
-        ).count()
+        total_tenant_count = totals.total_tenants
+        expiring_soon_count = int(totals.expiring_soon or 0)
         
         return jsonify({
             "tenant_data": {
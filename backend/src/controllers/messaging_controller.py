@@ -10,76 +10,30 @@ from ..models.tenant_property import TenantProperty
 from ..models.property import Property
 from ..extensions import db, socketio
 from ..utils.role_required import role_required
+from ..services.messaging_service import MessagingService
+from ..services.search_service import apply_search, search_criterion
+from ..utils.cursor_pagination import InvalidCursor
 
 messaging_bp = Blueprint('messaging', __name__)
 
 @messaging_bp.route('/threads', methods=['GET'])
 @jwt_required()
 def get_threads():
-    """Get all message threads for the current user"""
+    """Get the current user's message threads, newest first, keyset-paginated via ?cursor="""
     current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id)
-    
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
+
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        
-        # Query threads where the user is either sender or recipient
-        query = MessageThread.query.filter(
-            or_(
-                MessageThread.user1_id == current_user_id,
-                MessageThread.user2_id == current_user_id
-            )
-        ).order_by(MessageThread.updated_at.desc())
-        
-        # Paginate results
-        paginated_threads = query.paginate(page=page, per_page=per_page)
-        
-        threads_data = []
-        for thread in paginated_threads.items:
-            # Get the other user in the conversation
-            other_user_id = thread.user2_id if thread.user1_id == current_user_id else thread.user1_id
-            other_user = db.session.get(User, other_user_id)
-            
-            # Get the last message in the thread
-            last_message = Message.query.filter_by(thread_id=thread.id).order_by(Message.created_at.desc()).first()
-            
-            # Get unread count for current user
-            unread_count = Message.query.filter_by(
-                thread_id=thread.id,
-                recipient_id=current_user_id,
-                read=False
-            ).count()
-            
-            thread_data = {
-                "id": thread.id,
-                "other_user": {
-                    "id": other_user.id,
-                    "name": other_user.name,
-                    "email": other_user.email,
-                    "role": other_user.role
-                },
-                "last_message": last_message.to_dict() if last_message else None,
-                "unread_count": unread_count,
-                "created_at": thread.created_at.isoformat(),
-                "updated_at": thread.updated_at.isoformat()
-            }
-            threads_data.append(thread_data)
-        
-        result = {
-            "threads": threads_data,
-            "total": paginated_threads.total,
-            "pages": paginated_threads.pages,
-            "current_page": page
-        }
-        
-        return jsonify(result), 200
-        
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        result, error = MessagingService.get_thread_inbox(
+            current_user_id,
+            per_page=request.args.get('per_page', 10, type=int),
+            cursor=request.args.get('cursor')
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    if error:
+        return jsonify({"error": error}), 500
+
+    return jsonify(result), 200
 
 @messaging_bp.route('/threads/<int:user_id>', methods=['POST'])
 @jwt_required()
@@ -282,9 +236,9 @@ def mark_as_read(message_id):
 
 @messaging_bp.route('/threads/<int:thread_id>/read', methods=['PUT'])
 @jwt_required()
-def mark_thread_as_read(thread_id):
+def mark_thread_as_read(thread_id, user_id=None):
     """Mark all messages in a thread as read"""
-    current_user_id = get_jwt_identity()
+    current_user_id = int(user_id or get_jwt_identity())
     
     # Ensure thread exists and user is part of it
     thread = db.session.get(MessageThread, thread_id)
@@ -294,29 +248,15 @@ def mark_thread_as_read(thread_id):
     if thread.user1_id != current_user_id and thread.user2_id != current_user_id:
         return jsonify({"error": "You don't have access to this thread"}), 403
         
-    try:
-        # Mark all unread messages as read
-        unread_messages = Message.query.filter_by(
-            thread_id=thread_id,
-            recipient_id=current_user_id,
-            read=False
-        ).all()
-        
-        current_time = datetime.now()
-        for message in unread_messages:
-            message.read = True
-            message.read_at = current_time
-            
-        db.session.commit()
+    # Unread counts are derived from the participant's last_read_at
+    participant, error = MessagingService.mark_thread_read(current_user_id, thread_id)
+    if error:
+        return jsonify({"error": error}), 500
         
-        return jsonify({
-            "message": f"Marked {len(unread_messages)} messages as read",
-            "count": len(unread_messages)
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "message": "Thread marked as read",
+        "last_read_at": participant.last_read_at.isoformat()
+    }), 200
 
 @messaging_bp.route('/unread-count', methods=['GET'])
 @jwt_required()
@@ -339,7 +279,7 @@ def get_unread_count():
 @messaging_bp.route('/contacts', methods=['GET'])
 @jwt_required()
 def get_contacts():
-    """Get users that the current user can message"""
+    """Get users that the current user can message, optionally narrowed by ?search="""
     current_user_id = get_jwt_identity()
     user = db.session.get(User, current_user_id)
     
@@ -348,6 +288,8 @@ def get_contacts():
         
     try:
         contacts = []
+        search_filter = search_criterion('user', User.id, request.args.get('search'))
+        criteria = [search_filter] if search_filter is not None else []
         
         # If user is a tenant, they can message their landlords
         if user.role == 'tenant':
@@ -358,7 +300,8 @@ def get_contacts():
                 TenantProperty, TenantProperty.property_id == Property.id
             ).filter(
                 TenantProperty.tenant_id == current_user_id,
-                TenantProperty.status.in_(['active', 'pending'])
+                TenantProperty.status.in_(['active', 'pending']),
+                *criteria
             ).distinct().all()
             
             contacts = [
@@ -380,7 +323,8 @@ def get_contacts():
                 Property, Property.id == TenantProperty.property_id
             ).filter(
                 Property.landlord_id == current_user_id,
-                TenantProperty.status.in_(['active', 'pending'])
+                TenantProperty.status.in_(['active', 'pending']),
+                *criteria
             ).distinct().all()
             
             contacts = [
@@ -395,7 +339,9 @@ def get_contacts():
             
         # Admin can message anyone
         elif user.role == 'admin':
-            users = User.query.filter(User.id != current_user_id).all()
+            users = apply_search(
+                User.query.filter(User.id != current_user_id), 'user', User.id, request.args.get('search')
+            ).all()
             
             contacts = [
                 {
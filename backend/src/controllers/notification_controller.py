@@ -6,6 +6,8 @@ from ..models.notification import Notification
 from ..models.user import User
 from ..extensions import db, socketio
 from ..utils.role_required import role_required
+from ..services.notification_fanout_service import NotificationFanoutService
+from ..services.notification_counter_service import NotificationCounterService
 
 notification_bp = Blueprint('notifications', __name__)
 
@@ -102,23 +104,11 @@ def mark_all_as_read():
     current_user_id = get_jwt_identity()
     
     try:
-        # Get all unread notifications for the user
-        unread_notifications = Notification.query.filter_by(
-            user_id=current_user_id,
-            read=False
-        ).all()
-        
-        # Mark each as read
-        current_time = datetime.now()
-        for notification in unread_notifications:
-            notification.read = True
-            notification.read_at = current_time
-            
-        db.session.commit()
+        count = NotificationCounterService.mark_all_read(current_user_id)
         
         return jsonify({
-            "message": f"Marked {len(unread_notifications)} notifications as read",
-            "count": len(unread_notifications)
+            "message": f"Marked {count} notifications as read",
+            "count": count
         }), 200
         
     except Exception as e:
@@ -157,12 +147,9 @@ def clear_all_notifications():
     current_user_id = get_jwt_identity()
     
     try:
-        # Get count for response
-        count = Notification.query.filter_by(user_id=current_user_id).count()
-        
-        # Delete all notifications for user
-        Notification.query.filter_by(user_id=current_user_id).delete()
-        db.session.commit()
+        # Bulk DELETE bypasses the flush hooks, so the unread counter is reset with it
+        count = Notification.query.filter_by(user_id=current_user_id).delete()
+        NotificationCounterService.recount([current_user_id])
         
         return jsonify({
             "message": f"Cleared {count} notifications",
@@ -180,10 +167,7 @@ def get_unread_count():
     current_user_id = get_jwt_identity()
     
     try:
-        unread_count = Notification.query.filter_by(
-            user_id=current_user_id,
-            read=False
-        ).count()
+        unread_count = NotificationCounterService.get_unread_count(current_user_id)
         
         return jsonify({"unread_count": unread_count}), 200
         
@@ -254,53 +238,41 @@ def broadcast_notification():
             if field not in data:
                 return jsonify({"error": f"Missing required field: {field}"}), 400
         
-        # Get all users with the specified role
-        role = data['role']
-        if role not in ['tenant', 'landlord', 'admin', 'all']:
-            return jsonify({"error": "Invalid role specified"}), 400
-            
-        if role == 'all':
-            users = User.query.all()
-        else:
-            users = User.query.filter_by(role=role).all()
-            
-        if not users:
-            return jsonify({"error": f"No users found with role: {role}"}), 404
-            
-        # Create notifications for each user
-        created_count = 0
-        for user in users:
-            new_notification = Notification(
-                user_id=user.id,
-                type=data['type'],
-                title=data['title'],
-                message=data['message'],
-                resource_type=data.get('resource_type'),
-                resource_id=data.get('resource_id'),
-                read=False
-            )
-            
-            db.session.add(new_notification)
-            created_count += 1
-            
-            # Emit socket event for real-time notification
-            socketio.emit(
-                'new_notification', 
-                new_notification.to_dict(),
-                room=f"user_{user.id}"
-            )
-            
-        db.session.commit()
+        # Fan out in the background; progress at GET /broadcast/<id>
+        broadcast, error = NotificationFanoutService.start_broadcast(
+            created_by=get_jwt_identity(),
+            target_role=data['role'],
+            title=data['title'],
+            message=data['message'],
+            notification_type=data['type'],
+            resource_type=data.get('resource_type'),
+            resource_id=data.get('resource_id')
+        )
+        if error:
+            return jsonify({"error": error}), 400 if error == "Invalid role specified" else 500
+        if broadcast.total == 0:
+            return jsonify({"error": f"No users found with role: {data['role']}"}), 404
         
         return jsonify({
-            "message": f"Successfully sent notification to {created_count} users",
-            "count": created_count
-        }), 201
+            "message": f"Broadcasting notification to {broadcast.total} users",
+            "count": broadcast.total,
+            "broadcast": broadcast.to_dict()
+        }), 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@notification_bp.route('/broadcast/<int:broadcast_id>', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def get_broadcast(broadcast_id):
+    """Get the progress of a broadcast (admin only)"""
+    broadcast, error = NotificationFanoutService.get_broadcast(broadcast_id)
+    if error:
+        return jsonify({"error": error}), 404
+    return jsonify(broadcast.to_dict()), 200
+
 # Utility functions for creating notifications programmatically
 def create_system_notification(user_id, notification_type, title, message, resource_type=None, resource_id=None):
     """Create a notification from within the system (not through API)"""
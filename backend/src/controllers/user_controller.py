@@ -9,15 +9,15 @@ from datetime import datetime, timedelta
 import uuid
 import os
 import json
-from sqlalchemy import or_
 
 from ..models.user import User
 from ..models.property import Property
 from ..models.tenant_property import TenantProperty
-from ..models.token_blocklist import TokenBlocklist
+from ..utils.token_revocation import revoke_token
 from ..models.password_reset import PasswordReset
 from ..extensions import db, mail
 from ..utils.role_required import role_required
+from ..services.search_service import apply_search
 from ..utils.email_service import send_email, send_verification_email, send_password_reset_email
 
 user_bp = Blueprint('users', __name__)
@@ -154,17 +154,8 @@ def refresh():
 def logout():
     """Logout the current user by revoking their tokens"""
     try:
-        user_id = int(get_jwt_identity())
-        jti = get_jwt()['jti']
-        
-        # Add token to blocklist
-        now = datetime.now()
-        token = TokenBlocklist(
-            jti=jti,
-            created_at=now
-        )
-        db.session.add(token)
-        db.session.commit()
+        # Add token to blocklist until it expires
+        revoke_token(get_jwt())
         
         return jsonify({"message": "Successfully logged out"}), 200
         
@@ -488,12 +479,7 @@ def get_users():
             query = query.filter(User.role == role_filter)
             
         if search:
-            query = query.filter(
-                or_(
-                    User.name.ilike(f'%{search}%'),
-                    User.email.ilike(f'%{search}%')
-                )
-            )
+            query = apply_search(query, 'user', User.id, search)
             
         # Paginate results
         paginated_users = query.paginate(page=page, per_page=per_page)
@@ -17,3 +17,9 @@ from .token_blocklist import TokenBlocklist
 from .password_reset import PasswordReset
 from .stripe_account import StripeAccount
 from .landlord_profile import LandlordProfile
+from .landlord_stats_rollup import LandlordStatsRollup
+from .idempotency_key import IdempotencyKey
+from .notification_broadcast import NotificationBroadcast
+from .email_outbox import EmailOutbox
+from .stored_blob import StoredBlob
+from .search_document import SearchDocument
@@ -16,6 +16,7 @@ class Document(db.Model):
     original_name = db.Column(db.String(255))  # Added original_name field
     file_type = db.Column(db.String(50))
     file_size = db.Column(db.Integer)  # size in bytes
+    content_hash = db.Column(db.String(64), index=True)  # stored_blobs.sha256; None for legacy files
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
@@ -0,0 +1,47 @@
+# backend/src/models/email_outbox.py
+
+from datetime import datetime
+from ..extensions import db
+
+class EmailOutbox(db.Model):
+    """
+    Outbound emails waiting for delivery.
+
+    Request handlers only insert rows (status `pending`); the workers in
+    services/email_outbox_service.py claim them in batches, hand them to the
+    configured provider and record the outcome.
+    """
+    __tablename__ = 'email_outbox'
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'  # retry scheduled at next_attempt_at
+    STATUS_DEAD = 'dead'      # rejected or out of attempts; needs `flask email-outbox-retry`
+
+    id = db.Column(db.Integer, primary_key=True)
+    to_address = db.Column(db.String(255), nullable=False)
+    from_address = db.Column(db.String(255), nullable=True)  # Provider default when empty
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=True)
+    text_body = db.Column(db.Text, nullable=True)
+    message_stream = db.Column(db.String(50), nullable=True)
+    tag = db.Column(db.String(50), nullable=True)  # verification, password_reset, invite, ...
+
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    provider_message_id = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_claim_token', 'claim_token'),
+    )
+
+    def __repr__(self):
+        return f"<EmailOutbox {self.id} to {self.to_address} ({self.status})>"
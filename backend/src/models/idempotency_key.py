@@ -0,0 +1,25 @@
+from datetime import datetime
+from ..extensions import db
+
+class IdempotencyKey(db.Model):
+    """
+    Durable claim on a webhook delivery, used by utils/idempotency.py when
+    Redis is unavailable.
+
+    `key` is "<scope>:<event id>". A `processing` row whose lease has
+    expired (locked_until in the past) may be claimed again; `done` rows are
+    permanent until purged with `flask purge-idempotency-keys`.
+    """
+    __tablename__ = 'idempotency_keys'
+
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+
+    key = db.Column(db.String(255), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PROCESSING)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key} ({self.status})>"
@@ -0,0 +1,42 @@
+from datetime import datetime
+from ..extensions import db
+
+class LandlordStatsRollup(db.Model):
+    """
+    Precomputed dashboard figures for a landlord, one row per landlord.
+
+    Rows are refreshed by the session hooks in services/stats_rollup_service.py
+    whenever a tracked model changes, and can be rebuilt with
+    `flask rebuild-stats-rollup`.
+    """
+    __tablename__ = 'landlord_stats_rollup'
+
+    landlord_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    property_count = db.Column(db.Integer, nullable=False, default=0)
+    unit_count = db.Column(db.Integer, nullable=False, default=0)
+    occupied_units = db.Column(db.Integer, nullable=False, default=0)
+    tenant_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue_current_month = db.Column(db.Float, nullable=False, default=0)
+    outstanding_rent = db.Column(db.Float, nullable=False, default=0)
+    open_maintenance_requests = db.Column(db.Integer, nullable=False, default=0)
+    expiring_leases = db.Column(db.Integer, nullable=False, default=0)
+    computed_on = db.Column(db.Date, nullable=False)  # Day the time-dependent figures refer to
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<LandlordStatsRollup landlord_id={self.landlord_id}>"
+
+    def to_dict(self):
+        return {
+            'landlord_id': self.landlord_id,
+            'property_count': self.property_count,
+            'unit_count': self.unit_count,
+            'occupied_units': self.occupied_units,
+            'tenant_count': self.tenant_count,
+            'revenue_current_month': self.revenue_current_month,
+            'outstanding_rent': self.outstanding_rent,
+            'open_maintenance_requests': self.open_maintenance_requests,
+            'expiring_leases': self.expiring_leases,
+            'computed_on': self.computed_on.isoformat() if self.computed_on else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
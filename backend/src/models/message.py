@@ -22,6 +22,11 @@ class Message(db.Model):
     conversation = db.relationship('Conversation', back_populates='messages')
     sender = db.relationship('User', backref=db.backref('sent_messages', lazy=True))
     
+    # Latest-message-per-conversation lookups in the thread inbox
+    __table_args__ = (
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<Message {self.id} from User {self.sender_id} in Conversation {self.conversation_id}>'
     
@@ -16,6 +16,11 @@ class MessageThread(db.Model):
     # Relationships
     user1 = db.relationship('User', foreign_keys=[user1_id])
     user2 = db.relationship('User', foreign_keys=[user2_id])
+    # Inbox keyset pagination per participant
+    __table_args__ = (
+        db.Index('ix_message_threads_user1_updated', 'user1_id', 'updated_at'),
+        db.Index('ix_message_threads_user2_updated', 'user2_id', 'updated_at'),
+    )
     # Remove the invalid relationship that's causing the error
     # messages = db.relationship('Message', backref='thread', lazy=True, cascade="all, delete-orphan")
     
@@ -0,0 +1,59 @@
+from datetime import datetime
+from ..extensions import db
+
+class NotificationBroadcast(db.Model):
+    """
+    A notification fanned out to every user of a role, and its progress.
+
+    Created by broadcasts and admin announcements and filled in by the
+    background job in services/notification_fanout_service.py, which commits
+    each chunk of notifications together with `sent` and `last_user_id`, so
+    an interrupted job resumes where it stopped. `locked_at` is the running
+    worker's lease, renewed with every chunk; a broadcast whose lease expired
+    is picked up again by `resume_broadcasts`.
+    """
+    __tablename__ = 'notification_broadcasts'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    target_role = db.Column(db.String(20), nullable=False, default='all')
+    type = db.Column(db.String(50), nullable=False, default='system')
+    title = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    resource_type = db.Column(db.String(50))
+    resource_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED, index=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)  # Keyset position of the fan-out
+    error = db.Column(db.Text)
+    locked_at = db.Column(db.DateTime)  # Lease of the worker fanning it out
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<NotificationBroadcast {self.id} ({self.status} {self.sent}/{self.total})>"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'created_by': self.created_by,
+            'target_role': self.target_role,
+            'type': self.type,
+            'title': self.title,
+            'message': self.message,
+            'status': self.status,
+            'total': self.total,
+            'sent': self.sent,
+            'progress': round(self.sent / self.total, 4) if self.total else 1.0,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
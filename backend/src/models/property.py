@@ -20,8 +20,8 @@ class Property(db.Model):
     amenities = db.Column(db.Text)
     status = db.Column(db.String(20), default='available')  # available, rented, maintenance
     unit_count = db.Column(db.Integer)
-    created_at = db.Column(db.DateTime, default=datetime.now)
-    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     landlord = db.relationship("User", backref="properties")
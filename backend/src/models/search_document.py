@@ -0,0 +1,58 @@
+from sqlalchemy import DDL, event
+
+from ..extensions import db
+
+class SearchDocument(db.Model):
+    """
+    The searchable text of one user, property or document.
+
+    Rows are written by the session hooks in services/search_service.py in
+    the same transaction as the entity. The full-text index lives beside the
+    table: a generated `tsv` tsvector column with a GIN index (and a pg_trgm
+    index on `content`) on PostgreSQL, the `search_documents_fts` FTS5
+    external-content table on SQLite.
+    """
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.UniqueConstraint('entity_type', 'entity_id', name='uq_search_documents_entity'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # user, property, document
+    entity_id = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False, default='')
+
+    def __repr__(self):
+        return f"<SearchDocument {self.entity_type}:{self.entity_id}>"
+
+
+# Index DDL for databases built with create_all; migrations carry their own copy
+POSTGRES_INDEX_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING GIN (tsv)",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_trgm ON search_documents USING GIN (content gin_trgm_ops)",
+)
+
+SQLITE_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5("
+    "content, content='search_documents', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_documents_fts(search_documents_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); "
+    "INSERT INTO search_documents_fts(rowid, content) VALUES (new.id, new.content); END",
+)
+
+for _statement in POSTGRES_INDEX_DDL:
+    event.listen(SearchDocument.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in SQLITE_INDEX_DDL:
+    event.listen(SearchDocument.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(SearchDocument.__table__, 'before_drop',
+             DDL("DROP TABLE IF EXISTS search_documents_fts").execute_if(dialect='sqlite'))
@@ -0,0 +1,28 @@
+from datetime import datetime
+from ..extensions import db
+
+class StoredBlob(db.Model):
+    """
+    A file in the document store, addressed by the SHA-256 of its bytes.
+
+    `ref_count` is the number of documents pointing at the blob; the bytes
+    are deleted from the store when it drops to zero (see
+    services/document_store.py). `flask reconcile-document-blobs` recomputes
+    the counts from the documents table.
+    """
+    __tablename__ = 'stored_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    storage_key = db.Column(db.String(255), nullable=False)  # aa/bb/<sha256>.<ext>
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(255), nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @property
+    def etag(self):
+        """Strong validator: the content hash never changes for a given key"""
+        return self.sha256
+
+    def __repr__(self):
+        return f"<StoredBlob {self.sha256[:12]} refs={self.ref_count}>"
@@ -5,17 +5,36 @@ from ..extensions import db
 
 class StripeEvent(db.Model):
     """
-    Model to track processed Stripe webhook events for idempotency
+    Stripe webhook events: the idempotency record and the processing queue.
+
+    The webhook only verifies and inserts the event (status `pending`); the
+    workers in webhooks/stripe_worker.py apply it and record the outcome.
     """
     __tablename__ = 'stripe_events'
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_PROCESSED = 'processed'
+    STATUS_FAILED = 'failed'  # retry scheduled at next_attempt_at
+    STATUS_DEAD = 'dead'      # out of attempts; needs `flask stripe-events-retry`
     
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.String(255), unique=True, nullable=False)
     event_type = db.Column(db.String(255), nullable=False)
     api_version = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    processed_at = db.Column(db.DateTime, default=datetime.utcnow)
-    payload = db.Column(db.Text, nullable=True)  # Optional: store full payload for debugging
+    processed_at = db.Column(db.DateTime, nullable=True)
+    payload = db.Column(db.Text, nullable=True)  # Event JSON the worker replays
+
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PROCESSED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_stripe_events_status_next_attempt', 'status', 'next_attempt_at'),
+    )
     
     def __repr__(self):
-        return f"<StripeEvent {self.event_id} ({self.event_type})>"
+        return f"<StripeEvent {self.event_id} ({self.event_type}, {self.status})>"
@@ -8,6 +8,7 @@ class TokenBlocklist(db.Model):
     jti = db.Column(db.String(36), nullable=False, unique=True)
     type = db.Column(db.String(10), nullable=True)  # 'access' or 'refresh'
     created_at = db.Column(db.DateTime, default=datetime.now)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # Token's `exp` (UTC); purged after
     
     def __repr__(self):
         return f"<BlocklistedToken {self.jti}>"
@@ -18,5 +19,6 @@ class TokenBlocklist(db.Model):
             'id': self.id,
             'jti': self.jti,
             'type': self.type,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
         }
\ No newline at end of file
@@ -15,8 +15,8 @@ class Unit(db.Model):
     description = db.Column(db.Text)
     features = db.Column(db.Text)
     status = db.Column(db.String(20), default='available')  # available, occupied, maintenance
-    created_at = db.Column(db.DateTime, default=datetime.now)
-    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     tenant_properties = db.relationship('TenantProperty', backref='unit', lazy=True)
@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from ..extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from ..utils.password import hash_password, verify_password
 
 class User(db.Model):
     landlord_profile = db.relationship('LandlordProfile', back_populates='user', uselist=False)
@@ -37,15 +37,18 @@ class User(db.Model):
     # Account status
     is_active = db.Column(db.Boolean, default=True)
     
+    # Denormalized, maintained by services/notification_counter_service.py
+    unread_notification_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Stripe integration fields
     stripe_customer_id = db.Column(db.String(100), nullable=True)
     stripe_account_id = db.Column(db.String(100), nullable=True)
     
     def set_password(self, password):
-        self.password = generate_password_hash(password)  # Changed from password_hash to password
+        self.password = hash_password(password)  # Changed from password_hash to password
         
     def check_password(self, password):
-        return check_password_hash(self.password, password)  # Changed from password_hash to password
+        return verify_password(password, self.password)  # Changed from password_hash to password
     
     def __repr__(self):
         return f"<User {self.id}: {self.name} ({self.role})>"
@@ -4,7 +4,7 @@ from flask import Blueprint
 from ..controllers.admin_controller import (
     get_users, get_user, update_user, delete_user,
     get_properties, get_tenants, get_stats, get_payments,
-    get_maintenance_requests, create_announcement,
+    get_maintenance_requests, create_announcement, get_announcement,
     verify_user_email, get_verification_requests
 )
 from ..controllers.admin_logs_controller import get_logs, get_audit_log
@@ -34,6 +34,7 @@ admin_bp.route('/maintenance', methods=['GET'])(get_maintenance_requests)
 
 # Announcements
 admin_bp.route('/announcements', methods=['POST'])(create_announcement)
+admin_bp.route('/announcements/<int:broadcast_id>', methods=['GET'])(get_announcement)
 
 # User verification
 admin_bp.route('/verify-email/<int:user_id>', methods=['PUT'])(verify_user_email)
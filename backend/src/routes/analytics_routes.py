@@ -4,12 +4,20 @@ from ..controllers.analytics_controller import (
     get_occupancy_stats, get_maintenance_stats,
     get_tenant_stats, get_property_analytics
 )
+from ..utils.cache import cached
+from ..utils.performance import query_budget
 
 analytics_bp = Blueprint('analytics', __name__)
 
-analytics_bp.route('/dashboard', methods=['GET'])(get_dashboard_stats)
-analytics_bp.route('/revenue', methods=['GET'])(get_revenue_stats)
-analytics_bp.route('/occupancy', methods=['GET'])(get_occupancy_stats)
-analytics_bp.route('/maintenance', methods=['GET'])(get_maintenance_stats)
-analytics_bp.route('/tenants', methods=['GET'])(get_tenant_stats)
-analytics_bp.route('/property/<int:property_id>', methods=['GET'])(get_property_analytics)
\ No newline at end of file
+# Cached per landlord; evicted on commit of any row the landlord owns
+landlord_cached = cached(ttl=300, tags=['landlord:{identity}'])
+
+# The dashboard reads one rollup row
+analytics_bp.route('/dashboard', methods=['GET'])(landlord_cached(query_budget(6)(get_dashboard_stats)))
+analytics_bp.route('/revenue', methods=['GET'])(landlord_cached(get_revenue_stats))
+analytics_bp.route('/occupancy', methods=['GET'])(landlord_cached(get_occupancy_stats))
+analytics_bp.route('/maintenance', methods=['GET'])(landlord_cached(get_maintenance_stats))
+analytics_bp.route('/tenants', methods=['GET'])(landlord_cached(get_tenant_stats))
+analytics_bp.route('/property/<int:property_id>', methods=['GET'])(
+    cached(ttl=300, tags=['landlord:{identity}', 'property:{property_id}'])(get_property_analytics)
+)
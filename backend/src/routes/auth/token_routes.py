@@ -4,10 +4,9 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import (
     jwt_required, get_jwt_identity, create_access_token, get_jwt
 )
-from datetime import datetime, timezone, timedelta
 
 from ...models.user import User
-from ...models.token_blocklist import TokenBlocklist
+from ...utils.token_revocation import is_token_revoked, revoke_token
 from ...extensions import db, jwt
 
 bp = Blueprint("auth_tokens", __name__)
@@ -70,19 +69,12 @@ def logout():
     Returns:
         dict: Success message
     """
-    jti = get_jwt()["jti"]
-    now = datetime.now(timezone.utc)
-    
-    # Add token to blocklist
-    token = TokenBlocklist(jti=jti, created_at=now)
-    db.session.add(token)
-    db.session.commit()
+    # Add token to blocklist until it expires
+    revoke_token(get_jwt())
     
     return jsonify({"message": "Successfully logged out"}), 200
 
 # JWT token blocklist loader
 @jwt.token_in_blocklist_loader
 def check_if_token_is_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    token = TokenBlocklist.query.filter_by(jti=jti).first()
-    return token is not None
+    return is_token_revoked(jwt_payload)
@@ -22,8 +22,10 @@ from flask_jwt_extended import (
 )
 from ..extensions import db, jwt, limiter
 from ..models.user import User
-from ..models.token_blocklist import TokenBlocklist
+from ..utils.token_revocation import is_token_revoked, revoke_token
 from ..utils.limiter import limit_if_enabled
+from ..utils.account_security import check_account_lockout, reset_login_attempts, track_failed_login
+from ..utils.password import verify_and_upgrade
 from ..utils.validators import validate_email, validate_password
 from ..utils.email_service import send_welcome_email
 from ..controllers.auth_controller import request_password_reset, confirm_password_reset
@@ -34,10 +36,7 @@ bp = Blueprint("auth", __name__)  # prefix applied in app.register_blueprint(...
 # JWT blocklist callback
 @jwt.token_in_blocklist_loader
 def _check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload.get("jti")
-    if not jti:
-        return True
-    return db.session.query(TokenBlocklist.id).filter_by(jti=jti).first() is not None
+    return is_token_revoked(jwt_payload)
 
 
 @bp.get("/verify")
@@ -107,9 +106,11 @@ def login():
     if not email or not password:
         return jsonify({"error": "Email and password are required"}), 400
 
+    # One user lookup serves the lockout, password and reset steps
+    user = User.query.filter_by(email=email).first()
+
     # Check for account lockout status
-    from ..utils.account_security import check_account_lockout
-    lockout_status = check_account_lockout(email)
+    lockout_status = check_account_lockout(email, user=user)
     if lockout_status.get('locked', False):
         unlock_time = lockout_status.get('unlock_time')
         # Make sure we're comparing UTC datetime objects
@@ -131,15 +132,14 @@ def login():
                 "locked": True
             }), 403
 
-    user = User.query.filter_by(email=email).first()
-    if not user or not user.check_password(password):
+    # Verified on the hashing pool; unknown emails cost the same as wrong passwords
+    if not verify_and_upgrade(user, password):
         # Track failed attempt
-        from ..utils.account_security import track_failed_login
-        track_status = track_failed_login(email, request.remote_addr)
+        track_status = track_failed_login(email, request.remote_addr, user=user)
         
         # Return different message if this attempt triggered a lockout
         if track_status.get('locked', False):
-            minutes = current_app.config.get('ACCOUNT_LOCKOUT_MINUTES', 15)
+            minutes = current_app.config.get('ACCOUNT_LOCKOUT_DURATION_MINUTES', 30)
             return jsonify({
                 "error": f"Too many failed attempts. Account locked for {minutes} minutes.",
                 "locked": True
@@ -177,8 +177,7 @@ def login():
                 return jsonify({"error": "Invalid MFA code"}), 401
     
     # Reset any failed login attempts
-    from ..utils.account_security import reset_login_attempts
-    reset_login_attempts(email)
+    reset_login_attempts(email, user=user)
     
     # Generate tokens
     access_token = create_access_token(
@@ -187,7 +186,7 @@ def login():
     )
     refresh_token = create_refresh_token(identity=str(user.id))
 
-    # Update last login timestamp
+    # Update last login timestamp (and commit any upgraded password hash)
     user.last_login = datetime.now(timezone.utc)
     db.session.commit()
 
@@ -309,9 +308,7 @@ def logout():
     if not jti or not ttype:
         return jsonify({"message": "Already logged out"}), 200
 
-    now = datetime.now(timezone.utc)
-    db.session.add(TokenBlocklist(jti=jti, type=ttype, created_at=now))
-    db.session.commit()
+    revoke_token(token)
 
     response = jsonify({"message": "Successfully logged out"})
     if current_app.config.get('JWT_COOKIE_SECURE', False):
@@ -1,7 +1,7 @@
 from flask import Blueprint
 from ..controllers.document_controller import (
     upload_document, get_documents, get_document,
-    update_document, delete_document
+    update_document, delete_document, download_document
 )
 
 document_bp = Blueprint('documents', __name__)
@@ -9,5 +9,6 @@ document_bp = Blueprint('documents', __name__)
 document_bp.route('/', methods=['POST'])(upload_document)
 document_bp.route('/', methods=['GET'])(get_documents)
 document_bp.route('/<int:document_id>', methods=['GET'])(get_document)
+document_bp.route('/<int:document_id>/download', methods=['GET'])(download_document)
 document_bp.route('/<int:document_id>', methods=['PUT'])(update_document)
 document_bp.route('/<int:document_id>', methods=['DELETE'])(delete_document)
\ No newline at end of file
@@ -1,21 +1,48 @@
 # backend/src/routes/invoice_routes.py
-from flask import Blueprint
+from flask import Blueprint, request
+from sqlalchemy import select
 from src.controllers.invoice_controller import (
     create_invoice, get_invoices, get_invoice,
     update_invoice, delete_invoice, get_tenant_invoices,
     get_landlord_invoices, mark_paid, mark_unpaid,
     generate_rent_invoices,
 )
+from src.models.invoice import Invoice
+from src.models.property import Property
+from src.utils.conditional import conditional_get, fingerprint_query, combine_fingerprints
 
 invoice_bp = Blueprint("invoices", __name__)
 
+
+def _invoices_fingerprint(column, arg):
+    """
+    Fingerprint of the invoices selected by `column` == the query arg or the
+    caller, plus the properties whose names they embed.
+    """
+    def fingerprint(identity):
+        try:
+            owner_id = int(request.args.get(arg, identity))
+        except (TypeError, ValueError):
+            return None  # let the view report the bad parameter
+        criteria = column == owner_id
+        return combine_fingerprints(
+            fingerprint_query(Invoice, criteria),
+            fingerprint_query(Property, Property.id.in_(select(Invoice.property_id).where(criteria))),
+        )
+    return fingerprint
+
+
 invoice_bp.route("/", methods=["POST"])(create_invoice)
-invoice_bp.route("/", methods=["GET"])(get_invoices)
-invoice_bp.route("/<int:invoice_id>", methods=["GET"])(get_invoice)
+invoice_bp.route("/", methods=["GET"])(conditional_get()(get_invoices))
+invoice_bp.route("/<int:invoice_id>", methods=["GET"])(conditional_get()(get_invoice))
 invoice_bp.route("/<int:invoice_id>", methods=["PUT"])(update_invoice)
 invoice_bp.route("/<int:invoice_id>", methods=["DELETE"])(delete_invoice)
-invoice_bp.route("/tenant", methods=["GET"])(get_tenant_invoices)
-invoice_bp.route("/landlord", methods=["GET"])(get_landlord_invoices)
+invoice_bp.route("/tenant", methods=["GET"])(
+    conditional_get(_invoices_fingerprint(Invoice.tenant_id, "tenant_id"))(get_tenant_invoices)
+)
+invoice_bp.route("/landlord", methods=["GET"])(
+    conditional_get(_invoices_fingerprint(Invoice.landlord_id, "landlord_id"))(get_landlord_invoices)
+)
 invoice_bp.route("/<int:invoice_id>/paid", methods=["PUT"])(mark_paid)
 invoice_bp.route("/<int:invoice_id>/unpay", methods=["PUT"])(mark_unpaid)
 invoice_bp.route("/generate-rent", methods=["POST"])(generate_rent_invoices)
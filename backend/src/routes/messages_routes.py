@@ -20,6 +20,9 @@ from ..controllers.messaging_controller import (
 from ..extensions import db, limiter
 from ..models.message_thread import MessageThread
 from ..models.user import User
+from ..services.messaging_service import MessagingService
+from ..utils.cursor_pagination import InvalidCursor, cursor_params, keyset_paginate, wants_cursor
+from ..utils.performance import query_budget
 
 # app.py should register this at url_prefix="/api/messages"
 messages_bp = Blueprint("messages", __name__)
@@ -45,6 +48,8 @@ def _normalize_response(result: Any):
     # If (payload, status) tuple
     if isinstance(result, tuple) and len(result) == 2:
         payload, status = result
+        if isinstance(payload, Response):
+            return payload, status
         return _ok(payload, status)
 
     # Otherwise assume dict payload, 200 OK
@@ -55,72 +60,37 @@ def _normalize_response(result: Any):
 @messages_bp.route("/threads", methods=["GET"])
 @jwt_required()
 @limiter.limit("240/hour")
+@query_budget(8, max_repeats=3)
 def list_threads():
     """
     GET /api/messages/threads
     
-    Retrieves all message threads where the current user is a participant.
-    Returns paginated list of threads with basic information about the other participant.
+    Retrieves the message threads where the current user is a participant,
+    most recently updated first, each with the other participant, the latest
+    message and the unread count, in a single query.
     
     Optional query params:
-      - page (int): Page number, defaults to 1
-      - per_page (int): Number of threads per page, defaults to 10
+      - per_page (int): Number of threads per page, defaults to 10 (max 100)
+      - cursor (str): `next_cursor` from the previous page (keyset pagination)
       
     Returns:
-      - 200 OK: {"threads": [...], "total": int, "pages": int, "current_page": int}
-      - 404: If user not found
+      - 200 OK: {"threads": [...], "next_cursor": str|null, "per_page": int}
+      - 400: If the cursor is malformed
       - 500: On server error
     """
     try:
-        current_user_id = get_jwt_identity()
-        user = db.session.get(User, current_user_id)
-        
-        if not user:
-            return _err("User not found", 404)
-        
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        
-        # Query threads where the user is either sender or recipient
-        from sqlalchemy import or_
-        query = MessageThread.query.filter(
-            or_(
-                MessageThread.user1_id == current_user_id,
-                MessageThread.user2_id == current_user_id
-            )
-        ).order_by(MessageThread.updated_at.desc())
-        
-        # Paginate results
-        paginated_threads = query.paginate(page=page, per_page=per_page)
-        
-        threads_data = []
-        for thread in paginated_threads.items:
-            # Get the other user in the conversation
-            other_user_id = thread.user2_id if thread.user1_id == current_user_id else thread.user1_id
-            other_user = db.session.get(User, other_user_id)
-            
-            thread_data = {
-                "id": thread.id,
-                "subject": thread.subject,
-                "other_user": {
-                    "id": other_user.id,
-                    "name": other_user.name,
-                    "email": other_user.email,
-                    "role": other_user.role
-                },
-                "created_at": thread.created_at.isoformat(),
-                "updated_at": thread.updated_at.isoformat()
-            }
-            threads_data.append(thread_data)
-        
-        result = {
-            "threads": threads_data,
-            "total": paginated_threads.total,
-            "pages": paginated_threads.pages,
-            "current_page": page
-        }
+        result, error = MessagingService.get_thread_inbox(
+            get_jwt_identity(),
+            per_page=request.args.get('per_page', 10, type=int),
+            cursor=request.args.get('cursor')
+        )
+        if error:
+            current_app.logger.error("Failed to list message threads: %s", error)
+            return _err("Internal server error", 500)
         
         return _ok(result, 200)
+    except InvalidCursor as e:
+        return _err(str(e), 400)
     except Exception as e:
         current_app.logger.exception("Failed to list message threads: %s", str(e))
         return _err("Internal server error", 500)
@@ -164,7 +134,6 @@ def create_thread_direct():
         content = data.get("content", "")
         
         # Ensure the other user exists
-        from ..models.user import User
         other_user = db.session.get(User, recipient_id)
         if not other_user:
             return _err("Recipient user not found", 404)
@@ -292,9 +261,15 @@ def list_messages(thread_id: int):
       - page (int): Page number, defaults to 1
       - per_page (int): Number of messages per page, defaults to 20
       - since_id (int): Only return messages newer than this ID (not implemented yet)
+      - cursor (str): Keyset pagination for infinite scroll; empty for the
+        newest page, then the previous `next_cursor` for older pages.
+        Messages within a page stay oldest first.
+      - count (str): "exact" or "estimate" to include a total in cursor mode
       
     Returns:
-      - 200 OK: {"messages": [...], "total": int, "pages": int, "current_page": int}
+      - 200 OK: {"messages": [...], "total": int, "pages": int, "current_page": int},
+        or {"messages": [...], "next_cursor": str|null, "per_page": int} with ?cursor=
+      - 400: If the cursor is invalid
       - 403: If the user doesn't have access to the thread
       - 404: If thread not found
       - 500: On server error
@@ -330,6 +305,15 @@ def list_messages(thread_id: int):
             db.session.commit()
             current_app.logger.debug(f"Created conversation for thread {thread_id}")
         
+        if wants_cursor():
+            page_data = keyset_paginate(
+                Message.query.filter_by(conversation_id=thread_id),
+                (Message.created_at.desc(), Message.id.desc()),
+                scope=f"messages:{thread_id}", **cursor_params(default_per_page=20)
+            )
+            page_data["messages"] = [message.to_dict() for message in reversed(page_data.pop("items"))]
+            return _ok(page_data, 200)
+
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
@@ -349,6 +333,8 @@ def list_messages(thread_id: int):
         }
         
         return _ok(result, 200)
+    except InvalidCursor as e:
+        return _err(str(e), 400)
     except Exception as e:
         current_app.logger.exception("Failed to get messages for thread %s: %s", thread_id, str(e))
         return _err("Internal server error", 500)
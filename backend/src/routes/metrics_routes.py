@@ -1,104 +1,196 @@
 """
 Metrics endpoints for application performance monitoring.
 Provides Prometheus-compatible metrics.
+
+Request metrics are labeled by the matched route template
+(`request.url_rule.rule`, e.g. `/api/properties/<int:property_id>`) and
+method, never by the raw path, so the number of series is bounded by the
+route table. Unmatched requests share the `<unmatched>` label.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory before
+the workers start; `/api/metrics` then aggregates every worker's samples,
+and `mark_worker_dead` (called from gunicorn's `child_exit` hook) drops the
+live gauges of exited workers.
 """
-from flask import Blueprint, Response, current_app
+from flask import Blueprint, Response, current_app, request, g
 import time
 import os
 import psutil
-import json
-from prometheus_client import generate_latest, Counter, Histogram, Gauge, CollectorRegistry, multiprocess
+from prometheus_client import (
+    generate_latest, Counter, Histogram, Gauge, CollectorRegistry, multiprocess,
+    REGISTRY, CONTENT_TYPE_LATEST
+)
 
 # Create metrics blueprint
 bp = Blueprint('metrics', __name__)
 
+APP_NAME = 'property_backend'
+UNMATCHED_ENDPOINT = '<unmatched>'
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
 # Define metrics
 REQUEST_COUNT = Counter(
     'request_count', 'App Request Count',
     ['app_name', 'method', 'endpoint', 'http_status']
 )
-REQUEST_LATENCY = Histogram(
-    'request_latency_seconds', 'Request latency',
-    ['app_name', 'endpoint']
-)
 ERROR_COUNT = Counter(
     'error_count', 'Application Error Count',
     ['app_name', 'error_type']
 )
+REQUESTS_IN_FLIGHT = Gauge(
+    'requests_in_flight', 'Requests currently being handled',
+    ['app_name', 'method', 'endpoint'],
+    multiprocess_mode='livesum'
+)
 ACTIVE_SESSIONS = Gauge(
     'active_sessions', 'Number of active user sessions',
-    ['app_name']
-)
-CPU_USAGE = Gauge('cpu_usage_percent', 'CPU Usage Percentage')
-MEMORY_USAGE = Gauge('memory_usage_bytes', 'Memory Usage in Bytes')
-DB_QUERY_LATENCY = Histogram(
-    'db_query_latency_seconds', 'Database Query Latency',
-    ['app_name', 'query_type']
+    ['app_name'],
+    multiprocess_mode='livesum'
 )
+# System-wide readings: every worker reports the same host, keep the max
+CPU_USAGE = Gauge('cpu_usage_percent', 'CPU Usage Percentage', multiprocess_mode='livemax')
+MEMORY_USAGE = Gauge('memory_usage_bytes', 'Memory Usage in Bytes', multiprocess_mode='livemax')
+
+# Histograms take their bucket layout from the first init_metrics() call
+REQUEST_LATENCY = None
+RESPONSE_SIZE = None
+DB_QUERY_LATENCY = None
+
+
+def _create_histograms(latency_buckets, size_buckets):
+    """Create the histograms once per process; later calls keep the first layout."""
+    global REQUEST_LATENCY, RESPONSE_SIZE, DB_QUERY_LATENCY
+
+    if REQUEST_LATENCY is not None:
+        return
+    REQUEST_LATENCY = Histogram(
+        'request_latency_seconds', 'Request latency',
+        ['app_name', 'method', 'endpoint'],
+        buckets=latency_buckets
+    )
+    RESPONSE_SIZE = Histogram(
+        'response_size_bytes', 'Response body size',
+        ['app_name', 'method', 'endpoint'],
+        buckets=size_buckets
+    )
+    DB_QUERY_LATENCY = Histogram(
+        'db_query_latency_seconds', 'Database Query Latency',
+        ['app_name', 'query_type'],
+        buckets=latency_buckets
+    )
+
+
+def _parse_buckets(value, default):
+    """Accept a sequence or a comma-separated string of bucket bounds."""
+    if not value:
+        return tuple(default)
+    if isinstance(value, str):
+        value = [part for part in value.split(',') if part.strip()]
+    return tuple(sorted(float(bound) for bound in value))
+
+
+def request_labels():
+    """(method, endpoint) labels for the current request, bounded in cardinality."""
+    method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+    rule = request.url_rule
+    return method, rule.rule if rule is not None else UNMATCHED_ENDPOINT
+
 
-def track_request_latency(start_time, endpoint):
-    """Track request latency for a specific endpoint."""
+def track_request_latency(start_time, endpoint, method='GET'):
+    """Track request latency for a specific route template."""
     latency = time.time() - start_time
-    REQUEST_LATENCY.labels('property_backend', endpoint).observe(latency)
+    REQUEST_LATENCY.labels(APP_NAME, method, endpoint).observe(latency)
+
 
 def track_request_count(method, endpoint, status):
-    """Track request count for specific method, endpoint and status code."""
-    REQUEST_COUNT.labels('property_backend', method, endpoint, status).inc()
+    """Track request count for specific method, route template and status code."""
+    REQUEST_COUNT.labels(APP_NAME, method, endpoint, status).inc()
+
 
 def track_error(error_type):
     """Track application errors by type."""
-    ERROR_COUNT.labels('property_backend', error_type).inc()
+    ERROR_COUNT.labels(APP_NAME, error_type).inc()
+
 
 def update_system_metrics():
     """Update system metrics (CPU, memory)."""
     CPU_USAGE.set(psutil.cpu_percent())
     MEMORY_USAGE.set(psutil.virtual_memory().used)
 
+
+def multiprocess_enabled():
+    """True when prometheus_client writes samples to PROMETHEUS_MULTIPROC_DIR."""
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir'))
+
+
+def mark_worker_dead(pid):
+    """Drop the live gauges of an exited worker; call from gunicorn's child_exit hook."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
+
+
 def init_metrics(app):
     """Initialize metrics collection for the app."""
+    _create_histograms(
+        _parse_buckets(app.config.get('METRICS_LATENCY_BUCKETS'), DEFAULT_LATENCY_BUCKETS),
+        _parse_buckets(app.config.get('METRICS_SIZE_BUCKETS'), DEFAULT_SIZE_BUCKETS),
+    )
+
     @app.before_request
     def before_request():
         # Store the start time of each request
-        from flask import request
-        request.start_time = time.time()
+        if request.endpoint == 'metrics.metrics':
+            return
+        g.metrics_labels = request_labels()
+        g.metrics_start = time.time()
+        REQUESTS_IN_FLIGHT.labels(APP_NAME, *g.metrics_labels).inc()
 
     @app.after_request
     def after_request(response):
-        from flask import request
         # Skip metrics for the metrics endpoint itself to avoid recursion
-        if request.path != '/api/metrics':
-            # Track request latency
-            latency = time.time() - getattr(request, 'start_time', time.time())
-            REQUEST_LATENCY.labels('property_backend', request.path).observe(latency)
-            
-            # Track request count
-            REQUEST_COUNT.labels(
-                'property_backend',
-                request.method,
-                request.path,
-                response.status_code
-            ).inc()
-            
-            # Track errors
-            if response.status_code >= 400:
-                ERROR_COUNT.labels(
-                    'property_backend',
-                    f'http_{response.status_code}'
-                ).inc()
+        labels = g.get('metrics_labels')
+        if labels is None:
+            return response
+
+        method, endpoint = labels
+        REQUEST_LATENCY.labels(APP_NAME, method, endpoint).observe(time.time() - g.metrics_start)
+        REQUEST_COUNT.labels(APP_NAME, method, endpoint, response.status_code).inc()
+
+        size = response.calculate_content_length()
+        if size is not None:
+            RESPONSE_SIZE.labels(APP_NAME, method, endpoint).observe(size)
+
+        # Track errors
+        if response.status_code >= 400:
+            ERROR_COUNT.labels(APP_NAME, f'http_{response.status_code}').inc()
 
         return response
 
+    @app.teardown_request
+    def teardown_request(exc):
+        # Runs even when the view raised, so the gauge always comes back down
+        labels = g.pop('metrics_labels', None)
+        if labels is not None:
+            REQUESTS_IN_FLIGHT.labels(APP_NAME, *labels).dec()
+
     # Register metrics blueprint
     app.register_blueprint(bp, url_prefix='/api')
 
+
 @bp.route('/metrics')
 def metrics():
     """Expose metrics in Prometheus format."""
     # Update system metrics
     update_system_metrics()
-    
-    # Generate and return metrics
-    registry = CollectorRegistry()
-    multiprocess.MultiProcessCollector(registry)
-    
-    return Response(generate_latest(registry), mimetype='text/plain')
+
+    # Aggregate every worker's samples in multiprocess mode
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -6,10 +6,15 @@ from typing import Any, Dict
 
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
 
 from ..models.notification import Notification
-from ..models.user import User
 from ..extensions import db, limiter
+from ..utils.conditional import conditional_get, fingerprint_query
+from ..utils.cursor_pagination import InvalidCursor, cursor_params, keyset_paginate, wants_cursor
+from ..utils.performance import query_budget
+from ..services.notification_fanout_service import NotificationFanoutService
+from ..services.notification_counter_service import NotificationCounterService
 
 # app.py registers this at url_prefix="/api/notifications"
 notification_bp = Blueprint("notifications", __name__)
@@ -21,9 +26,24 @@ def _err(msg, code=400):
     return jsonify({"error": msg}), code
 
 
+def _read_flag():
+    """is_read as a non-null boolean, so filter, ORDER BY and keyset agree"""
+    return func.coalesce(Notification.is_read, False)
+
+
+def _notifications_fingerprint(identity):
+    """(max(updated_at), count) of the caller's notifications, honoring only_unread"""
+    criteria = [Notification.user_id == int(identity)]
+    if str(request.args.get("only_unread", "false")).lower() in {"1", "true", "yes", "on"}:
+        criteria.append(_read_flag() == False)  # noqa: E712
+    return fingerprint_query(Notification, *criteria)
+
+
 @notification_bp.route("/", methods=["GET"])
 @jwt_required()
 @limiter.limit("480/hour")
+@conditional_get(_notifications_fingerprint)
+@query_budget(10, max_repeats=4)
 def get_notifications():
     """
     Get notifications for the current user.
@@ -31,6 +51,9 @@ def get_notifications():
       - page (int, default 1)
       - per_page (int, default 20, max 100)
       - only_unread (bool)
+      - cursor (str): keyset pagination; empty for the first page, then the
+        previous `next_cursor`. Responds with `next_cursor` and no total
+        unless count=exact|estimate.
     """
     uid = get_jwt_identity()
     try:
@@ -39,18 +62,20 @@ def get_notifications():
         only_unread = str(request.args.get("only_unread", "false")).lower() in {"1", "true", "yes", "on"}
 
         q = Notification.query.filter_by(user_id=uid)
-        
-        # Handle either is_read or read field
-        if hasattr(Notification, 'is_read') and only_unread:
-            q = q.filter_by(is_read=False)
-        elif hasattr(Notification, 'read') and only_unread:
-            q = q.filter_by(read=False)
+        read_flag = _read_flag()
+        if only_unread:
+            q = q.filter(read_flag == False)  # noqa: E712
 
         # Unread first, most recent first
-        if hasattr(Notification, 'is_read'):
-            q = q.order_by(Notification.is_read.asc(), Notification.created_at.desc())
-        else:
-            q = q.order_by(Notification.read.asc(), Notification.created_at.desc())
+        if wants_cursor():
+            page_data = keyset_paginate(
+                q, (read_flag.asc(), Notification.created_at.desc(), Notification.id.desc()),
+                scope=f"notifications:{uid}:{int(only_unread)}", **cursor_params(default_per_page=20)
+            )
+            page_data["notifications"] = [n.to_dict() for n in page_data.pop("items")]
+            return _ok(page_data)
+
+        q = q.order_by(read_flag.asc(), Notification.created_at.desc())
 
         pagination = q.paginate(page=page, per_page=per_page, error_out=False)
         return _ok({
@@ -60,6 +85,8 @@ def get_notifications():
             "page": page,
             "per_page": per_page,
         })
+    except InvalidCursor as e:
+        return _err(str(e), 400)
     except Exception as e:
         current_app.logger.exception("Failed to get notifications for user %s: %s", uid, str(e))
         return _err("Internal server error", 500)
@@ -116,24 +143,8 @@ def mark_all_read():
     """Mark all notifications as read for the current user."""
     uid = get_jwt_identity()
     try:
-        # Build query based on which field is present
-        if hasattr(Notification, 'is_read'):
-            q = Notification.query.filter_by(user_id=uid, is_read=False)
-        else:
-            q = Notification.query.filter_by(user_id=uid, read=False)
-            
-        now = datetime.utcnow()
-        updated = 0
-        for n in q.all():
-            if hasattr(n, 'is_read'):
-                n.is_read = True
-            if hasattr(n, 'read'):
-                n.read = True
-            n.read_at = now
-            n.updated_at = now
-            updated += 1
-            
-        db.session.commit()
+        # One UPDATE ... WHERE over the caller's unread rows
+        updated = NotificationCounterService.mark_all_read(uid)
         return _ok({"message": "All notifications marked as read", "count": updated})
     except Exception as e:
         db.session.rollback()
@@ -195,7 +206,7 @@ def get_unread_count():
     """Get count of unread notifications for the current user."""
     uid = get_jwt_identity()
     try:
-        count = Notification.query.filter_by(user_id=uid, is_read=False).count()
+        count = NotificationCounterService.get_unread_count(uid)
         return _ok({"unread_count": count})
     except Exception:
         current_app.logger.exception("Failed to get unread count for user %s", uid)
@@ -236,38 +247,39 @@ def create_notification():
 def broadcast_notification():
     """Send a notification to all users (admin-only if you wire role_required)."""
     data: Dict[str, Any] = request.get_json(silent=True) or {}
-    try:
-        message = (data.get("message") or "").strip()
-        if not message:
-            return _err("Field 'message' is required", 400)
+    message = (data.get("message") or "").strip()
+    if not message:
+        return _err("Field 'message' is required", 400)
+
+    # Fanned out in the background; progress at GET /broadcast/<id>
+    broadcast, error = NotificationFanoutService.start_broadcast(
+        created_by=get_jwt_identity(),
+        target_role=data.get("role") or "all",
+        title=(data.get("title") or "Announcement").strip()[:100],
+        message=message,
+        notification_type=data.get("type") or "system",
+    )
+    if error == "Invalid role specified":
+        return _err(error, 400)
+    if error:
+        current_app.logger.error("Failed to broadcast notification: %s", error)
+        return _err("Internal server error", 500)
 
-        users = User.query.with_entities(User.id).all()
-        if not users:
-            return _ok({"message": "No users to notify", "notifications": []}, 201)
-
-        notifications = []
-        now = datetime.utcnow()
-        for (user_id,) in users:
-            n = Notification(
-                user_id=user_id,
-                message=message,
-                is_read=False,
-                created_at=now,
-                updated_at=now,
-            )
-            db.session.add(n)
-            notifications.append(n)
+    return _ok(
+        {
+            "message": "Notification broadcast queued",
+            "count": broadcast.total,
+            "broadcast": broadcast.to_dict(),
+        },
+        202,
+    )
 
-        db.session.commit()
-        return _ok(
-            {
-                "message": "Notification broadcasted to all users",
-                "count": len(notifications),
-                "notifications": [n.to_dict() for n in notifications],
-            },
-            201,
-        )
-    except Exception:
-        db.session.rollback()
-        current_app.logger.exception("Failed to broadcast notification")
-        return _err("Internal server error", 500)
+
+@notification_bp.route("/broadcast/<int:broadcast_id>", methods=["GET"])
+@jwt_required()
+def get_broadcast(broadcast_id: int):
+    """Progress of a broadcast started by the caller."""
+    broadcast, error = NotificationFanoutService.get_broadcast(broadcast_id)
+    if error or broadcast.created_by != int(get_jwt_identity()):
+        return _err("Broadcast not found", 404)
+    return _ok(broadcast.to_dict())
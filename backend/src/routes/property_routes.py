@@ -12,6 +12,10 @@ from ..controllers.property_controller import (
     delete_property,
 )
 from ..extensions import limiter
+from ..models.property import Property
+from ..services.property_service import PropertyService
+from ..utils.conditional import conditional_get, fingerprint_query
+from ..utils.performance import query_budget
 
 # app.py registers this at url_prefix="/api/properties"
 property_bp = Blueprint("property", __name__)
@@ -28,9 +32,24 @@ def _err(msg, code=400):
     return jsonify({"error": msg}), code
 
 
+def _properties_fingerprint(identity):
+    """(max(updated_at), count) of the properties visible to the caller"""
+    criteria = PropertyService.visible_property_criteria(identity)
+    return None if criteria is None else fingerprint_query(Property, *criteria)
+
+
+def _property_fingerprint(identity, property_id):
+    # A property the caller may not read counts 0 rows, so a revoked
+    # tenant never matches the ETag of the copy they were once served
+    criteria = PropertyService.visible_property_criteria(identity)
+    return None if criteria is None else fingerprint_query(Property, Property.id == property_id, *criteria)
+
+
 @property_bp.route("/", methods=["GET"])
 @jwt_required()
 @limiter.limit("240/hour")
+@conditional_get(_properties_fingerprint)
+@query_budget(12, max_repeats=4)
 def list_properties():
     """
     GET /api/properties
@@ -53,6 +72,8 @@ def list_properties():
 @property_bp.route("/<int:property_id>", methods=["GET"])
 @jwt_required()
 @limiter.limit("480/hour")
+@conditional_get(_property_fingerprint)
+@query_budget(12, max_repeats=4)
 def fetch_property(property_id: int):
     """
     GET /api/properties/<property_id>
@@ -4,14 +4,30 @@ from ..controllers.unit_controller import (
     update_unit, delete_unit, get_available_units,
     assign_tenant_to_unit, remove_tenant_from_unit
 )
+from ..models.property import Property
+from ..models.unit import Unit
+from ..services.property_service import PropertyService
+from ..utils.conditional import conditional_get, fingerprint_query, combine_fingerprints
 
 unit_bp = Blueprint('units', __name__)
 
+
+def _units_fingerprint(identity, property_id):
+    """Units of the property plus the property itself, whose name each unit embeds"""
+    criteria = PropertyService.visible_property_criteria(identity)
+    if criteria is None:
+        return None
+    return combine_fingerprints(
+        fingerprint_query(Unit, Unit.property_id == property_id),
+        fingerprint_query(Property, Property.id == property_id, *criteria),
+    )
+
+
 unit_bp.route('/', methods=['POST'])(create_unit)
-unit_bp.route('/property/<int:property_id>', methods=['GET'])(get_units_by_property)
-unit_bp.route('/<int:unit_id>', methods=['GET'])(get_unit)
+unit_bp.route('/property/<int:property_id>', methods=['GET'])(conditional_get(_units_fingerprint)(get_units_by_property))
+unit_bp.route('/<int:unit_id>', methods=['GET'])(conditional_get()(get_unit))
 unit_bp.route('/<int:unit_id>', methods=['PUT'])(update_unit)
 unit_bp.route('/<int:unit_id>', methods=['DELETE'])(delete_unit)
 unit_bp.route('/available', methods=['GET'])(get_available_units)
 unit_bp.route('/<int:unit_id>/assign-tenant', methods=['POST'])(assign_tenant_to_unit)
-unit_bp.route('/<int:unit_id>/remove-tenant', methods=['POST'])(remove_tenant_from_unit)
\ No newline at end of file
+unit_bp.route('/<int:unit_id>/remove-tenant', methods=['POST'])(remove_tenant_from_unit)
@@ -1,103 +1,52 @@
 from ..models.property import Property
 from ..models.unit import Unit
-from ..models.tenant_property import TenantProperty
-from ..models.lease import Lease
-from ..models.invoice import Invoice
 from ..models.payment import Payment
-from ..models.maintenance_request import MaintenanceRequest
 from ..extensions import db
+from .stats_rollup_service import StatsRollupService
+from ..utils.sql_time import days_between, date_bucket, bucket_range, to_bucket_date, BUCKET_PERIODS
 from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func, and_, or_, case, extract
+from sqlalchemy import func, and_, case, literal, Date
 from datetime import datetime, timedelta
 
+# Period keys as formerly produced by strftime on SQLite
+_PERIOD_LABELS = {
+    'daily': lambda d: d.strftime('%Y-%m-%d'),
+    'weekly': lambda d: d.strftime('%Y-%W'),
+    'monthly': lambda d: d.strftime('%Y-%m'),
+    'quarterly': lambda d: f"{d.year}-Q{(d.month - 1) // 3 + 1}",
+}
+
 class AnalyticsService:
     @staticmethod
     def get_landlord_dashboard_stats(landlord_id):
-        """Get overview statistics for landlord dashboard"""
+        """Get overview statistics for landlord dashboard from the stats rollup"""
         try:
-            # Get current date for calculations
-            today = datetime.utcnow().date()
-            current_month = today.month
-            current_year = today.year
+            stats = StatsRollupService.get_stats(landlord_id) or {}
             
-            # Total properties
-            property_count = Property.query.filter_by(landlord_id=landlord_id).count()
-            
-            # Total units
-            unit_count = Unit.query.join(
-                Property, Property.id == Unit.property_id
-            ).filter(
-                Property.landlord_id == landlord_id
-            ).count()
-            
-            # Occupied units
-            occupied_units = Unit.query.join(
-                Property, Property.id == Unit.property_id
-            ).filter(
-                Property.landlord_id == landlord_id,
-                Unit.status == 'occupied'
-            ).count()
+            unit_count = stats.get('unit_count', 0)
+            occupied_units = stats.get('occupied_units', 0)
             
             # Calculate vacancy rate
             vacancy_rate = 0 if unit_count == 0 else round((1 - (occupied_units / unit_count)) * 100, 2)
             
-            # Total active tenants
-            tenant_count = TenantProperty.query.join(
-                Property, Property.id == TenantProperty.property_id
-            ).filter(
-                Property.landlord_id == landlord_id,
-                TenantProperty.status == 'active'
-            ).count()
-            
-            # Revenue this month
-            revenue = db.session.query(func.sum(Payment.amount)).filter(
-                Payment.landlord_id == landlord_id,
-                Payment.status == 'completed',
-                extract('month', Payment.created_at) == current_month,
-                extract('year', Payment.created_at) == current_year
-            ).scalar() or 0
-            
-            # Outstanding rent - check both category and description for rent
-            outstanding = db.session.query(func.sum(Invoice.amount)).filter(
-                Invoice.landlord_id == landlord_id,
-                Invoice.status.in_(['pending', 'due', 'overdue']),
-                or_(
-                    Invoice.category == 'rent',
-                    Invoice.description.ilike('%rent%')
-                )
-            ).scalar() or 0
+            outstanding = stats.get('outstanding_rent', 0)
             
             # In test environments, if no outstanding rent is found, use a default value
             # This helps tests pass while keeping the API contract consistent
             if outstanding == 0 and current_app.config.get('TESTING', False):
                 outstanding = 1200.0
             
-            # Open maintenance requests
-            maintenance_count = MaintenanceRequest.query.join(
-                Property, Property.id == MaintenanceRequest.property_id
-            ).filter(
-                Property.landlord_id == landlord_id,
-                MaintenanceRequest.status.in_(['pending', 'in_progress'])
-            ).count()
-            
-            # Expiring leases (next 30 days)
-            expiring_leases = Lease.query.filter(
-                Lease.landlord_id == landlord_id,
-                Lease.status == 'active',
-                Lease.end_date.between(today, today + timedelta(days=30))
-            ).count()
-            
             return {
-                'property_count': property_count,
+                'property_count': stats.get('property_count', 0),
                 'unit_count': unit_count,
                 'occupied_units': occupied_units,
                 'vacancy_rate': vacancy_rate,
-                'tenant_count': tenant_count,
-                'revenue_current_month': float(revenue),
+                'tenant_count': stats.get('tenant_count', 0),
+                'revenue_current_month': float(stats.get('revenue_current_month', 0)),
                 'outstanding_rent': float(outstanding),
-                'open_maintenance_requests': maintenance_count,
-                'expiring_leases': expiring_leases
+                'open_maintenance_requests': stats.get('open_maintenance_requests', 0),
+                'expiring_leases': stats.get('expiring_leases', 0)
             }, None
             
         except SQLAlchemyError as e:
@@ -107,8 +56,6 @@ class AnalyticsService:
     def get_revenue_analytics(landlord_id, period='monthly', start_date=None, end_date=None):
         """Get revenue analytics for a landlord"""
         try:
-            query = db.session
-            
             # Set default date range if not provided
             if not end_date:
                 end_date = datetime.utcnow().date()
@@ -120,39 +67,38 @@ class AnalyticsService:
                 elif period == 'weekly':
                     # Last 12 weeks
                     start_date = end_date - timedelta(weeks=12)
+                elif period == 'quarterly':
+                    # Last 4 quarters
+                    start_date = end_date.replace(year=end_date.year - 1)
                 else:  # daily
                     # Last 30 days
                     start_date = end_date - timedelta(days=30)
             
-            # Format date grouping based on period
-            if period == 'monthly':
-                # SQLite compatible date extraction
-                date_format = func.strftime('%Y-%m', Payment.created_at)
-            elif period == 'weekly':
-                # SQLite compatible week extraction
-                date_format = func.strftime('%Y-%W', Payment.created_at)
-            else:  # daily
-                date_format = func.strftime('%Y-%m-%d', Payment.created_at)
-            
-            # Query revenue by period
-            revenue_data = query.query(
-                date_format.label('period'),
+            if period not in BUCKET_PERIODS:
+                period = 'daily'
+            
+            # Group in the database with the dialect's native truncation
+            bucket = date_bucket(period, Payment.created_at).label('bucket')
+            revenue_data = db.session.query(
+                bucket,
                 func.sum(case((Payment.status == 'completed', Payment.amount), else_=0)).label('revenue'),
                 func.count(Payment.id).label('payment_count')
             ).filter(
                 Payment.landlord_id == landlord_id,
                 Payment.created_at.between(start_date, end_date + timedelta(days=1))
-            ).group_by('period').order_by('period').all()
-            
-            # Format results
-            results = [
-                {
-                    'period': item.period,
-                    'revenue': float(item.revenue),
-                    'payment_count': item.payment_count
-                }
-                for item in revenue_data
-            ]
+            ).group_by(bucket).all()
+            
+            totals = {to_bucket_date(item.bucket): item for item in revenue_data}
+            
+            # Format results, zero-filling periods without payments
+            results = []
+            for period_start in bucket_range(start_date, end_date, period):
+                item = totals.get(period_start)
+                results.append({
+                    'period': _PERIOD_LABELS[period](period_start),
+                    'revenue': float(item.revenue) if item else 0.0,
+                    'payment_count': item.payment_count if item else 0
+                })
             
             return results, None
             
@@ -163,43 +109,49 @@ class AnalyticsService:
     def get_occupancy_analytics(landlord_id):
         """Get occupancy statistics for a landlord's properties"""
         try:
-            # Get all properties
-            properties = Property.query.filter_by(landlord_id=landlord_id).all()
+            today = datetime.utcnow().date()
+            
+            # Units have no last-occupied date, so vacancy is measured from the
+            # property's creation, as the per-unit fallback always did
+            vacant_days = case(
+                (Unit.status == 'available', days_between(Property.created_at, literal(today, Date))),
+                else_=None
+            )
+            
+            # One grouped query for all properties; the inner join skips
+            # properties without units
+            rows = db.session.query(
+                Property.id,
+                Property.name,
+                func.count(Unit.id).label('total_units'),
+                func.sum(case((Unit.status == 'occupied', 1), else_=0)).label('occupied_units'),
+                func.avg(vacant_days).label('avg_vacant_days')
+            ).join(
+                Unit, Unit.property_id == Property.id
+            ).filter(
+                Property.landlord_id == landlord_id
+            ).group_by(
+                Property.id, Property.name
+            ).order_by(Property.id).all()
             
             results = []
-            for prop in properties:
-                # Get units for this property
-                units = Unit.query.filter_by(property_id=prop.id).all()
-                total_units = len(units)
-                
-                if total_units == 0:
-                    continue
-                    
-                # Count occupied units
-                occupied = sum(1 for unit in units if unit.status == 'occupied')
+            for row in rows:
+                total_units = row.total_units
+                occupied = int(row.occupied_units or 0)
                 
                 # Calculate occupancy rate
                 occupancy_rate = (occupied / total_units) * 100 if total_units > 0 else 0
                 
-                # Get current vacancy days (average days vacant for available units)
-                vacant_units = [unit for unit in units if unit.status == 'available']
-                if vacant_units:
-                    total_vacant_days = sum((datetime.utcnow().date() - (unit.last_occupied_date or prop.created_at.date())).days 
-                                           for unit in vacant_units)
-                    avg_vacant_days = total_vacant_days / len(vacant_units)
-                else:
-                    avg_vacant_days = 0
-                
                 results.append({
-                    'property_id': prop.id,
-                    'property_name': prop.name,
+                    'property_id': row.id,
+                    'property_name': row.name,
                     'total_units': total_units,
                     'occupied_units': occupied,
                     'occupancy_rate': round(occupancy_rate, 2),
-                    'avg_vacant_days': round(avg_vacant_days, 1)
+                    'avg_vacant_days': round(float(row.avg_vacant_days or 0), 1)
                 })
             
             return results, None
             
         except SQLAlchemyError as e:
-            return [], str(e)
\ No newline at end of file
+            return [], str(e)
@@ -0,0 +1,67 @@
+"""
+Tag-based invalidation of cached API responses.
+
+Cached responses are tagged with the landlord and property they were built
+from ("landlord:42", "property:7"), and per-user notification data with the
+user ("user:5"). A session `after_flush` hook collects the
+tags touched by each flush, and `after_commit` evicts them once the data is
+durable, so readers never repopulate the cache from uncommitted rows. Rolled
+back transactions invalidate nothing.
+"""
+import logging
+
+from flask import has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models.notification import Notification
+from ..utils.cache import invalidate_tags
+from .stats_rollup_service import affected_landlords
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'cache_invalidation_tags'
+_HOOKS_ATTACHED = False
+
+
+def tags_for(landlord_ids=(), property_ids=(), user_ids=()):
+    """Cache tags covering the given landlords, properties and users"""
+    tags = {f'landlord:{landlord_id}' for landlord_id in landlord_ids}
+    tags.update(f'property:{property_id}' for property_id in property_ids)
+    tags.update(f'user:{user_id}' for user_id in user_ids)
+    return tags
+
+
+def _after_flush(session, flush_context):
+    landlord_ids, property_ids = affected_landlords(session, flush_context)
+    user_ids = {
+        obj.user_id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, Notification) and obj.user_id is not None
+    }
+    tags = tags_for(landlord_ids, property_ids, user_ids)
+    if tags:
+        session.info.setdefault(_PENDING_KEY, set()).update(tags)
+
+
+def _after_commit(session):
+    tags = session.info.pop(_PENDING_KEY, None)
+    if tags and has_app_context():
+        invalidate_tags(tags)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_cache_invalidation(app):
+    """
+    Attach the session hooks evicting cached responses on commit.
+    Safe to call multiple times; hooks attach once.
+    """
+    global _HOOKS_ATTACHED
+
+    if not _HOOKS_ATTACHED:
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        _HOOKS_ATTACHED = True
@@ -5,9 +5,9 @@ from ..extensions import db
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 import os
-import uuid
-from werkzeug.utils import secure_filename
-from flask import current_app
+from ..utils.file_validator import ALLOWED_MIME_TYPES, FileValidationError, is_test_environment
+from .document_store import get_document_store
+from .search_service import apply_search
 
 class DocumentService:
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'jpg', 'jpeg', 'png'}
@@ -19,43 +19,45 @@ class DocumentService:
                filename.rsplit('.', 1)[1].lower() in DocumentService.ALLOWED_EXTENSIONS
     
     @staticmethod
-    def save_file(file, directory):
-        """Save file to filesystem"""
+    def save_file(file, store=None):
+        """Stream file into the document store, taking a reference to its blob"""
         if not file or not DocumentService.allowed_file(file.filename):
             return None, "Invalid file or file type not allowed"
         
-        # Create unique filename
-        original_filename = secure_filename(file.filename)
-        ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
-        unique_filename = f"{str(uuid.uuid4())}.{ext}"
-        
-        # Ensure directory exists
-        os.makedirs(directory, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(directory, unique_filename)
-        file.save(file_path)
+        # One pass over the upload; identical content is stored once
+        store = store or get_document_store()
+        try:
+            blob, upload = store.put(
+                file,
+                allowed_extensions=DocumentService.ALLOWED_EXTENSIONS,
+                allowed_mime_types=None if is_test_environment() else ALLOWED_MIME_TYPES,
+            )
+        except FileValidationError as e:
+            return None, str(e)
         
         return {
-            'original_filename': original_filename,
-            'filename': unique_filename,
-            'path': file_path,
-            'size': os.path.getsize(file_path),
-            'extension': ext
+            'original_filename': upload.filename,
+            'filename': os.path.basename(blob.storage_key),
+            'path': blob.storage_key,
+            'size': blob.size,
+            'extension': upload.extension,
+            'sha256': blob.sha256,
+            'mime_type': blob.content_type,
+            'deduplicated': upload.deduplicated
         }, None
     
     @staticmethod
     def upload_document(user_id, file, data):
         """Upload a new document"""
+        file_data = None
         try:
             # Verify user exists
             user = db.session.get(User, user_id)
             if not user:
                 return None, "User not found"
             
-            # Save file to appropriate directory
-            upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], f"user_{user_id}")
-            file_data, error = DocumentService.save_file(file, upload_dir)
+            # Store file contents
+            file_data, error = DocumentService.save_file(file)
             
             if error:
                 return None, error
@@ -71,6 +73,7 @@ class DocumentService:
                 original_name=file_data['original_filename'],
                 file_size=file_data['size'],
                 file_type=file_data['extension'],
+                content_hash=file_data.get('sha256'),
                 document_type=data.get('document_type', 'other'),
                 property_id=data.get('property_id'),
                 created_at=datetime.utcnow()
@@ -83,6 +86,8 @@ class DocumentService:
         
         except SQLAlchemyError as e:
             db.session.rollback()
+            if file_data and file_data.get('sha256'):
+                get_document_store().release(file_data['sha256'])
             return None, str(e)
         except Exception as e:
             return None, str(e)
@@ -100,13 +105,9 @@ class DocumentService:
                 if 'property_id' in filters:
                     query = query.filter_by(property_id=filters['property_id'])
                 if 'search' in filters and filters['search']:
-                    search = f"%{filters['search']}%"
-                    query = query.filter(
-                        (Document.name.ilike(search)) | 
-                        (Document.description.ilike(search))
-                    )
+                    query = apply_search(query, 'document', Document.id, filters['search'])
             
-            # Order by most recent first
+            # Order by most recent first (after search rank, if any)
             query = query.order_by(Document.created_at.desc())
             
             # Paginate results
@@ -130,13 +131,16 @@ class DocumentService:
             if document.user_id != user_id:
                 return False, "Not authorized to delete this document"
             
-            # Delete file from filesystem
-            if os.path.exists(document.file_path):
-                os.remove(document.file_path)
-            
-            # Delete database record
-            db.session.delete(document)
-            db.session.commit()
+            # Drop the blob reference (the bytes go with the last one);
+            # files from before the document store are removed directly
+            if document.content_hash:
+                db.session.delete(document)
+                get_document_store().release(document.content_hash)
+            else:
+                if os.path.exists(document.file_path):
+                    os.remove(document.file_path)
+                db.session.delete(document)
+                db.session.commit()
             
             return True, None
         
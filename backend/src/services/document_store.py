@@ -0,0 +1,393 @@
+"""
+Content-addressed document store.
+
+Features
+- Blobs are kept once per distinct content under `aa/bb/<sha256>.<ext>`,
+  streamed in through utils/upload_pipeline.py (one pass, bounded memory)
+- `stored_blobs` rows reference-count them: `put` takes a reference,
+  `release` drops one and deletes the bytes along with the last reference
+- Backends: the local filesystem, or S3 through a boto3-compatible client;
+  `LocalS3Client` is an on-disk S3 stand-in for development and tests
+  (DOCUMENT_STORE_BACKEND=s3-local)
+- `open` returns a seekable reader (S3 reads become buffered ranged GETs),
+  so downloads can answer HTTP Range requests without fetching whole objects
+- `flask reconcile-document-blobs` recomputes the counts from the documents
+  table and removes blobs nothing points at
+"""
+
+import io
+import logging
+import os
+import tempfile
+import threading
+
+import click
+from flask import current_app
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models.document import Document
+from ..models.stored_blob import StoredBlob
+from ..utils.upload_pipeline import ingest_upload
+
+try:
+    import boto3
+    _HAS_BOTO3 = True
+except ImportError:
+    boto3 = None
+    _HAS_BOTO3 = False
+
+logger = logging.getLogger(__name__)
+
+READ_BUFFER_SIZE = 1024 * 1024  # bytes fetched per ranged GET
+
+_EXT_KEY = 'document_store'
+_LOCK = threading.Lock()
+_NOT_FOUND_CODES = {'404', 'NoSuchKey', 'NotFound'}
+
+
+def _is_not_found(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return str(code) in _NOT_FOUND_CODES
+
+
+# ---- backends ----
+
+class LocalBlobBackend:
+    """Blobs as files under `root`; uploads are staged beside them and renamed in"""
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.staging_root = self.root
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def store(self, upload, key):
+        upload.commit(key)
+
+    def open(self, key, size=None):
+        return open(self.path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable read-only view of an S3 object; every read is a ranged GET"""
+
+    def __init__(self, client, bucket, key, size):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size or not len(buffer):
+            return 0
+        end = min(self.position + len(buffer), self.size) - 1
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key,
+                                          Range=f"bytes={self.position}-{end}")
+        data = response['Body'].read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class S3BlobBackend:
+    """Blobs as objects in an S3 bucket; uploads are staged in a local temp dir"""
+
+    name = 's3'
+
+    def __init__(self, client, bucket, prefix='', staging_root=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.staging_root = staging_root or os.path.join(tempfile.gettempdir(), 'document-store')
+
+    def object_key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def path(self, key):
+        return None
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except Exception as e:
+            if _is_not_found(e):
+                return False
+            raise
+
+    def store(self, upload, key):
+        if self.exists(key):
+            upload.deduplicated = True
+        else:
+            with open(upload.temp_path, 'rb') as body:
+                self.client.put_object(Bucket=self.bucket, Key=self.object_key(key),
+                                       Body=body, ContentLength=upload.size,
+                                       ContentType=upload.mime_type)
+        upload.discard()
+
+    def open(self, key, size=None):
+        if size is None:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            size = head['ContentLength']
+        raw = S3RangeReader(self.client, self.bucket, self.object_key(key), size)
+        return io.BufferedReader(raw, buffer_size=READ_BUFFER_SIZE)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+
+class LocalS3Error(Exception):
+    """Shaped like botocore's ClientError so callers can read .response"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class LocalS3Client:
+    """
+    The subset of the boto3 S3 client the store uses, backed by a directory
+    (<root>/<bucket>/<key>). Lets the S3 code path run without a bucket.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, bucket, key):
+        path = os.path.abspath(os.path.join(self.root, bucket, key))
+        if not path.startswith(self.root + os.sep):
+            raise LocalS3Error('InvalidKey', key)
+        return path
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        with os.fdopen(fd, 'wb') as out:
+            if isinstance(Body, bytes):
+                out.write(Body)
+            else:
+                for chunk in iter(lambda: Body.read(READ_BUFFER_SIZE), b''):
+                    out.write(chunk)
+        os.replace(temp_path, path)
+        return {}
+
+    def head_object(self, Bucket, Key):
+        try:
+            return {'ContentLength': os.path.getsize(self._path(Bucket, Key))}
+        except FileNotFoundError:
+            raise LocalS3Error('404', 'Not Found')
+
+    def get_object(self, Bucket, Key, Range=None):
+        try:
+            with open(self._path(Bucket, Key), 'rb') as f:
+                if Range:
+                    start, end = Range[len('bytes='):].split('-')
+                    f.seek(int(start))
+                    data = f.read(int(end) - int(start) + 1)
+                else:
+                    data = f.read()
+        except FileNotFoundError:
+            raise LocalS3Error('NoSuchKey', 'The specified key does not exist.')
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data)}
+
+    def delete_object(self, Bucket, Key):
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+        return {}
+
+
+# ---- store ----
+
+class DocumentStore:
+    """Reference-counted, content-addressed blobs on top of a backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def put(self, file, **validation):
+        """
+        Stream `file` into the store and take a reference to its blob.
+
+        `validation` is passed to ingest_upload (allowed_extensions,
+        allowed_mime_types, max_size). Commits the session.
+
+        Returns:
+            (StoredBlob, IngestedUpload)
+
+        Raises:
+            FileValidationError if the upload is rejected
+        """
+        upload = ingest_upload(file, self.backend.staging_root, **validation)
+        with upload:
+            blob = self._acquire(upload)
+            try:
+                # The blob may already be stored under another extension's key
+                self.backend.store(upload, blob.storage_key)
+            except Exception:
+                self.release(blob.sha256)
+                raise
+        return blob, upload
+
+    def _acquire(self, upload):
+        increment = (
+            update(StoredBlob)
+            .where(StoredBlob.sha256 == upload.sha256)
+            .values(ref_count=StoredBlob.ref_count + 1)
+        )
+        if not db.session.execute(increment).rowcount:
+            try:
+                db.session.add(StoredBlob(sha256=upload.sha256, storage_key=upload.relative_path,
+                                          size=upload.size, content_type=upload.mime_type, ref_count=1))
+                db.session.commit()
+                return db.session.get(StoredBlob, upload.sha256)
+            except IntegrityError:
+                # Another request stored the same bytes first
+                db.session.rollback()
+                db.session.execute(increment)
+        db.session.commit()
+        return db.session.get(StoredBlob, upload.sha256)
+
+    def release(self, sha256):
+        """
+        Drop one reference; the blob is deleted with its last reference.
+        Commits the session (and with it whatever the caller has pending).
+        Returns True if the blob was deleted.
+        """
+        # The UPDATE locks the row until commit, and a concurrent put's
+        # increment or insert waits on it. Unlinking before the commit means
+        # that put sees either the live row or no row and no bytes, never a
+        # file about to disappear that it would dedupe against.
+        db.session.execute(
+            update(StoredBlob)
+            .where(StoredBlob.sha256 == sha256)
+            .values(ref_count=StoredBlob.ref_count - 1)
+        )
+        key = db.session.query(StoredBlob.storage_key).filter(StoredBlob.sha256 == sha256).scalar()
+        removed = db.session.execute(
+            delete(StoredBlob).where(StoredBlob.sha256 == sha256, StoredBlob.ref_count <= 0)
+        ).rowcount
+        if removed:
+            self._delete_bytes(key)
+        db.session.commit()
+        return bool(removed)
+
+    def _delete_bytes(self, key):
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            # The row is gone; the orphaned bytes are harmless and get
+            # overwritten if the same content is uploaded again
+            logger.warning(f"Could not delete blob {key}: {e}")
+
+    def open(self, blob):
+        """Seekable binary reader over the blob's bytes"""
+        return self.backend.open(blob.storage_key, blob.size)
+
+    def local_path(self, blob):
+        """Filesystem path of the blob, or None when the backend is remote"""
+        return self.backend.path(blob.storage_key)
+
+    def reconcile(self):
+        """Recompute ref counts from documents and delete unreferenced blobs; returns (updated, removed)"""
+        counts = dict(
+            db.session.query(Document.content_hash, func.count())
+            .filter(Document.content_hash.isnot(None))
+            .group_by(Document.content_hash)
+        )
+        updated, orphaned = 0, []
+        for blob in StoredBlob.query.yield_per(1000):
+            refs = counts.get(blob.sha256, 0)
+            if refs == 0:
+                orphaned.append((blob.sha256, blob.storage_key, blob.ref_count))
+            elif blob.ref_count != refs:
+                blob.ref_count = refs
+                updated += 1
+        removed = 0
+        for sha256, key, seen_refs in orphaned:
+            # Skipped if a put took a reference since the scan; as in
+            # release, the bytes go while the row delete is uncommitted
+            if db.session.execute(
+                delete(StoredBlob).where(StoredBlob.sha256 == sha256, StoredBlob.ref_count == seen_refs)
+            ).rowcount:
+                self._delete_bytes(key)
+                removed += 1
+        db.session.commit()
+        return updated, removed
+
+
+def create_document_store(config):
+    """Build a DocumentStore from DOCUMENT_STORE_* config"""
+    backend_name = config.get('DOCUMENT_STORE_BACKEND', 'local')
+    root = config.get('DOCUMENT_STORE_ROOT') or os.path.join(config.get('UPLOAD_FOLDER', 'uploads'), 'blobs')
+    bucket = config.get('DOCUMENT_STORE_S3_BUCKET') or 'documents'
+    prefix = config.get('DOCUMENT_STORE_S3_PREFIX', 'blobs')
+
+    if backend_name == 'local':
+        backend = LocalBlobBackend(root)
+    elif backend_name == 's3-local':
+        backend = S3BlobBackend(LocalS3Client(root), bucket, prefix)
+    elif backend_name == 's3':
+        if not _HAS_BOTO3:
+            raise RuntimeError("DOCUMENT_STORE_BACKEND=s3 requires boto3")
+        client = boto3.client('s3', endpoint_url=config.get('DOCUMENT_STORE_S3_ENDPOINT') or None)
+        backend = S3BlobBackend(client, bucket, prefix)
+    else:
+        raise ValueError(f"Unknown DOCUMENT_STORE_BACKEND: {backend_name}")
+    return DocumentStore(backend)
+
+
+def get_document_store(app=None):
+    """The app's document store, memoized in app.extensions['document_store']"""
+    app = app or current_app._get_current_object()
+    store = app.extensions.get(_EXT_KEY)
+    if store is None:
+        with _LOCK:
+            store = app.extensions.get(_EXT_KEY)
+            if store is None:
+                store = app.extensions[_EXT_KEY] = create_document_store(app.config)
+    return store
+
+
+def init_document_store(app):
+    """Register the document store CLI commands"""
+
+    @app.cli.command('reconcile-document-blobs')
+    def reconcile_document_blobs():
+        """Recompute blob reference counts and delete unreferenced blobs."""
+        updated, removed = get_document_store().reconcile()
+        click.echo(f"Corrected {updated} reference counts, removed {removed} blobs")
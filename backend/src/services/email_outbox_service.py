@@ -0,0 +1,451 @@
+"""
+Outbound email queue.
+
+Features
+- `enqueue_email` adds an email_outbox row to the caller's session, so the
+  email is sent only if the caller's transaction commits; the workers are
+  woken after that commit. The provider round trip happens on the worker
+  pool, never in the request thread (EMAIL_OUTBOX_INLINE delivers right
+  after the commit, for tests)
+- Workers claim due rows in batches with a compare-and-set UPDATE tagged by
+  a claim token, so any number of threads and processes can drain the table
+- A claimed batch goes to the provider in one call: Postmark's /email/batch,
+  SendGrid personalizations, one SMTP connection; HTTP providers share a
+  pooled requests.Session and a per-provider token bucket
+  (EMAIL_RATE_LIMIT_PER_SECOND)
+- Failures retry with capped exponential backoff and jitter; rejected
+  recipients and messages out of attempts are parked as `dead`. Every claim
+  counts as an attempt, so rows whose worker died are parked too
+- The pool starts with the app's first request, so due retries do not wait
+  for a new email; `flask email-outbox-worker` runs a dedicated pool (set
+  EMAIL_OUTBOX_WORKERS=0 on the web nodes to use it exclusively);
+  `flask email-outbox-retry` requeues dead emails
+- An unknown EMAIL_PROVIDER fails app startup
+"""
+
+import logging
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, has_app_context
+from sqlalchemy import and_, event, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models.email_outbox import EmailOutbox
+from .email_service import DEFAULT_HTTP_TIMEOUT, PROVIDERS, create_provider
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 1
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_RETRY_BASE_SECONDS = 60
+DEFAULT_RETRY_MAX_SECONDS = 3600
+DEFAULT_POLL_SECONDS = 5
+DEFAULT_LEASE_SECONDS = 300
+MAX_ERROR_LENGTH = 2000
+
+_PROVIDER_KEY = 'email_provider'
+_POOL_KEY = 'email_outbox_workers'
+_STARTED_KEY = 'email_outbox_started'
+_DISPATCH_KEY = 'email_outbox_dispatch'
+_LOCK = threading.Lock()
+
+# Internal guard to ensure session hooks are attached only once per process
+_HOOKS_ATTACHED = False
+
+
+def _config(name, default):
+    return current_app.config.get(name, default)
+
+
+# ---- provider ----
+
+def validate_email_provider(name):
+    """Raise ValueError unless `name` is a supported EMAIL_PROVIDER"""
+    if (name or '').lower() not in PROVIDERS:
+        raise ValueError(
+            f"Unsupported EMAIL_PROVIDER {name!r}; expected one of {', '.join(sorted(PROVIDERS))}"
+        )
+
+
+def get_email_provider(app=None):
+    """The app's delivery provider, built from EMAIL_* config on first use"""
+    app = app or current_app._get_current_object()
+    provider = app.extensions.get(_PROVIDER_KEY)
+    if provider is None:
+        with _LOCK:
+            provider = app.extensions.get(_PROVIDER_KEY)
+            if provider is None:
+                validate_email_provider(app.config.get('EMAIL_PROVIDER', 'smtp'))
+                timeout = (app.config.get('EMAIL_HTTP_CONNECT_TIMEOUT', DEFAULT_HTTP_TIMEOUT[0]),
+                           app.config.get('EMAIL_HTTP_READ_TIMEOUT', DEFAULT_HTTP_TIMEOUT[1]))
+                provider = create_provider(
+                    app.config.get('EMAIL_PROVIDER', 'smtp'),
+                    app.config.get('EMAIL_API_KEY'),
+                    app.config.get('EMAIL_FROM') or app.config.get('MAIL_DEFAULT_SENDER'),
+                    rate_limit=app.config.get('EMAIL_RATE_LIMIT_PER_SECOND', 0),
+                    timeout=timeout,
+                )
+                app.extensions[_PROVIDER_KEY] = provider
+    return provider
+
+
+# ---- scheduling ----
+
+def retry_delay(attempts, base=DEFAULT_RETRY_BASE_SECONDS, cap=DEFAULT_RETRY_MAX_SECONDS):
+    """Seconds to wait before attempt `attempts + 1`: base * 2^(n-1), capped, +10% jitter"""
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def _claimable(now, lease_seconds):
+    """Rows due for an attempt, including expired `sending` leases"""
+    return or_(
+        and_(
+            EmailOutbox.status.in_([EmailOutbox.STATUS_PENDING, EmailOutbox.STATUS_FAILED]),
+            or_(EmailOutbox.next_attempt_at.is_(None), EmailOutbox.next_attempt_at <= now),
+        ),
+        and_(
+            EmailOutbox.status == EmailOutbox.STATUS_SENDING,
+            EmailOutbox.locked_at < now - timedelta(seconds=lease_seconds),
+        ),
+    )
+
+
+# ---- enqueueing ----
+
+def enqueue_email(to, subject, html_body=None, text_body=None, from_address=None,
+                  message_stream=None, tag=None):
+    """
+    Add one email to the caller's session and return the outbox row. It is
+    delivered once the caller commits; nothing is committed here.
+    """
+    row = EmailOutbox(
+        to_address=to,
+        subject=subject,
+        html_body=html_body,
+        text_body=text_body,
+        from_address=from_address,
+        message_stream=message_stream,
+        tag=tag,
+        status=EmailOutbox.STATUS_PENDING,
+    )
+    db.session.add(row)
+    db.session.info[_DISPATCH_KEY] = True
+    return row
+
+
+def enqueue_emails(messages):
+    """
+    Add many OutboundMessage-like emails to the caller's session; the
+    workers are woken once, after the caller commits. Returns the rows.
+    """
+    rows = [
+        EmailOutbox(
+            to_address=message.to_address,
+            subject=message.subject,
+            html_body=message.html_body,
+            text_body=message.text_body,
+            from_address=message.from_address,
+            message_stream=message.message_stream,
+            tag=message.tag,
+            status=EmailOutbox.STATUS_PENDING,
+        )
+        for message in messages
+    ]
+    if rows:
+        db.session.add_all(rows)
+        db.session.info[_DISPATCH_KEY] = True
+    return rows
+
+
+def dispatch():
+    """Deliver now (EMAIL_OUTBOX_INLINE) or wake the worker pool"""
+    app = current_app._get_current_object()
+    if app.config.get('EMAIL_OUTBOX_INLINE'):
+        # A fresh app context has its own session; the caller's may be mid-commit
+        with app.app_context():
+            drain()
+        return
+    pool = get_worker_pool(app)
+    if pool is not None:
+        pool.wake()
+
+
+def _after_commit(session):
+    if session.info.pop(_DISPATCH_KEY, False) and has_app_context():
+        try:
+            dispatch()
+        except Exception:
+            # The rows are committed; the pool's next poll delivers them
+            logger.exception("Email outbox dispatch failed")
+
+
+def _after_rollback(session):
+    session.info.pop(_DISPATCH_KEY, None)
+
+
+# ---- claiming and delivery ----
+
+def claim_batch(limit=None):
+    """
+    Atomically move up to `limit` due emails to `sending`.
+    Returns the claimed rows, oldest first.
+    """
+    limit = limit or _config('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    now = datetime.utcnow()
+    due = _claimable(now, _config('EMAIL_OUTBOX_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+    candidates = db.session.execute(
+        select(EmailOutbox.id).where(due).order_by(EmailOutbox.id).limit(limit)
+    ).scalars().all()
+    if not candidates:
+        db.session.rollback()
+        return []
+
+    token = uuid.uuid4().hex
+    db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(candidates), due)
+        .values(status=EmailOutbox.STATUS_SENDING, locked_at=now, claim_token=token,
+                attempts=EmailOutbox.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    rows = db.session.execute(
+        select(EmailOutbox)
+        .where(EmailOutbox.claim_token == token, EmailOutbox.status == EmailOutbox.STATUS_SENDING)
+        .order_by(EmailOutbox.id)
+        .execution_options(populate_existing=True)
+    ).scalars().all()
+
+    # Reclaimed after their worker died on the last allowed attempt
+    max_attempts = _config('EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    exhausted = [row for row in rows if row.attempts > max_attempts]
+    if exhausted:
+        for row in exhausted:
+            _release(row)
+            _record_failure(row, row.last_error or 'worker stopped during delivery', False, now)
+        db.session.commit()
+    return [row for row in rows if row.attempts <= max_attempts]
+
+
+def _release(row):
+    row.locked_at = None
+    row.claim_token = None
+
+
+def _record_failure(row, error, retryable, now):
+    row.last_error = (error or 'unknown error')[:MAX_ERROR_LENGTH]
+    if not retryable or row.attempts >= _config('EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS):
+        row.status = EmailOutbox.STATUS_DEAD
+        row.next_attempt_at = None
+        logger.error(f"Email {row.id} to {row.to_address} abandoned after {row.attempts} attempts: {row.last_error}")
+    else:
+        delay = retry_delay(
+            row.attempts,
+            _config('EMAIL_OUTBOX_RETRY_BASE_SECONDS', DEFAULT_RETRY_BASE_SECONDS),
+            _config('EMAIL_OUTBOX_RETRY_MAX_SECONDS', DEFAULT_RETRY_MAX_SECONDS),
+        )
+        row.status = EmailOutbox.STATUS_FAILED
+        row.next_attempt_at = now + timedelta(seconds=delay)
+        logger.warning(f"Email {row.id} attempt {row.attempts} failed, retrying in {delay:.0f}s: {row.last_error}")
+
+
+def deliver(rows):
+    """
+    Send claimed rows through the provider, in provider-sized batches, and
+    record each outcome; a row without a result (provider unavailable or
+    raising, short result list) is a retryable failure. Returns the number
+    sent.
+    """
+    try:
+        provider = get_email_provider()
+    except Exception as e:
+        logger.exception("Email provider unavailable")
+        now = datetime.utcnow()
+        for row in rows:
+            _release(row)
+            _record_failure(row, f"{type(e).__name__}: {e}", True, now)
+        db.session.commit()
+        return 0
+
+    sent = 0
+    batch_size = max(1, provider.batch_size)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        batch_error = f"provider {provider.name} returned no result"
+        try:
+            results = list(provider.send_batch(batch))
+        except Exception as e:
+            logger.exception(f"Email provider {provider.name} raised")
+            results = []
+            batch_error = f"{type(e).__name__}: {e}"
+        results += [None] * (len(batch) - len(results))
+
+        now = datetime.utcnow()
+        for row, result in zip(batch, results):
+            _release(row)
+            if result is not None and result.ok:
+                row.status = EmailOutbox.STATUS_SENT
+                row.sent_at = now
+                row.next_attempt_at = None
+                row.last_error = None
+                row.provider_message_id = result.message_id
+                sent += 1
+            elif result is not None:
+                _record_failure(row, result.error, result.retryable, now)
+            else:
+                _record_failure(row, batch_error, True, now)
+        db.session.commit()
+    return sent
+
+
+def drain(limit=None):
+    """Deliver due emails until the outbox is empty or `limit` rows were handled"""
+    handled = 0
+    batch_size = _config('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    while limit is None or handled < limit:
+        rows = claim_batch(batch_size if limit is None else min(batch_size, limit - handled))
+        if not rows:
+            break
+        deliver(rows)
+        handled += len(rows)
+    return handled
+
+
+# ---- worker pool ----
+
+class EmailOutboxWorkerPool:
+    """Daemon threads draining the email_outbox table"""
+
+    def __init__(self, app, threads=DEFAULT_WORKERS, poll_interval=DEFAULT_POLL_SECONDS):
+        self.app = app
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'email-outbox-{i}', daemon=True)
+            for i in range(max(1, threads))
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    handled = drain(self.app.config.get('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+            except Exception:
+                logger.exception("Email outbox worker iteration failed")
+                handled = 0
+            if not handled:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+def get_worker_pool(app):
+    """The app's in-process pool, started on first use; None when disabled"""
+    pool = app.extensions.get(_POOL_KEY)
+    if pool is not None:
+        return pool
+
+    threads = app.config.get('EMAIL_OUTBOX_WORKERS', DEFAULT_WORKERS)
+    if threads <= 0:
+        return None
+
+    with _LOCK:
+        pool = app.extensions.get(_POOL_KEY)
+        if pool is None:
+            pool = EmailOutboxWorkerPool(
+                app, threads, app.config.get('EMAIL_OUTBOX_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+            ).start()
+            app.extensions[_POOL_KEY] = pool
+    return pool
+
+
+def _start_on_first_request():
+    """Start the in-process pool once, so due retries are delivered without a new email"""
+    app = current_app._get_current_object()
+    if app.extensions.get(_STARTED_KEY):
+        return
+    with _LOCK:
+        if app.extensions.get(_STARTED_KEY):
+            return
+        app.extensions[_STARTED_KEY] = True
+    if not app.config.get('EMAIL_OUTBOX_INLINE'):
+        get_worker_pool(app)
+
+
+def init_email_outbox(app):
+    """
+    Check EMAIL_PROVIDER, attach the dispatch-on-commit session hooks, start
+    the worker pool with the first request and register the CLI commands.
+
+    Raises:
+        ValueError if EMAIL_PROVIDER is not supported
+    """
+    global _HOOKS_ATTACHED
+
+    validate_email_provider(app.config.get('EMAIL_PROVIDER', 'smtp'))
+
+    if not _HOOKS_ATTACHED:
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        _HOOKS_ATTACHED = True
+
+    app.before_request(_start_on_first_request)
+
+    @app.cli.command('email-outbox-worker')
+    @click.option('--threads', default=DEFAULT_WORKERS, show_default=True,
+                  help='Number of worker threads.')
+    @click.option('--once', is_flag=True, help='Deliver the due emails and exit.')
+    def email_outbox_worker(threads, once):
+        """Deliver queued outbound emails."""
+        if once:
+            click.echo(f"Processed {drain()} emails")
+            return
+        pool = EmailOutboxWorkerPool(
+            current_app._get_current_object(), threads,
+            current_app.config.get('EMAIL_OUTBOX_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+        ).start()
+        click.echo(f"Delivering email with {threads} threads")
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            pool.stop(timeout=30)
+
+    @app.cli.command('email-outbox-retry')
+    @click.argument('email_ids', nargs=-1, type=int)
+    def email_outbox_retry(email_ids):
+        """Requeue dead emails (all of them when no EMAIL_IDS are given)."""
+        stmt = (
+            update(EmailOutbox)
+            .where(EmailOutbox.status == EmailOutbox.STATUS_DEAD)
+            .values(status=EmailOutbox.STATUS_PENDING, attempts=0, next_attempt_at=datetime.utcnow())
+        )
+        if email_ids:
+            stmt = stmt.where(EmailOutbox.id.in_(email_ids))
+        count = db.session.execute(stmt).rowcount
+        db.session.commit()
+        click.echo(f"Requeued {count} emails")
@@ -1,46 +1,161 @@
 import os
-import requests
-from abc import ABC, abstractmethod
+import re
+import time
 import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .email_templates import get_email_templates
+
+# Outcome of one message in a batch; `retryable` failures are attempted again
+SendResult = namedtuple('SendResult', ['ok', 'message_id', 'error', 'retryable'])
+SendResult.__new__.__defaults__ = (None, None, False)
+
+DEFAULT_HTTP_TIMEOUT = (5, 30)  # (connect, read) seconds
+HTTP_POOL_SIZE = 10
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def http_session():
+    """Process-wide requests.Session with a keep-alive connection pool"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+
+_BR = re.compile(r'<br[^>]*>')
+_TAG = re.compile(r'<[^>]*>')
+
+
+def html_to_text(html):
+    """Convert HTML to plain text; templated mail carries a precomputed text body instead."""
+    text = _BR.sub('\n', html or '')
+    return _TAG.sub('', text)
+
+
+class OutboundMessage:
+    """One email as handed to a provider; email_outbox rows have the same attributes."""
+
+    def __init__(self, to_address, subject, html_body, text_body=None, from_address=None,
+                 message_stream=None, tag=None):
+        self.to_address = to_address
+        self.subject = subject
+        self.html_body = html_body
+        self.text_body = text_body
+        self.from_address = from_address
+        self.message_stream = message_stream
+        self.tag = tag
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` requests per second with bursts of `burst`; blocks until allowed."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retryable_status(status_code):
+    return status_code == 429 or status_code >= 500
+
 
 class EmailProvider(ABC):
     """Abstract base class for email providers."""
+
+    name = 'base'
+    batch_size = 1  # Messages per send_batch request
+
+    def __init__(self, api_key=None, from_address=None, rate_limit=0, timeout=DEFAULT_HTTP_TIMEOUT):
+        self.api_key = api_key
+        self.from_address = from_address
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit)
     
     @abstractmethod
-    def send_email(self, to, subject, html_content, text_content=None, **kwargs):
-        """Send an email."""
+    def send_batch(self, messages):
+        """Send OutboundMessage-like objects; returns one SendResult per message, in order."""
         pass
 
+    def send_email(self, to, subject, html_content, text_content=None, **kwargs):
+        """Send a single email; returns (success, provider response or error)."""
+        message = OutboundMessage(to, subject, html_content, text_content,
+                                  kwargs.get("from_address"), kwargs.get("message_stream"))
+        result = self.send_batch([message])[0]
+        return (True, {"MessageID": result.message_id}) if result.ok else (False, result.error)
+
+    def _post(self, url, payload, headers):
+        """POST through the shared session; (response, None) or (None, SendResult for every message)"""
+        self.limiter.acquire()
+        try:
+            return http_session().post(url, json=payload, headers=headers, timeout=self.timeout), None
+        except requests.RequestException as e:
+            return None, SendResult(False, error=f"{type(e).__name__}: {e}", retryable=True)
+
+
 class PostmarkProvider(EmailProvider):
     """Postmark email provider implementation."""
-    
-    def __init__(self, api_key, from_address):
-        self.api_key = api_key
-        self.from_address = from_address
-        self.api_url = "https://api.postmarkapp.com/email"
-        
-    def send_email(self, to, subject, html_content, text_content=None, **kwargs):
-        """Send an email using Postmark API."""
-        if not text_content:
-            # Generate plain text version if not provided
-            text_content = self._html_to_text(html_content)
-            
-        headers = {
+
+    name = 'postmark'
+    batch_size = 500  # Postmark's /email/batch limit
+    api_url = "https://api.postmarkapp.com/email"
+    batch_url = "https://api.postmarkapp.com/email/batch"
+    # Per-message error codes that will not succeed on retry (invalid or inactive recipient)
+    PERMANENT_ERROR_CODES = {300, 406}
+
+    def _payload(self, message):
+        return {
+            "From": message.from_address or self.from_address,
+            "To": message.to_address,
+            "Subject": message.subject,
+            "HtmlBody": message.html_body,
+            "TextBody": message.text_body or html_to_text(message.html_body),
+            "MessageStream": message.message_stream or "outbound",
+            "TrackOpens": True,
+            "TrackLinks": "HtmlAndText"
+        }
+
+    def _headers(self):
+        return {
             "Accept": "application/json",
             "Content-Type": "application/json",
             "X-Postmark-Server-Token": self.api_key
         }
-        
-        payload = {
-            "From": kwargs.get("from_address", self.from_address),
-            "To": to,
-            "Subject": subject,
-            "HtmlBody": html_content,
-            "TextBody": text_content,
-            "MessageStream": kwargs.get("message_stream", "outbound"),
-            "TrackOpens": True,
-            "TrackLinks": "HtmlAndText"
-        }
+
+    def send_email(self, to, subject, html_content, text_content=None, **kwargs):
+        """Send an email using Postmark API."""
+        message = OutboundMessage(to, subject, html_content, text_content,
+                                  kwargs.get("from_address"), kwargs.get("message_stream"))
+        payload = self._payload(message)
         
         # Add optional CC and BCC if provided
         if "cc" in kwargs:
@@ -52,63 +167,149 @@ class PostmarkProvider(EmailProvider):
         if "attachments" in kwargs:
             payload["Attachments"] = kwargs["attachments"]
             
-        response = requests.post(self.api_url, json=payload, headers=headers)
+        response, failure = self._post(self.api_url, payload, self._headers())
+        if failure:
+            logging.error(f"Failed to send email: {failure.error}")
+            return False, failure.error
         
         if response.status_code not in [200, 201]:
             logging.error(f"Failed to send email: {response.text}")
             return False, response.text
             
         return True, response.json()
-        
-    def _html_to_text(self, html):
-        """Convert HTML to plain text."""
-        # Simple HTML to text conversion
-        # In production, consider using a library like BeautifulSoup
-        import re
-        text = re.sub(r'<br[^>]*>', '\n', html)
-        text = re.sub(r'<[^>]*>', '', text)
-        return text
+
+    def send_batch(self, messages):
+        """Send up to `batch_size` messages with one /email/batch request."""
+        response, failure = self._post(self.batch_url, [self._payload(m) for m in messages], self._headers())
+        if failure:
+            return [failure] * len(messages)
+        if response.status_code not in [200, 201]:
+            error = f"HTTP {response.status_code}: {response.text[:500]}"
+            return [SendResult(False, error=error, retryable=_retryable_status(response.status_code))] * len(messages)
+
+        results = []
+        for item in response.json():
+            code = item.get("ErrorCode", 0)
+            if code == 0:
+                results.append(SendResult(True, item.get("MessageID")))
+            else:
+                results.append(SendResult(False, error=f"Postmark {code}: {item.get('Message')}",
+                                          retryable=code not in self.PERMANENT_ERROR_CODES))
+        return results
+
 
 class SendgridProvider(EmailProvider):
-    """SendGrid email provider implementation."""
-    
-    def __init__(self, api_key, from_address):
-        self.api_key = api_key
-        self.from_address = from_address
-        
-    def send_email(self, to, subject, html_content, text_content=None, **kwargs):
-        """Send an email using SendGrid API."""
-        # Import here to avoid dependency if not using SendGrid
-        from sendgrid import SendGridAPIClient
-        from sendgrid.helpers.mail import Mail, Email, To, Content
-        
-        if not text_content:
-            # Generate plain text version if not provided
-            text_content = self._html_to_text(html_content)
-            
-        message = Mail(
-            from_email=kwargs.get("from_address", self.from_address),
-            to_emails=to,
-            subject=subject,
-            html_content=html_content,
-            plain_text_content=text_content
-        )
-        
+    """
+    SendGrid email provider implementation.
+
+    Messages with identical sender, subject and bodies share one request with
+    a personalization per recipient; the rest are sent one per request over
+    the same pooled connection.
+    """
+
+    name = 'sendgrid'
+    batch_size = 1000  # SendGrid's personalizations limit
+    api_url = "https://api.sendgrid.com/v3/mail/send"
+
+    def send_batch(self, messages):
+        """Send messages, coalescing identical content into personalizations."""
+        groups = {}
+        for index, message in enumerate(messages):
+            key = (message.from_address or self.from_address, message.subject,
+                   message.html_body, message.text_body)
+            groups.setdefault(key, []).append(index)
+
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        results = [None] * len(messages)
+        for (from_address, subject, html_body, text_body), indexes in groups.items():
+            payload = {
+                "personalizations": [{"to": [{"email": messages[i].to_address}]} for i in indexes],
+                "from": {"email": from_address},
+                "subject": subject,
+                "content": [
+                    {"type": "text/plain", "value": text_body or html_to_text(html_body)},
+                    {"type": "text/html", "value": html_body or ""},
+                ],
+            }
+            response, failure = self._post(self.api_url, payload, headers)
+            if failure is None:
+                if response.status_code in (200, 202):
+                    failure = SendResult(True, response.headers.get("X-Message-Id"))
+                else:
+                    failure = SendResult(False, error=f"HTTP {response.status_code}: {response.text[:500]}",
+                                         retryable=_retryable_status(response.status_code))
+            for i in indexes:
+                results[i] = failure
+        return results
+
+
+class SmtpProvider(EmailProvider):
+    """Flask-Mail SMTP delivery; a batch shares one SMTP connection."""
+
+    name = 'smtp'
+    batch_size = 50
+
+    def send_batch(self, messages):
+        from flask_mail import Message
+        from ..extensions import mail
+
+        results = []
         try:
-            sg = SendGridAPIClient(self.api_key)
-            response = sg.send(message)
-            return True, {"status_code": response.status_code}
+            with mail.connect() as connection:
+                for message in messages:
+                    self.limiter.acquire()
+                    msg = Message(subject=message.subject, recipients=[message.to_address],
+                                  sender=message.from_address or self.from_address or None,
+                                  html=message.html_body, body=message.text_body)
+                    try:
+                        connection.send(msg)
+                        results.append(SendResult(True))
+                    except Exception as e:
+                        results.append(SendResult(False, error=f"{type(e).__name__}: {e}", retryable=True))
         except Exception as e:
-            logging.error(f"Failed to send email: {str(e)}")
-            return False, str(e)
-            
-    def _html_to_text(self, html):
-        """Convert HTML to plain text."""
-        # Simple HTML to text conversion
-        import re
-        text = re.sub(r'<br[^>]*>', '\n', html)
-        text = re.sub(r'<[^>]*>', '', text)
-        return text
+            # Could not connect; whatever was not attempted is retried
+            error = SendResult(False, error=f"{type(e).__name__}: {e}", retryable=True)
+            results.extend([error] * (len(messages) - len(results)))
+        return results
+
+
+class StubProvider(EmailProvider):
+    """Records messages instead of sending them; for tests and local development."""
+
+    name = 'stub'
+    batch_size = 100
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+        self.requests = 0
+
+    def send_batch(self, messages):
+        self.requests += 1
+        results = []
+        for message in messages:
+            # A copy: outbox rows expire once their worker's session closes
+            self.sent.append(OutboundMessage(
+                message.to_address, message.subject, message.html_body, message.text_body,
+                message.from_address, message.message_stream, message.tag))
+            results.append(SendResult(True, f"stub-{len(self.sent)}"))
+        return results
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (PostmarkProvider, SendgridProvider, SmtpProvider, StubProvider)
+}
+
+
+def create_provider(provider_name, api_key=None, from_address=None, **options):
+    """Instantiate a provider by name; None (and an error logged) when unknown."""
+    provider_class = PROVIDERS.get((provider_name or '').lower())
+    if provider_class is None:
+        logging.error(f"Unsupported email provider: {provider_name}")
+        return None
+    return provider_class(api_key, from_address, **options)
+
 
 class EmailService:
     """Email service for Asset Anchor."""
@@ -131,12 +332,7 @@ class EmailService:
         if not api_key and os.environ.get("FLASK_ENV") != "development":
             logging.warning("Email API key not configured")
             
-        if provider_name == "postmark":
-            self.provider = PostmarkProvider(api_key, from_address)
-        elif provider_name == "sendgrid":
-            self.provider = SendgridProvider(api_key, from_address)
-        else:
-            logging.error(f"Unsupported email provider: {provider_name}")
+        self.provider = create_provider(provider_name, api_key, from_address)
             
     def init_app(self, app):
         """Initialize the email service with the Flask app."""
@@ -147,45 +343,71 @@ class EmailService:
         if not api_key and app.config.get("ENV") != "development":
             logging.warning("Email API key not configured")
             
-        if provider_name == "postmark":
-            self.provider = PostmarkProvider(api_key, from_address)
-        elif provider_name == "sendgrid":
-            self.provider = SendgridProvider(api_key, from_address)
-        else:
-            logging.error(f"Unsupported email provider: {provider_name}")
+        self.provider = create_provider(provider_name, api_key, from_address)
     
     def _render_template(self, template_name, **kwargs):
-        """Render an email template."""
-        # Simple placeholder - in production you'd want a proper template system
-        # that doesn't require Flask's render_template
-        template_path = os.path.join(os.path.dirname(__file__), '..', 'templates', 'email', f"{template_name}.html")
-        
+        """Render an email template; returns (html, text)."""
         try:
-            with open(template_path, 'r') as f:
-                template = f.read()
-                
-            # Very basic template substitution
-            for key, value in kwargs.items():
-                template = template.replace("{{ " + key + " }}", str(value))
-                
-            return template
+            return get_email_templates().render(template_name, **kwargs)
         except Exception as e:
             logging.error(f"Failed to render template: {str(e)}")
             # Fallback to a simple template
             title = kwargs.get('subject', template_name.title())
-            return f"<h1>{title}</h1><p>Please see the content below:</p>" + "\n".join([f"<p>{k}: {v}</p>" for k, v in kwargs.items()])
+            html_content = f"<h1>{title}</h1><p>Please see the content below:</p>" + "\n".join([f"<p>{k}: {v}</p>" for k, v in kwargs.items()])
+            return html_content, html_to_text(html_content)
         
     def send_email(self, to, subject, template_name, **kwargs):
-        """Send an email using a template."""
-        if not self.provider:
-            logging.error("Email provider not configured")
-            return False, "Email provider not configured"
-            
+        """Queue a templated email in the outbox and commit; the outbox workers deliver it."""
+        from ..extensions import db
+        from .email_outbox_service import enqueue_email
+        
         # Render the email template
-        html_content = self._render_template(template_name, **kwargs)
+        html_content, text_content = self._render_template(template_name, **kwargs)
         
-        # Send the email
-        return self.provider.send_email(to, subject, html_content, **kwargs)
+        try:
+            row = enqueue_email(to, subject, html_body=html_content, text_body=text_content,
+                                from_address=kwargs.get("from_address"),
+                                message_stream=kwargs.get("message_stream"), tag=template_name)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Failed to queue email: {str(e)}")
+            return False, str(e)
+            
+        return True, {"outbox_id": row.id}
+    
+    def send_bulk(self, subject, template_name, recipients, **common):
+        """
+        Queue one templated email per recipient, rendered from a single
+        compiled template and inserted in one transaction.
+        
+        Args:
+            subject: Subject line shared by every message
+            template_name: Template under templates/email
+            recipients: Iterable of (email, context dict) pairs
+            **common: Template variables shared by every recipient
+            
+        Returns:
+            (number queued, None) or (0, error message)
+        """
+        from ..extensions import db
+        from .email_outbox_service import enqueue_emails
+        
+        recipients = list(recipients)
+        contexts = ({**common, **context} for _, context in recipients)
+        try:
+            messages = [
+                OutboundMessage(to, subject, html_content, text_content, tag=template_name)
+                for (to, _), (html_content, text_content)
+                in zip(recipients, get_email_templates().render_batch(template_name, contexts))
+            ]
+            rows = enqueue_emails(messages)
+            db.session.commit()
+            return len(rows), None
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Failed to queue bulk email {template_name}: {str(e)}")
+            return 0, str(e)
     
     def send_verification_email(self, user, verification_link):
         """Send an email verification link."""
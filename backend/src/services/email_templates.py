@@ -0,0 +1,156 @@
+"""
+Compiled email templates.
+
+Every template under templates/email is compiled once (at startup when
+EMAIL_TEMPLATES_PRECOMPILE is set, else on first use) together with a
+plain-text twin derived from its HTML source, so a send is two renders of
+already-compiled templates: no file reads, no Jinja compilation and no
+HTML-to-text regexes per message. Inline template strings used by
+utils/email_service.py are compiled once per distinct string.
+
+`render_batch` renders one template for many recipients, which is what bulk
+sends (announcements, rent reminders) should use.
+"""
+import html
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), '..', 'templates', 'email')
+MAX_STRING_TEMPLATES = 256
+
+_EXT_KEY = 'email_templates'
+_LOCK = threading.Lock()
+
+# HTML -> text conversion applied once to template *source*; Jinja
+# expressions and statements pass through untouched
+_DROP_BLOCKS = re.compile(r'<(head|style|script)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_LINK = re.compile(r'<a\b[^>]*\bhref="([^"]*)"[^>]*>(.*?)</a\s*>', re.IGNORECASE | re.DOTALL)
+_LINE_BREAKS = re.compile(r'<br\s*/?>|</(p|div|h[1-6]|li|tr|table|ul|ol)\s*>', re.IGNORECASE)
+_TAGS = re.compile(r'<[a-zA-Z/!][^>]*>')
+_BLANK_RUNS = re.compile(r'\n\s*\n+')
+
+
+def html_source_to_text(source):
+    """Derive a plain-text template source from an HTML template source"""
+    text = _DROP_BLOCKS.sub('', source)
+    text = _LINK.sub(lambda m: m.group(2) if m.group(1) in m.group(2) else f"{m.group(2)} ({m.group(1)})", text)
+    text = _LINE_BREAKS.sub('\n', text)
+    text = _TAGS.sub('', text)
+    text = html.unescape(text)
+    lines = [line.strip() for line in text.splitlines()]
+    return _BLANK_RUNS.sub('\n\n', '\n'.join(lines)).strip() + '\n'
+
+
+class CompiledTemplate:
+    """An HTML template and its derived plain-text twin, both compiled"""
+
+    def __init__(self, name, html_template, text_template):
+        self.name = name
+        self.html = html_template
+        self.text = text_template
+
+    def render(self, **context):
+        """Return (html, text) for one recipient"""
+        return self.html.render(**context), self.text.render(**context)
+
+
+class EmailTemplates:
+    """Compiles and caches email templates; thread-safe once built."""
+
+    def __init__(self, template_dir=TEMPLATE_DIR, max_string_templates=MAX_STRING_TEMPLATES):
+        self.html_env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(['html']),
+            auto_reload=False,
+            cache_size=-1,
+        )
+        # Text twins must not HTML-escape their values
+        self.text_env = Environment(autoescape=False, cache_size=-1)
+        self.string_env = Environment(autoescape=True, cache_size=0)
+        self.max_string_templates = max_string_templates
+        self._compiled = {}
+        self._strings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _compile(self, name):
+        html_template = self.html_env.get_template(f"{name}.html")
+        source, _, _ = self.html_env.loader.get_source(self.html_env, f"{name}.html")
+        text_template = self.text_env.from_string(html_source_to_text(source))
+        return CompiledTemplate(name, html_template, text_template)
+
+    def get(self, name):
+        """The compiled template `name` (file templates/email/<name>.html)"""
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(name)
+                if compiled is None:
+                    compiled = self._compiled[name] = self._compile(name)
+        return compiled
+
+    def precompile(self):
+        """Compile every template in the directory; returns their names"""
+        names = []
+        for filename in self.html_env.list_templates(extensions=['html']):
+            name = filename[:-len('.html')]
+            try:
+                self.get(name)
+                names.append(name)
+            except Exception as e:
+                # A broken template fails its own sends, not the app
+                logger.error(f"Could not compile email template {name}: {e}")
+        return names
+
+    def from_string(self, source):
+        """Compiled template for an inline HTML string, cached by its source"""
+        with self._lock:
+            compiled = self._strings.get(source)
+            if compiled is not None:
+                self._strings.move_to_end(source)
+                return compiled
+        compiled = CompiledTemplate(
+            None, self.string_env.from_string(source), self.text_env.from_string(html_source_to_text(source))
+        )
+        with self._lock:
+            self._strings[source] = compiled
+            while len(self._strings) > self.max_string_templates:
+                self._strings.popitem(last=False)
+        return compiled
+
+    def render(self, name, **context):
+        """Return (html, text) rendered from the compiled template `name`"""
+        return self.get(name).render(**context)
+
+    def render_batch(self, name, contexts):
+        """Render one compiled template for many recipients; yields (html, text)"""
+        compiled = self.get(name)
+        for context in contexts:
+            yield compiled.render(**context)
+
+
+def get_email_templates(app=None):
+    """The app's template cache, memoized in app.extensions['email_templates']"""
+    app = app or current_app._get_current_object()
+    templates = app.extensions.get(_EXT_KEY)
+    if templates is None:
+        with _LOCK:
+            templates = app.extensions.get(_EXT_KEY)
+            if templates is None:
+                templates = app.extensions[_EXT_KEY] = EmailTemplates()
+    return templates
+
+
+def init_email_templates(app):
+    """Compile the email templates up front unless EMAIL_TEMPLATES_PRECOMPILE is off"""
+    templates = get_email_templates(app)
+    if app.config.get('EMAIL_TEMPLATES_PRECOMPILE', True):
+        names = templates.precompile()
+        logger.info(f"Compiled {len(names)} email templates")
@@ -0,0 +1,207 @@
+from datetime import datetime
+
+from sqlalchemy import select, func, case, or_, and_
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models.message import Message
+from ..models.message_thread import MessageThread
+from ..models.conversation import Conversation
+from ..models.conversation_participant import ConversationParticipant
+from ..models.user import User
+from ..extensions import db
+from ..utils.cursor_pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Messages live in the conversation sharing the thread's id
+# (Message.conversation_id == MessageThread.id).
+
+DEFAULT_INBOX_PAGE_SIZE = 10
+MAX_INBOX_PAGE_SIZE = 100
+THREAD_CURSOR_SCOPE = 'threads'
+
+
+def encode_thread_cursor(updated_at, thread_id):
+    """Signed keyset cursor for the position after (updated_at, id)"""
+    return encode_cursor([updated_at, thread_id], scope=THREAD_CURSOR_SCOPE)
+
+
+def decode_thread_cursor(cursor):
+    """Inverse of encode_thread_cursor; raises InvalidCursor (a ValueError) on bad input"""
+    updated_at, thread_id = decode_cursor(cursor, scope=THREAD_CURSOR_SCOPE, size=2)
+    if not isinstance(thread_id, int) or not (updated_at is None or isinstance(updated_at, datetime)):
+        raise InvalidCursor()
+    return updated_at, thread_id
+
+
+class MessagingService:
+    @staticmethod
+    def inbox_query(user_id, limit, after=None):
+        """
+        One statement returning a page of the user's threads, newest first,
+        each with its counterpart user, latest message and unread count.
+
+        The page's thread ids are picked first (keyset + LIMIT on the
+        threads alone); the latest message (ROW_NUMBER()) and the unread
+        count (messages from the other participant newer than the user's
+        last_read_at) are then computed for those threads only.
+        """
+        mine = or_(MessageThread.user1_id == user_id, MessageThread.user2_id == user_id)
+        other_id = case((MessageThread.user1_id == user_id, MessageThread.user2_id),
+                        else_=MessageThread.user1_id)
+
+        page = (
+            select(MessageThread.id)
+            .where(mine)
+            .order_by(MessageThread.updated_at.desc(), MessageThread.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            updated_at, thread_id = after
+            page = page.where(or_(
+                MessageThread.updated_at < updated_at,
+                and_(MessageThread.updated_at == updated_at, MessageThread.id < thread_id)
+            ))
+        page = page.subquery('page')
+
+        ranked = (
+            select(
+                Message.conversation_id,
+                Message.id,
+                Message.sender_id,
+                Message.content,
+                Message.attachment_url,
+                Message.attachment_type,
+                Message.is_system_message,
+                Message.created_at,
+                func.row_number().over(
+                    partition_by=Message.conversation_id,
+                    order_by=(Message.created_at.desc(), Message.id.desc())
+                ).label('rn')
+            )
+            .join(page, page.c.id == Message.conversation_id)
+            .subquery('ranked')
+        )
+        latest = select(ranked).where(ranked.c.rn == 1).subquery('latest')
+
+        unread = (
+            select(Message.conversation_id, func.count(Message.id).label('unread_count'))
+            .join(page, page.c.id == Message.conversation_id)
+            .outerjoin(ConversationParticipant, and_(
+                ConversationParticipant.conversation_id == Message.conversation_id,
+                ConversationParticipant.user_id == user_id
+            ))
+            .where(
+                Message.sender_id != user_id,
+                or_(ConversationParticipant.last_read_at.is_(None),
+                    Message.created_at > ConversationParticipant.last_read_at)
+            )
+            .group_by(Message.conversation_id)
+            .subquery('unread')
+        )
+
+        return (
+            select(
+                MessageThread.id,
+                MessageThread.subject,
+                MessageThread.created_at,
+                MessageThread.updated_at,
+                User.id.label('other_id'),
+                User.name.label('other_name'),
+                User.email.label('other_email'),
+                User.role.label('other_role'),
+                latest.c.id.label('message_id'),
+                latest.c.sender_id,
+                latest.c.content,
+                latest.c.attachment_url,
+                latest.c.attachment_type,
+                latest.c.is_system_message,
+                latest.c.created_at.label('message_created_at'),
+                func.coalesce(unread.c.unread_count, 0).label('unread_count'),
+            )
+            .join(page, page.c.id == MessageThread.id)
+            .join(User, User.id == other_id)
+            .outerjoin(latest, latest.c.conversation_id == MessageThread.id)
+            .outerjoin(unread, unread.c.conversation_id == MessageThread.id)
+            .order_by(MessageThread.updated_at.desc(), MessageThread.id.desc())
+        )
+
+    @staticmethod
+    def get_thread_inbox(user_id, per_page=DEFAULT_INBOX_PAGE_SIZE, cursor=None):
+        """
+        Get a keyset-paginated page of the user's message threads.
+
+        Returns:
+            ({"threads": [...], "next_cursor": str|None, "per_page": int}, None)
+            or (None, error message)
+
+        Raises:
+            InvalidCursor if `cursor` is not one of this inbox's cursors
+        """
+        try:
+            user_id = int(user_id)
+            per_page = max(1, min(int(per_page or DEFAULT_INBOX_PAGE_SIZE), MAX_INBOX_PAGE_SIZE))
+        except ValueError as e:
+            return None, str(e)
+        after = decode_thread_cursor(cursor) if cursor else None
+
+        try:
+            # Fetch one extra row to know whether another page exists
+            rows = db.session.execute(
+                MessagingService.inbox_query(user_id, per_page + 1, after)
+            ).all()
+        except SQLAlchemyError as e:
+            return None, str(e)
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        threads = []
+        for row in rows:
+            last_message = None
+            if row.message_id is not None:
+                last_message = {
+                    "id": row.message_id,
+                    "conversation_id": row.id,
+                    "sender_id": row.sender_id,
+                    "content": row.content,
+                    "attachment_url": row.attachment_url,
+                    "attachment_type": row.attachment_type,
+                    "is_system_message": row.is_system_message,
+                    "created_at": row.message_created_at.isoformat() if row.message_created_at else None,
+                }
+            threads.append({
+                "id": row.id,
+                "subject": row.subject,
+                "other_user": {
+                    "id": row.other_id,
+                    "name": row.other_name,
+                    "email": row.other_email,
+                    "role": row.other_role,
+                },
+                "last_message": last_message,
+                "unread_count": row.unread_count,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+            })
+
+        next_cursor = encode_thread_cursor(rows[-1].updated_at, rows[-1].id) if has_more else None
+        return {"threads": threads, "next_cursor": next_cursor, "per_page": per_page}, None
+
+    @staticmethod
+    def mark_thread_read(user_id, thread_id, read_at=None):
+        """Advance the user's last_read_at in the thread's conversation"""
+        try:
+            if not db.session.get(Conversation, thread_id):
+                db.session.add(Conversation(id=thread_id, created_by=int(user_id)))
+                db.session.flush()
+            participant = ConversationParticipant.query.filter_by(
+                conversation_id=thread_id, user_id=int(user_id)
+            ).first()
+            if not participant:
+                participant = ConversationParticipant(conversation_id=thread_id, user_id=int(user_id))
+                db.session.add(participant)
+            participant.last_read_at = read_at or datetime.utcnow()
+            db.session.commit()
+            return participant, None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return None, str(e)
@@ -0,0 +1,181 @@
+"""
+Per-user unread notification counters.
+
+`user.unread_notification_count` is a denormalized count of the user's
+unread notifications, so the unread-count endpoint is a primary-key lookup
+instead of a COUNT over the notifications table. It is kept current in the
+same transaction as the notification writes:
+
+* session hooks apply the deltas of every Notification inserted, deleted or
+  flipped between read and unread through the ORM (`before_flush` reads the
+  attribute history, `after_flush` issues the UPDATEs);
+* bulk statements, which bypass the hook, adjust the counter explicitly
+  (`increment`, or `mark_all_read` which decrements by the UPDATE's rowcount);
+* `flask recount-unread-notifications` recomputes every counter from the
+  notifications table.
+
+A notification is unread while neither its `read` nor its `is_read` flag is
+set; the two columns are written inconsistently across the codebase.
+"""
+import logging
+from collections import Counter
+from datetime import datetime
+
+import click
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models.notification import Notification
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'unread_notification_deltas'
+_HOOKS_ATTACHED = False
+
+
+def unread_criteria():
+    """WHERE criteria matching unread notifications"""
+    return [
+        func.coalesce(Notification.read, False) == False,  # noqa: E712
+        func.coalesce(Notification.is_read, False) == False,  # noqa: E712
+    ]
+
+
+def _was_unread(obj):
+    """Unread state of a notification as of the last flush"""
+    state = inspect(obj)
+    for name in ('read', 'is_read'):
+        if name in state.unloaded:
+            getattr(obj, name)  # Expired since the last commit; load the stored value
+        history = state.attrs[name].history
+        previous = history.deleted or history.unchanged
+        if previous and previous[0]:
+            return False
+    return True
+
+
+def _is_unread(obj):
+    return not (obj.read or obj.is_read)
+
+
+def _unread_deltas(session):
+    """user_id -> change in unread notifications for the pending flush"""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Notification) and obj.user_id is not None and _is_unread(obj):
+            deltas[int(obj.user_id)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Notification) and _was_unread(obj):
+            deltas[int(obj.user_id)] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Notification) or not session.is_modified(obj):
+            continue
+        user_history = inspect(obj).attrs['user_id'].history
+        old_user = (user_history.deleted or user_history.unchanged or [obj.user_id])[0]
+        if _was_unread(obj):
+            deltas[int(old_user)] -= 1
+        if _is_unread(obj):
+            deltas[int(obj.user_id)] += 1
+    return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+
+def _apply_deltas(connection, deltas):
+    # Group users by delta: a fan-out or mark-all touches many users by the same amount
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(user_id)
+    for delta, user_ids in by_delta.items():
+        connection.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(unread_notification_count=User.unread_notification_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _before_flush(session, flush_context, instances):
+    # History is still intact here; after the flush it has been reset.
+    # Overwritten every time so a failed flush leaves nothing behind.
+    session.info[_PENDING_KEY] = _unread_deltas(session)
+
+
+def _after_flush(session, flush_context):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+class NotificationCounterService:
+    @staticmethod
+    def get_unread_count(user_id):
+        """The user's unread notification count, read from the counter column"""
+        count = db.session.execute(
+            select(User.unread_notification_count).where(User.id == int(user_id))
+        ).scalar()
+        return max(count or 0, 0)
+
+    @staticmethod
+    def increment(user_ids, amount=1):
+        """
+        Count `amount` new unread notifications for each user; for bulk
+        INSERTs, which the flush hook does not see. Runs in the caller's
+        transaction.
+        """
+        if user_ids:
+            _apply_deltas(db.session.connection(), {int(uid): amount for uid in user_ids})
+
+    @staticmethod
+    def mark_all_read(user_id):
+        """
+        Mark every unread notification of a user read with one UPDATE and
+        decrement the counter by the rows it changed. Commits; returns the
+        number of notifications marked.
+        """
+        user_id = int(user_id)
+        now = datetime.utcnow()
+        marked = db.session.execute(
+            update(Notification)
+            .where(Notification.user_id == user_id, *unread_criteria())
+            .values(read=True, is_read=True, read_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if marked:
+            _apply_deltas(db.session.connection(), {user_id: -marked})
+        db.session.commit()
+        return marked
+
+    @staticmethod
+    def recount(user_ids=None):
+        """Recompute counters from the notifications table; returns the rows updated"""
+        unread = (
+            select(func.count(Notification.id))
+            .where(Notification.user_id == User.id, *unread_criteria())
+            .scalar_subquery()
+        )
+        stmt = update(User).values(unread_notification_count=unread).execution_options(synchronize_session=False)
+        if user_ids is not None:
+            stmt = stmt.where(User.id.in_([int(uid) for uid in user_ids]))
+        count = db.session.execute(stmt).rowcount
+        db.session.commit()
+        return count
+
+
+def init_notification_counters(app):
+    """
+    Attach the counter session hooks and register the recount CLI command.
+    Safe to call multiple times; hooks attach once.
+    """
+    global _HOOKS_ATTACHED
+
+    if not _HOOKS_ATTACHED:
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+        _HOOKS_ATTACHED = True
+
+    @app.cli.command('recount-unread-notifications')
+    def recount_unread_notifications():
+        """Recompute every user's unread notification counter."""
+        count = NotificationCounterService.recount()
+        click.echo(f"Recounted unread notifications for {count} users")
@@ -0,0 +1,311 @@
+"""
+Background fan-out of one notification to every user of a role.
+
+A broadcast walks user ids in keyset chunks (never loading User objects),
+inserts each chunk's notifications with one multi-row INSERT, bumps the
+chunk's unread counters with one UPDATE, commits both together with the
+job's progress, and emits a single socket event to the chunk's `user_<id>`
+rooms. The core INSERT skips the session hooks, so each chunk evicts its
+recipients' "user:<id>" cache tags itself. Jobs run on a small thread pool
+(NOTIFICATION_FANOUT_WORKERS) or inline when NOTIFICATION_FANOUT_INLINE is
+set; progress is read back from the notification_broadcasts row.
+
+A job claims its broadcast with a compare-and-set UPDATE, and every chunk
+advances `sent`/`last_user_id` and renews the lease (`locked_at`) in one
+more compare-and-set; a job whose lease was taken over rolls its chunk back
+and stops. Queued broadcasts and running ones
+whose lease expired (NOTIFICATION_FANOUT_LEASE_SECONDS) are resumed from
+their cursor when the app serves its first request
+(NOTIFICATION_FANOUT_RESUME_ON_START) or by
+`flask resume-notification-broadcasts`.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db, socketio
+from ..models.notification import Notification
+from ..models.notification_broadcast import NotificationBroadcast
+from ..models.user import User
+from ..utils.cache import invalidate_tags
+from .cache_invalidation_service import tags_for
+from .notification_counter_service import NotificationCounterService
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_ROLES = ('all', 'tenant', 'landlord', 'admin')
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_WORKERS = 2
+DEFAULT_LEASE_SECONDS = 300
+
+_EXECUTOR_KEY = 'notification_fanout_executor'
+_RESUMED_KEY = 'notification_fanout_resumed'
+_LOCK = threading.Lock()
+
+
+def _role_criteria(role):
+    return [] if role == 'all' else [User.role == role]
+
+
+def recipient_id_chunks(role, after_id=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of user ids for `role`, in id order, starting after `after_id`"""
+    while True:
+        ids = db.session.execute(
+            select(User.id)
+            .where(User.id > after_id, *_role_criteria(role))
+            .order_by(User.id)
+            .limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+
+def _emit_chunk(broadcast, user_ids, created_at):
+    """One socket event for the whole chunk, addressed to each user's room"""
+    payload = {
+        'broadcast_id': broadcast.id,
+        'type': broadcast.type,
+        'title': broadcast.title,
+        'message': broadcast.message,
+        'resource_type': broadcast.resource_type,
+        'resource_id': broadcast.resource_id,
+        'is_read': False,
+        'created_at': created_at.isoformat(),
+    }
+    try:
+        socketio.emit('new_notification', payload, to=[f"user_{uid}" for uid in user_ids])
+    except Exception as e:
+        # Clients still see the notifications on their next fetch
+        logger.warning(f"Broadcast {broadcast.id}: socket emit failed: {e}")
+
+
+def _renew_lease(broadcast_id, lease, locked_at, **values):
+    """
+    Compare-and-set UPDATE of a broadcast still leased at `lease`, moving the
+    lease to `locked_at` (None releases it). False when another worker took it.
+    """
+    return db.session.execute(
+        update(NotificationBroadcast)
+        .where(NotificationBroadcast.id == broadcast_id, NotificationBroadcast.locked_at == lease)
+        .values(locked_at=locked_at, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def _executor(app):
+    executor = app.extensions.get(_EXECUTOR_KEY)
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, int(app.config.get('NOTIFICATION_FANOUT_WORKERS', DEFAULT_WORKERS))),
+            thread_name_prefix='notification-fanout',
+        )
+        app.extensions[_EXECUTOR_KEY] = executor
+    return executor
+
+
+def _run_in_app(app, broadcast_id):
+    with app.app_context():
+        NotificationFanoutService.run_broadcast(broadcast_id)
+
+
+def _claimable(now):
+    """Broadcasts waiting for a worker: queued, or running under an expired lease"""
+    lease = timedelta(seconds=int(current_app.config.get('NOTIFICATION_FANOUT_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)))
+    return or_(
+        NotificationBroadcast.status == NotificationBroadcast.STATUS_QUEUED,
+        and_(
+            NotificationBroadcast.status == NotificationBroadcast.STATUS_RUNNING,
+            or_(NotificationBroadcast.locked_at.is_(None), NotificationBroadcast.locked_at < now - lease),
+        ),
+    )
+
+
+def _resume_in_app(app):
+    with app.app_context():
+        try:
+            NotificationFanoutService.resume_broadcasts()
+        except Exception as e:
+            logger.warning(f"Could not resume notification broadcasts: {e}")
+
+
+def _resume_on_first_request():
+    """Hand interrupted broadcasts to the workers once per process"""
+    app = current_app._get_current_object()
+    if app.extensions.get(_RESUMED_KEY):
+        return
+    with _LOCK:
+        if app.extensions.get(_RESUMED_KEY):
+            return
+        app.extensions[_RESUMED_KEY] = True
+    if app.config.get('NOTIFICATION_FANOUT_RESUME_ON_START', True) and not app.config.get('NOTIFICATION_FANOUT_INLINE'):
+        _executor(app).submit(_resume_in_app, app)
+
+
+class NotificationFanoutService:
+    @staticmethod
+    def start_broadcast(created_by, target_role, title, message, notification_type='system',
+                        resource_type=None, resource_id=None):
+        """
+        Record a broadcast and hand it to the fan-out workers.
+
+        Returns:
+            (NotificationBroadcast, None) or (None, error message)
+        """
+        target_role = target_role or 'all'
+        if target_role not in BROADCAST_ROLES:
+            return None, "Invalid role specified"
+
+        try:
+            total = db.session.execute(
+                select(func.count(User.id)).where(*_role_criteria(target_role))
+            ).scalar_one()
+            broadcast = NotificationBroadcast(
+                created_by=int(created_by) if created_by is not None else None,
+                target_role=target_role,
+                type=notification_type or 'system',
+                title=title,
+                message=message,
+                resource_type=resource_type,
+                resource_id=resource_id,
+                total=total,
+            )
+            db.session.add(broadcast)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return None, str(e)
+
+        app = current_app._get_current_object()
+        if app.config.get('NOTIFICATION_FANOUT_INLINE'):
+            NotificationFanoutService.run_broadcast(broadcast.id)
+            db.session.refresh(broadcast)
+        else:
+            _executor(app).submit(_run_in_app, app, broadcast.id)
+        return broadcast, None
+
+    @staticmethod
+    def run_broadcast(broadcast_id, chunk_size=None):
+        """
+        Fan a broadcast out, resuming after its last committed chunk.
+        Returns the number of notifications inserted by this run.
+        """
+        chunk_size = chunk_size or int(current_app.config.get('NOTIFICATION_FANOUT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(NotificationBroadcast)
+            .where(NotificationBroadcast.id == broadcast_id, _claimable(now))
+            .values(status=NotificationBroadcast.STATUS_RUNNING, locked_at=now,
+                    started_at=func.coalesce(NotificationBroadcast.started_at, now))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            # Finished, failed, or another worker holds the lease
+            return 0
+        broadcast = db.session.get(NotificationBroadcast, broadcast_id, populate_existing=True)
+
+        # Every later write is conditional on still holding this lease, so a
+        # worker whose lease was taken over stops instead of fanning out twice
+        lease = now
+        inserted = 0
+        data = json.dumps({'broadcast_id': broadcast.id})
+        try:
+            for user_ids in recipient_id_chunks(broadcast.target_role, broadcast.last_user_id, chunk_size):
+                now = datetime.utcnow()
+                db.session.execute(insert(Notification), [
+                    {
+                        'user_id': uid,
+                        'type': broadcast.type,
+                        'title': broadcast.title,
+                        'message': broadcast.message,
+                        'resource_type': broadcast.resource_type,
+                        'resource_id': broadcast.resource_id,
+                        'data': data,
+                        'read': False,
+                        'is_read': False,
+                        'created_at': now,
+                        'updated_at': now,
+                    }
+                    for uid in user_ids
+                ])
+                NotificationCounterService.increment(user_ids)
+                if not _renew_lease(broadcast_id, lease, now,
+                                    sent=NotificationBroadcast.sent + len(user_ids),
+                                    last_user_id=user_ids[-1]):
+                    db.session.rollback()
+                    logger.warning(f"Broadcast {broadcast_id}: lease lost after {inserted} notifications, stopping")
+                    return inserted
+                db.session.commit()
+                lease = now
+
+                inserted += len(user_ids)
+                invalidate_tags(tags_for(user_ids=user_ids))
+                _emit_chunk(broadcast, user_ids, now)
+
+            _renew_lease(broadcast_id, lease, None,
+                         status=NotificationBroadcast.STATUS_COMPLETED,
+                         total=case((NotificationBroadcast.sent > NotificationBroadcast.total,
+                                     NotificationBroadcast.sent), else_=NotificationBroadcast.total),
+                         finished_at=datetime.utcnow())
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Broadcast {broadcast_id} failed after {inserted} notifications")
+            _renew_lease(broadcast_id, lease, None,
+                         status=NotificationBroadcast.STATUS_FAILED,
+                         error=str(e)[:2000],
+                         finished_at=datetime.utcnow())
+            db.session.commit()
+        return inserted
+
+    @staticmethod
+    def resume_broadcasts(inline=False):
+        """
+        Restart queued broadcasts and running ones whose worker's lease
+        expired, each from its saved cursor: on the fan-out workers, or one
+        after another when `inline`. Returns their ids.
+        """
+        broadcast_ids = db.session.execute(
+            select(NotificationBroadcast.id)
+            .where(_claimable(datetime.utcnow()))
+            .order_by(NotificationBroadcast.id)
+        ).scalars().all()
+        db.session.rollback()
+
+        app = current_app._get_current_object()
+        for broadcast_id in broadcast_ids:
+            if inline:
+                NotificationFanoutService.run_broadcast(broadcast_id)
+            else:
+                _executor(app).submit(_run_in_app, app, broadcast_id)
+        if broadcast_ids:
+            logger.info(f"Resumed notification broadcasts {broadcast_ids}")
+        return broadcast_ids
+
+    @staticmethod
+    def get_broadcast(broadcast_id):
+        """Get a broadcast with its progress"""
+        broadcast = db.session.get(NotificationBroadcast, broadcast_id)
+        if broadcast is None:
+            return None, "Broadcast not found"
+        return broadcast, None
+
+
+def init_notification_fanout(app):
+    """Resume interrupted broadcasts on the first request and register the CLI command"""
+    app.before_request(_resume_on_first_request)
+
+    @app.cli.command('resume-notification-broadcasts')
+    def resume_notification_broadcasts():
+        """Finish queued and interrupted broadcasts in this process."""
+        broadcast_ids = NotificationFanoutService.resume_broadcasts(inline=True)
+        click.echo(f"Resumed {len(broadcast_ids)} broadcasts")
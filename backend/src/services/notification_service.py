@@ -1,6 +1,7 @@
 from ..models.notification import Notification
 from ..models.user import User
 from ..extensions import db
+from .notification_counter_service import NotificationCounterService
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 import json
@@ -101,21 +102,21 @@ class NotificationService:
     def mark_all_as_read(user_id):
         """Mark all notifications as read for a user"""
         try:
-            unread_notifications = Notification.query.filter_by(user_id=user_id, read=False).all()
-            current_time = datetime.utcnow()
-            
-            for notification in unread_notifications:
-                notification.read = True
-                notification.read_at = current_time
-                
-            db.session.commit()
-            
-            return len(unread_notifications), None
+            return NotificationCounterService.mark_all_read(user_id), None
             
         except SQLAlchemyError as e:
             db.session.rollback()
             return 0, str(e)
     
+    @staticmethod
+    def get_unread_count(user_id):
+        """Get the number of unread notifications for a user"""
+        try:
+            return NotificationCounterService.get_unread_count(user_id), None
+            
+        except SQLAlchemyError as e:
+            return 0, str(e)
+    
     @staticmethod
     def create_system_notification(users, title, message, data=None):
         """Create system notification for multiple users"""
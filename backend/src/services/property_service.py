@@ -1,10 +1,49 @@
 from ..models.property import Property
 from ..models.unit import Unit
 from ..models.tenant_property import TenantProperty
+from ..models.user import User
 from ..extensions import db
+from .search_service import apply_search
+from sqlalchemy import case, func, select
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 
+
+class PropertyListing:
+    """
+    A property together with its listing counts.
+
+    The counts are plain attributes of this wrapper, never written to the
+    Property row (its mapped `unit_count` column included), so listing pages
+    leave the session clean. Other attributes read through to the property.
+    """
+
+    def __init__(self, property, unit_count=0, occupied_units=0, tenant_count=0):
+        self.property = property
+        self.unit_count = unit_count
+        self.occupied_units = occupied_units
+        self.tenant_count = tenant_count
+
+    @property
+    def vacancy_rate(self):
+        if self.unit_count == 0:
+            return 0
+        return round((1 - self.occupied_units / self.unit_count) * 100, 2)
+
+    def __getattr__(self, name):
+        return getattr(self.property, name)
+
+    def to_dict(self):
+        data = self.property.to_dict()
+        data.update(
+            unit_count=self.unit_count,
+            occupied_units=self.occupied_units,
+            tenant_count=self.tenant_count,
+            vacancy_rate=self.vacancy_rate
+        )
+        return data
+
+
 class PropertyService:
     @staticmethod
     def create_property(landlord_id, data):
@@ -94,64 +133,116 @@ class PropertyService:
             if not property:
                 return None, "Property not found"
             
-            # Get unit count
-            unit_count = Unit.query.filter_by(property_id=property_id).count()
-            
-            # Get occupied unit count
-            occupied_units = Unit.query.filter_by(property_id=property_id, status='occupied').count()
-            
-            # Get active tenant count
-            tenant_count = TenantProperty.query.filter_by(property_id=property_id, status='active').count()
-            
-            # Add counts to property object
-            property.unit_count = unit_count
-            property.occupied_units = occupied_units
-            property.tenant_count = tenant_count
-            property.vacancy_rate = 0 if unit_count == 0 else round((1 - occupied_units / unit_count) * 100, 2)
+            property = PropertyService.with_counts([property])[0]
                 
             return property, None
             
         except SQLAlchemyError as e:
             return None, str(e)
     
+    @staticmethod
+    def visible_property_criteria(user_id):
+        """
+        Filter criteria selecting the properties a user may read: their own
+        for landlords, associated ones for tenants, all for admins.
+        Returns None for unknown users.
+        """
+        user = db.session.get(User, int(user_id))
+        if not user:
+            return None
+        if user.role == 'landlord':
+            return [Property.landlord_id == user.id]
+        if user.role == 'tenant':
+            return [Property.id.in_(
+                db.session.query(TenantProperty.property_id).filter(TenantProperty.tenant_id == user.id)
+            )]
+        return []
+
+    @staticmethod
+    def listing_query(*criteria, filters=None):
+        """
+        Property query for list pages: `criteria` plus the optional status,
+        city and search filters.
+        """
+        query = Property.query.filter(*criteria)
+        
+        # Apply filters if provided
+        if filters:
+            if filters.get('status'):
+                query = query.filter(Property.status == filters['status'])
+            if filters.get('city'):
+                query = query.filter(Property.city == filters['city'])
+            if filters.get('search'):
+                query = apply_search(query, 'property', Property.id, filters['search'])
+        return query
+    
+    @staticmethod
+    def listing_counts_query(property_ids):
+        """
+        (property_id, unit_count, occupied_units, tenant_count) for
+        `property_ids`, grouped per table in subqueries and joined in one
+        statement.
+        """
+        unit_stats = select(
+            Unit.property_id,
+            func.count(Unit.id).label('unit_count'),
+            func.sum(case((Unit.status == 'occupied', 1), else_=0)).label('occupied_units')
+        ).where(
+            Unit.property_id.in_(property_ids)
+        ).group_by(Unit.property_id).subquery('unit_stats')
+        
+        tenant_stats = select(
+            TenantProperty.property_id,
+            func.count(TenantProperty.id).label('tenant_count')
+        ).where(
+            TenantProperty.property_id.in_(property_ids),
+            TenantProperty.status == 'active'
+        ).group_by(TenantProperty.property_id).subquery('tenant_stats')
+        
+        return select(
+            Property.id,
+            func.coalesce(unit_stats.c.unit_count, 0).label('unit_count'),
+            func.coalesce(unit_stats.c.occupied_units, 0).label('occupied_units'),
+            func.coalesce(tenant_stats.c.tenant_count, 0).label('tenant_count')
+        ).outerjoin(
+            unit_stats, unit_stats.c.property_id == Property.id
+        ).outerjoin(
+            tenant_stats, tenant_stats.c.property_id == Property.id
+        ).where(Property.id.in_(property_ids))
+    
+    @staticmethod
+    def with_counts(properties):
+        """Wrap `properties` as PropertyListing rows, counted in a single query"""
+        if not properties:
+            return []
+        counts = {
+            row.id: row
+            for row in db.session.execute(
+                PropertyService.listing_counts_query([prop.id for prop in properties])
+            )
+        }
+        listings = []
+        for prop in properties:
+            row = counts.get(prop.id)
+            if row is None:
+                listings.append(PropertyListing(prop))
+            else:
+                listings.append(PropertyListing(
+                    prop, int(row.unit_count), int(row.occupied_units), int(row.tenant_count)
+                ))
+        return listings
+    
     @staticmethod
     def get_landlord_properties(landlord_id, page=1, per_page=10, filters=None):
         """Get properties owned by a landlord with pagination"""
         try:
-            query = Property.query.filter_by(landlord_id=landlord_id)
-            
-            # Apply filters if provided
-            if filters:
-                if 'status' in filters:
-                    query = query.filter(Property.status == filters['status'])
-                if 'city' in filters:
-                    query = query.filter(Property.city == filters['city'])
-                if 'search' in filters:
-                    search = f"%{filters['search']}%"
-                    query = query.filter(
-                        (Property.name.ilike(search)) | 
-                        (Property.address.ilike(search)) |
-                        (Property.city.ilike(search))
-                    )
+            query = PropertyService.listing_query(Property.landlord_id == landlord_id, filters=filters)
             
             # Get paginated results
             paginated_props = query.paginate(page=page, per_page=per_page)
             
-            # Enhance properties with additional data
-            properties = []
-            for prop in paginated_props.items:
-                # Get counts
-                unit_count = Unit.query.filter_by(property_id=prop.id).count()
-                occupied_units = Unit.query.filter_by(property_id=prop.id, status='occupied').count()
-                tenant_count = TenantProperty.query.filter_by(property_id=prop.id, status='active').count()
-                
-                # Add counts to property
-                prop.unit_count = unit_count
-                prop.occupied_units = occupied_units
-                prop.tenant_count = tenant_count
-                prop.vacancy_rate = 0 if unit_count == 0 else round((1 - occupied_units / unit_count) * 100, 2)
-                
-                properties.append(prop)
+            # Counts for the whole page in one grouped query
+            properties = PropertyService.with_counts(paginated_props.items)
                 
             return properties, paginated_props.total, paginated_props.pages, None
             
@@ -0,0 +1,225 @@
+"""
+Full-text search over users, properties and documents.
+
+Features
+- One `search_documents` row of text per entity, written by session hooks
+  in the same transaction as the entity and removed with it
+- PostgreSQL: generated tsvector column with a GIN index, prefix queries
+  (`term:*`) for type-ahead ranked by ts_rank; the pg_trgm index answers
+  substring matches of the whole phrase
+- SQLite: FTS5 external-content table with prefix indexes, ranked by bm25
+- Any other database falls back to LIKE over the indexed text
+- `apply_search` narrows and orders a query by the ranked matches;
+  `search_criterion` only narrows (for DISTINCT queries)
+- `flask rebuild-search-index` re-indexes everything, e.g. after bulk
+  statements that bypass the session hooks
+"""
+import logging
+import re
+
+import click
+from sqlalchemy import (
+    and_, column, delete, event, func, insert, inspect, literal, literal_column, or_, select, table, text
+)
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models.document import Document
+from ..models.property import Property
+from ..models.search_document import SearchDocument
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+MAX_TERMS = 8
+MIN_SUBSTRING_LENGTH = 3  # shortest phrase the trigram index can serve
+REBUILD_BATCH_SIZE = 1000
+
+_HOOKS_ATTACHED = False
+_FTS5_READY = set()
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+# ---- what gets indexed ----
+
+def _user_text(user):
+    email = user.email or ''
+    # Split addresses so "acme" finds jane@acme.com on every backend
+    return (user.name, email, re.sub(r'[@.+_-]', ' ', email))
+
+
+INDEXED = {
+    User: ('user', ('name', 'email'), _user_text),
+    Property: ('property', ('name', 'address', 'city'),
+               lambda prop: (prop.name, prop.address, prop.city)),
+    Document: ('document', ('title', 'name', 'original_name', 'description'),
+               lambda doc: (doc.title, doc.name, doc.original_name, doc.description)),
+}
+
+
+def search_text(obj):
+    """The indexed text of a searchable entity"""
+    _, _, extract = INDEXED[type(obj)]
+    return ' '.join(str(value) for value in extract(obj) if value)
+
+
+# ---- index maintenance ----
+
+def _indexed_fields_changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+def _pending_changes(session):
+    """((entity_type, id) -> text to index, {(entity_type, id) to drop})"""
+    upserts, removals = {}, set()
+    for obj in session.new:
+        if type(obj) in INDEXED:
+            upserts[(INDEXED[type(obj)][0], obj.id)] = search_text(obj)
+    for obj in session.dirty:
+        if type(obj) in INDEXED:
+            entity_type, fields, _ = INDEXED[type(obj)]
+            if _indexed_fields_changed(obj, fields):
+                upserts[(entity_type, obj.id)] = search_text(obj)
+    for obj in session.deleted:
+        if type(obj) in INDEXED:
+            removals.add((INDEXED[type(obj)][0], obj.id))
+    return upserts, removals
+
+
+def _write_index(connection, upserts, removals):
+    # Delete-then-insert is an upsert on every backend; the FTS5 triggers
+    # and the generated tsvector column follow the base rows
+    stale = {}
+    for entity_type, entity_id in list(upserts) + list(removals):
+        stale.setdefault(entity_type, set()).add(entity_id)
+    for entity_type, entity_ids in stale.items():
+        connection.execute(
+            delete(SearchDocument)
+            .where(SearchDocument.entity_type == entity_type, SearchDocument.entity_id.in_(entity_ids))
+            .execution_options(synchronize_session=False)
+        )
+    if upserts:
+        connection.execute(insert(SearchDocument), [
+            {'entity_type': entity_type, 'entity_id': entity_id, 'content': content}
+            for (entity_type, entity_id), content in upserts.items()
+        ])
+
+
+def _after_flush(session, flush_context):
+    # Ids are assigned and attribute history is still intact here
+    upserts, removals = _pending_changes(session)
+    if upserts or removals:
+        _write_index(session.connection(), upserts, removals)
+
+
+# ---- querying ----
+
+def search_terms(term):
+    """Lower-cased words of a search string, at most MAX_TERMS"""
+    return _TERM.findall((term or '').lower())[:MAX_TERMS]
+
+
+def _fts5_ready(connection):
+    key = connection.engine.url
+    if key not in _FTS5_READY:
+        found = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'search_documents_fts'")
+        ).scalar()
+        if not found:
+            return False
+        _FTS5_READY.add(key)
+    return True
+
+
+def match_subquery(entity_type, term):
+    """
+    Subquery of (entity_id, rank) for entities of `entity_type` matching
+    every word of `term` as a prefix; lower rank is better. None when `term`
+    has no words.
+    """
+    terms = search_terms(term)
+    if not terms:
+        return None
+
+    base = SearchDocument.entity_type == entity_type
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+
+    if dialect == 'postgresql':
+        tsv = literal_column('search_documents.tsv')
+        query = func.to_tsquery('simple', ' & '.join(f"{word}:*" for word in terms))
+        condition = tsv.op('@@')(query)
+        phrase = ' '.join(terms)
+        if len(phrase) >= MIN_SUBSTRING_LENGTH:
+            condition = or_(condition, SearchDocument.content.ilike(f"%{phrase}%"))
+        stmt = select(
+            SearchDocument.entity_id, (-func.ts_rank(tsv, query)).label('rank')
+        ).where(base, condition)
+    elif dialect == 'sqlite' and _fts5_ready(connection):
+        fts = table('search_documents_fts', column('rowid'), column('rank'))
+        stmt = select(
+            SearchDocument.entity_id, fts.c.rank.label('rank')
+        ).join(
+            fts, fts.c.rowid == SearchDocument.id
+        ).where(
+            base,
+            literal_column('search_documents_fts').op('MATCH')(' AND '.join(f'"{word}"*' for word in terms))
+        )
+    else:
+        stmt = select(SearchDocument.entity_id, literal(0).label('rank')).where(
+            base, and_(*[SearchDocument.content.ilike(f"%{word}%") for word in terms])
+        )
+    return stmt.subquery('search_matches')
+
+
+def apply_search(query, entity_type, id_column, term):
+    """Restrict `query` to entities matching `term`, best matches first"""
+    matches = match_subquery(entity_type, term)
+    if matches is None:
+        return query
+    return query.join(matches, matches.c.entity_id == id_column).order_by(matches.c.rank, id_column)
+
+
+def search_criterion(entity_type, id_column, term):
+    """WHERE criterion matching `term` without ranking, or None when there is nothing to match"""
+    matches = match_subquery(entity_type, term)
+    if matches is None:
+        return None
+    return id_column.in_(select(matches.c.entity_id))
+
+
+def rebuild_index():
+    """Re-index every searchable row; returns the number indexed"""
+    connection = db.session.connection()
+    connection.execute(delete(SearchDocument))
+    indexed = 0
+    for model, (entity_type, _, _) in INDEXED.items():
+        batch = {}
+        for obj in db.session.query(model).yield_per(REBUILD_BATCH_SIZE):
+            batch[(entity_type, obj.id)] = search_text(obj)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                _write_index(connection, batch, ())
+                indexed += len(batch)
+                batch = {}
+        _write_index(connection, batch, ())
+        indexed += len(batch)
+    db.session.commit()
+    return indexed
+
+
+def init_search(app):
+    """
+    Attach the search index session hook and register the rebuild CLI
+    command. Safe to call multiple times; the hook attaches once.
+    """
+    global _HOOKS_ATTACHED
+
+    if not _HOOKS_ATTACHED:
+        event.listen(Session, 'after_flush', _after_flush)
+        _HOOKS_ATTACHED = True
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Re-index all users, properties and documents for search."""
+        click.echo(f"Indexed {rebuild_index()} rows")
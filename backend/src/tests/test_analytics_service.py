@@ -101,11 +101,84 @@ def test_analytics_revenue_data(session, test_users, setup_analytics_data):
     assert error is None
     assert len(revenue_data) > 0
     
-    # Check data structure
-    first_entry = revenue_data[0]
+    # Check data structure (empty periods are zero-filled, so skip to the first with payments)
+    first_entry = next(entry for entry in revenue_data if entry['payment_count'])
     assert 'period' in first_entry
     assert 'revenue' in first_entry
     assert 'payment_count' in first_entry
     
     # Test revenue value
-    assert first_entry['revenue'] > 0
\ No newline at end of file
+    assert first_entry['revenue'] > 0
+
+def test_analytics_dashboard_stats_single_statement(app, session, test_users, setup_analytics_data):
+    """Dashboard stats are computed in one round trip and match per-table counts"""
+    from sqlalchemy import event
+    from ..models.property import Property
+    from ..models.unit import Unit
+
+    landlord_id = test_users['landlord'].id
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _count)
+    try:
+        stats, error = AnalyticsService.get_landlord_dashboard_stats(landlord_id)
+    finally:
+        event.remove(engine, 'before_cursor_execute', _count)
+
+    assert error is None
+    assert len([s for s in statements if s.lstrip().upper().startswith(('SELECT', 'WITH'))]) == 1
+
+    assert stats['property_count'] == Property.query.filter_by(landlord_id=landlord_id).count()
+    assert stats['unit_count'] == Unit.query.join(
+        Property, Property.id == Unit.property_id
+    ).filter(Property.landlord_id == landlord_id).count()
+    assert stats['open_maintenance_requests'] == MaintenanceRequest.query.join(
+        Property, Property.id == MaintenanceRequest.property_id
+    ).filter(
+        Property.landlord_id == landlord_id,
+        MaintenanceRequest.status.in_(['pending', 'in_progress'])
+    ).count()
+
+
+def test_analytics_occupancy_grouped(session, test_users, test_property):
+    """Occupancy analytics aggregate units per property, including vacancy days"""
+    landlord_id = test_users['landlord'].id
+
+    results, error = AnalyticsService.get_occupancy_analytics(landlord_id)
+
+    assert error is None
+    entry = next(r for r in results if r['property_id'] == test_property['property_id'])
+    assert entry['total_units'] == 3
+    assert entry['occupied_units'] == 0
+    assert entry['occupancy_rate'] == 0
+    assert entry['avg_vacant_days'] >= 0
+
+
+def test_analytics_revenue_buckets(session, test_users, setup_analytics_data):
+    """Revenue is bucketed in SQL and empty periods are zero-filled"""
+    landlord_id = test_users['landlord'].id
+    end_date = datetime.utcnow().date()
+
+    for period in ('daily', 'weekly', 'monthly', 'quarterly'):
+        revenue_data, error = AnalyticsService.get_revenue_analytics(
+            landlord_id,
+            period=period,
+            start_date=end_date - timedelta(days=90),
+            end_date=end_date
+        )
+
+        assert error is None
+        periods = [entry['period'] for entry in revenue_data]
+        assert len(periods) == len(set(periods))
+        assert sum(entry['revenue'] for entry in revenue_data) > 0
+
+    daily, _ = AnalyticsService.get_revenue_analytics(
+        landlord_id, period='daily',
+        start_date=end_date - timedelta(days=90), end_date=end_date
+    )
+    assert len(daily) == 91
+    assert daily[-1]['period'] == end_date.strftime('%Y-%m-%d')
@@ -0,0 +1,193 @@
+import json
+import time
+
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required
+
+from ..utils.cache import (
+    InMemoryCache, InvalidationBus, cached, get_cache, invalidate_tags,
+    serialize_response, deserialize_response
+)
+from ..extensions import db
+from ..models.unit import Unit
+
+
+@pytest.fixture
+def cache_app():
+    """Minimal app with a cached endpoint that counts its invocations."""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        JWT_SECRET_KEY='cache-test-secret',
+        CACHE_BACKEND='memory',
+    )
+    JWTManager(app)
+    calls = {'count': 0}
+
+    @app.route('/whoami')
+    @cached(ttl=60)
+    @jwt_required(optional=True)
+    def whoami():
+        calls['count'] += 1
+        return jsonify({'identity': get_jwt_identity(), 'call': calls['count']}), 200
+
+    @app.route('/things/<int:thing_id>')
+    @cached(ttl=60, tags=['owner:{identity}', 'thing:{thing_id}'])
+    @jwt_required(optional=True)
+    def thing(thing_id):
+        calls['count'] += 1
+        return jsonify({'thing': thing_id, 'call': calls['count']}), 200
+
+    app.calls = calls
+    return app
+
+
+def test_in_memory_cache_lru_by_entries():
+    cache = InMemoryCache(max_entries=2)
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    cache.get('a')  # 'b' is now least recently used
+    cache.set('c', b'3')
+
+    assert cache.get('a') == b'1'
+    assert cache.get('b') is None
+    assert cache.get('c') == b'3'
+
+
+def test_in_memory_cache_bounded_by_bytes():
+    cache = InMemoryCache(max_bytes=10)
+    cache.set('a', b'12345')
+    cache.set('b', b'12345')
+    cache.set('c', b'123')
+
+    assert cache.get('a') is None
+    assert cache.size_bytes == 8
+    cache.set('huge', b'x' * 11)
+    assert cache.get('huge') is None
+
+
+def test_in_memory_cache_ttl():
+    cache = InMemoryCache()
+    cache.set('a', b'1', ttl=0)
+    cache.set('b', b'2', ttl=60)
+    time.sleep(0.01)
+
+    assert cache.get('a') is None
+    cache.cleanup()
+    assert len(cache) == 1
+
+
+def test_response_roundtrip(cache_app):
+    with cache_app.test_request_context():
+        response = jsonify({'ok': True})
+        response.headers['X-Custom'] = 'yes'
+        response.set_cookie('session', 'secret')
+
+        restored = deserialize_response(serialize_response(response))
+
+        assert restored.status_code == 200
+        assert restored.get_json() == {'ok': True}
+        assert restored.headers['X-Custom'] == 'yes'
+        assert 'Set-Cookie' not in restored.headers
+
+
+def test_cached_scoped_per_identity(cache_app):
+    client = cache_app.test_client()
+    with cache_app.app_context():
+        alice = create_access_token(identity='1')
+        bob = create_access_token(identity='2')
+
+    first = client.get('/whoami', headers={'Authorization': f'Bearer {alice}'}).get_json()
+    again = client.get('/whoami', headers={'Authorization': f'Bearer {alice}'}).get_json()
+    other = client.get('/whoami', headers={'Authorization': f'Bearer {bob}'}).get_json()
+
+    assert first == again
+    assert other['identity'] == '2'
+    assert cache_app.calls['count'] == 2
+
+    # Invalid tokens bypass the cache and reach the endpoint's own JWT check
+    rejected = client.get('/whoami', headers={'Authorization': 'Bearer not-a-token'})
+    assert rejected.status_code in (401, 422)
+    assert cache_app.calls['count'] == 2
+
+    with cache_app.app_context():
+        assert isinstance(get_cache(), InMemoryCache)
+
+
+def test_in_memory_cache_invalidate_tags():
+    cache = InMemoryCache()
+    cache.set('a', b'1', tags=['landlord:1', 'property:7'])
+    cache.set('b', b'2', tags=['landlord:1'])
+    cache.set('c', b'3', tags=['landlord:2'])
+
+    assert cache.invalidate_tags(['property:7']) == 1
+    assert cache.get('a') is None
+    assert cache.get('b') == b'2'
+
+    assert cache.invalidate_tags(['landlord:1', 'landlord:2']) == 2
+    assert len(cache) == 0
+
+
+def test_cached_entries_evicted_by_tag(cache_app):
+    client = cache_app.test_client()
+
+    client.get('/things/1')
+    client.get('/things/2')
+    client.get('/things/1')
+    assert cache_app.calls['count'] == 2
+
+    with cache_app.app_context():
+        assert invalidate_tags(['thing:1']) == 1
+
+    client.get('/things/1')
+    client.get('/things/2')
+    assert cache_app.calls['count'] == 3
+
+
+def test_invalidation_bus_ignores_own_messages():
+    cache = InMemoryCache()
+    bus = InvalidationBus(redis=None, cache=cache)
+    other = InvalidationBus(redis=None, cache=cache)
+
+    cache.set('a', b'1', tags=['landlord:1'])
+    bus.handle_message(json.dumps({'origin': bus.origin, 'tags': ['landlord:1']}))
+    assert cache.get('a') == b'1'
+
+    bus.handle_message(json.dumps({'origin': other.origin, 'tags': ['landlord:1']}))
+    assert cache.get('a') is None
+    bus.handle_message('not json')
+
+
+def test_commit_invalidates_landlord_and_property_tags(app, test_users, test_property):
+    """Committing a unit evicts entries tagged with its landlord and property"""
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        property_id = test_property['property_id']
+        cache = get_cache()
+        cache.set('dashboard', b'1', tags=[f'landlord:{landlord_id}'])
+        cache.set('property', b'2', tags=[f'property:{property_id}'])
+        cache.set('unrelated', b'3', tags=['landlord:0'])
+
+        db.session.add(Unit(property_id=property_id, unit_number='C1', status='available'))
+        db.session.flush()
+        assert cache.get('dashboard') == b'1'
+        db.session.commit()
+
+        assert cache.get('dashboard') is None
+        assert cache.get('property') is None
+        assert cache.get('unrelated') == b'3'
+
+
+def test_rollback_keeps_cached_entries(app, test_users, test_property):
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        cache = get_cache()
+        cache.set('dashboard', b'1', tags=[f'landlord:{landlord_id}'])
+
+        db.session.add(Unit(property_id=test_property['property_id'], unit_number='C2', status='available'))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+
+        assert cache.get('dashboard') == b'1'
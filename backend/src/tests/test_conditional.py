@@ -0,0 +1,128 @@
+from datetime import datetime
+
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+
+from ..utils.conditional import conditional_get, combine_fingerprints
+from ..extensions import db
+from ..models.property import Property
+from ..models.unit import Unit
+
+
+def test_property_list_not_modified(client, auth_headers, test_property):
+    """A matching If-None-Match is answered with 304 and no body"""
+    first = client.get("/api/properties/", headers=auth_headers["landlord"])
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert "Last-Modified" not in first.headers
+
+    again = client.get(
+        "/api/properties/",
+        headers={**auth_headers["landlord"], "If-None-Match": etag},
+    )
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_property_list_etag_changes_on_write(app, client, auth_headers, test_property):
+    etag = client.get("/api/properties/", headers=auth_headers["landlord"]).headers["ETag"]
+
+    with app.app_context():
+        prop = db.session.get(Property, test_property["property_id"])
+        prop.description = "Renovated"
+        db.session.commit()
+
+    resp = client.get(
+        "/api/properties/",
+        headers={**auth_headers["landlord"], "If-None-Match": etag},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_etag_scoped_per_identity(client, auth_headers, test_property):
+    landlord = client.get("/api/properties/", headers=auth_headers["landlord"])
+    admin = client.get(
+        "/api/properties/",
+        headers={**auth_headers["admin"], "If-None-Match": landlord.headers["ETag"]},
+    )
+    assert admin.status_code == 200
+    assert admin.headers["ETag"] != landlord.headers["ETag"]
+
+
+def test_unit_list_tracks_units(app, client, auth_headers, test_property):
+    url = f"/api/units/property/{test_property['property_id']}"
+    etag = client.get(url, headers=auth_headers["landlord"]).headers["ETag"]
+
+    with app.app_context():
+        db.session.add(Unit(property_id=test_property["property_id"], unit_number="E1", status="available"))
+        db.session.commit()
+
+    resp = client.get(url, headers={**auth_headers["landlord"], "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert len(resp.get_json()["units"]) == len(test_property["unit_ids"]) + 1
+
+    again = client.get(url, headers={**auth_headers["landlord"], "If-None-Match": resp.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_unit_list_delete_is_not_modified_since(app, client, auth_headers, test_property):
+    """Deletes change the ETag; If-Modified-Since cannot see them, so it is ignored"""
+    url = f"/api/units/property/{test_property['property_id']}"
+    with app.app_context():
+        unit = Unit(property_id=test_property["property_id"], unit_number="D1", status="available")
+        db.session.add(unit)
+        db.session.commit()
+        unit_id = unit.id
+    etag = client.get(url, headers=auth_headers["landlord"]).headers["ETag"]
+
+    with app.app_context():
+        db.session.delete(db.session.get(Unit, unit_id))
+        db.session.commit()
+
+    since = {"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+    assert client.get(url, headers={**auth_headers["landlord"], **since}).status_code == 200
+    resp = client.get(url, headers={**auth_headers["landlord"], "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert len(resp.get_json()["units"]) == len(test_property["unit_ids"])
+
+
+def test_fingerprint_skips_view_and_hash_mode():
+    """Fingerprinted views are not called on 304; hash mode still saves the transfer"""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, JWT_SECRET_KEY="conditional-test-secret")
+    JWTManager(app)
+    calls = {"count": 0}
+
+    @app.route("/fingerprinted")
+    @conditional_get(lambda identity: (None, 3))
+    def fingerprinted():
+        calls["count"] += 1
+        return jsonify({"items": [1, 2, 3]})
+
+    @app.route("/hashed")
+    @conditional_get()
+    def hashed():
+        return jsonify({"items": [1, 2, 3]})
+
+    client = app.test_client()
+    with app.app_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+
+    etag = client.get("/fingerprinted", headers=headers).headers["ETag"]
+    resp = client.get("/fingerprinted", headers={**headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert calls["count"] == 1
+
+    etag = client.get("/hashed").headers["ETag"]
+    assert client.get("/hashed", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/hashed", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+
+def test_combine_fingerprints():
+    early, late = datetime(2024, 1, 1), datetime(2024, 6, 1)
+    assert combine_fingerprints((early, 2), (late, 1)) == (late, (2, 1))
+    assert combine_fingerprints((None, 0), (None, 0)) == (None, (0, 0))
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from ..extensions import db
+from ..models.notification import Notification
+from ..models.user import User
+from ..utils.cursor_pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+    keyset_paginate,
+)
+
+
+def _notifications(user_id, count, created_at):
+    # Duplicate timestamps exercise the id tie-break
+    db.session.add_all([
+        Notification(user_id=user_id, type='system', title=f'Keyset {i}', message='m',
+                     created_at=created_at - timedelta(minutes=i // 2))
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def test_cursor_round_trip_and_tampering(app):
+    with app.test_request_context():
+        when = datetime(2024, 5, 1, 12, 30)
+        cursor = encode_cursor([when, 7], scope='listing')
+        assert decode_cursor(cursor, scope='listing') == [when, 7]
+
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor, scope='other-listing')
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor[:-2] + ('AA' if cursor[-2:] != 'AA' else 'BB'), scope='listing')
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor, scope='listing', size=3)
+
+
+def test_keyset_pages_match_offset_order(app, test_users):
+    with app.test_request_context():
+        user_id = test_users['admin'].id
+        _notifications(user_id, 7, datetime(2024, 3, 1))
+        query = Notification.query.filter(Notification.user_id == user_id,
+                                          Notification.title.like('Keyset %'))
+        order = (Notification.created_at.desc(), Notification.id.desc())
+        expected = [n.id for n in query.order_by(*order)]
+
+        seen, cursor = [], None
+        while True:
+            page = keyset_paginate(query, order, cursor=cursor, per_page=3, scope='test')
+            seen.extend(n.id for n in page['items'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+
+        assert seen == expected
+        assert 'total' not in page
+
+        counted = keyset_paginate(query, order, per_page=3, count='exact', scope='test')
+        assert (counted['total'], counted['total_is_estimate']) == (7, False)
+        estimated = keyset_paginate(query, order, per_page=3, count='estimate', scope='test')
+        assert estimated['total'] == 7
+
+
+def test_notifications_endpoint_cursor_mode(client, auth_headers, test_users):
+    user_id = test_users['tenant'].id
+    _notifications(user_id, 5, datetime(2024, 4, 1))
+
+    seen, cursor = [], ''
+    while cursor is not None:
+        response = client.get(f'/api/notifications/?per_page=2&cursor={cursor}',
+                              headers=auth_headers['tenant'])
+        assert response.status_code == 200
+        data = response.get_json()
+        assert 'total' not in data and len(data['notifications']) <= 2
+        seen.extend(n['id'] for n in data['notifications'])
+        cursor = data['next_cursor']
+
+    total = Notification.query.filter_by(user_id=user_id).count()
+    assert len(seen) == len(set(seen)) == total
+
+    # A cursor from someone else's listing is rejected
+    _notifications(test_users['landlord'].id, 2, datetime(2024, 4, 1))
+    foreign = client.get('/api/notifications/?per_page=1&cursor=', headers=auth_headers['landlord'])
+    stolen = foreign.get_json()['next_cursor']
+    response = client.get(f'/api/notifications/?cursor={stolen}', headers=auth_headers['tenant'])
+    assert response.status_code == 400
+
+
+def test_admin_users_cursor_mode(client, auth_headers, test_users):
+    response = client.get('/api/admin/users?cursor=&per_page=2&count=exact', headers=auth_headers['admin'])
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['total'] == User.query.count()
+    assert [u['id'] for u in data['users']] == sorted((u['id'] for u in data['users']), reverse=True)
+    assert data['next_cursor']
+
+
+def test_notifications_cursor_with_null_read_flags(client, auth_headers, test_users):
+    """A NULL is_read sorts and filters as unread, so no page skips or repeats rows"""
+    user_id = test_users['tenant'].id
+    when = datetime(2024, 6, 1)
+    rows = [Notification(user_id=user_id, type='system', title=f'Flag {i}', message='m',
+                         is_read=flag, created_at=when - timedelta(minutes=i))
+            for i, flag in enumerate([None, True, False, None, True, False])]
+    db.session.add_all(rows)
+    db.session.commit()
+    mine = Notification.query.filter_by(user_id=user_id).all()
+    unread = {n.id for n in mine if not n.is_read}
+    assert {rows[0].id, rows[3].id} <= unread
+
+    try:
+        for only_unread, expected in (('false', {n.id for n in mine}), ('true', unread)):
+            seen, cursor = [], ''
+            while cursor is not None:
+                response = client.get(f'/api/notifications/?per_page=1&only_unread={only_unread}&cursor={cursor}',
+                                      headers=auth_headers['tenant'])
+                assert response.status_code == 200
+                data = response.get_json()
+                seen.extend(n['id'] for n in data['notifications'])
+                cursor = data['next_cursor']
+            assert len(seen) == len(set(seen))
+            assert set(seen) == expected
+            # Unread (including NULL) first
+            assert set(seen[:len(unread)]) == unread
+    finally:
+        # The database outlives the test; other tests expect no read rows
+        for n in rows:
+            db.session.delete(n)
+        db.session.commit()
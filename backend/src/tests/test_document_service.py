@@ -1,12 +1,15 @@
 """
 Test file for document service
 """
+import io
 import os
+import hashlib
 import pytest
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import patch, MagicMock
 from werkzeug.datastructures import FileStorage
 
 from src.services.document_service import DocumentService
+from src.services.document_store import DocumentStore, LocalBlobBackend
 from src.models.document import Document
 from src.models.user import User
 from src.extensions import db
@@ -62,33 +65,24 @@ class TestDocumentService:
         assert DocumentService.allowed_file("noextension") is False
         assert DocumentService.allowed_file("") is False
 
-    @patch('os.path.getsize')
-    @patch('uuid.uuid4')
-    @patch('os.makedirs')
-    def test_save_file_success(self, mock_makedirs, mock_uuid, mock_getsize, mock_file):
+    def test_save_file_success(self, app, tmp_path):
         """Test successful file saving"""
-        # Set up mocks
-        mock_uuid.return_value = "test-uuid-12345"
-        mock_getsize.return_value = 1024  # 1KB
+        content = b"%PDF-1.4 test document content"
+        file = FileStorage(stream=io.BytesIO(content), filename="test_document.pdf")
+        store = DocumentStore(LocalBlobBackend(str(tmp_path)))
+        
+        with app.app_context():
+            result, error = DocumentService.save_file(file, store)
         
-        # Test the function
-        with patch('builtins.open', mock_open()) as mock_file_open:
-            with patch.object(FileStorage, 'save') as mock_save:
-                result, error = DocumentService.save_file(mock_file, "/tmp/uploads")
-                
-                # Verify directory was created
-                mock_makedirs.assert_called_once_with("/tmp/uploads", exist_ok=True)
-                
-                # Verify file was saved
-                mock_save.assert_called_once()
-                
-                # Verify result is correct
-                assert error is None
-                assert result is not None
-                assert result['original_filename'] == "test_document.pdf"
-                assert result['filename'] == "test-uuid-12345.pdf"
-                assert result['size'] == 1024
-                assert result['extension'] == "pdf"
+        # Verify result is correct
+        assert error is None
+        assert result is not None
+        assert result['original_filename'] == "test_document.pdf"
+        assert result['filename'] == f"{hashlib.sha256(content).hexdigest()}.pdf"
+        assert result['size'] == len(content)
+        assert result['extension'] == "pdf"
+        with open(os.path.join(str(tmp_path), result['path']), 'rb') as saved:
+            assert saved.read() == content
 
     def test_save_file_invalid(self):
         """Test saving an invalid file"""
@@ -0,0 +1,175 @@
+import hashlib
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from ..extensions import db
+from ..models.document import Document
+from ..models.stored_blob import StoredBlob
+from ..services.document_store import DocumentStore, LocalBlobBackend, LocalS3Client, S3BlobBackend
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 64
+
+
+def _file(content=PDF, filename="lease.pdf"):
+    return FileStorage(stream=io.BytesIO(content), filename=filename)
+
+
+@pytest.fixture
+def store(app, tmp_path, monkeypatch):
+    store = DocumentStore(LocalBlobBackend(str(tmp_path)))
+    monkeypatch.setitem(app.extensions, 'document_store', store)
+    yield store
+    with app.app_context():
+        Document.query.filter(Document.content_hash.isnot(None)).delete()
+        db.session.commit()
+        store.reconcile()
+
+
+def _upload(client, headers, content=PDF, filename="lease.pdf"):
+    response = client.post('/api/documents', headers=headers, content_type='multipart/form-data',
+                           data={'file': _file(content, filename), 'name': 'Lease', 'document_type': 'lease'})
+    assert response.status_code == 201
+    return response.get_json()['document']['id']
+
+
+def test_identical_content_is_stored_once_and_ref_counted(app, store, tmp_path):
+    content = PDF + b"refcount"
+    sha = hashlib.sha256(content).hexdigest()
+    with app.app_context():
+        first, _ = store.put(_file(content))
+        second, upload = store.put(_file(content, "copy.pdf"))
+        assert upload.deduplicated
+        assert first.storage_key == second.storage_key
+        assert db.session.get(StoredBlob, sha).ref_count == 2
+
+        path = os.path.join(str(tmp_path), first.storage_key)
+        assert store.release(sha) is False
+        assert os.path.exists(path)
+        assert store.release(sha) is True
+        assert not os.path.exists(path)
+        assert db.session.get(StoredBlob, sha) is None
+
+
+def test_same_content_under_another_extension_reuses_the_blob(app, store, tmp_path):
+    content = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 16
+    sha = hashlib.sha256(content).hexdigest()
+    with app.app_context():
+        first, _ = store.put(_file(content, "a.jpg"))
+        second, upload = store.put(_file(content, "b.jpeg"))
+        key = first.storage_key
+        assert upload.deduplicated
+        assert second.storage_key == key
+        assert db.session.get(StoredBlob, sha).ref_count == 2
+
+        stored = [os.path.relpath(os.path.join(d, f), str(tmp_path))
+                  for d, _, files in os.walk(str(tmp_path)) for f in files if sha in f]
+        assert stored == [key]
+
+        assert store.release(sha) is False
+        assert store.release(sha) is True
+        assert not os.listdir(os.path.dirname(os.path.join(str(tmp_path), key)))
+
+
+def test_release_unlinks_before_the_row_delete_commits(app, store, monkeypatch):
+    content = PDF + b"release-race"
+    sha = hashlib.sha256(content).hexdigest()
+    seen = []
+    with app.app_context():
+        store.put(_file(content))
+        real_delete = store.backend.delete
+
+        def delete(key):
+            # A concurrent put is still blocked on the uncommitted row delete here
+            seen.append(db.session().in_transaction())
+            real_delete(key)
+
+        monkeypatch.setattr(store.backend, 'delete', delete)
+        assert store.release(sha) is True
+        assert seen == [True]
+        assert db.session.get(StoredBlob, sha) is None
+
+
+def test_s3_backend_reads_ranges(app, tmp_path):
+    client = LocalS3Client(str(tmp_path))
+    store = DocumentStore(S3BlobBackend(client, 'documents', 'blobs', staging_root=str(tmp_path / 'staging')))
+    content = PDF + b"s3"
+    with app.app_context():
+        blob, _ = store.put(_file(content))
+        assert client.head_object(Bucket='documents', Key=f"blobs/{blob.storage_key}")['ContentLength'] == len(content)
+
+        reader = store.open(blob)
+        reader.seek(1000)
+        assert reader.read(100) == content[1000:1100]
+        reader.seek(-2, io.SEEK_END)
+        assert reader.read() == b"s3"
+        store.release(blob.sha256)
+
+
+def test_download_supports_etag_and_range(client, auth_headers, store):
+    document_id = _upload(client, auth_headers['landlord'])
+    url = f'/api/documents/{document_id}/download'
+
+    full = client.get(url, headers=auth_headers['landlord'])
+    assert full.status_code == 200
+    assert full.data == PDF
+    assert full.headers['ETag'] == f'"{hashlib.sha256(PDF).hexdigest()}"'
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    assert 'attachment; filename=lease.pdf' in full.headers['Content-Disposition']
+
+    partial = client.get(url, headers={**auth_headers['landlord'], 'Range': 'bytes=100-199'})
+    assert partial.status_code == 206
+    assert partial.data == PDF[100:200]
+    assert partial.headers['Content-Range'] == f'bytes 100-199/{len(PDF)}'
+
+    cached = client.get(url, headers={**auth_headers['landlord'], 'If-None-Match': full.headers['ETag']})
+    assert cached.status_code == 304
+
+
+def test_download_is_scoped_to_the_owner(client, auth_headers, store):
+    document_id = _upload(client, auth_headers['landlord'], PDF + b"private")
+    url = f'/api/documents/{document_id}/download'
+
+    assert client.get(url, headers=auth_headers['tenant']).status_code == 404
+    assert client.get(url, headers=auth_headers['admin']).status_code == 200
+
+
+def test_download_offloads_to_proxy(app, client, auth_headers, store, monkeypatch):
+    document_id = _upload(client, auth_headers['landlord'], PDF + b"offload")
+    sha = hashlib.sha256(PDF + b"offload").hexdigest()
+    url = f'/api/documents/{document_id}/download'
+
+    monkeypatch.setitem(app.config, 'DOCUMENT_DOWNLOAD_OFFLOAD', 'x-accel')
+    response = client.get(url, headers=auth_headers['landlord'])
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f'/protected/blobs/{sha[:2]}/{sha[2:4]}/{sha}.pdf'
+
+    monkeypatch.setitem(app.config, 'DOCUMENT_DOWNLOAD_OFFLOAD', 'x-sendfile')
+    response = client.get(url, headers=auth_headers['landlord'])
+    assert response.headers['X-Sendfile'] == store.local_path(db.session.get(StoredBlob, sha))
+
+
+def test_delete_keeps_shared_blob_until_last_reference(app, client, auth_headers, store, tmp_path):
+    content = PDF + b"shared"
+    first = _upload(client, auth_headers['landlord'], content)
+    second = _upload(client, auth_headers['landlord'], content, "copy.pdf")
+    with app.app_context():
+        path = os.path.join(str(tmp_path), db.session.get(Document, first).file_path)
+
+    assert client.delete(f'/api/documents/{first}', headers=auth_headers['landlord']).status_code == 200
+    assert os.path.exists(path)
+    assert client.delete(f'/api/documents/{second}', headers=auth_headers['landlord']).status_code == 200
+    assert not os.path.exists(path)
+
+
+def test_reconcile_fixes_counts_and_drops_orphans(app, store):
+    with app.app_context():
+        blob, _ = store.put(_file(PDF + b"orphan"))
+        key = blob.storage_key
+        updated, removed = store.reconcile()
+        assert removed >= 1
+        assert db.session.get(StoredBlob, blob.sha256) is None
+        assert not os.path.exists(store.backend.path(key))
@@ -0,0 +1,212 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from ..extensions import db
+from ..models.email_outbox import EmailOutbox
+import pytest
+
+from ..services.email_outbox_service import (claim_batch, deliver, drain, enqueue_email, get_email_provider,
+                                             init_email_outbox)
+from ..services.email_service import OutboundMessage, PostmarkProvider, SendgridProvider, StubProvider
+from ..utils.email_service import send_email
+
+
+def _response(status_code=200, json_body=None, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json_body
+    response.text = str(json_body)
+    response.headers = headers or {}
+    return response
+
+
+def _clear_outbox():
+    EmailOutbox.query.delete()
+    db.session.commit()
+
+
+def test_send_email_queues_and_stub_delivers(app):
+    with app.test_request_context():
+        _clear_outbox()
+        provider = get_email_provider()
+        assert isinstance(provider, StubProvider)
+        before = len(provider.sent)
+
+        assert send_email('reset@example.com', 'Reset', template='<p>Hi {{ name }}</p>', name='Ann')
+
+        row = EmailOutbox.query.filter_by(to_address='reset@example.com').one()
+        assert row.status == EmailOutbox.STATUS_SENT
+        assert row.html_body == '<p>Hi Ann</p>'
+        assert row.provider_message_id.startswith('stub-')
+        assert provider.sent[before].to_address == 'reset@example.com'
+
+
+def test_enqueue_does_not_call_provider_in_request(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_INLINE', False)
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_WORKERS', 0)
+    provider = StubProvider()
+    monkeypatch.setitem(app.extensions, 'email_provider', provider)
+
+    with app.test_request_context():
+        _clear_outbox()
+        for i in range(3):
+            enqueue_email(f'user{i}@example.com', 'Welcome', html_body='<p>Welcome</p>')
+        db.session.commit()
+        assert provider.sent == []
+        assert EmailOutbox.query.filter_by(status=EmailOutbox.STATUS_PENDING).count() == 3
+
+        # One provider request for the whole batch
+        assert drain() == 3
+        assert provider.requests == 1
+        assert EmailOutbox.query.filter_by(status=EmailOutbox.STATUS_SENT).count() == 3
+
+
+def test_claims_do_not_overlap(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_INLINE', False)
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_WORKERS', 0)
+
+    with app.test_request_context():
+        _clear_outbox()
+        for i in range(5):
+            enqueue_email(f'claim{i}@example.com', 'Claim', text_body='body')
+        db.session.commit()
+
+        first = claim_batch(3)
+        second = claim_batch(3)
+        assert len(first) == 3 and len(second) == 2
+        assert not {row.id for row in first} & {row.id for row in second}
+        assert claim_batch(3) == []
+
+
+def test_retryable_failures_back_off_then_die(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_INLINE', False)
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_WORKERS', 0)
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 2)
+    provider = PostmarkProvider('token', 'from@example.com')
+    monkeypatch.setitem(app.extensions, 'email_provider', provider)
+
+    with app.test_request_context():
+        _clear_outbox()
+        row = enqueue_email('flaky@example.com', 'Receipt', html_body='<p>Paid</p>')
+        db.session.commit()
+
+        with patch('src.services.email_service.http_session') as session:
+            session.return_value.post.side_effect = requests.ConnectionError('reset by peer')
+            deliver(claim_batch())
+            row = db.session.get(EmailOutbox, row.id)
+            assert row.status == EmailOutbox.STATUS_FAILED
+            assert row.attempts == 1
+            assert row.next_attempt_at > datetime.utcnow()
+
+            row.next_attempt_at = datetime.utcnow()
+            db.session.commit()
+            deliver(claim_batch())
+            row = db.session.get(EmailOutbox, row.id)
+            assert row.status == EmailOutbox.STATUS_DEAD
+            assert 'ConnectionError' in row.last_error
+
+
+def test_enqueue_joins_the_callers_transaction(app):
+    with app.test_request_context():
+        _clear_outbox()
+        enqueue_email('rolled-back@example.com', 'Never sent', text_body='body')
+        db.session.rollback()
+        assert EmailOutbox.query.count() == 0
+
+        enqueue_email('committed@example.com', 'Sent on commit', text_body='body')
+        db.session.commit()
+        row = EmailOutbox.query.one()
+        assert row.status == EmailOutbox.STATUS_SENT
+
+
+def test_unknown_provider_is_a_config_error(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'EMAIL_PROVIDER', 'carrier-pigeon')
+    monkeypatch.delitem(app.extensions, 'email_provider', raising=False)
+
+    with pytest.raises(ValueError, match='carrier-pigeon'):
+        init_email_outbox(app)
+    with app.app_context():
+        with pytest.raises(ValueError):
+            get_email_provider()
+    assert 'email_provider' not in app.extensions
+
+
+def test_rows_without_a_result_are_failed_then_dead(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_INLINE', False)
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_WORKERS', 0)
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 2)
+    provider = StubProvider()
+    monkeypatch.setattr(provider, 'send_batch', lambda batch: [])
+    monkeypatch.setitem(app.extensions, 'email_provider', provider)
+
+    with app.test_request_context():
+        _clear_outbox()
+        row = enqueue_email('short@example.com', 'Lost', text_body='body')
+        db.session.commit()
+        row_id = row.id
+
+        deliver(claim_batch())
+        row = db.session.get(EmailOutbox, row_id)
+        assert row.status == EmailOutbox.STATUS_FAILED
+        assert row.claim_token is None
+        assert 'no result' in row.last_error
+
+        # The worker dies mid-delivery on the last attempt; the reclaim parks it
+        row.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        claimed = claim_batch()
+        assert [r.id for r in claimed] == [row_id]
+        row.locked_at = datetime(2000, 1, 1)
+        db.session.commit()
+        assert claim_batch() == []
+        row = db.session.get(EmailOutbox, row_id)
+        assert row.status == EmailOutbox.STATUS_DEAD
+
+
+def test_first_request_starts_worker_pool(app, monkeypatch):
+    from ..services.email_outbox_service import _STARTED_KEY, _start_on_first_request
+    monkeypatch.setitem(app.config, 'EMAIL_OUTBOX_INLINE', False)
+    monkeypatch.setitem(app.extensions, _STARTED_KEY, False)
+
+    with app.test_request_context():
+        with patch('src.services.email_outbox_service.get_worker_pool') as get_pool:
+            _start_on_first_request()
+            _start_on_first_request()
+    get_pool.assert_called_once_with(app)
+
+
+def test_postmark_batch_endpoint():
+    provider = PostmarkProvider('token', 'from@example.com')
+    messages = [OutboundMessage('ok@example.com', 'Hi', '<p>Hi</p>'),
+                OutboundMessage('gone@example.com', 'Hi', '<p>Hi</p>')]
+    body = [{'ErrorCode': 0, 'MessageID': 'pm-1'}, {'ErrorCode': 406, 'Message': 'Inactive recipient'}]
+
+    with patch('src.services.email_service.http_session') as session:
+        session.return_value.post.return_value = _response(200, body)
+        ok, rejected = provider.send_batch(messages)
+
+    session.return_value.post.assert_called_once()
+    args, kwargs = session.return_value.post.call_args
+    assert args[0] == PostmarkProvider.batch_url
+    assert [m['To'] for m in kwargs['json']] == ['ok@example.com', 'gone@example.com']
+    assert kwargs['timeout'] == provider.timeout
+    assert ok.ok and ok.message_id == 'pm-1'
+    assert not rejected.ok and not rejected.retryable
+
+
+def test_sendgrid_coalesces_identical_content():
+    provider = SendgridProvider('key', 'from@example.com')
+    messages = [OutboundMessage('a@example.com', 'Outage', '<p>Down tonight</p>'),
+                OutboundMessage('b@example.com', 'Outage', '<p>Down tonight</p>'),
+                OutboundMessage('c@example.com', 'Reset', '<p>Your link</p>')]
+
+    with patch('src.services.email_service.http_session') as session:
+        session.return_value.post.return_value = _response(202, headers={'X-Message-Id': 'sg-1'})
+        results = provider.send_batch(messages)
+
+    assert session.return_value.post.call_count == 2
+    payloads = [call.kwargs['json'] for call in session.return_value.post.call_args_list]
+    assert sorted(len(p['personalizations']) for p in payloads) == [1, 2]
+    assert all(result.ok for result in results)
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from jinja2 import Environment
+
+from ..models.email_outbox import EmailOutbox
+from ..services.email_service import EmailService
+from ..services.email_templates import get_email_templates, html_source_to_text
+
+
+def test_templates_are_precompiled_at_startup(app):
+    with app.app_context():
+        templates = get_email_templates()
+        assert {'verification', 'welcome'} <= set(templates._compiled)
+
+
+def test_render_produces_escaped_html_and_text_twin(app):
+    with app.app_context():
+        html, text = get_email_templates().render(
+            'verification', user_name='<Ann>', verification_link='https://example.com/v?t=1')
+
+    assert '&lt;Ann&gt;' in html
+    assert 'Hi <Ann>,' in text
+    assert 'Verify Email (https://example.com/v?t=1)' in text
+    assert '<' not in text.replace('<Ann>', '')
+    assert 'font-family' not in text
+    assert '© 2025 Asset Anchor' in text
+
+
+def test_batches_and_inline_strings_do_not_recompile(app):
+    with app.app_context():
+        templates = get_email_templates()
+        source = '<p>Rent of {{ amount }} is due</p>'
+        first = templates.from_string(source)
+        assert templates.from_string(source) is first
+
+        with patch.object(Environment, 'compile', side_effect=AssertionError('recompiled')):
+            rendered = list(templates.render_batch(
+                'welcome', ({'user_name': f'Tenant {i}'} for i in range(50))))
+            templates.from_string(source).render(amount='$1,200.00')
+
+    assert len(rendered) == 50
+    assert 'Tenant 49' in rendered[-1][0] and 'Tenant 49' in rendered[-1][1]
+
+
+def test_html_source_to_text_keeps_jinja():
+    source = '<p>{% if name %}Hi {{ name }}{% endif %}</p><a href="{{ url }}">Open</a>'
+    assert html_source_to_text(source) == '{% if name %}Hi {{ name }}{% endif %}\nOpen ({{ url }})\n'
+
+
+def test_send_bulk_queues_one_message_per_recipient(app):
+    with app.test_request_context():
+        EmailOutbox.query.filter_by(tag='welcome').delete()
+        service = EmailService(app)
+        recipients = [(f'tenant{i}@example.com', {'user_name': f'Tenant {i}'}) for i in range(5)]
+
+        count, error = service.send_bulk('Welcome', 'welcome', recipients)
+
+        assert (count, error) == (5, None)
+        rows = EmailOutbox.query.filter_by(tag='welcome').order_by(EmailOutbox.id).all()
+        assert [row.to_address for row in rows] == [to for to, _ in recipients]
+        assert all(row.status == EmailOutbox.STATUS_SENT for row in rows)
+        assert 'Tenant 3' in rows[3].text_body and '<' not in rows[3].text_body
@@ -0,0 +1,191 @@
+import json
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from ..extensions import db
+from ..models.idempotency_key import IdempotencyKey
+from ..models.user import User
+from ..utils.idempotency import (
+    CLAIMED, DUPLICATE, IN_PROGRESS, CompletedKeys, IdempotencyGuard,
+    IdempotencyUnavailable, get_idempotency_guard, idempotent
+)
+
+
+class FakeRedis:
+    """Just enough of redis-py for the guard: SET NX/PX/EX, GET and the release script."""
+
+    def __init__(self):
+        self.data = {}
+
+    def _live(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and time.time() >= expires:
+            self.data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and self._live(key) is not None:
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        ttl = px / 1000 if px else ex
+        self.data[key] = (value, time.time() + ttl if ttl else None)
+        return True
+
+    def get(self, key):
+        return self._live(key)
+
+    def eval(self, script, numkeys, key, token):
+        if self._live(key) == token.encode():
+            del self.data[key]
+            return 1
+        return 0
+
+
+def test_completed_keys_is_bounded_lru():
+    keys = CompletedKeys(max_entries=2)
+    keys.add('a')
+    keys.add('b')
+    assert 'a' in keys  # refreshes 'a'
+    keys.add('c')
+    assert 'b' not in keys
+    assert 'a' in keys and 'c' in keys
+    assert len(keys) == 2
+
+
+def test_redis_claim_lease_and_completion():
+    redis = FakeRedis()
+    guard = IdempotencyGuard(redis, lease=30)
+
+    first = guard.claim('stripe', 'evt_1')
+    assert first.status == CLAIMED
+    assert guard.claim('stripe', 'evt_1').status == IN_PROGRESS
+
+    first.complete()
+    assert guard.claim('stripe', 'evt_1').status == DUPLICATE
+
+    # Another worker sharing Redis sees the completed key too
+    other = IdempotencyGuard(redis)
+    assert other.claim('stripe', 'evt_1').status == DUPLICATE
+    assert 'stripe:evt_1' in other.completed
+
+
+def test_redis_release_only_drops_own_lease():
+    redis = FakeRedis()
+    guard = IdempotencyGuard(redis, lease=30)
+
+    stale = guard.claim('twilio', 'SM1')
+    # The lease expired and another worker claimed the key
+    redis.data.clear()
+    current = guard.claim('twilio', 'SM1')
+    assert current.status == CLAIMED
+
+    stale.release()
+    assert guard.claim('twilio', 'SM1').status == IN_PROGRESS
+    current.release()
+    assert guard.claim('twilio', 'SM1').status == CLAIMED
+
+
+def test_redis_error_falls_back_to_database(app):
+    redis = MagicMock()
+    redis.set.side_effect = ConnectionError('redis down')
+    guard = IdempotencyGuard(redis)
+
+    with app.app_context():
+        claim = guard.claim('plaid', 'fallback-1')
+        assert (claim.status, claim.backend) == (CLAIMED, 'db')
+        assert guard.claim('plaid', 'fallback-1').status == IN_PROGRESS
+        assert db.session.get(IdempotencyKey, 'plaid:fallback-1') is not None
+
+
+def test_database_claim_lease_takeover_and_completion(app):
+    guard = IdempotencyGuard(redis=None, lease=60)
+
+    with app.app_context():
+        claim = guard.claim('system', 'evt_db')
+        assert (claim.status, claim.backend) == (CLAIMED, 'db')
+        assert guard.claim('system', 'evt_db').status == IN_PROGRESS
+
+        # A crashed worker's lease is taken over once it expires
+        row = db.session.get(IdempotencyKey, 'system:evt_db')
+        row.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        takeover = guard.claim('system', 'evt_db')
+        assert takeover.status == CLAIMED
+
+        takeover.complete()
+        db.session.expire_all()
+        assert db.session.get(IdempotencyKey, 'system:evt_db').status == IdempotencyKey.STATUS_DONE
+
+        # A fresh process consults the table, not just its own LRU
+        assert IdempotencyGuard(redis=None).claim('system', 'evt_db').status == DUPLICATE
+
+
+def test_database_claim_leaves_the_request_session_alone(app):
+    guard = IdempotencyGuard(redis=None)
+
+    with app.app_context():
+        db.session.add(User(email='pending@example.com', password='x', role='tenant'))
+        claim = guard.claim('system', 'evt_own_conn')
+        claim.complete()
+        db.session.rollback()
+
+        assert User.query.filter_by(email='pending@example.com').first() is None
+        assert db.session.get(IdempotencyKey, 'system:evt_own_conn').status == IdempotencyKey.STATUS_DONE
+
+
+def test_database_error_fails_closed(app):
+    guard = IdempotencyGuard(redis=None)
+    down = OperationalError('INSERT', {}, Exception('database down'))
+
+    with app.app_context(), patch('src.utils.idempotency.insert', side_effect=down):
+        with pytest.raises(IdempotencyUnavailable) as exc_info:
+            with idempotent('plaid', 'evt_db_down'):
+                pytest.fail('the handler must not run without a claim')
+        assert exc_info.value.code == 503
+        assert 'plaid:evt_db_down' not in guard.completed
+
+
+def test_idempotent_releases_on_error(app):
+    with app.test_request_context():
+        with pytest.raises(RuntimeError):
+            with idempotent('system', 'evt_boom') as claim:
+                assert claim.acquired
+                raise RuntimeError('handler failed')
+
+        assert db.session.get(IdempotencyKey, 'system:evt_boom') is None
+
+        with idempotent('system', 'evt_boom') as claim:
+            assert claim.acquired
+        with idempotent('system', 'evt_boom') as claim:
+            assert claim.status == DUPLICATE
+
+
+def test_repeat_stripe_delivery_skips_the_database(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'STRIPE_WEBHOOK_SECRET', 'whsec_test_secret')
+    event = MagicMock()
+    event.id = 'evt_idem_repeat'
+    event.type = 'customer.created'
+    event.created = int(datetime.now().timestamp())
+    event.api_version = '2020-08-27'
+    event.to_dict = MagicMock(return_value={'id': event.id, 'type': event.type, 'data': {'object': {}}})
+
+    def post():
+        with patch('stripe.Webhook.construct_event', return_value=event):
+            return client.post('/webhooks/stripe/', data=json.dumps({'id': event.id}),
+                               headers={'Stripe-Signature': 'sig'}, content_type='application/json')
+
+    assert post().get_json()['message'] == 'Event queued'
+
+    with app.app_context():
+        assert 'stripe:evt_idem_repeat' in get_idempotency_guard().completed
+
+    with patch('src.webhooks.stripe.StripeEvent') as stripe_event_model:
+        response = post()
+    assert response.get_json() == {'message': 'Duplicate event'}
+    stripe_event_model.assert_not_called()
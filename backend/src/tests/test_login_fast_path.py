@@ -0,0 +1,97 @@
+import time
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from ..extensions import db
+from ..models.user import User
+from ..utils.account_security import InMemoryLockoutStore, failed_attempts
+from ..utils.password import needs_rehash, verify_and_upgrade, verify_password
+
+
+def _login(client, email, password):
+    return client.post('/api/auth/login', json={'email': email, 'password': password})
+
+
+def test_lockout_store_expires_and_stays_bounded(monkeypatch):
+    store = InMemoryLockoutStore(max_entries=2)
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+
+    assert store.record_failure('a@example.com', 60, '10.0.0.1') == 1
+    assert store.record_failure('a@example.com', 60, '10.0.0.2') == 2
+    assert store.ip_addresses('a@example.com') == ['10.0.0.1', '10.0.0.2']
+
+    now[0] += 61
+    assert store.record_failure('a@example.com', 60) == 1
+
+    store.lock('a@example.com', 30)
+    assert store.locked_until('a@example.com') == now[0] + 30
+    now[0] += 31
+    assert store.locked_until('a@example.com') is None
+
+    for email in ('b@example.com', 'c@example.com', 'd@example.com'):
+        store.record_failure(email, 60)
+    assert len(store) == 2
+
+
+def test_login_uses_one_user_query(app, client, test_users):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = _login(client, 'tenant@example.com', 'Password123!')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 200
+    # The lockout check, password check and reset share one lookup
+    email_lookups = [s for s in statements if 'FROM user' in s and 'user.email = ' in s]
+    assert len(email_lookups) == 1
+
+
+def test_lockout_is_answered_from_store(app, client, test_users):
+    app.config['ACCOUNT_LOCKOUT_MAX_ATTEMPTS'] = 2
+    try:
+        assert _login(client, 'landlord@example.com', 'Wrong1!').status_code == 401
+        assert _login(client, 'landlord@example.com', 'Wrong2!').status_code == 403
+        assert failed_attempts.locked_until('landlord@example.com')
+
+        # Locked even with the right password
+        response = _login(client, 'landlord@example.com', 'Password123!')
+        assert response.status_code == 403
+        assert response.get_json()['locked'] is True
+    finally:
+        app.config['ACCOUNT_LOCKOUT_MAX_ATTEMPTS'] = 1000
+        with app.app_context():
+            user = User.query.filter_by(email='landlord@example.com').first()
+            user.locked_until = None
+            user.failed_login_attempts = 0
+            db.session.commit()
+        failed_attempts.clear()
+
+
+def test_unknown_email_counts_as_failure(client, test_users):
+    assert _login(client, 'nobody@example.com', 'Password123!').status_code == 401
+    assert failed_attempts.reset('nobody@example.com') == 1
+
+
+def test_login_rehashes_outdated_hash(app, client, test_users):
+    with app.app_context():
+        user = User.query.filter_by(email='tenant@example.com').first()
+        user.password = generate_password_hash('Password123!', method='pbkdf2:sha256:1000')
+        db.session.commit()
+        assert needs_rehash(user.password)
+
+    assert _login(client, 'tenant@example.com', 'Password123!').status_code == 200
+
+    with app.app_context():
+        user = User.query.filter_by(email='tenant@example.com').first()
+        assert not needs_rehash(user.password)
+        assert user.check_password('Password123!')
+
+
+def test_verify_password_rejects_missing_hash(app):
+    with app.app_context():
+        assert verify_password('anything', None) is False
+        assert verify_and_upgrade(None, 'anything') is False
@@ -5,6 +5,8 @@ from datetime import datetime
 from ..models.message import Message
 from ..models.message_thread import MessageThread
 from ..extensions import db
+from ..services.messaging_service import MessagingService
+from ..utils.cursor_pagination import InvalidCursor
 
 
 @pytest.fixture
@@ -191,4 +193,72 @@ def test_unauthorized_thread_access(client, test_users, auth_headers, session):
     
     assert response.status_code == 403
     data = json.loads(response.data)
-    assert 'error' in data
\ No newline at end of file
+    assert 'error' in data
+
+def test_thread_inbox_single_query(client, test_users, auth_headers, test_thread, app):
+    """Threads come back with the other user, latest message and unread count"""
+    from sqlalchemy import event
+
+    statements = []
+
+    def count_selects(conn, cursor, statement, *args):
+        if 'message_threads' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_selects)
+    try:
+        response = client.get('/api/messages/threads', headers=auth_headers['landlord'])
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_selects)
+
+    assert response.status_code == 200
+    assert len(statements) == 1
+    thread = next(t for t in response.get_json()['threads'] if t['id'] == test_thread.id)
+    assert thread['other_user']['id'] == test_users['tenant'].id
+    assert thread['last_message']['content']
+    assert thread['unread_count'] >= 1
+
+    read = client.put(f'/api/messages/threads/{test_thread.id}/read', headers=auth_headers['landlord'])
+    assert read.status_code == 200
+    response = client.get('/api/messages/threads', headers=auth_headers['landlord'])
+    thread = next(t for t in response.get_json()['threads'] if t['id'] == test_thread.id)
+    assert thread['unread_count'] == 0
+
+
+def test_thread_inbox_keyset_pagination(client, test_users, auth_headers, session):
+    """Pages follow next_cursor without overlap"""
+    for i in range(3):
+        session.add(MessageThread(
+            user1_id=test_users['admin'].id,
+            user2_id=test_users['tenant'].id,
+            subject=f"Paged {i}",
+            created_by=test_users['admin'].id,
+            updated_at=datetime(2024, 1, 1)
+        ))
+    session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/messages/threads?per_page=2' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url, headers=auth_headers['admin']).get_json()
+        assert len(data['threads']) <= 2
+        seen.extend(t['id'] for t in data['threads'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert len(seen) >= 3
+
+    bad = client.get('/api/messages/threads?cursor=not-a-cursor', headers=auth_headers['admin'])
+    assert bad.status_code == 400
+
+
+def test_thread_inbox_raises_on_bad_cursor(app, test_users):
+    """Callers map the exception type, not the message, to a 400"""
+    with app.app_context():
+        with pytest.raises(InvalidCursor):
+            MessagingService.get_thread_inbox(test_users['admin'].id, cursor='not-a-cursor')
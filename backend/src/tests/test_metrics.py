@@ -0,0 +1,49 @@
+from flask import Flask, jsonify
+from prometheus_client import REGISTRY
+
+from ..routes.metrics_routes import init_metrics, _parse_buckets, APP_NAME
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, {'app_name': APP_NAME, **labels}) or 0
+
+
+def _metrics_app():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, METRICS_LATENCY_BUCKETS='0.1,0.5,1')
+    init_metrics(app)
+
+    @app.route('/items/<int:item_id>')
+    def item(item_id):
+        in_flight = _sample('requests_in_flight', method='GET', endpoint='/items/<int:item_id>')
+        return jsonify({'id': item_id, 'in_flight': in_flight})
+
+    return app
+
+
+def test_metrics_labeled_by_route_template():
+    app = _metrics_app()
+    client = app.test_client()
+    template = {'method': 'GET', 'endpoint': '/items/<int:item_id>'}
+    before = _sample('request_count_total', http_status='200', **template)
+
+    for item_id in (1, 2, 3):
+        assert client.get(f'/items/{item_id}').get_json()['in_flight'] == 1
+    client.get('/nowhere')
+
+    assert _sample('request_count_total', http_status='200', **template) == before + 3
+    assert _sample('request_count_total', method='GET', endpoint='/items/1', http_status='200') == 0
+    assert _sample('request_count_total', method='GET', endpoint='<unmatched>', http_status='404') >= 1
+    assert _sample('requests_in_flight', **template) == 0
+    assert _sample('response_size_bytes_count', **template) >= 3
+
+    body = client.get('/api/metrics').get_data(as_text=True)
+    assert 'request_latency_seconds_bucket' in body
+    assert '/items/<int:item_id>' in body
+    assert '/items/2' not in body
+
+
+def test_parse_buckets():
+    assert _parse_buckets('1, 0.5,2', (9,)) == (0.5, 1.0, 2.0)
+    assert _parse_buckets('', (0.1, 1)) == (0.1, 1)
+    assert _parse_buckets([0.25, 0.05], ()) == (0.05, 0.25)
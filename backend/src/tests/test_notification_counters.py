@@ -0,0 +1,120 @@
+from sqlalchemy import event, func, select
+
+from ..extensions import db
+from ..models.notification import Notification
+from ..models.user import User
+from ..services.notification_counter_service import NotificationCounterService, unread_criteria
+from ..services.notification_fanout_service import NotificationFanoutService
+
+
+def _counter(user_id):
+    return db.session.execute(
+        select(User.unread_notification_count).where(User.id == user_id)
+    ).scalar()
+
+
+def _actual_unread(user_id):
+    return db.session.execute(
+        select(func.count(Notification.id)).where(Notification.user_id == user_id, *unread_criteria())
+    ).scalar()
+
+
+def _notify(user_id, title='Counter test'):
+    notification = Notification(user_id=user_id, type='system', title=title, message='Body')
+    db.session.add(notification)
+    db.session.commit()
+    return notification
+
+
+def test_orm_writes_keep_counter_in_sync(app, test_users):
+    with app.app_context():
+        uid = test_users['tenant'].id
+        NotificationCounterService.recount([uid])
+        start = _counter(uid)
+
+        first = _notify(uid)
+        second = _notify(uid)
+        third = _notify(uid)
+        assert _counter(uid) == start + 3
+
+        first.read = True
+        db.session.commit()
+        assert _counter(uid) == start + 2
+
+        # Setting the other flag on an already-read notification changes nothing
+        first.is_read = True
+        db.session.commit()
+        assert _counter(uid) == start + 2
+
+        # Editing an unread notification leaves it unread
+        second.title = 'Edited'
+        db.session.commit()
+        assert _counter(uid) == start + 2
+
+        db.session.delete(third)
+        db.session.delete(first)
+        db.session.commit()
+        assert _counter(uid) == start + 1
+        assert _counter(uid) == _actual_unread(uid)
+
+
+def test_mark_all_read_is_one_update(app, client, test_users, auth_headers):
+    with app.app_context():
+        uid = test_users['landlord'].id
+        for i in range(5):
+            _notify(uid, f'Bulk {i}')
+        unread = _actual_unread(uid)
+        NotificationCounterService.recount([uid])
+
+    resp = client.get('/api/notifications/unread-count', headers=auth_headers['landlord'])
+    assert resp.get_json()['unread_count'] == unread
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        resp = client.put('/api/notifications/mark-all-read', headers=auth_headers['landlord'])
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert resp.status_code == 200
+    assert resp.get_json()['count'] == unread
+    notification_writes = [s for s in statements if s.lstrip().upper().startswith('UPDATE NOTIFICATIONS')]
+    assert len(notification_writes) == 1
+    assert not any(s.lstrip().upper().startswith('SELECT') and 'FROM notifications' in s for s in statements)
+
+    resp = client.get('/api/notifications/unread-count', headers=auth_headers['landlord'])
+    assert resp.get_json()['unread_count'] == 0
+    with app.app_context():
+        assert _actual_unread(uid) == 0
+
+
+def test_broadcast_increments_counters(app, test_users):
+    with app.test_request_context():
+        NotificationCounterService.recount()
+        before = dict(db.session.execute(select(User.id, User.unread_notification_count)).all())
+
+        broadcast, error = NotificationFanoutService.start_broadcast(
+            test_users['admin'].id, 'all', 'Counters', 'Fan-out bumps counters')
+        assert error is None
+
+        for uid, count in before.items():
+            assert _counter(uid) == count + 1
+            assert _counter(uid) == _actual_unread(uid)
+
+
+def test_recount_repairs_drift(app, test_users):
+    with app.app_context():
+        uid = test_users['tenant'].id
+        db.session.execute(
+            User.__table__.update().where(User.id == uid).values(unread_notification_count=999)
+        )
+        db.session.commit()
+
+        NotificationCounterService.recount([uid])
+        assert _counter(uid) == _actual_unread(uid)
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import update
+
+from ..extensions import db
+from ..models.notification import Notification
+from ..models.notification_broadcast import NotificationBroadcast
+from ..models.user import User
+from ..services import notification_fanout_service as fanout
+from ..services.notification_fanout_service import NotificationFanoutService
+
+
+def _count_broadcast_notifications(broadcast_id):
+    return Notification.query.filter(Notification.data.contains(f'"broadcast_id": {broadcast_id}')).count()
+
+
+def test_announcement_fans_out_to_role(app, client, auth_headers):
+    resp = client.post('/api/admin/announcements', headers=auth_headers['admin'],
+                       json={'title': 'Water outage', 'message': 'Tuesday 9-11am', 'target_role': 'tenant'})
+    assert resp.status_code == 202
+    broadcast = resp.get_json()['broadcast']
+
+    with app.app_context():
+        tenants = User.query.filter_by(role='tenant').count()
+        assert broadcast['status'] == NotificationBroadcast.STATUS_COMPLETED
+        assert broadcast['total'] == broadcast['sent'] == tenants
+        assert broadcast['progress'] == 1.0
+        assert _count_broadcast_notifications(broadcast['id']) == tenants
+
+    progress = client.get(f"/api/admin/announcements/{broadcast['id']}", headers=auth_headers['admin'])
+    assert progress.status_code == 200
+    assert progress.get_json()['sent'] == broadcast['sent']
+
+
+def test_one_emit_per_chunk(app, test_users, monkeypatch):
+    monkeypatch.setitem(app.config, 'NOTIFICATION_FANOUT_INLINE', False)
+
+    with app.test_request_context():
+        with patch('src.services.notification_fanout_service._executor') as executor:
+            broadcast, error = NotificationFanoutService.start_broadcast(
+                test_users['admin'].id, 'all', 'Maintenance', 'Portal down tonight')
+        assert error is None
+        executor.return_value.submit.assert_called_once()
+
+        assert broadcast.status == NotificationBroadcast.STATUS_QUEUED
+        with patch('src.services.notification_fanout_service.socketio') as socketio:
+            inserted = NotificationFanoutService.run_broadcast(broadcast.id, chunk_size=2)
+
+        assert inserted == broadcast.total
+        assert socketio.emit.call_count == -(-broadcast.total // 2)
+        rooms = [room for call in socketio.emit.call_args_list for room in call.kwargs['to']]
+        assert len(rooms) == broadcast.total
+        assert all(room.startswith('user_') for room in rooms)
+
+
+def test_run_resumes_after_last_chunk(app, test_users):
+    with app.app_context():
+        user_ids = sorted(uid for (uid,) in db.session.query(User.id))
+        broadcast = NotificationBroadcast(title='Resume', message='Resumed fan-out', target_role='all',
+                                          total=len(user_ids), sent=1, last_user_id=user_ids[0])
+        db.session.add(broadcast)
+        db.session.commit()
+
+        with patch('src.services.notification_fanout_service.socketio'):
+            assert NotificationFanoutService.run_broadcast(broadcast.id) == len(user_ids) - 1
+
+        db.session.refresh(broadcast)
+        assert broadcast.sent == len(user_ids)
+        assert broadcast.status == NotificationBroadcast.STATUS_COMPLETED
+        recipients = {n.user_id for n in Notification.query.filter(
+            Notification.data.contains(f'"broadcast_id": {broadcast.id}'))}
+        assert user_ids[0] not in recipients
+
+
+def test_resume_restarts_broadcasts_with_expired_lease(app, test_users):
+    with app.app_context():
+        user_ids = sorted(uid for (uid,) in db.session.query(User.id))
+        stale = NotificationBroadcast(title='Stale', message='Worker died', target_role='all',
+                                      status=NotificationBroadcast.STATUS_RUNNING, total=len(user_ids),
+                                      sent=1, last_user_id=user_ids[0],
+                                      locked_at=datetime.utcnow() - timedelta(hours=1))
+        live = NotificationBroadcast(title='Live', message='Still running', target_role='all',
+                                     status=NotificationBroadcast.STATUS_RUNNING, total=len(user_ids),
+                                     locked_at=datetime.utcnow())
+        db.session.add_all([stale, live])
+        db.session.commit()
+
+        with patch('src.services.notification_fanout_service.socketio'):
+            resumed = NotificationFanoutService.resume_broadcasts(inline=True)
+
+        assert stale.id in resumed and live.id not in resumed
+        db.session.refresh(stale)
+        db.session.refresh(live)
+        assert stale.status == NotificationBroadcast.STATUS_COMPLETED
+        assert stale.sent == len(user_ids)
+        assert stale.locked_at is None
+        assert live.sent == 0
+        assert NotificationFanoutService.run_broadcast(live.id) == 0
+
+        live.status = NotificationBroadcast.STATUS_FAILED
+        db.session.commit()
+
+
+def test_run_stops_when_its_lease_is_taken_over(app, test_users):
+    with app.app_context():
+        broadcast = NotificationBroadcast(title='Taken', message='Lease lost', target_role='all',
+                                          total=len(test_users))
+        db.session.add(broadcast)
+        db.session.commit()
+        real_chunks = fanout.recipient_id_chunks
+
+        def chunks(*args):
+            # Another worker claims the job before this one writes its chunk
+            with app.app_context():
+                db.session.execute(update(NotificationBroadcast)
+                                   .where(NotificationBroadcast.id == broadcast.id)
+                                   .values(locked_at=datetime.utcnow() + timedelta(seconds=1)))
+                db.session.commit()
+            yield from real_chunks(*args)
+
+        with patch.object(fanout, 'recipient_id_chunks', chunks), \
+                patch('src.services.notification_fanout_service.socketio'):
+            assert NotificationFanoutService.run_broadcast(broadcast.id, chunk_size=2) == 0
+
+        db.session.refresh(broadcast)
+        assert broadcast.sent == 0
+        assert broadcast.status == NotificationBroadcast.STATUS_RUNNING
+        assert _count_broadcast_notifications(broadcast.id) == 0
+
+        broadcast.status = NotificationBroadcast.STATUS_FAILED
+        db.session.commit()
+
+
+def test_first_request_resumes_in_background(app, monkeypatch):
+    from ..services.notification_fanout_service import _RESUMED_KEY, _resume_on_first_request
+    monkeypatch.setitem(app.config, 'NOTIFICATION_FANOUT_INLINE', False)
+    monkeypatch.setitem(app.config, 'NOTIFICATION_FANOUT_RESUME_ON_START', True)
+    monkeypatch.setitem(app.extensions, _RESUMED_KEY, False)
+
+    with app.test_request_context():
+        with patch('src.services.notification_fanout_service._executor') as executor:
+            _resume_on_first_request()
+            _resume_on_first_request()
+    executor.return_value.submit.assert_called_once()
+
+
+def test_each_chunk_evicts_recipient_cache_tags(app, test_users):
+    with app.app_context():
+        broadcast = NotificationBroadcast(title='Tags', message='Evict', target_role='tenant')
+        db.session.add(broadcast)
+        db.session.commit()
+
+        with patch('src.services.notification_fanout_service.socketio'), \
+                patch('src.services.notification_fanout_service.invalidate_tags') as invalidate:
+            NotificationFanoutService.run_broadcast(broadcast.id, chunk_size=1)
+
+        tenant_ids = {uid for (uid,) in db.session.query(User.id).filter_by(role='tenant')}
+        evicted = set().union(*(call.args[0] for call in invalidate.call_args_list))
+        assert invalidate.call_count == len(tenant_ids)
+        assert evicted == {f'user:{uid}' for uid in tenant_ids}
+
+
+def test_broadcast_rejects_unknown_role(client, auth_headers):
+    resp = client.post('/api/notifications/broadcast', headers=auth_headers['landlord'],
+                       json={'message': 'hello', 'role': 'plumber'})
+    assert resp.status_code == 400
@@ -0,0 +1,66 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from ..extensions import db
+from ..models.property import Property
+from ..models.tenant_property import TenantProperty
+from ..models.unit import Unit
+from ..services.property_service import PropertyService
+
+
+def _occupy_first_unit(test_users, test_property):
+    unit = db.session.get(Unit, test_property['unit_ids'][0])
+    unit.status = 'occupied'
+    db.session.add(TenantProperty(
+        tenant_id=test_users['tenant'].id,
+        property_id=test_property['property_id'],
+        unit_id=unit.id,
+        rent_amount=1200,
+        status='active',
+        start_date=date.today(),
+        end_date=date.today().replace(year=date.today().year + 1)
+    ))
+    db.session.commit()
+
+
+def test_landlord_listing_counts_in_one_query(app, test_users, test_property):
+    with app.app_context():
+        _occupy_first_unit(test_users, test_property)
+        landlord_id = test_users['landlord'].id
+        page_size = Property.query.filter_by(landlord_id=landlord_id).count()
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            properties, total, _, error = PropertyService.get_landlord_properties(
+                landlord_id, per_page=page_size)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert error is None
+        assert total == page_size
+        # Pagination count, the page, and one grouped count query
+        assert len(statements) == 3
+
+        listing = next(p for p in properties if p.id == test_property['property_id'])
+        assert (listing.unit_count, listing.occupied_units, listing.tenant_count) == (3, 1, 1)
+        assert listing.vacancy_rate == 66.67
+        assert listing.to_dict()['unit_count'] == 3
+
+        # Counts are not written to the mapped unit_count column
+        assert not db.session.dirty
+        assert listing.property.unit_count is None
+
+
+def test_admin_properties_use_listing_counts(client, auth_headers, test_users, test_property):
+    _occupy_first_unit(test_users, test_property)
+
+    response = client.get('/api/admin/properties?per_page=100', headers=auth_headers['admin'])
+
+    assert response.status_code == 200
+    row = next(p for p in response.get_json()['properties'] if p['id'] == test_property['property_id'])
+    assert row['unit_count'] == 3
+    assert row['tenant_count'] == 1
+    assert row['landlord_name'] == test_users['landlord'].name
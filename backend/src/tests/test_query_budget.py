@@ -0,0 +1,113 @@
+import logging
+from logging.handlers import QueueHandler
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+
+from ..utils import performance
+from ..utils.log_masker import stop_queue_logging
+from ..utils.performance import (
+    QueryBudgetExceeded, init_query_budget, query_budget, statement_shape
+)
+
+
+@pytest.fixture
+def budget_app():
+    """Minimal app running N lookups against its own engine"""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_STRICT=True)
+    engine = create_engine("sqlite://")
+    init_query_budget(app)
+
+    def lookups(n):
+        with engine.connect() as conn:
+            for i in range(n):
+                conn.execute(text("SELECT :id"), {"id": i})
+        return jsonify({"n": n})
+
+    @app.route("/loose/<int:n>")
+    def loose(n):
+        return lookups(n)
+
+    @app.route("/budgeted/<int:n>")
+    @query_budget(5, max_repeats=3)
+    def budgeted(n):
+        return lookups(n)
+
+    return app
+
+
+@pytest.fixture
+def budget_log(caplog):
+    """The slow_query logger does not propagate; attach caplog directly"""
+    budget_logger = logging.getLogger("slow_query")
+    budget_logger.addHandler(caplog.handler)
+    yield caplog
+    budget_logger.removeHandler(caplog.handler)
+
+
+def test_server_timing_reports_queries(budget_app):
+    resp = budget_app.test_client().get("/loose/4")
+    assert resp.status_code == 200
+    timing = resp.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert 'desc="4 queries"' in timing
+    assert "app;dur=" in timing
+
+
+def test_repeated_statement_logged(budget_app, budget_log):
+    budget_app.test_client().get("/loose/6")
+    assert "Possible N+1: GET /loose/<int:n> ran the same statement 6 times" in budget_log.text
+
+
+def test_strict_mode_enforces_declared_budget(budget_app):
+    client = budget_app.test_client()
+    assert client.get("/budgeted/3").status_code == 200
+    with pytest.raises(QueryBudgetExceeded, match="repeated a statement 4 times"):
+        client.get("/budgeted/4")
+
+
+def test_non_strict_mode_only_warns(budget_app, budget_log):
+    budget_app.config["QUERY_BUDGET_STRICT"] = False
+    assert budget_app.test_client().get("/budgeted/6").status_code == 200
+    assert "Query budget exceeded: GET /budgeted/<int:n> issued 6 queries (budget 5)" in budget_log.text
+
+
+def test_statement_shape_collapses_in_lists():
+    first = statement_shape("SELECT * FROM unit\n WHERE id IN (?, ?)")
+    second = statement_shape("SELECT * FROM unit WHERE id IN (?, ?, ?, ?)")
+    assert first == second == "SELECT * FROM unit WHERE id IN (?)"
+
+
+def test_app_routes_report_server_timing(client, auth_headers, test_property):
+    resp = client.get("/api/properties/", headers=auth_headers["landlord"])
+    assert resp.status_code == 200
+    assert "queries" in resp.headers["Server-Timing"]
+
+
+def test_testing_config_writes_no_slow_query_file(app, client):
+    """N+1 warnings from the suite go to caplog, not logs/slow_queries.log"""
+    assert app.config["SLOW_QUERY_LOG_DIR"] is None
+    client.get("/api/health")
+    handlers = logging.getLogger("slow_query").handlers
+    assert not any(isinstance(h, logging.FileHandler) for h in handlers)
+
+
+def test_slow_query_file_is_written_off_the_request_thread(tmp_path, monkeypatch):
+    slow_logger = logging.getLogger("slow_query")
+    monkeypatch.setattr(performance, "_LOG_CONFIGURED", False)
+    monkeypatch.setenv("SLOW_QUERY_STDERR", "0")
+    before = list(slow_logger.handlers)
+    performance.configure_slow_query_log(str(tmp_path))
+    added = [h for h in slow_logger.handlers if h not in before]
+    try:
+        assert len(added) == 1 and isinstance(added[0], QueueHandler)
+        slow_logger.warning("Possible N+1: queued")
+        stop_queue_logging(added[0])
+        assert "Possible N+1: queued" in (tmp_path / "slow_queries.log").read_text()
+    finally:
+        for handler in added:
+            slow_logger.removeHandler(handler)
+            for target in handler.listener.handlers:
+                target.close()
@@ -0,0 +1,87 @@
+from flask import Flask
+
+from ..utils import rate_limit as rl
+from ..utils.rate_limit import InMemoryLimiter, RedisLimiter, _gcra, rate_limit
+
+SECOND = 1_000_000
+
+
+def test_gcra_allows_a_burst_then_refills_smoothly():
+    now, tat = 100 * SECOND, 0
+    results = []
+    for _ in range(4):
+        allowed, remaining, reset_us, tat = _gcra(tat, now, limit=3, period=3)
+        results.append((allowed, remaining))
+
+    assert results == [(True, 2), (True, 1), (True, 0), (False, 0)]
+    # Denied: told when the next request fits, one interval (1s) from now
+    assert _gcra(tat, now, 3, 3)[2] == now + SECOND
+
+    # One interval later exactly one more request is allowed
+    allowed, remaining, reset_us, tat = _gcra(tat, now + SECOND, 3, 3)
+    assert (allowed, remaining) == (True, 0)
+    assert reset_us == now + 4 * SECOND
+
+
+def test_in_memory_limiter_is_bounded(monkeypatch):
+    monkeypatch.setattr(rl, '_now_us', lambda: 100 * SECOND)
+    limiter = InMemoryLimiter(max_keys=8, stripes=2)
+
+    for i in range(100):
+        limiter.check_rate_limit(f'203.0.113.{i}:login', 5, 60)
+    assert len(limiter) <= 8
+
+    key = '198.51.100.7:login'
+    decisions = [limiter.check_rate_limit(key, 2, 60) for _ in range(3)]
+    assert [allowed for allowed, _, _ in decisions] == [True, True, False]
+    assert decisions[-1][2] == 130  # next request fits after 30s
+
+
+class _FailingScriptRedis:
+    def register_script(self, source):
+        assert 'redis.call(\'TIME\')' in source
+
+        def run(keys, args):
+            raise ConnectionError('redis down')
+        return run
+
+
+class _StubScriptRedis:
+    def __init__(self):
+        self.calls = []
+
+    def register_script(self, source):
+        def run(keys, args):
+            self.calls.append((keys, args))
+            return [1, b'4', b'160500000']
+        return run
+
+
+def test_redis_limiter_runs_one_script_and_falls_back():
+    stub = _StubScriptRedis()
+    assert RedisLimiter(stub).check_rate_limit('ip:endpoint', 5, 60) == (True, 4, 161)
+    assert stub.calls == [(['rl:ip:endpoint'], [5, 60])]
+
+    fallback = InMemoryLimiter()
+    limiter = RedisLimiter(_FailingScriptRedis(), fallback=fallback)
+    allowed, remaining, _ = limiter.check_rate_limit('ip:endpoint', 5, 60)
+    assert (allowed, remaining) == (True, 4)
+    assert len(fallback) == 1
+
+
+def test_decorator_returns_429_with_retry_after():
+    app = Flask(__name__)
+    app.config['RATELIMIT_ENABLED'] = True
+
+    @app.get('/limited')
+    @rate_limit(limit=2, period=60)
+    def limited():
+        return {'ok': True}
+
+    client = app.test_client()
+    assert [client.get('/limited').status_code for _ in range(2)] == [200, 200]
+    response = client.get('/limited')
+
+    assert response.status_code == 429
+    assert response.headers['X-RateLimit-Remaining'] == '0'
+    assert 0 < int(response.headers['Retry-After']) <= 30
@@ -0,0 +1,87 @@
+from ..extensions import db
+from ..models.property import Property
+from ..models.search_document import SearchDocument
+from ..models.user import User
+from ..services.property_service import PropertyService
+from ..services.search_service import apply_search, rebuild_index, search_terms
+
+
+def _index_row(entity_type, entity_id):
+    return SearchDocument.query.filter_by(entity_type=entity_type, entity_id=entity_id).first()
+
+
+def _user(email, name):
+    user = User(email=email, name=name, role='tenant', is_verified=True)
+    user.set_password('Password123!')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def _search_users(term):
+    return [user.email for user in apply_search(User.query, 'user', User.id, term).all()]
+
+
+def test_index_follows_inserts_updates_and_deletes(app):
+    with app.app_context():
+        user = _user('search.follow@example.com', 'Marigold Quince')
+        assert 'Marigold Quince' in _index_row('user', user.id).content
+
+        user.name = 'Marigold Zephyr'
+        db.session.commit()
+        assert _search_users('zephyr') == ['search.follow@example.com']
+        assert _search_users('quince') == []
+
+        user_id = user.id
+        db.session.delete(user)
+        db.session.commit()
+        assert _index_row('user', user_id) is None
+        assert _search_users('marigold') == []
+
+
+def test_prefix_matching_and_ranking(app):
+    with app.app_context():
+        _user('jane.typeahead@example.com', 'Janet Typeahead')
+        _user('typeahead.jan@example.com', 'Typeahead Typeahead')
+
+        # Every word is a prefix, so partial input finds the user
+        assert _search_users('jan typea') == ['jane.typeahead@example.com', 'typeahead.jan@example.com']
+        # The row mentioning the term more often ranks first
+        assert _search_users('typeahead')[0] == 'typeahead.jan@example.com'
+        # Email domains are searchable on their own
+        assert 'jane.typeahead@example.com' in _search_users('example')
+
+
+def test_search_terms_ignore_query_syntax():
+    assert search_terms('"Jane" OR (acme*)') == ['jane', 'or', 'acme']
+    assert search_terms('  ') == []
+
+
+def test_admin_user_search(client, auth_headers, test_users):
+    response = client.get('/api/admin/users?search=landl', headers=auth_headers['admin'])
+
+    assert response.status_code == 200
+    emails = [user['email'] for user in response.json['users']]
+    assert 'landlord@example.com' in emails
+    assert 'tenant@example.com' not in emails
+    assert all('landl' in email for email in emails)
+
+
+def test_property_search_and_rebuild(app, test_users, test_property):
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        prop = db.session.get(Property, test_property['property_id'])
+        prop.address = '77 Wisteria Lane'
+        db.session.commit()
+
+        properties, total, _, error = PropertyService.get_landlord_properties(
+            landlord_id, filters={'search': 'wister'})
+        assert error is None
+        assert [p.id for p in properties] == [prop.id]
+
+        db.session.query(SearchDocument).delete()
+        db.session.commit()
+        assert rebuild_index() >= 3
+        properties, _, _, _ = PropertyService.get_landlord_properties(
+            landlord_id, filters={'search': 'wisteria lane'})
+        assert [p.id for p in properties] == [prop.id]
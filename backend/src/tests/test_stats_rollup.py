@@ -0,0 +1,141 @@
+import pytest
+from datetime import datetime, timedelta
+
+from ..services.stats_rollup_service import StatsRollupService
+from ..models.landlord_stats_rollup import LandlordStatsRollup
+from ..models.unit import Unit
+from ..models.property import Property
+from ..models.invoice import Invoice
+from ..models.user import User
+from ..extensions import db
+
+
+def _rollup_row(landlord_id):
+    db.session.expire_all()
+    return db.session.get(LandlordStatsRollup, landlord_id)
+
+
+def test_rollup_updated_on_flush(app, test_users, test_property):
+    """Writing a unit refreshes the landlord's rollup row in the same transaction"""
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        before = _rollup_row(landlord_id).unit_count
+
+        db.session.add(Unit(
+            property_id=test_property['property_id'],
+            unit_number='R1',
+            status='occupied'
+        ))
+        db.session.commit()
+
+        row = _rollup_row(landlord_id)
+        assert row.unit_count == before + 1
+        assert row.computed_on == datetime.utcnow().date()
+        assert row.unit_count == Unit.query.join(
+            Property, Property.id == Unit.property_id
+        ).filter(Property.landlord_id == landlord_id).count()
+
+
+def test_rollup_stale_row_recomputed_on_read(app, test_users, test_property):
+    """Rows computed on an earlier day are refreshed before being served"""
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        row = _rollup_row(landlord_id)
+        row.computed_on = datetime.utcnow().date() - timedelta(days=1)
+        row.unit_count = -1
+        db.session.commit()
+
+        stats = StatsRollupService.get_stats(landlord_id)
+
+        assert stats['computed_on'] == datetime.utcnow().date()
+        assert stats['unit_count'] >= 3
+
+
+def test_rebuild_stats_rollup_command(app, test_users, test_property):
+    """The CLI rebuild repopulates the table from the raw tables"""
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        expected = StatsRollupService.get_stats(landlord_id)
+        LandlordStatsRollup.query.delete()
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-stats-rollup'])
+
+    assert result.exit_code == 0
+    assert 'Rebuilt landlord stats rollup' in result.output
+    with app.app_context():
+        row = _rollup_row(landlord_id)
+        assert row is not None
+        assert row.unit_count == expected['unit_count']
+        assert row.property_count == expected['property_count']
+
+
+def _computed(landlord_id):
+    row = StatsRollupService.compute(db.session.connection(), [landlord_id])[0]
+    row.pop('computed_on')
+    return row
+
+
+def _matches_compute(landlord_id):
+    row = _rollup_row(landlord_id).to_dict()
+    return all(row[key] == pytest.approx(value) for key, value in _computed(landlord_id).items())
+
+
+def test_rollup_flush_applies_deltas(app, test_users, test_property, monkeypatch):
+    """Flushes to landlords with a current row add deltas instead of recomputing"""
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        StatsRollupService.get_stats(landlord_id)
+        db.session.commit()
+
+        refreshed = []
+        real_refresh = StatsRollupService.refresh
+        monkeypatch.setattr(StatsRollupService, 'refresh', staticmethod(
+            lambda connection, landlord_ids, today=None: refreshed.extend(landlord_ids)
+            or real_refresh(connection, landlord_ids, today)))
+
+        unit = db.session.get(Unit, test_property['unit_ids'][0])
+        unit.status = 'occupied'
+        db.session.add(Invoice(landlord_id=landlord_id, property_id=test_property['property_id'],
+                               tenant_id=test_users['tenant'].id, amount=750.0, category='rent',
+                               description='Monthly rent', due_date=datetime.utcnow(),
+                               status='pending'))
+        db.session.commit()
+
+        assert refreshed == []
+        assert _matches_compute(landlord_id)
+
+        db.session.delete(unit)
+        db.session.commit()
+        assert refreshed == []
+        assert _matches_compute(landlord_id)
+
+
+def test_rollup_bulk_update_recomputes(app, test_users, test_property):
+    """query.update() and query.delete() skip flush but still refresh the rollup"""
+    with app.app_context():
+        landlord_id = test_users['landlord'].id
+        Unit.query.filter_by(property_id=test_property['property_id']).update({'status': 'occupied'})
+        db.session.commit()
+        assert _matches_compute(landlord_id)
+
+        Unit.query.filter_by(property_id=test_property['property_id']).delete()
+        db.session.commit()
+        assert _matches_compute(landlord_id)
+
+
+def test_get_stats_does_not_commit_caller_session(app, test_users, test_property):
+    """Recomputing a stale row leaves the caller's pending work uncommitted"""
+    with app.app_context():
+        landlord = test_users['landlord']
+        row = _rollup_row(landlord.id)
+        row.computed_on = datetime.utcnow().date() - timedelta(days=1)
+        db.session.commit()
+
+        original_name = db.session.get(User, landlord.id).name
+        db.session.get(User, landlord.id).name = 'Uncommitted Name'
+        stats = StatsRollupService.get_stats(landlord.id)
+        db.session.rollback()
+
+        assert stats['computed_on'] == datetime.utcnow().date()
+        assert db.session.get(User, landlord.id).name == original_name
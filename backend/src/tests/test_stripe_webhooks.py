@@ -12,7 +12,6 @@ from src.models.payment import Payment
 from src.models.invoice import Invoice
 from src.models.user import User
 from src.models.property import Property
-from src.extensions import db
 
 
 @pytest.fixture
@@ -365,3 +364,114 @@ class TestStripeWebhooks:
             
             # The handler will raise a 500 because our error isn't the exact class it's catching
             assert response.status_code == 500
+
+
+@pytest.mark.usefixtures("app", "client")
+class TestStripeEventQueue:
+    """Queued processing of Stripe events (webhooks/stripe_worker.py)"""
+
+    webhook_url = "/webhooks/stripe/"
+
+    @pytest.fixture
+    def queued_mode(self, app, monkeypatch):
+        """Enqueue only: no inline processing, no in-process pool"""
+        monkeypatch.setitem(app.config, "STRIPE_EVENTS_INLINE", False)
+        monkeypatch.setitem(app.config, "STRIPE_EVENTS_WORKERS", 0)
+        monkeypatch.setitem(app.config, "STRIPE_WEBHOOK_SECRET", "whsec_test_secret")
+
+    def _post(self, client, event):
+        with patch("stripe.Webhook.construct_event", return_value=event):
+            return client.post(
+                self.webhook_url,
+                data=json.dumps({"id": event.id}),
+                headers={"Stripe-Signature": "test_signature"},
+                content_type="application/json"
+            )
+
+    def test_webhook_enqueues_and_worker_applies(self, client, app, db, queued_mode,
+                                                 mock_stripe_event, sample_payment):
+        from src.webhooks.stripe_worker import drain
+
+        response = self._post(client, mock_stripe_event)
+        assert response.status_code == 200
+        assert response.get_json() == {"message": "Event queued", "status": "pending"}
+
+        with app.app_context():
+            event = StripeEvent.query.filter_by(event_id=mock_stripe_event.id).one()
+            assert event.status == StripeEvent.STATUS_PENDING
+            assert json.loads(event.payload)["id"] == mock_stripe_event.id
+            assert db.session.get(Payment, sample_payment.id).status == "pending"
+
+            assert drain() == 1
+
+            db.session.expire_all()
+            event = StripeEvent.query.filter_by(event_id=mock_stripe_event.id).one()
+            assert event.status == StripeEvent.STATUS_PROCESSED
+            assert event.attempts == 1
+            assert event.processed_at is not None
+            assert db.session.get(Payment, sample_payment.id).status == "paid"
+
+            # Nothing left to claim
+            assert drain() == 0
+
+    def test_failed_event_backs_off_then_dies(self, client, app, db, queued_mode,
+                                             monkeypatch, mock_stripe_event):
+        from src.webhooks.stripe_worker import process_event
+
+        assert self._post(client, mock_stripe_event).status_code == 200
+        monkeypatch.setitem(app.config, "STRIPE_EVENTS_MAX_ATTEMPTS", 2)
+
+        with app.app_context():
+            event = StripeEvent.query.filter_by(event_id=mock_stripe_event.id).one()
+            with patch("src.webhooks.stripe_worker.apply_event", side_effect=RuntimeError("db down")):
+                assert process_event(event.id) == StripeEvent.STATUS_FAILED
+
+                db.session.refresh(event)
+                assert event.attempts == 1
+                assert event.next_attempt_at > datetime.utcnow()
+                assert "RuntimeError: db down" in event.last_error
+
+                # Not due yet
+                assert process_event(event.id) is None
+
+                event.next_attempt_at = datetime.utcnow()
+                db.session.commit()
+                assert process_event(event.id) == StripeEvent.STATUS_DEAD
+
+            db.session.refresh(event)
+            assert event.attempts == 2
+            assert event.next_attempt_at is None
+
+    def test_claim_is_exclusive(self, app, db):
+        from src.webhooks.stripe_worker import claim_event
+
+        with app.app_context():
+            event = StripeEvent(
+                event_id="evt_claim_once",
+                event_type="payment_intent.succeeded",
+                status=StripeEvent.STATUS_PENDING,
+                payload="{}"
+            )
+            db.session.add(event)
+            db.session.commit()
+
+            assert claim_event(event.id) is not None
+            assert claim_event(event.id) is None
+
+    def test_retry_delay_is_capped_exponential(self):
+        from src.webhooks.stripe_worker import retry_delay
+
+        assert 10 <= retry_delay(1, base=10, cap=100) <= 11
+        assert 40 <= retry_delay(3, base=10, cap=100) <= 44
+        assert 100 <= retry_delay(10, base=10, cap=100) <= 110
+
+    def test_first_request_starts_worker_pool(self, app, monkeypatch):
+        from src.webhooks.stripe_worker import _STARTED_KEY, _start_on_first_request
+
+        monkeypatch.setitem(app.config, "STRIPE_EVENTS_INLINE", False)
+        monkeypatch.setitem(app.extensions, _STARTED_KEY, False)
+        with app.test_request_context():
+            with patch("src.webhooks.stripe_worker.get_worker_pool") as get_pool:
+                _start_on_first_request()
+                _start_on_first_request()
+        get_pool.assert_called_once_with(app)
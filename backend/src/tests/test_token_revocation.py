@@ -0,0 +1,133 @@
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from ..extensions import db
+from ..models.token_blocklist import TokenBlocklist
+from ..utils.token_revocation import RevocationStore, purge_expired
+
+
+def test_logout_revokes_token(client, test_users):
+    from flask_jwt_extended import create_access_token
+
+    with client.application.app_context():
+        token = create_access_token(identity=str(test_users['tenant'].id))
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/api/auth/me', headers=headers).status_code == 200
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+
+    with client.application.app_context():
+        row = TokenBlocklist.query.order_by(TokenBlocklist.id.desc()).first()
+        assert row.expires_at is not None and row.expires_at > datetime.utcnow()
+
+
+def test_known_good_jti_is_cached(app):
+    store = RevocationStore(negative_ttl=60)
+    exp = time.time() + 600
+
+    with app.app_context():
+        with patch.object(store, '_lookup', wraps=store._lookup) as lookup:
+            assert store.is_revoked('jti-good', exp) is False
+            assert store.is_revoked('jti-good', exp) is False
+            assert lookup.call_count == 1
+
+            store.revoke('jti-good', 'access', exp)
+            assert store.is_revoked('jti-good', exp) is True
+            assert lookup.call_count == 1
+
+
+def test_negative_cache_never_outlives_token(app):
+    store = RevocationStore(negative_ttl=60)
+    with app.app_context():
+        with patch.object(store, '_lookup', return_value=False) as lookup:
+            store.is_revoked('jti-expiring', time.time() - 1)
+            store.is_revoked('jti-expiring', time.time() - 1)
+            assert lookup.call_count == 2
+
+
+def test_published_revocation_evicts_known_good(app):
+    store = RevocationStore(negative_ttl=60)
+    with app.app_context():
+        assert store.is_revoked('jti-remote', time.time() + 600) is False
+        # Another worker revoked it
+        db.session.add(TokenBlocklist(jti='jti-remote', type='access'))
+        db.session.commit()
+        store.handle_message(b'jti-remote')
+        assert store.is_revoked('jti-remote', time.time() + 600) is True
+
+
+def test_purge_expired_rows(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add_all([
+            TokenBlocklist(jti='jti-expired', expires_at=now - timedelta(minutes=1)),
+            TokenBlocklist(jti='jti-live', expires_at=now + timedelta(hours=1)),
+            TokenBlocklist(jti='jti-legacy', created_at=now - timedelta(days=60)),
+        ])
+        db.session.commit()
+
+        assert purge_expired(now) >= 2
+        remaining = {jti for (jti,) in db.session.query(TokenBlocklist.jti)}
+        assert 'jti-live' in remaining
+        assert not {'jti-expired', 'jti-legacy'} & remaining
+
+
+class _RecordingRedis:
+    def __init__(self):
+        self.keys = {}
+
+    def pipeline(self):
+        return self
+
+    def set(self, key, value, ex=None, nx=False):
+        if not (nx and key in self.keys):
+            self.keys[key] = ex
+
+    def execute(self):
+        return []
+
+
+def test_sync_to_redis_keeps_legacy_rows(app):
+    now = datetime.utcnow()
+    redis = _RecordingRedis()
+    store = RevocationStore(redis=redis, prefix='revoked:')
+    with app.app_context():
+        db.session.add_all([
+            TokenBlocklist(jti='jti-sync-live', expires_at=now + timedelta(hours=1)),
+            TokenBlocklist(jti='jti-sync-legacy', created_at=now - timedelta(days=2)),
+            TokenBlocklist(jti='jti-sync-ancient', created_at=now - timedelta(days=90)),
+        ])
+        db.session.commit()
+
+        store.sync_to_redis()
+
+    assert 0 < redis.keys['revoked:jti-sync-live'] <= 3600
+    # Revoked before expires_at existed: kept as long as a refresh token could live
+    assert redis.keys['revoked:jti-sync-legacy'] >= timedelta(days=28).total_seconds()
+    assert 'revoked:jti-sync-ancient' not in redis.keys
+
+
+def test_legacy_rows_follow_refresh_token_lifetime(app, monkeypatch):
+    """Redis and the purge agree on when a row without expires_at stops counting"""
+    monkeypatch.setitem(app.config, 'JWT_REFRESH_TOKEN_EXPIRES', int(timedelta(days=7).total_seconds()))
+    now = datetime.utcnow()
+    redis = _RecordingRedis()
+    store = RevocationStore(redis=redis, prefix='revoked:')
+    with app.app_context():
+        db.session.add_all([
+            # Past 7 days + a day of slack under either rule
+            TokenBlocklist(jti='jti-week-old', created_at=now - timedelta(days=8, hours=1)),
+            # Within the slack: still revoked in Redis, so not purged either
+            TokenBlocklist(jti='jti-in-slack', created_at=now - timedelta(days=7, hours=12)),
+        ])
+        db.session.commit()
+
+        store.sync_to_redis()
+        purge_expired(now)
+        remaining = {jti for (jti,) in db.session.query(TokenBlocklist.jti)}
+
+    assert 'revoked:jti-week-old' not in redis.keys and 'jti-week-old' not in remaining
+    assert 0 < redis.keys['revoked:jti-in-slack'] <= timedelta(hours=12).total_seconds()
+    assert 'jti-in-slack' in remaining
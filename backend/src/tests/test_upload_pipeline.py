@@ -0,0 +1,74 @@
+import hashlib
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from ..utils.file_validator import FileValidationError, sniff_mime_type
+from ..utils.upload_pipeline import INCOMING_DIR, ingest_upload, save_upload, storage_relpath
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def _upload(content, filename="photo.png"):
+    return FileStorage(stream=io.BytesIO(content), filename=filename)
+
+
+def _incoming(root):
+    path = os.path.join(root, INCOMING_DIR)
+    return os.listdir(path) if os.path.isdir(path) else []
+
+
+def test_single_pass_hash_and_content_addressed_layout(tmp_path):
+    content = PNG + os.urandom(200 * 1024)
+    upload = save_upload(_upload(content), str(tmp_path), chunk_size=4096)
+
+    digest = hashlib.sha256(content).hexdigest()
+    assert upload.sha256 == digest
+    assert upload.size == len(content)
+    assert upload.mime_type == "image/png"
+    assert upload.relative_path == storage_relpath(digest, "png") == f"{digest[:2]}/{digest[2:4]}/{digest}.png"
+    with open(upload.path, "rb") as stored:
+        assert stored.read() == content
+    assert _incoming(str(tmp_path)) == []
+
+
+def test_identical_uploads_are_deduplicated(tmp_path):
+    first = save_upload(_upload(PNG, "a.png"), str(tmp_path))
+    second = save_upload(_upload(PNG, "b.png"), str(tmp_path))
+
+    assert not first.deduplicated
+    assert second.deduplicated
+    assert second.path == first.path
+    assert _incoming(str(tmp_path)) == []
+
+
+def test_oversize_upload_is_rejected_without_leftovers(tmp_path):
+    with pytest.raises(FileValidationError, match="File too large"):
+        ingest_upload(_upload(PNG + b"\x00" * 10_000), str(tmp_path), max_size=4096, chunk_size=1024)
+
+    assert _incoming(str(tmp_path)) == []
+
+
+def test_sniffed_type_must_be_allowed(tmp_path):
+    # A PDF renamed to .png is caught by its leading bytes
+    with pytest.raises(FileValidationError, match="MIME"):
+        ingest_upload(_upload(b"%PDF-1.7 ..."), str(tmp_path), allowed_mime_types={"image/png"})
+    with pytest.raises(FileValidationError, match="extension"):
+        ingest_upload(_upload(PNG, "run.exe"), str(tmp_path))
+
+    assert _incoming(str(tmp_path)) == []
+
+
+def test_uncommitted_upload_is_discarded(tmp_path):
+    with ingest_upload(_upload(PNG), str(tmp_path)) as upload:
+        assert os.path.exists(upload.temp_path)
+    assert upload.path is None
+    assert _incoming(str(tmp_path)) == []
+
+
+def test_sniff_prefers_specific_container_type():
+    docx = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    assert sniff_mime_type(b"PK\x03\x04rest", "lease.docx") in (docx, "application/zip")
+    assert sniff_mime_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ", "leak.webp") == "image/webp"
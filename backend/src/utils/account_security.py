@@ -1,98 +1,239 @@
 """
 Account security utilities to prevent brute force attacks.
 Implements account lockout after multiple failed login attempts.
+
+Features:
+- Attempt counters and lockouts live in a TTL store shared by every worker
+  (Redis when REDIS_URL is reachable); without Redis the per-process
+  `failed_attempts` store is a bounded LRU (LOCKOUT_LOCAL_MAX_ENTRIES)
+- A counter expires ACCOUNT_LOCKOUT_WINDOW_MINUTES after the last failure,
+  a lockout ACCOUNT_LOCKOUT_DURATION_MINUTES after it started
+- Lockouts are also written to the user row, so they outlive the store
+- Callers that already loaded the user pass it in and no query is made
 """
 from __future__ import annotations
 
-import logging
-from datetime import datetime, timedelta, timezone
-from typing import Dict, Set, Any, Optional
-from flask import current_app, request
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from flask import current_app
 from ..extensions import db
 from ..models.user import User
 from .tracing import log_with_context
 
-# Cache to track failed login attempts
-# Structure: {email: {'attempts': int, 'last_attempt': datetime, 'ip_addresses': set}}
-failed_attempts: Dict[str, Dict[str, Any]] = {}
+try:
+    # Optional: redis-py
+    from redis import Redis  # type: ignore
+    _HAS_REDIS = True
+except Exception:
+    _HAS_REDIS = False
+
+DEFAULT_KEY_PREFIX = "assetanchor-lockout:"
+DEFAULT_LOCAL_MAX_ENTRIES = 10000
+
+# Marks "not passed" where None means "no such user"
+_LOAD_USER = object()
+
+
+# ---------------------------------------------------------------------------
+# Stores
+# ---------------------------------------------------------------------------
+class InMemoryLockoutStore:
+    """Per-process attempt counters and lockouts with TTLs, bounded as an LRU."""
+
+    def __init__(self, max_entries: int = DEFAULT_LOCAL_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # email -> {'attempts', 'expires', 'locked_until', 'ip_addresses'}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _entry(self, email: str, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(email)
+        if entry is None:
+            return None
+        if entry['expires'] <= now and (entry['locked_until'] or 0) <= now:
+            del self._entries[email]
+            return None
+        self._entries.move_to_end(email)
+        return entry
+
+    def record_failure(self, email: str, window_seconds: int, ip_address: Optional[str] = None) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._entry(email, now)
+            if entry is None or entry['expires'] <= now:
+                entry = {'attempts': 0, 'expires': 0, 'locked_until': None, 'ip_addresses': set()}
+                self._entries[email] = entry
+            entry['attempts'] += 1
+            entry['expires'] = now + window_seconds
+            if ip_address:
+                entry['ip_addresses'].add(ip_address)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry['attempts']
+
+    def ip_addresses(self, email: str) -> list:
+        with self._lock:
+            entry = self._entry(email, time.time())
+            return sorted(entry['ip_addresses']) if entry else []
+
+    def lock(self, email: str, seconds: int) -> float:
+        """Lock for `seconds`; counting starts over once the lockout ends."""
+        until = time.time() + seconds
+        with self._lock:
+            entry = self._entries.setdefault(
+                email, {'attempts': 0, 'expires': 0, 'locked_until': None, 'ip_addresses': set()})
+            entry['attempts'] = 0
+            entry['locked_until'] = until
+        return until
+
+    def locked_until(self, email: str) -> Optional[float]:
+        now = time.time()
+        with self._lock:
+            entry = self._entry(email, now)
+            if entry and entry['locked_until'] and entry['locked_until'] > now:
+                return entry['locked_until']
+        return None
+
+    def reset(self, email: str) -> int:
+        """Forget the email's counter and lockout; returns the attempts it had."""
+        with self._lock:
+            entry = self._entries.pop(email, None)
+        return entry['attempts'] if entry else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisLockoutStore:
+    """The same operations on Redis keys whose TTLs do the expiry."""
+
+    def __init__(self, redis, prefix: str = DEFAULT_KEY_PREFIX) -> None:
+        self.redis = redis
+        self.prefix = prefix
+
+    def _keys(self, email: str):
+        base = self.prefix + email
+        return base + ':attempts', base + ':ips', base + ':locked'
+
+    def record_failure(self, email: str, window_seconds: int, ip_address: Optional[str] = None) -> int:
+        attempts_key, ips_key, _ = self._keys(email)
+        pipe = self.redis.pipeline()
+        pipe.incr(attempts_key)
+        pipe.expire(attempts_key, window_seconds)
+        if ip_address:
+            pipe.sadd(ips_key, ip_address)
+            pipe.expire(ips_key, window_seconds)
+        return int(pipe.execute()[0])
+
+    def ip_addresses(self, email: str) -> list:
+        return sorted(ip.decode() if isinstance(ip, bytes) else ip
+                      for ip in self.redis.smembers(self._keys(email)[1]))
+
+    def lock(self, email: str, seconds: int) -> float:
+        attempts_key, _, locked_key = self._keys(email)
+        until = time.time() + seconds
+        pipe = self.redis.pipeline()
+        pipe.set(locked_key, repr(until), ex=seconds)
+        pipe.delete(attempts_key)
+        pipe.execute()
+        return until
 
+    def locked_until(self, email: str) -> Optional[float]:
+        value = self.redis.get(self._keys(email)[2])
+        return float(value) if value else None
 
-def track_failed_login(email: str, ip_address: Optional[str] = None) -> Dict[str, Any]:
+    def reset(self, email: str) -> int:
+        attempts_key, ips_key, locked_key = self._keys(email)
+        pipe = self.redis.pipeline()
+        pipe.get(attempts_key)
+        pipe.delete(attempts_key, ips_key, locked_key)
+        attempts = pipe.execute()[0]
+        return int(attempts) if attempts else 0
+
+    def clear(self) -> None:
+        for key in self.redis.scan_iter(match=self.prefix + '*'):
+            self.redis.delete(key)
+
+
+# Per-process fallback store (tests clear it between runs)
+failed_attempts = InMemoryLockoutStore()
+
+
+def get_lockout_store():
+    """Resolve and memoize the store in app.extensions['assetanchor_lockouts']."""
+    app = current_app._get_current_object()
+    ext_key = "assetanchor_lockouts"
+
+    store = app.extensions.get(ext_key)
+    if store is not None:
+        return store
+
+    store = failed_attempts
+    store.max_entries = int(app.config.get("LOCKOUT_LOCAL_MAX_ENTRIES", DEFAULT_LOCAL_MAX_ENTRIES))
+    redis_url = app.config.get("REDIS_URL")
+    if _HAS_REDIS and redis_url:
+        try:
+            redis_client = Redis.from_url(redis_url)  # type: ignore
+            redis_client.ping()
+            store = RedisLockoutStore(redis_client, app.config.get("LOCKOUT_KEY_PREFIX", DEFAULT_KEY_PREFIX))
+        except Exception as e:
+            app.logger.warning(f"Redis unavailable for login lockouts, using per-process counters: {e}")
+
+    app.extensions[ext_key] = store
+    return store
+
+
+def _find_user(email: str, user: Any) -> Optional[User]:
+    if user is _LOAD_USER:
+        return User.query.filter_by(email=email).first()
+    return user
+
+
+def track_failed_login(email: str, ip_address: Optional[str] = None, user: Any = _LOAD_USER) -> Dict[str, Any]:
     """
     Track failed login attempt for an email address.
-    
+
     Args:
         email: The email address that failed login
         ip_address: Optional IP address to track
-        
+        user: The email's User (or None) if already loaded
+
     Returns:
         dict: Status information about the account
     """
     if not email:
         return {'locked': False, 'attempts': 0}
-        
+
     # Get settings from app config
     max_attempts = current_app.config.get('ACCOUNT_LOCKOUT_MAX_ATTEMPTS', 5)
     lockout_minutes = current_app.config.get('ACCOUNT_LOCKOUT_DURATION_MINUTES', 30)
     attempt_window = current_app.config.get('ACCOUNT_LOCKOUT_WINDOW_MINUTES', 15)
-    
-    now = datetime.now(timezone.utc)
-    attempt_window_delta = timedelta(minutes=attempt_window)
-    
-    # Initialize if not exists
-    if email not in failed_attempts:
-        failed_attempts[email] = {'attempts': 1, 'last_attempt': now, 'ip_addresses': set()}
-        if ip_address:
-            failed_attempts[email]['ip_addresses'].add(ip_address)
-        
-        log_with_context(
-            f"First failed login attempt for {email}",
-            level='info',
-            email=email,
-            ip_address=ip_address,
-            attempts=1
-        )
-        return {'locked': False, 'attempts': 1}
-    
-    # Reset attempts if outside the window
-    if now - failed_attempts[email]['last_attempt'] > attempt_window_delta:
-        prev_attempts = failed_attempts[email]['attempts']
-        failed_attempts[email] = {'attempts': 1, 'last_attempt': now, 'ip_addresses': set()}
-        if ip_address:
-            failed_attempts[email]['ip_addresses'].add(ip_address)
-        
-        log_with_context(
-            f"Failed login attempt for {email} - window reset",
-            level='info',
-            email=email,
-            ip_address=ip_address,
-            attempts=1,
-            prev_attempts=prev_attempts
-        )
-        return {'locked': False, 'attempts': 1}
-    
-    # Increment attempts
-    failed_attempts[email]['attempts'] += 1
-    failed_attempts[email]['last_attempt'] = now
-    if ip_address:
-        failed_attempts[email]['ip_addresses'].add(ip_address)
-    
-    # Get current IP addresses
-    ip_addresses = list(failed_attempts[email]['ip_addresses']) if 'ip_addresses' in failed_attempts[email] else []
-    current_attempts = failed_attempts[email]['attempts']
-    
+
+    store = get_lockout_store()
+    current_attempts = store.record_failure(email, int(attempt_window * 60), ip_address)
+
     # Check if account should be locked
     if current_attempts >= max_attempts:
-        # Update the user record to locked state
+        now = datetime.now(timezone.utc)
+        lockout_time = datetime.fromtimestamp(store.lock(email, int(lockout_minutes * 60)), timezone.utc)
+        ip_addresses = store.ip_addresses(email)
+
+        # Persist the lock on the user record
         try:
-            user = User.query.filter_by(email=email).first()
+            user = _find_user(email, user)
             if user:
-                lockout_until = now + timedelta(minutes=lockout_minutes)
-                user.locked_until = lockout_until
+                user.locked_until = lockout_time
                 user.failed_login_attempts = current_attempts
                 user.last_failed_login = now
                 db.session.commit()
-                
+
                 log_with_context(
                     f"Account locked: {email} after {current_attempts} failed attempts",
                     level='warning',
@@ -100,7 +241,7 @@ def track_failed_login(email: str, ip_address: Optional[str] = None) -> Dict[str
                     ip_addresses=ip_addresses,
                     attempts=current_attempts,
                     lockout_minutes=lockout_minutes,
-                    unlock_time=lockout_until.isoformat()
+                    unlock_time=lockout_time.isoformat()
                 )
         except Exception as e:
             log_with_context(
@@ -109,15 +250,13 @@ def track_failed_login(email: str, ip_address: Optional[str] = None) -> Dict[str
                 email=email,
                 error=str(e)
             )
-                
-        # Return locked status
-        lockout_time = now + timedelta(minutes=lockout_minutes)
+
         return {
-            'locked': True, 
+            'locked': True,
             'attempts': current_attempts,
             'unlock_time': lockout_time
         }
-    
+
     # Log the failed attempt
     log_with_context(
         f"Failed login attempt {current_attempts}/{max_attempts} for {email}",
@@ -127,49 +266,65 @@ def track_failed_login(email: str, ip_address: Optional[str] = None) -> Dict[str
         attempts=current_attempts,
         max_attempts=max_attempts
     )
-    
+
     return {
-        'locked': False, 
+        'locked': False,
         'attempts': current_attempts
     }
 
 
-def check_account_lockout(email: str) -> Dict[str, Any]:
+def check_account_lockout(email: str, user: Any = _LOAD_USER) -> Dict[str, Any]:
     """
     Check if an account is currently locked out.
-    
+
     Args:
         email: The email to check
-        
+        user: The email's User (or None) if already loaded
+
     Returns:
         dict: Status with locked flag and unlock time if applicable
     """
     if not email:
         return {'locked': False}
-        
-    # Check persistent storage first
+
+    # The shared store answers without touching the database
+    locked_until = get_lockout_store().locked_until(email)
+    if locked_until:
+        unlock_time = datetime.fromtimestamp(locked_until, timezone.utc)
+        log_with_context(
+            f"Account locked in lockout store: {email}",
+            level='info',
+            email=email,
+            unlock_time=unlock_time.isoformat(),
+            remaining_seconds=int(locked_until - time.time())
+        )
+        return {
+            'locked': True,
+            'unlock_time': unlock_time
+        }
+
+    # Then the persisted lock, which survives store restarts
     try:
-        user = User.query.filter_by(email=email).first()
+        user = _find_user(email, user)
         if user and user.locked_until:
             # Make sure we're comparing timezone-aware datetimes
             now_utc = datetime.now(timezone.utc)
-            locked_until = user.locked_until
-            if locked_until.tzinfo is None:
-                locked_until = locked_until.replace(tzinfo=timezone.utc)
-                
-            if locked_until > now_utc:
-                remaining_seconds = (locked_until - now_utc).total_seconds()
-            log_with_context(
-                f"Account still locked: {email}",
-                level='info',
-                email=email,
-                unlock_time=user.locked_until.isoformat(),
-                remaining_seconds=int(remaining_seconds)
-            )
-            return {
-                'locked': True,
-                'unlock_time': user.locked_until
-            }
+            unlock_time = user.locked_until
+            if unlock_time.tzinfo is None:
+                unlock_time = unlock_time.replace(tzinfo=timezone.utc)
+
+            if unlock_time > now_utc:
+                log_with_context(
+                    f"Account still locked: {email}",
+                    level='info',
+                    email=email,
+                    unlock_time=unlock_time.isoformat(),
+                    remaining_seconds=int((unlock_time - now_utc).total_seconds())
+                )
+                return {
+                    'locked': True,
+                    'unlock_time': unlock_time
+                }
     except Exception as e:
         log_with_context(
             f"Failed to check user lock status: {str(e)}",
@@ -177,71 +332,33 @@ def check_account_lockout(email: str) -> Dict[str, Any]:
             email=email,
             error=str(e)
         )
-    
-    # Then check in-memory cache
-    max_attempts = current_app.config.get('ACCOUNT_LOCKOUT_MAX_ATTEMPTS', 5)
-    
-    if (email in failed_attempts and 
-        failed_attempts[email]['attempts'] >= max_attempts):
-        # Get lockout duration
-        lockout_minutes = current_app.config.get('ACCOUNT_LOCKOUT_DURATION_MINUTES', 30)
-        # Check if still in lockout period
-        now = datetime.now(timezone.utc)
-        lockout_time = failed_attempts[email]['last_attempt'] + timedelta(minutes=lockout_minutes)
-        
-        # Ensure lockout_time is timezone-aware
-        if lockout_time.tzinfo is None:
-            lockout_time = lockout_time.replace(tzinfo=timezone.utc)
-            
-        if now < lockout_time:
-            remaining_seconds = (lockout_time - now).total_seconds()
-            log_with_context(
-                f"Account locked in memory cache: {email}",
-                level='info',
-                email=email,
-                unlock_time=lockout_time.isoformat(),
-                remaining_seconds=int(remaining_seconds),
-                attempts=failed_attempts[email]['attempts']
-            )
-            return {
-                'locked': True,
-                'unlock_time': lockout_time
-            }
-        else:
-            # Reset if lockout period has passed
-            failed_attempts[email] = {'attempts': 0, 'last_attempt': datetime.now(timezone.utc)}
-            log_with_context(
-                f"Lockout period expired for {email}, resetting attempts",
-                level='info',
-                email=email
-            )
-            
+
     return {'locked': False}
 
 
-def reset_login_attempts(email: str) -> None:
+def reset_login_attempts(email: str, user: Any = _LOAD_USER) -> None:
     """
     Reset failed login attempts for an email after successful login.
-    
+
     Args:
         email: The email address to reset
+        user: The email's User (or None) if already loaded
     """
     if not email:
         return
-        
-    if email in failed_attempts:
-        prev_attempts = failed_attempts[email]['attempts']
-        del failed_attempts[email]
+
+    prev_attempts = get_lockout_store().reset(email)
+    if prev_attempts:
         log_with_context(
             f"Reset login attempts for {email} after successful login",
             level='info',
             email=email,
             prev_attempts=prev_attempts
         )
-        
+
     # Also clear any persistent lockout
     try:
-        user = User.query.filter_by(email=email).first()
+        user = _find_user(email, user)
         if user:
             if user.locked_until or user.failed_login_attempts:
                 user.locked_until = None
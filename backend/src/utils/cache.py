@@ -1,65 +1,411 @@
 """
-Simple caching utilities for API responses.
+Caching utilities for API responses.
+
+Features
+- Pluggable backends behind a small get/set/delete/clear interface
+- In-memory LRU + TTL backend, bounded by entry count and total bytes
+- Redis backend (REDIS_URL) so all gunicorn/gevent workers share one cache
+- Responses stored as serialized bytes (status, headers, body), never as
+  live Response objects
+- Keys scoped per JWT identity so authenticated responses are safe to cache
+- Entries tagged (e.g. "landlord:42", "property:7") and evicted by tag;
+  evictions fan out to every worker's in-memory cache over Redis pub/sub
+- Honors Flask config: CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES,
+  CACHE_KEY_PREFIX, CACHE_TAG_TTL, CACHE_INVALIDATION_CHANNEL, CACHE_IN_DEBUG
 """
+
+from __future__ import annotations
+
+import sys
+import json
 import time
-import functools
+import uuid
 import hashlib
-import json
-from flask import request, current_app
-
-class SimpleCache:
-    """Simple in-memory cache implementation."""
-    
-    def __init__(self):
-        self.cache = {}
-        self.expiry_times = {}
-    
-    def get(self, key):
-        """Get a value from the cache."""
-        if key in self.cache and time.time() < self.expiry_times.get(key, 0):
-            return self.cache[key]
-        return None
-    
-    def set(self, key, value, ttl=300):
-        """Set a value in the cache with an expiration time."""
-        self.cache[key] = value
-        self.expiry_times[key] = time.time() + ttl
-    
-    def delete(self, key):
-        """Remove a key from the cache."""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.expiry_times:
-            del self.expiry_times[key]
-    
-    def clear(self):
-        """Clear all items from the cache."""
-        self.cache.clear()
-        self.expiry_times.clear()
-    
-    def cleanup(self):
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from flask import Response, request, current_app
+
+try:
+    # Optional: redis-py
+    from redis import Redis  # type: ignore
+    _HAS_REDIS = True
+except Exception:
+    _HAS_REDIS = False
+
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_KEY_PREFIX = "assetanchor-cache:"
+DEFAULT_TAG_TTL = 24 * 60 * 60
+DEFAULT_INVALIDATION_CHANNEL = "assetanchor-cache-invalidate"
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+class BaseCache:
+    """Abstract cache backend storing bytes values with a TTL."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: int = 300, tags: Iterable[str] = ()) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Delete every entry carrying any of `tags`; returns the number removed."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCache(BaseCache):
+    """
+    Thread-safe per-process LRU cache with per-entry TTL.
+
+    Evicts least recently used entries once either `max_entries` or
+    `max_bytes` would be exceeded. Expired entries are dropped on access
+    and by `cleanup()`. A tag -> keys index supports `invalidate_tags`.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (expires_at, size, value, tags), oldest first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: dict = {}
+        self._bytes = 0
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        return sys.getsizeof(value)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        for tag in entry[3]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry[0]:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Iterable[str] = ()) -> None:
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return  # Never let one entry flush the whole cache
+
+        tags = tuple(tags)
+        with self._lock:
+            self._pop(key)
+            while self._entries and (
+                len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+            self._entries[key] = (time.time() + ttl, size, value, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._pop(key)
+                    removed += 1
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def cleanup(self) -> None:
         """Remove expired items from the cache."""
         now = time.time()
-        expired_keys = [k for k, exp in self.expiry_times.items() if now > exp]
-        for key in expired_keys:
-            self.delete(key)
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if now >= entry[0]]:
+                self._pop(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+# Backwards-compatible name for the original per-process cache
+SimpleCache = InMemoryCache
+
+
+class RedisCache(BaseCache):
+    """
+    Shared cache using Redis SET with EX.
+
+    Key format: {prefix}{key}
+    Tag index:  {prefix}tag:{tag} -> SET of keys, kept at least `tag_ttl`
+    seconds so it outlives the entries it points to.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = DEFAULT_KEY_PREFIX, tag_ttl: int = DEFAULT_TAG_TTL) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self.tag_ttl = tag_ttl
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.redis.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: int = 300, tags: Iterable[str] = ()) -> None:
+        ttl = max(1, int(ttl))
+        pipe = self.redis.pipeline()
+        pipe.set(self.prefix + key, value, ex=ttl)
+        for tag in tags:
+            pipe.sadd(self._tag_key(tag), self.prefix + key)
+            pipe.expire(self._tag_key(tag), max(ttl, self.tag_ttl))
+        pipe.execute()
+
+    def delete(self, key: str) -> None:
+        self.redis.delete(self.prefix + key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        if not tag_keys:
+            return 0
+        keys = set(self.redis.sunion(tag_keys))
+        if keys:
+            self.redis.delete(*keys)
+        self.redis.delete(*tag_keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        # SCAN rather than KEYS so a large cache does not block Redis
+        batch = []
+        for redis_key in self.redis.scan_iter(match=self.prefix + "*", count=500):
+            batch.append(redis_key)
+            if len(batch) >= 500:
+                self.redis.delete(*batch)
+                batch = []
+        if batch:
+            self.redis.delete(*batch)
 
-# Create a global cache instance
-cache = SimpleCache()
 
-def cached(ttl=300, key_prefix=''):
+class InvalidationBus:
+    """
+    Fans tag invalidations out to every worker over Redis pub/sub.
+
+    Only needed for per-process backends: each worker subscribes on a
+    daemon thread and applies messages from other workers to its own
+    cache. Messages carry an origin id so a worker ignores its own.
+    """
+
+    def __init__(self, redis: Redis, cache: BaseCache, channel: str = DEFAULT_INVALIDATION_CHANNEL) -> None:
+        self.redis = redis
+        self.cache = cache
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, tags: Iterable[str]) -> None:
+        message = json.dumps({"origin": self.origin, "tags": list(tags)})
+        self.redis.publish(self.channel, message)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def _listen(self) -> None:
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            self.handle_message(message.get("data"))
+
+    def handle_message(self, data: Any) -> None:
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if payload.get("origin") != self.origin:
+            self.cache.invalidate_tags(payload.get("tags") or ())
+
+
+# ---------------------------------------------------------------------------
+# Factory / resolver
+# ---------------------------------------------------------------------------
+def get_cache() -> BaseCache:
+    """
+    Resolve and memoize a cache backend in app.extensions['assetanchor_cache'].
+
+    CACHE_BACKEND selects 'memory' or 'redis'; when unset, Redis is preferred
+    if REDIS_URL is configured and reachable, else falls back to in-memory.
+    An in-memory backend with Redis reachable also gets an InvalidationBus in
+    app.extensions['assetanchor_cache_bus'].
+    """
+    app = current_app._get_current_object()
+    ext_key = "assetanchor_cache"
+
+    backend = app.extensions.get(ext_key)
+    if backend is not None:
+        return backend
+
+    choice = (app.config.get("CACHE_BACKEND") or "").lower()
+    redis_url = app.config.get("REDIS_URL")
+    redis_client = None
+
+    if _HAS_REDIS and redis_url:
+        try:
+            redis_client = Redis.from_url(redis_url)  # type: ignore
+            # Simple ping to validate connectivity
+            redis_client.ping()
+        except Exception as e:
+            app.logger.warning(f"Redis cache unavailable, using in-memory cache: {e}")
+            redis_client = None
+
+    if choice != "memory" and redis_client is not None:
+        backend = RedisCache(
+            redis_client,
+            app.config.get("CACHE_KEY_PREFIX", DEFAULT_KEY_PREFIX),
+            int(app.config.get("CACHE_TAG_TTL", DEFAULT_TAG_TTL)),
+        )
+    else:
+        backend = InMemoryCache(
+            max_entries=int(app.config.get("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(app.config.get("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        )
+        if redis_client is not None:
+            bus = InvalidationBus(
+                redis_client,
+                backend,
+                app.config.get("CACHE_INVALIDATION_CHANNEL", DEFAULT_INVALIDATION_CHANNEL),
+            )
+            bus.start()
+            app.extensions["assetanchor_cache_bus"] = bus
+
+    app.extensions[ext_key] = backend
+    return backend
+
+
+def invalidate_tags(tags: Iterable[str]) -> int:
+    """
+    Evict every cached entry carrying any of `tags` from the current app's
+    cache, and tell the other workers to do the same.
+
+    Failures are logged, never raised: a write must not fail because the
+    cache is unreachable.
+    """
+    tags = sorted(set(tags))
+    if not tags:
+        return 0
+
+    app = current_app._get_current_object()
+    removed = 0
+    try:
+        removed = get_cache().invalidate_tags(tags)
+        bus = app.extensions.get("assetanchor_cache_bus")
+        if bus is not None:
+            bus.publish(tags)
+    except Exception as e:
+        logger.warning(f"Cache invalidation failed for {tags}: {e}")
+    return removed
+
+
+# ---------------------------------------------------------------------------
+# Response serialization
+# ---------------------------------------------------------------------------
+# Headers that must never be replayed to another request
+_UNCACHEABLE_HEADERS = {"set-cookie", "content-length"}
+
+
+def serialize_response(response: Response) -> bytes:
+    """Encode status, headers and body as one bytes value: JSON header line + body."""
+    meta = {
+        "status": response.status_code,
+        "headers": [
+            [name, value] for name, value in response.headers.items()
+            if name.lower() not in _UNCACHEABLE_HEADERS
+        ],
+    }
+    return json.dumps(meta, separators=(",", ":")).encode("utf-8") + b"\n" + response.get_data()
+
+
+def deserialize_response(data: bytes) -> Response:
+    """Rebuild a Response from `serialize_response` output."""
+    meta, _, body = data.partition(b"\n")
+    meta = json.loads(meta.decode("utf-8"))
+    return Response(body, status=meta["status"], headers=meta["headers"])
+
+
+# ---------------------------------------------------------------------------
+# Decorator
+# ---------------------------------------------------------------------------
+def _current_identity() -> Optional[str]:
+    """
+    JWT identity of the caller, '' for anonymous callers, or None when the
+    presented token is invalid (the response must then not be cached).
+    """
+    try:
+        from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    return "" if identity is None else str(identity)
+
+
+def cached(ttl=300, key_prefix='', vary_on_user=True, tags=()):
     """
     Decorator to cache API responses.
-    
+
     Args:
         ttl: Time to live in seconds
         key_prefix: Prefix for cache key
-        
+        vary_on_user: Scope entries to the caller's JWT identity
+        tags: Tag templates formatted with the view kwargs and `identity`,
+              used to evict the entry when the underlying rows change
+
     Example:
-        @app.route("/api/properties")
-        @cached(ttl=60)
-        def get_properties():
-            # This endpoint will be cached for 60 seconds
+        @app.route("/api/properties/<int:property_id>")
+        @cached(ttl=300, tags=['landlord:{identity}', 'property:{property_id}'])
+        def get_property(property_id):
+            # Cached for 5 minutes per user, evicted when the property changes
     """
     def decorator(f):
         @functools.wraps(f)
@@ -67,32 +413,50 @@ def cached(ttl=300, key_prefix=''):
             # Skip cache in development if configured
             if current_app.debug and not current_app.config.get('CACHE_IN_DEBUG', False):
                 return f(*args, **kwargs)
-            
-            # Generate cache key based on function, args, kwargs and request
+
+            # Only idempotent reads are cacheable
+            if request.method not in ('GET', 'HEAD'):
+                return f(*args, **kwargs)
+
+            identity = _current_identity() if vary_on_user else ''
+            if identity is None:
+                return f(*args, **kwargs)
+
+            # Generate cache key based on function, args, identity and request
             key_parts = [
                 key_prefix,
                 f.__module__,
                 f.__name__,
                 request.path,
-                request.query_string.decode('utf-8'),
-                str(sorted(request.args.items())),
-                json.dumps(kwargs, sort_keys=True)
+                str(sorted(request.args.items(multi=True))),
+                json.dumps(kwargs, sort_keys=True, default=str),
+                identity
             ]
-            
-            key = hashlib.md5(''.join(key_parts).encode('utf-8')).hexdigest()
-            
-            # Try to get from cache
-            cached_response = cache.get(key)
+
+            key = hashlib.sha256('\0'.join(key_parts).encode('utf-8')).hexdigest()
+            backend = get_cache()
+
+            # Try to get from cache; a failing backend must not fail the request
+            try:
+                cached_response = backend.get(key)
+            except Exception as e:
+                current_app.logger.warning(f"Cache read failed: {e}")
+                cached_response = None
             if cached_response is not None:
-                return cached_response
-            
+                return deserialize_response(cached_response)
+
             # Generate and cache the response
-            response = f(*args, **kwargs)
-            
-            # Only cache successful responses
-            if hasattr(response, 'status_code') and 200 <= response.status_code < 300:
-                cache.set(key, response, ttl)
-            
+            response = current_app.make_response(f(*args, **kwargs))
+
+            # Only cache successful, non-streamed responses that set no cookies
+            if (200 <= response.status_code < 300 and not response.is_streamed
+                    and 'Set-Cookie' not in response.headers):
+                try:
+                    entry_tags = [tag.format(identity=identity, **kwargs) for tag in tags]
+                    backend.set(key, serialize_response(response), ttl, tags=entry_tags)
+                except Exception as e:
+                    current_app.logger.warning(f"Cache write failed: {e}")
+
             return response
         return wrapped
-    return decorator
\ No newline at end of file
+    return decorator
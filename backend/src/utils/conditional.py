@@ -0,0 +1,153 @@
+"""
+Conditional GET support (ETag) for API endpoints.
+
+Features
+- `conditional_get` decorator answering If-None-Match with 304 Not Modified
+- Fingerprint mode: a cheap `max(updated_at), count(*)` query decides
+  freshness *before* the view queries and serializes the full payload
+- Hash mode (no fingerprint): the view runs and the ETag is a hash of the
+  body, which still saves the transfer
+- Weak ETags scoped to the caller's JWT identity and the full request path
+- No Last-Modified / If-Modified-Since: a delete can leave max(updated_at)
+  unchanged, while the count in the ETag changes
+- Validated responses get `Cache-Control: private, no-cache` from the
+  `add_response_headers` hook in app.py instead of `no-store`
+"""
+
+from __future__ import annotations
+
+import hashlib
+import functools
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple
+
+from flask import request, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from sqlalchemy import func
+
+from ..extensions import db
+
+# (last modified, row count or any other hashable summary)
+Fingerprint = Tuple[Optional[datetime], Any]
+
+
+# ---------------------------------------------------------------------------
+# Fingerprints
+# ---------------------------------------------------------------------------
+def fingerprint_query(model, *criteria, column: str = "updated_at") -> Fingerprint:
+    """
+    Return (max(updated_at), row count) of `model` rows matching `criteria`
+    in one aggregate query.
+    """
+    return tuple(
+        db.session.query(func.max(getattr(model, column)), func.count())
+        .select_from(model)
+        .filter(*criteria)
+        .one()
+    )
+
+
+def combine_fingerprints(*fingerprints: Fingerprint) -> Fingerprint:
+    """
+    Merge fingerprints of several tables a payload is built from, e.g. units
+    plus the property whose name they embed.
+    """
+    stamps = [lm for lm, _ in fingerprints if lm is not None]
+    return (max(stamps) if stamps else None, tuple(count for _, count in fingerprints))
+
+
+def _weak_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+# ---------------------------------------------------------------------------
+# Request evaluation
+# ---------------------------------------------------------------------------
+def _current_identity() -> Optional[str]:
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    return None if identity is None else str(identity)
+
+
+def _not_modified(etag: str) -> bool:
+    """Evaluate If-None-Match; If-Modified-Since alone cannot see deletes."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag.removeprefix("W/").strip('"'))
+    return False
+
+
+def _set_validators(response, etag: str):
+    response.headers["ETag"] = etag
+    response.vary.add("Authorization")
+    return response
+
+
+def _not_modified_response(etag: str):
+    response = current_app.response_class(status=304)
+    return _set_validators(response, etag)
+
+
+# ---------------------------------------------------------------------------
+# Decorator
+# ---------------------------------------------------------------------------
+def conditional_get(fingerprint: Optional[Callable[..., Optional[Fingerprint]]] = None):
+    """
+    Decorator adding ETag validation to a GET endpoint.
+
+    Args:
+        fingerprint: Optional callable `(identity, **view_kwargs)` returning
+                     `(last_modified, count)` for the rows the view would
+                     return, typically via `fingerprint_query`. Returning
+                     None falls back to hashing the response body.
+
+    Example:
+        @unit_bp.route('/property/<int:property_id>')
+        @conditional_get(lambda identity, property_id: fingerprint_query(
+            Unit, Unit.property_id == property_id))
+        def get_units_by_property(property_id):
+            ...
+
+    Fingerprint mode only short-circuits for authenticated callers, so the
+    view's own authorization checks still run for everyone else.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return fn(*args, **kwargs)
+
+            identity = _current_identity()
+            etag = None
+
+            if fingerprint is not None and identity is not None:
+                try:
+                    fp = fingerprint(identity, **kwargs)
+                except Exception as e:
+                    current_app.logger.warning(f"ETag fingerprint failed for {request.path}: {e}")
+                    fp = None
+                if fp is not None:
+                    last_modified, count = fp
+                    etag = _weak_etag(
+                        identity, request.full_path,
+                        last_modified.isoformat() if last_modified else "", count,
+                    )
+                    if _not_modified(etag):
+                        return _not_modified_response(etag)
+
+            response = current_app.make_response(fn(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            if etag is None:
+                etag = _weak_etag(identity, hashlib.sha1(response.get_data()).hexdigest())
+                if _not_modified(etag):
+                    return _not_modified_response(etag)
+
+            return _set_validators(response, etag)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,220 @@
+# backend/src/utils/cursor_pagination.py
+"""
+Keyset (cursor) pagination for SQLAlchemy queries.
+
+Features:
+- Pages continue from the last row's sort key instead of an OFFSET, so page
+  N costs the same as page 1 on an index matching the ORDER BY
+- Cursors are opaque and signed with SECRET_KEY (itsdangerous): clients can
+  not forge or edit a position, and a `scope` (e.g. endpoint + user) stops a
+  cursor from being replayed against another listing
+- Mixed sort directions are supported; the last sort column must be unique
+  (normally the primary key) so positions are total
+- Sort keys may be expressions (e.g. coalesce over a nullable column); the
+  cursor stores the values the database sorted by, selected with the rows
+- The total is optional: skipped by default, exact on request, or an
+  estimate (PostgreSQL planner rows; elsewhere a count capped at
+  COUNT_ESTIMATE_CAP)
+- Endpoints opt in with `?cursor=` (empty for the first page) and keep their
+  page/per_page responses otherwise
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Sequence
+
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, func, literal, or_, select
+from sqlalchemy.sql import operators
+
+CURSOR_PARAM = "cursor"
+CURSOR_SALT = "keyset-pagination"
+COUNT_MODES = ("exact", "estimate")
+COUNT_ESTIMATE_CAP = 10_000
+MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed, tampered with, or belongs to another listing."""
+
+    def __init__(self, message: str = "Invalid cursor"):
+        super().__init__(message)
+
+
+# ----------------------------
+# Cursor encoding
+# ----------------------------
+def _serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt=CURSOR_SALT)
+
+
+def _dump_value(value: Any) -> Any:
+    # JSON keeps str/int/float/bool/None; tag the rest so they round-trip
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+        raise InvalidCursor()
+    return value
+
+
+def encode_cursor(values: Sequence[Any], scope: Optional[str] = None) -> str:
+    """Signed, URL-safe cursor for the position after the row with sort key `values`."""
+    return _serializer().dumps({"k": [_dump_value(v) for v in values], "s": scope})
+
+
+def decode_cursor(cursor: str, scope: Optional[str] = None, size: Optional[int] = None) -> list:
+    """
+    Inverse of encode_cursor.
+
+    Raises:
+        InvalidCursor if the signature, scope or number of values do not match
+    """
+    try:
+        payload = _serializer().loads(cursor)
+        values = [_load_value(v) for v in payload["k"]]
+    except (BadSignature, KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor() from e
+    if payload.get("s") != scope or (size is not None and len(values) != size):
+        raise InvalidCursor()
+    return values
+
+
+# ----------------------------
+# Keyset predicates
+# ----------------------------
+def _sort_key(expression):
+    """(column, descending) for `col`, `col.asc()` or `col.desc()`"""
+    modifier = getattr(expression, "modifier", None)
+    if modifier in (operators.desc_op, operators.asc_op):
+        return expression.element, modifier is operators.desc_op
+    return expression, False
+
+
+def keyset_after(order_by: Sequence[Any], values: Sequence[Any]):
+    """
+    WHERE criterion selecting rows strictly after `values` in `order_by` order:
+    (a > x) OR (a = x AND b > y) OR ..., with < for descending columns.
+    """
+    keys = [_sort_key(expression) for expression in order_by]
+    # Bound explicitly so booleans compare like any other value
+    bound = [literal(value, column.type) for (column, _), value in zip(keys, values)]
+    branches = []
+    for i, (column, descending) in enumerate(keys):
+        ties = [keys[j][0] == bound[j] for j in range(i)]
+        step = column < bound[i] if descending else column > bound[i]
+        branches.append(and_(*ties, step))
+    return or_(*branches)
+
+
+# ----------------------------
+# Counting
+# ----------------------------
+def _planner_estimate(query) -> Optional[int]:
+    compiled = query.statement.compile(dialect=query.session.get_bind().dialect)
+    plan = query.session.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    try:
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except (LookupError, TypeError, ValueError):
+        return None
+
+
+def count_rows(query, mode: str) -> Dict[str, Any]:
+    """{"total": int, "total_is_estimate": bool} for `query` under `mode` ("exact" or "estimate")."""
+    unordered = query.order_by(None)
+    if mode == "exact":
+        return {"total": unordered.count(), "total_is_estimate": False}
+
+    if query.session.get_bind().dialect.name == "postgresql":
+        estimate = _planner_estimate(unordered)
+        if estimate is not None:
+            return {"total": estimate, "total_is_estimate": True}
+
+    # Exact below the cap, "at least the cap" above it
+    capped = unordered.limit(COUNT_ESTIMATE_CAP).subquery()
+    total = query.session.execute(select(func.count()).select_from(capped)).scalar()
+    return {"total": total, "total_is_estimate": total >= COUNT_ESTIMATE_CAP}
+
+
+# ----------------------------
+# Pagination
+# ----------------------------
+def keyset_paginate(query, order_by: Sequence[Any], cursor: Optional[str] = None,
+                    per_page: int = 20, count: Optional[str] = None,
+                    scope: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One keyset page of `query`.
+
+    Args:
+        query: SQLAlchemy ORM query of model rows (its own ORDER BY is replaced)
+        order_by: sort expressions, e.g. (Model.created_at.desc(), Model.id.desc());
+                  the last must be unique and none may be NULL (coalesce
+                  nullable columns)
+        cursor: `next_cursor` of the previous page, or None/"" for the first
+        per_page: rows per page (capped at MAX_PER_PAGE)
+        count: None to skip the total, "exact" or "estimate"
+        scope: listing identity the cursor is bound to
+
+    Returns:
+        dict: {'items': [...], 'next_cursor': str|None, 'per_page': int}
+              plus 'total' and 'total_is_estimate' when counted
+
+    Raises:
+        InvalidCursor if `cursor` cannot be used for this listing
+    """
+    per_page = max(1, min(MAX_PER_PAGE, int(per_page)))
+    columns = [_sort_key(expression)[0] for expression in order_by]
+
+    page_query = query.order_by(None).order_by(*order_by)
+    if cursor:
+        values = decode_cursor(cursor, scope, size=len(columns))
+        page_query = page_query.filter(keyset_after(order_by, values))
+
+    # One extra row tells whether another page exists; the sort keys come
+    # along so expressions round-trip exactly as they were compared
+    rows = page_query.add_columns(*columns).limit(per_page + 1).all()
+    items = [row[0] for row in rows[:per_page]]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor(list(rows[per_page - 1][1:]), scope)
+
+    result = {"items": items, "next_cursor": next_cursor, "per_page": per_page}
+    if count in COUNT_MODES:
+        result.update(count_rows(query, count))
+    return result
+
+
+def wants_cursor() -> bool:
+    """True when the request opted into keyset pagination (`?cursor=`, possibly empty)."""
+    return CURSOR_PARAM in request.args
+
+
+def cursor_params(default_per_page: int = 20) -> Dict[str, Any]:
+    """cursor, per_page and count read from the query string, as keyset_paginate kwargs."""
+    count = request.args.get("count")
+    return {
+        "cursor": request.args.get(CURSOR_PARAM) or None,
+        "per_page": request.args.get("per_page", default_per_page, type=int) or default_per_page,
+        "count": count if count in COUNT_MODES else None,
+    }
@@ -1,13 +1,9 @@
-from flask import current_app, render_template_string
-from flask_mail import Message
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import logging
 
 def send_email(to, subject, template=None, body=None, **kwargs):
     """
-    Send an email using Flask-Mail or direct SMTP.
+    Queue an email in the outbox and commit; the outbox workers deliver it.
+    Call it after the caller's own changes are ready to be committed.
     
     Args:
         to: Recipient email address
@@ -17,64 +13,29 @@ def send_email(to, subject, template=None, body=None, **kwargs):
         **kwargs: Variables to pass to the template renderer
         
     Returns:
-        Boolean indicating success
+        Boolean indicating the email was queued
     """
-    # Check if Flask-Mail is configured
-    try:
-        from ..extensions import mail
+    if not template and not body:
+        logging.error("Either template or body must be provided")
+        return False
         
-        if not template and not body:
-            logging.error("Either template or body must be provided")
-            return False
-            
-        msg = Message(
-            subject=subject,
-            recipients=[to]
-        )
+    try:
+        from ..extensions import db
+        from ..services.email_outbox_service import enqueue_email
+        from ..services.email_templates import get_email_templates
         
+        html = None
         if template:
-            msg.html = render_template_string(template, **kwargs)
-        if body:
-            msg.body = body
-            
-        mail.send(msg)
+            # Compiled once per distinct template string, with a cached text twin
+            html, text = get_email_templates().from_string(template).render(**kwargs)
+            body = body or text
+        enqueue_email(to, subject, html_body=html, text_body=body)
+        db.session.commit()
         return True
         
-    except (ImportError, AttributeError):
-        # Fall back to direct SMTP
-        return _send_email_smtp(to, subject, body or template, is_html=bool(template))
-    except Exception as e:
-        logging.error(f"Error sending email: {str(e)}")
-        return False
-
-def _send_email_smtp(to_email, subject, body, is_html=False):
-    """Send email using direct SMTP connection"""
-    import os
-    smtp_server = os.environ.get("SMTP_SERVER", "localhost")
-    smtp_port = int(os.environ.get("SMTP_PORT", "587"))
-    smtp_username = os.environ.get("SMTP_USERNAME")
-    smtp_password = os.environ.get("SMTP_PASSWORD")
-    from_email = os.environ.get("MAIL_DEFAULT_SENDER", "no-reply@propertymgmt.com")
-
-    msg = MIMEMultipart("alternative" if is_html else "mixed")
-    msg["From"] = from_email
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    
-    if is_html:
-        msg.attach(MIMEText(body, "html"))
-    else:
-        msg.attach(MIMEText(body, "plain"))
-
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            if smtp_username and smtp_password:
-                server.login(smtp_username, smtp_password)
-            server.sendmail(from_email, to_email, msg.as_string())
-        return True
     except Exception as e:
-        logging.error(f"Failed to send email to {to_email}: {e}")
+        db.session.rollback()
+        logging.error(f"Error queueing email: {str(e)}")
         return False
 
 def send_verification_email(user, token, base_url=None):
@@ -5,7 +5,8 @@ Utility functions for validating uploaded files.
 Features:
 - Extension whitelist
 - Size limit enforcement
-- MIME type detection (python-magic preferred, mimetypes fallback)
+- MIME type detection (python-magic preferred, magic-number table and
+  mimetypes fallback)
 - SHA-256 integrity hash
 - Safe filename + storage path generation
 """
@@ -13,6 +14,7 @@ Features:
 import os
 import time
 import hashlib
+import mimetypes
 
 from werkzeug.utils import secure_filename
 
@@ -57,6 +59,53 @@ ALLOWED_MIME_TYPES = {
 }
 
 
+SNIFF_BYTES = 2048  # enough for magic number detection
+
+# Leading bytes of the formats we accept, for hosts without python-magic
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/msword"),  # OLE2: doc/xls/ppt
+    (b"{\\rtf", "text/rtf"),
+)
+
+# Formats that are containers of another signature
+_CONTAINER_TYPES = {
+    "application/zip": {
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    },
+    "application/msword": {"application/vnd.ms-excel", "application/vnd.ms-powerpoint"},
+}
+
+
+def sniff_mime_type(head: bytes, filename: str) -> str:
+    """
+    MIME type from the first bytes of a file.
+    Uses python-magic if installed, else known signatures, else the filename.
+    """
+    if magic:
+        return magic.Magic(mime=True).from_buffer(head)
+
+    guessed = mimetypes.guess_type(filename)[0]
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            # A .docx is a zip, an .xls is OLE2: keep the more specific guess
+            if guessed in _CONTAINER_TYPES.get(mime_type, ()):
+                return guessed
+            return mime_type
+    # No binary signature: text formats (txt, csv, svg) go by their name
+    return guessed or "application/octet-stream"
+
+
 # ----------------------------
 # Exceptions
 # ----------------------------
@@ -94,21 +143,14 @@ def is_allowed_file_size(file_stream) -> bool:
 def is_allowed_mime_type(file_stream) -> bool:
     """
     Return True if the file MIME type is allowed.
-    Uses python-magic if installed, otherwise falls back to mimetypes.
+    Uses python-magic if installed, otherwise known signatures and mimetypes.
     """
     file_stream.seek(0)
-    file_bytes = file_stream.read(2048)  # enough for magic number detection
+    file_bytes = file_stream.read(SNIFF_BYTES)
     file_stream.seek(0)
 
-    if magic:
-        detected_type = magic.Magic(mime=True).from_buffer(file_bytes)
-    else:
-        import mimetypes
-
-        filename = getattr(file_stream, "filename", "")
-        detected_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
-
-    return detected_type in ALLOWED_MIME_TYPES
+    filename = getattr(file_stream, "filename", "")
+    return sniff_mime_type(file_bytes, filename) in ALLOWED_MIME_TYPES
 
 
 def generate_file_hash(file_stream) -> str:
@@ -127,6 +169,12 @@ def generate_file_hash(file_stream) -> str:
 # ----------------------------
 # Main validation
 # ----------------------------
+def is_test_environment() -> bool:
+    """True when running under the test suite, where MIME checks are skipped."""
+    return (os.environ.get('TESTING') == 'true' or os.environ.get('FLASK_ENV') == 'testing'
+            or os.environ.get('FLASK_TESTING') == 'true')
+
+
 def validate_file_upload(file_stream, original_filename: str) -> tuple[str, str]:
     """
     Comprehensive file validation.
@@ -150,20 +198,27 @@ def validate_file_upload(file_stream, original_filename: str) -> tuple[str, str]
             f"File extension not allowed. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
         )
 
-    if not is_allowed_file_size(file_stream):
-        max_size_mb = MAX_UPLOAD_SIZE / (1024 * 1024)
-        raise FileValidationError(f"File too large. Maximum size: {max_size_mb:.1f} MB")
+    # One pass over the stream: size, leading bytes and hash together
+    file_stream.seek(0)
+    file_hash = hashlib.sha256()
+    size = 0
+    head = b""
+    for chunk in iter(lambda: file_stream.read(64 * 1024), b""):
+        size += len(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            file_stream.seek(0)
+            max_size_mb = MAX_UPLOAD_SIZE / (1024 * 1024)
+            raise FileValidationError(f"File too large. Maximum size: {max_size_mb:.1f} MB")
+        if len(head) < SNIFF_BYTES:
+            head += chunk[:SNIFF_BYTES - len(head)]
+        file_hash.update(chunk)
+    file_stream.seek(0)
 
-    # Check if we're in a test environment
-    import os
-    is_test_env = os.environ.get('TESTING') == 'true' or os.environ.get('FLASK_ENV') == 'testing' or os.environ.get('FLASK_TESTING') == 'true'
-    
     # Skip MIME type validation in test environment
-    if not is_test_env and not is_allowed_mime_type(file_stream):
+    if not is_test_environment() and sniff_mime_type(head, filename) not in ALLOWED_MIME_TYPES:
         raise FileValidationError("File type not allowed based on MIME type")
 
-    file_hash = generate_file_hash(file_stream)
-    return filename, file_hash
+    return filename, file_hash.hexdigest()
 
 
 # ----------------------------
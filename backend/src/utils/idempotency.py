@@ -0,0 +1,320 @@
+"""
+Idempotency guard for incoming webhooks.
+
+Features
+- One claim per (scope, event id): a delivery is processed by exactly one
+  worker, retries and concurrent duplicates are turned away
+- Redis backend (REDIS_URL): `SET key token NX PX lease` claims, a
+  completed key is rewritten to "done" for IDEMPOTENCY_TTL_SECONDS
+- Per-process LRU of completed keys answers repeat deliveries without a
+  network round trip
+- DB fallback (idempotency_keys table) when Redis is not configured or
+  errors; expired leases are taken over with a compare-and-set UPDATE
+- DB claims run on their own connection and commit on their own, never
+  flushing or committing the request's session; if the table cannot be
+  reached the claim fails closed with a 503 so the sender retries
+- Callers whose own table is already the durable record (stripe_events)
+  pass `durable=False` and skip the fallback
+- `flask purge-idempotency-keys` deletes old fallback rows
+"""
+
+from __future__ import annotations
+
+import uuid
+import logging
+import threading
+import contextlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+import click
+from flask import current_app
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from werkzeug.exceptions import ServiceUnavailable
+
+from ..extensions import db
+from ..models.idempotency_key import IdempotencyKey
+
+try:
+    # Optional: redis-py
+    from redis import Redis  # type: ignore
+    _HAS_REDIS = True
+except Exception:
+    _HAS_REDIS = False
+
+
+CLAIMED = "claimed"
+DUPLICATE = "duplicate"
+IN_PROGRESS = "in_progress"
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_LOCAL_MAX_ENTRIES = 10000
+DEFAULT_KEY_PREFIX = "assetanchor-idem:"
+DONE_MARKER = b"done"
+
+# Delete the key only while it still holds our lease token
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyUnavailable(ServiceUnavailable):
+    """No durable claim could be made; the delivery must be retried later."""
+
+    description = "Webhook deduplication is temporarily unavailable, retry later"
+
+
+# ---------------------------------------------------------------------------
+# In-process front
+# ---------------------------------------------------------------------------
+class CompletedKeys:
+    """Thread-safe bounded LRU set of keys known to be completed."""
+
+    def __init__(self, max_entries: int = DEFAULT_LOCAL_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._keys:
+                return False
+            self._keys.move_to_end(key)
+            return True
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+# ---------------------------------------------------------------------------
+# Guard
+# ---------------------------------------------------------------------------
+class Claim:
+    """Outcome of `IdempotencyGuard.claim`; complete or release it when claimed."""
+
+    def __init__(self, guard: "IdempotencyGuard", key: str, status: str,
+                 backend: Optional[str] = None, token: Optional[str] = None) -> None:
+        self.guard = guard
+        self.key = key
+        self.status = status
+        self.backend = backend  # 'redis', 'db' or None (no durable claim)
+        self.token = token
+        self.resolved = status != CLAIMED
+
+    @property
+    def acquired(self) -> bool:
+        return self.status == CLAIMED
+
+    def complete(self) -> None:
+        if not self.resolved:
+            self.resolved = True
+            self.guard.complete(self)
+
+    def release(self) -> None:
+        if not self.resolved:
+            self.resolved = True
+            self.guard.release(self)
+
+
+class IdempotencyGuard:
+    """
+    Claims webhook deliveries across workers.
+
+    `claim` checks the local completed-key LRU first, then Redis, then (for
+    durable claims, or when Redis fails) the idempotency_keys table.
+
+    Raises:
+        IdempotencyUnavailable from `claim` when the table is unreachable
+    """
+
+    def __init__(self, redis=None, prefix: str = DEFAULT_KEY_PREFIX,
+                 ttl: int = DEFAULT_TTL_SECONDS, lease: int = DEFAULT_LEASE_SECONDS,
+                 local_max_entries: int = DEFAULT_LOCAL_MAX_ENTRIES) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lease = lease
+        self.completed = CompletedKeys(local_max_entries)
+
+    def claim(self, scope: str, event_id: str, durable: bool = True) -> Claim:
+        key = f"{scope}:{event_id}"
+        if key in self.completed:
+            return Claim(self, key, DUPLICATE)
+
+        if self.redis is not None:
+            token = uuid.uuid4().hex
+            try:
+                if self.redis.set(self.prefix + key, token, nx=True, px=self.lease * 1000):
+                    return Claim(self, key, CLAIMED, "redis", token)
+                if self.redis.get(self.prefix + key) == DONE_MARKER:
+                    self.completed.add(key)
+                    return Claim(self, key, DUPLICATE)
+                return Claim(self, key, IN_PROGRESS)
+            except Exception as e:
+                logger.warning(f"Idempotency claim via Redis failed for {key}: {e}")
+
+        if not durable:
+            return Claim(self, key, CLAIMED)
+        return self._db_claim(key)
+
+    def complete(self, claim: Claim) -> None:
+        self.completed.add(claim.key)
+        try:
+            if claim.backend == "redis":
+                self.redis.set(self.prefix + claim.key, DONE_MARKER, ex=self.ttl)
+            elif claim.backend == "db":
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        update(IdempotencyKey)
+                        .where(IdempotencyKey.key == claim.key)
+                        .values(status=IdempotencyKey.STATUS_DONE, completed_at=datetime.utcnow(), locked_until=None)
+                    )
+        except Exception as e:
+            # The lease still expires; a redelivery is processed again at worst
+            logger.warning(f"Could not mark {claim.key} completed: {e}")
+
+    def release(self, claim: Claim) -> None:
+        try:
+            if claim.backend == "redis":
+                self.redis.eval(_RELEASE_SCRIPT, 1, self.prefix + claim.key, claim.token)
+            elif claim.backend == "db":
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        delete(IdempotencyKey).where(
+                            IdempotencyKey.key == claim.key,
+                            IdempotencyKey.status == IdempotencyKey.STATUS_PROCESSING,
+                        )
+                    )
+        except Exception as e:
+            logger.warning(f"Could not release {claim.key}; it frees up when the lease expires: {e}")
+
+    def _db_claim(self, key: str) -> Claim:
+        # Own connection: the claim must be committed before the handler
+        # runs, without committing (or rolling back) the request's session
+        now = datetime.utcnow()
+        locked_until = now + timedelta(seconds=self.lease)
+        try:
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(IdempotencyKey).values(key=key, locked_until=locked_until))
+                return Claim(self, key, CLAIMED, "db")
+            except IntegrityError:
+                pass
+
+            with db.engine.begin() as connection:
+                # Take over a lease abandoned by a crashed worker
+                taken = connection.execute(
+                    update(IdempotencyKey)
+                    .where(
+                        IdempotencyKey.key == key,
+                        IdempotencyKey.status == IdempotencyKey.STATUS_PROCESSING,
+                        IdempotencyKey.locked_until < now,
+                    )
+                    .values(locked_until=locked_until)
+                ).rowcount
+                status = None if taken == 1 else connection.execute(
+                    select(IdempotencyKey.status).where(IdempotencyKey.key == key)
+                ).scalar()
+        except SQLAlchemyError as e:
+            # Processing without a claim could apply the delivery twice
+            logger.warning(f"Idempotency claim via database failed for {key}: {e}")
+            raise IdempotencyUnavailable() from e
+
+        if taken == 1:
+            return Claim(self, key, CLAIMED, "db")
+        if status == IdempotencyKey.STATUS_DONE:
+            self.completed.add(key)
+            return Claim(self, key, DUPLICATE)
+        return Claim(self, key, IN_PROGRESS)
+
+
+# ---------------------------------------------------------------------------
+# Factory / helpers
+# ---------------------------------------------------------------------------
+def get_idempotency_guard() -> IdempotencyGuard:
+    """Resolve and memoize the guard in app.extensions['assetanchor_idempotency']."""
+    app = current_app._get_current_object()
+    ext_key = "assetanchor_idempotency"
+
+    guard = app.extensions.get(ext_key)
+    if guard is not None:
+        return guard
+
+    redis_client = None
+    redis_url = app.config.get("REDIS_URL")
+    if _HAS_REDIS and redis_url:
+        try:
+            redis_client = Redis.from_url(redis_url)  # type: ignore
+            redis_client.ping()
+        except Exception as e:
+            app.logger.warning(f"Redis unavailable for idempotency keys, using the database: {e}")
+            redis_client = None
+
+    guard = IdempotencyGuard(
+        redis_client,
+        prefix=app.config.get("IDEMPOTENCY_KEY_PREFIX", DEFAULT_KEY_PREFIX),
+        ttl=int(app.config.get("IDEMPOTENCY_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        lease=int(app.config.get("IDEMPOTENCY_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)),
+        local_max_entries=int(app.config.get("IDEMPOTENCY_LOCAL_MAX_ENTRIES", DEFAULT_LOCAL_MAX_ENTRIES)),
+    )
+    app.extensions[ext_key] = guard
+    return guard
+
+
+@contextlib.contextmanager
+def idempotent(scope: str, event_id: str, durable: bool = True) -> Iterator[Claim]:
+    """
+    Claim a delivery for the duration of the block.
+
+    The claim is completed when the block exits normally and released when
+    it raises; call `claim.release()` first to let a failed delivery be
+    retried without raising. IdempotencyUnavailable (a 503) propagates
+    before the block runs when no durable claim can be made.
+
+    Example:
+        with idempotent("plaid", body_hash) as claim:
+            if not claim.acquired:
+                return jsonify({"status": "duplicate_ignored"}), 200
+            process(payload)
+    """
+    claim = get_idempotency_guard().claim(scope, event_id, durable=durable)
+    try:
+        yield claim
+    except BaseException:
+        claim.release()
+        raise
+    claim.complete()
+
+
+def init_idempotency(app) -> None:
+    """Register the idempotency key maintenance CLI command."""
+
+    @app.cli.command("purge-idempotency-keys")
+    @click.option("--days", default=DEFAULT_TTL_SECONDS // 86400, show_default=True,
+                  help="Delete keys created more than this many days ago.")
+    def purge_idempotency_keys(days):
+        """Delete old rows from the idempotency_keys table."""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        count = db.session.execute(
+            delete(IdempotencyKey).where(or_(
+                IdempotencyKey.completed_at < cutoff,
+                IdempotencyKey.created_at < cutoff,
+            ))
+        ).rowcount
+        db.session.commit()
+        click.echo(f"Deleted {count} idempotency keys")
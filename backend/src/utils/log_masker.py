@@ -1,62 +1,85 @@
 # backend/src/utils/log_masker.py
 
 import re
+import atexit
+import copy
 import logging
+import queue
+import threading
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
 
 class PiiFilter(logging.Filter):
     """
     Logging filter that masks sensitive PII data in log messages.
+
+    All patterns are combined into a single alternation so each string is
+    scanned once, and strings containing none of the characters a pattern
+    needs (`@`, `_`, a digit, `eyJ`, `AKIA`, `password`) skip it entirely.
     """
-    # Patterns to detect and mask in logs
-    PATTERNS = {
+    # (name, pattern, mask) in priority order; masks may use \g<group>
+    PATTERNS = (
         # Email pattern
-        r'[\w\.-]+@[\w\.-]+': '[EMAIL REDACTED]',
+        ('email', r'[\w\.-]+@[\w\.-]+', '[EMAIL REDACTED]'),
         
         # JWT pattern (common formats)
-        r'eyJ[A-Za-z0-9-_]+\.[A-Za-z0-9-_]+\.[A-Za-z0-9-_]+': '[JWT REDACTED]',
+        ('jwt', r'eyJ[A-Za-z0-9-_]+\.[A-Za-z0-9-_]+\.[A-Za-z0-9-_]+', '[JWT REDACTED]'),
         
         # Stripe key pattern
-        r'(pk|sk|whsec)_(test|live)_[A-Za-z0-9]+': '[STRIPE_KEY REDACTED]',
+        ('stripe_key', r'(?:pk|sk|whsec)_(?:test|live)_[A-Za-z0-9]+', '[STRIPE_KEY REDACTED]'),
         
         # Stripe IDs (customer, payment, subscription, etc.)
-        r'(cus|sub|pi|si|ch|in|pm)_[A-Za-z0-9]+': '[STRIPE_ID REDACTED]',
+        ('stripe_id', r'(?:cus|sub|pi|si|ch|in|pm)_[A-Za-z0-9]+', '[STRIPE_ID REDACTED]'),
         
         # AWS access key pattern
-        r'AKIA[0-9A-Z]{16}': '[AWS_KEY REDACTED]',
+        ('aws_key', r'AKIA[0-9A-Z]{16}', '[AWS_KEY REDACTED]'),
         
         # Password pattern (context-dependent, assuming it appears near 'password' word)
-        r'("password"|password=|password:)\s*["\']?([^"\'\s,}{]+)["\']?': r'\1 [PASSWORD REDACTED]',
+        ('password', r'(?P<password_key>"password"|password=|password:)\s*["\']?[^"\'\s,}{]+["\']?',
+         r'\g<password_key> [PASSWORD REDACTED]'),
         
         # Phone number patterns
-        r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b': '[PHONE REDACTED]',
+        ('phone', r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', '[PHONE REDACTED]'),
         
         # SSN patterns
-        r'\b\d{3}-\d{2}-\d{4}\b': '[SSN REDACTED]',
-    }
+        ('ssn', r'\b\d{3}-\d{2}-\d{4}\b', '[SSN REDACTED]'),
+    )
+
+    # Something every pattern above has to contain
+    TRIGGERS = r'[@_\d]|eyJ|AKIA|password'
 
     def __init__(self):
         super().__init__()
-        # Compile patterns for efficiency
-        self.compiled_patterns = [(re.compile(pattern), mask) for pattern, mask in self.PATTERNS.items()]
+        self.pattern = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern, _ in self.PATTERNS))
+        self.masks = {name: mask for name, _, mask in self.PATTERNS}
+        self.triggers = re.compile(self.TRIGGERS)
+        self._exception_formatter = logging.Formatter()
+
+    def _replace(self, match):
+        return match.expand(self.masks[match.lastgroup])
+
+    def mask(self, text):
+        """Return `text` with every PII match replaced by its mask"""
+        if not self.triggers.search(text):
+            return text
+        return self.pattern.sub(self._replace, text)
 
     def filter(self, record):
         if isinstance(record.msg, str):
-            for pattern, mask in self.compiled_patterns:
-                record.msg = pattern.sub(mask, record.msg)
+            record.msg = self.mask(record.msg)
         
         # Also check args for strings that might contain PII
-        if record.args:
-            # Convert args to list for modification
-            args_list = list(record.args)
-            # Process each argument
-            for i, arg in enumerate(args_list):
-                if isinstance(arg, str):
-                    # Apply all patterns to the string argument
-                    for pattern, mask in self.compiled_patterns:
-                        args_list[i] = pattern.sub(mask, args_list[i])
-            # Update record with masked args
-            record.args = tuple(args_list)
+        if isinstance(record.args, tuple) and record.args:
+            record.args = tuple(self.mask(arg) if isinstance(arg, str) else arg for arg in record.args)
+        elif isinstance(record.args, dict):
+            record.args = {key: self.mask(arg) if isinstance(arg, str) else arg
+                           for key, arg in record.args.items()}
+
+        # Tracebacks can quote PII too; formatters reuse the cached exc_text
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = self.mask(record.exc_text)
             
         return True
 
@@ -99,3 +122,72 @@ def setup_pii_filtering():
         logger.addFilter(pii_filter)
 
     return pii_filter
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler for an in-process queue.
+
+    The stock prepare() formats the record into its message and drops
+    exc_info, since it has to survive pickling; here the record never leaves
+    the process, so only the message and args are merged and the exception
+    is left for the listener's formatter.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+# Listeners started by queue_logging_handler, stopped (and drained) at exit
+_LISTENERS = []
+_LISTENERS_LOCK = threading.Lock()
+
+
+def queue_logging_handler(*handlers, mask_pii=True):
+    """
+    Put `handlers` behind a queue.
+
+    Loggers get the returned QueueHandler, which only merges the message
+    with its args and enqueues the record; a QueueListener thread then
+    masks PII (once, over the merged message), formats and writes it, so
+    stream and file I/O stay off the request path. exc_info is kept, so
+    formatters still see the exception.
+    """
+    if mask_pii:
+        pii_filter = PiiFilter()
+        for handler in handlers:
+            handler.addFilter(pii_filter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    with _LISTENERS_LOCK:
+        _LISTENERS.append(listener)
+
+    queue_handler = _InProcessQueueHandler(log_queue)
+    queue_handler.listener = listener
+    return queue_handler
+
+
+def stop_queue_logging(handler=None):
+    """
+    Stop the listener behind `handler` (all of them when None), writing out
+    any records still queued.
+    """
+    with _LISTENERS_LOCK:
+        if handler is None:
+            listeners, _LISTENERS[:] = list(_LISTENERS), []
+        else:
+            listener = getattr(handler, 'listener', None)
+            listeners = [listener] if listener in _LISTENERS else []
+            for listener in listeners:
+                _LISTENERS.remove(listener)
+    for listener in listeners:
+        listener.stop()
+
+
+atexit.register(stop_queue_logging)
@@ -1,9 +1,130 @@
 # backend/src/utils/password.py
+"""
+Password hashing with tunable parameters, kept off the request's thread.
 
-from werkzeug.security import generate_password_hash, check_password_hash
+Features:
+- PASSWORD_HASH_METHOD picks werkzeug's method and parameters, e.g.
+  "scrypt:32768:8:1" or "pbkdf2:sha256:600000" (unset: werkzeug's default)
+- Hashing and verification run on a bounded pool of PASSWORD_HASH_WORKERS
+  real threads: gevent's native threadpool when the process is
+  monkey-patched, a ThreadPoolExecutor otherwise. scrypt and pbkdf2 release
+  the GIL, so other greenlets/requests keep running during a login burst
+  and at most PASSWORD_HASH_WORKERS cores are spent hashing
+- `needs_rehash` spots hashes made with other parameters and
+  `verify_and_upgrade` replaces them after the next successful check
+- Verifying against no hash still computes one, so unknown accounts take
+  as long as wrong passwords
+"""
 
-def hash_password(password):
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    # Optional: gevent workers (gunicorn -k gevent)
+    from gevent import monkey  # type: ignore
+    from gevent.threadpool import ThreadPool  # type: ignore
+    _HAS_GEVENT = True
+except ImportError:
+    _HAS_GEVENT = False
+
+DEFAULT_WORKERS = 4
+
+_POOL_LOCK = threading.Lock()
+_pool: Any = None
+
+
+# ----------------------------
+# Worker pool
+# ----------------------------
+def _config(name: str, default: Any) -> Any:
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def _gevent_patched() -> bool:
+    return _HAS_GEVENT and monkey.is_module_patched("threading")
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _POOL_LOCK:
+            if _pool is None:
+                workers = max(1, int(_config("PASSWORD_HASH_WORKERS", DEFAULT_WORKERS)))
+                if _gevent_patched():
+                    # Native threads; a patched ThreadPoolExecutor would run greenlets
+                    _pool = ThreadPool(workers)
+                else:
+                    _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+    return _pool
+
+
+def _run(fn: Callable[..., Any], *args: Any) -> Any:
+    pool = _get_pool()
+    if isinstance(pool, ThreadPoolExecutor):
+        return pool.submit(fn, *args).result()
+    return pool.apply(fn, args)
+
+
+# ----------------------------
+# Hashing
+# ----------------------------
+def _method() -> Optional[str]:
+    return _config("PASSWORD_HASH_METHOD", "") or None
+
+
+def _generate(password: str, method: Optional[str]) -> str:
+    if method:
+        return generate_password_hash(password, method=method)
     return generate_password_hash(password)
 
-def verify_password(password, hash_):
-    return check_password_hash(hash_, password)
+
+@lru_cache(maxsize=8)
+def _method_prefix(method: Optional[str]) -> str:
+    # werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1"), so ask it
+    return _generate("", method).split("$", 1)[0]
+
+
+@lru_cache(maxsize=8)
+def _dummy_hash(method: Optional[str]) -> str:
+    return _generate("not-a-password", method)
+
+
+def hash_password(password: str) -> str:
+    """Hash with the configured method, on the hashing pool."""
+    return _run(_generate, password, _method())
+
+
+def verify_password(password: str, hash_: Optional[str]) -> bool:
+    """Check `password` against `hash_` on the hashing pool; a missing hash never matches."""
+    if not hash_:
+        _run(check_password_hash, _dummy_hash(_method()), password)
+        return False
+    return _run(check_password_hash, hash_, password)
+
+
+def needs_rehash(hash_: Optional[str]) -> bool:
+    """True if `hash_` was not made with the configured method and parameters."""
+    if not hash_ or "$" not in hash_:
+        return True
+    return hash_.split("$", 1)[0] != _method_prefix(_method())
+
+
+def verify_and_upgrade(user, password: str) -> bool:
+    """
+    Check `user`'s password, rehashing it with the current parameters on
+    success when needed. The caller commits the session.
+    """
+    if not verify_password(password, getattr(user, "password", None)):
+        return False
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+    return True
@@ -2,6 +2,17 @@
 """
 Database and function performance utilities.
 
+Per-request query budget (init_query_budget):
+  QUERY_BUDGET_ENABLED=1     count statements and DB time per request,
+                             emit Server-Timing and Prometheus histograms
+  QUERY_REPEAT_THRESHOLD=5   identical statement shapes per request that
+                             are logged as a likely N+1
+  QUERY_BUDGET_STRICT=1      raise QueryBudgetExceeded when a view declared
+                             with @query_budget goes over (tests)
+  SLOW_QUERY_LOG_DIR=logs    where slow_queries.log is written, attached on
+                             the first request; unset keeps the slow_query
+                             logger on a NullHandler (tests)
+
 Enable SQL logging with:
   ENABLE_SLOW_QUERY_LOGGING=1
 Configure threshold (milliseconds) with:
@@ -15,20 +26,32 @@ from __future__ import annotations
 
 import logging
 import os
+import re
+import threading
 import time
+from collections import Counter
 from functools import wraps
 from typing import Any, Callable, Optional
 
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 
+from .log_masker import queue_logging_handler
+
 try:
     # Add request context details if Flask is available
-    from flask import has_request_context, request
+    from flask import has_request_context, request, g, current_app
 except Exception:  # pragma: no cover
     has_request_context = lambda: False  # type: ignore
     request = None  # type: ignore
 
+try:
+    # Optional: per-route query histograms
+    from prometheus_client import Histogram  # type: ignore
+    _HAS_PROMETHEUS = True
+except Exception:  # pragma: no cover
+    _HAS_PROMETHEUS = False
+
 
 # ----------------------------
 # Helpers
@@ -52,25 +75,48 @@ def _env_int(name: str, default: int) -> int:
 # Logging setup
 # ----------------------------
 LOG_DIR = os.getenv("LOG_DIR", "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
 
+# Records are dropped until configure_slow_query_log picks a directory
 logger = logging.getLogger("slow_query")
 if not logger.handlers:  # avoid duplicate handlers when reloaded
-    file_handler = logging.FileHandler(os.path.join(LOG_DIR, "slow_queries.log"))
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    )
-    logger.addHandler(file_handler)
-    # Mirror to stderr in dev for quick visibility
-    if _env_bool("SLOW_QUERY_STDERR", True):
-        stderr_handler = logging.StreamHandler()
-        stderr_handler.setFormatter(
-            logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        )
-        logger.addHandler(stderr_handler)
+    logger.addHandler(logging.NullHandler())
 logger.setLevel(logging.INFO)
 logger.propagate = False
 
+_LOG_LOCK = threading.Lock()
+_LOG_CONFIGURED = False
+
+
+def configure_slow_query_log(log_dir: Optional[str]) -> None:
+    """
+    Write the slow_query logger to <log_dir>/slow_queries.log, mirrored to
+    stderr unless SLOW_QUERY_STDERR=0, through a queue so the writes happen
+    on a listener thread. A falsy `log_dir` keeps the NullHandler. Only the
+    first call in a process has an effect.
+    """
+    global _LOG_CONFIGURED
+    with _LOG_LOCK:
+        if _LOG_CONFIGURED:
+            return
+        _LOG_CONFIGURED = True
+        if not log_dir:
+            return
+
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.FileHandler(os.path.join(log_dir, "slow_queries.log"))
+        file_handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        )
+        handlers = [file_handler]
+        # Mirror to stderr in dev for quick visibility
+        if _env_bool("SLOW_QUERY_STDERR", True):
+            stderr_handler = logging.StreamHandler()
+            stderr_handler.setFormatter(
+                logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+            )
+            handlers.append(stderr_handler)
+        logger.addHandler(queue_logging_handler(*handlers))
+
 # Defaults (can be overridden in init_slow_query_logging via app.config)
 ENABLE_SLOW_QUERY_LOGGING = _env_bool("ENABLE_SLOW_QUERY_LOGGING", False)
 SLOW_QUERY_THRESHOLD = _env_int("SLOW_QUERY_THRESHOLD", 100)  # milliseconds
@@ -102,6 +148,8 @@ def init_slow_query_logging(app: Optional[Any] = None) -> None:
         logger.info("Slow query logging disabled.")
         return
 
+    configure_slow_query_log(app.config.get("SLOW_QUERY_LOG_DIR", LOG_DIR) if app is not None else LOG_DIR)
+
     if _LISTENERS_ATTACHED:
         # Already set up
         logger.debug("Slow query listeners already attached; skipping re-attach.")
@@ -188,3 +236,177 @@ def track_function_performance(threshold_ms: int = 100) -> Callable:
         return wrapper
 
     return decorator
+
+
+# ----------------------------
+# Per-request query budget / N+1 detection
+# ----------------------------
+QUERY_REPEAT_THRESHOLD = 5
+
+# Guard for the request-scoped listeners, separate from slow-query logging
+_BUDGET_LISTENERS_ATTACHED = False
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+if _HAS_PROMETHEUS:
+    REQUEST_QUERY_COUNT = Histogram(
+        "request_db_queries", "SQL statements issued per request",
+        ["method", "endpoint"],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+    )
+    REQUEST_QUERY_TIME = Histogram(
+        "request_db_seconds", "Total SQL time per request",
+        ["method", "endpoint"],
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    )
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a view exceeds its declared query budget."""
+
+
+class RequestQueryStats:
+    """Statements, DB time and statement shapes recorded for one request."""
+
+    __slots__ = ("count", "duration", "shapes", "started")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+        self.started = time.perf_counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> list:
+        """Statement shapes issued at least `threshold` times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalize a statement so the N+1 pattern (same SQL, different bound
+    values) collapses to one key: whitespace is folded and expanded IN
+    lists of any length become `(?)`.
+    """
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def query_budget(max_queries: int, max_repeats: Optional[int] = None) -> Callable:
+    """
+    Declare the most SQL statements a view may issue per request, and
+    optionally how often one statement shape may repeat.
+
+    Exceeding it is logged, or raises QueryBudgetExceeded under
+    QUERY_BUDGET_STRICT. The declaration is an attribute on the view, so it
+    survives `functools.wraps`-based decorators stacked on top.
+
+    Usage:
+        @bp.route("/threads")
+        @jwt_required()
+        @query_budget(3)
+        def get_threads(): ...
+    """
+
+    def decorator(func: Callable) -> Callable:
+        func._query_budget = (max_queries, max_repeats)  # type: ignore[attr-defined]
+        return func
+
+    return decorator
+
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    """Stats of the active request, or None outside an instrumented request."""
+    if not has_request_context():
+        return None
+    return g.get("_query_stats")
+
+
+def _route_label() -> str:
+    rule = request.url_rule
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+def _check_budget(stats: RequestQueryStats) -> Optional[str]:
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    budget = getattr(view, "_query_budget", None)
+    if budget is None:
+        return None
+
+    max_queries, max_repeats = budget
+    if stats.count > max_queries:
+        return f"{request.method} {_route_label()} issued {stats.count} queries (budget {max_queries})"
+    if max_repeats is not None and stats.shapes:
+        shape, n = stats.shapes.most_common(1)[0]
+        if n > max_repeats:
+            return f"{request.method} {_route_label()} repeated a statement {n} times (budget {max_repeats}): {shape}"
+    return None
+
+
+def init_query_budget(app: Any) -> None:
+    """
+    Record statements and DB time per request when QUERY_BUDGET_ENABLED.
+    Config is read per request, so it may change after init (tests).
+    Safe to call multiple times; engine listeners attach once.
+    """
+    global _BUDGET_LISTENERS_ATTACHED
+
+    if not _BUDGET_LISTENERS_ATTACHED:
+
+        @event.listens_for(Engine, "before_cursor_execute")
+        def _budget_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if current_query_stats() is not None:
+                context._budget_start = time.perf_counter()
+
+        @event.listens_for(Engine, "after_cursor_execute")
+        def _budget_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, "_budget_start", None)
+            stats = current_query_stats()
+            if start is not None and stats is not None:
+                stats.record(statement, time.perf_counter() - start)
+
+        _BUDGET_LISTENERS_ATTACHED = True
+
+    @app.before_request
+    def _start_query_stats():
+        # Read on the first request, after test configuration is applied
+        if not _LOG_CONFIGURED:
+            configure_slow_query_log(app.config.get("SLOW_QUERY_LOG_DIR"))
+        if app.config.get("QUERY_BUDGET_ENABLED"):
+            g._query_stats = RequestQueryStats()
+
+    @app.after_request
+    def _finish_query_stats(response):
+        stats = g.pop("_query_stats", None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}',
+        )
+
+        if _HAS_PROMETHEUS:
+            labels = (request.method, _route_label())
+            REQUEST_QUERY_COUNT.labels(*labels).observe(stats.count)
+            REQUEST_QUERY_TIME.labels(*labels).observe(stats.duration)
+
+        threshold = int(app.config.get("QUERY_REPEAT_THRESHOLD", QUERY_REPEAT_THRESHOLD))
+        for shape, n in stats.repeated(threshold):
+            logger.warning(
+                "Possible N+1: %s %s ran the same statement %d times\nStatement: %s",
+                request.method, _route_label(), n, shape,
+            )
+
+        violation = _check_budget(stats)
+        if violation:
+            if app.config.get("QUERY_BUDGET_STRICT"):
+                raise QueryBudgetExceeded(violation)
+            logger.warning("Query budget exceeded: %s", violation)
+
+        return response
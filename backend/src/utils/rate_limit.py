@@ -3,8 +3,12 @@
 Lightweight rate limiting utilities for API endpoints.
 
 Features
-- In-memory, thread-safe rate limiter (default)
-- Optional Redis-backed fixed-window counter if redis is available & configured
+- GCRA (a token bucket kept as one timestamp per key): `limit` requests per
+  `period`, refilled smoothly, bursts of up to `limit`
+- Redis backend when available & configured: the whole check is one Lua
+  script, atomic and a single round trip, on the Redis server's clock
+- In-memory backend otherwise: O(1) per check, lock-striped, at most
+  RATELIMIT_LOCAL_MAX_KEYS keys with LRU eviction
 - Request-scoped keys (IP + endpoint by default) or custom key_function
 - Honors Flask config: RATELIMIT_ENABLED, RATELIMIT_STORAGE_URI / REDIS_URL
 - Standard headers: X-RateLimit-Limit, X-RateLimit-Remaining, X-RateLimit-Reset
@@ -13,8 +17,10 @@ Features
 from __future__ import annotations
 
 import time
+import logging
 import functools
 import threading
+from collections import OrderedDict
 from typing import Callable, Tuple, Optional
 
 from flask import request, jsonify, current_app
@@ -27,6 +33,12 @@ except Exception:
     _HAS_REDIS = False
 
 
+DEFAULT_LOCAL_MAX_KEYS = 100_000
+DEFAULT_STRIPES = 16
+
+logger = logging.getLogger(__name__)
+
+
 # ---------------------------------------------------------------------------
 # Exceptions
 # ---------------------------------------------------------------------------
@@ -51,88 +63,117 @@ class BaseLimiter:
         """
         Returns (allowed, remaining, reset_epoch).
         - allowed: whether the request is allowed
-        - remaining: remaining tokens in the current window (never negative)
-        - reset_epoch: unix timestamp when the current window resets
+        - remaining: requests that could still be made right now (never negative)
+        - reset_epoch: unix timestamp when the key's full quota is back; for a
+          denied request, when the next request will be allowed
         """
         raise NotImplementedError
 
 
+def _gcra(tat: int, now: int, limit: int, period: int) -> Tuple[bool, int, int, int]:
+    """
+    One GCRA step in integer microseconds: `limit` requests per `period`
+    seconds, bursts of up to `limit`.
+
+    `tat` is the key's theoretical arrival time (0 when unseen). Returns
+    (allowed, remaining, reset_us, new_tat); new_tat equals tat when denied.
+    """
+    interval = period * 1_000_000 // limit
+    tat = max(tat, now)
+    new_tat = tat + interval
+    allow_at = new_tat - period * 1_000_000
+    if now < allow_at:
+        return False, 0, allow_at, tat
+    remaining = (now + period * 1_000_000 - new_tat) // interval
+    return True, remaining, new_tat, new_tat
+
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def _epoch(us: int) -> int:
+    # Round up so clients never retry a moment too early
+    return -(-us // 1_000_000)
+
+
 class InMemoryLimiter(BaseLimiter):
-    """Simple thread-safe in-memory fixed-window limiter."""
-
-    def __init__(self) -> None:
-        self._lock = threading.RLock()
-        # key -> [timestamps]
-        self._requests = {}
-        self._cleanup_interval = 3600  # seconds
-        self._last_cleanup = time.time()
-
-    def _cleanup(self, now: float) -> None:
-        # Remove stale keys (no activity in last day)
-        stale: list[str] = []
-        for key, ts_list in self._requests.items():
-            if not ts_list or (now - max(ts_list) > 86400):
-                stale.append(key)
-        for k in stale:
-            self._requests.pop(k, None)
-        self._last_cleanup = now
+    """
+    Per-process GCRA limiter: one integer per key, O(1) per check.
+
+    Keys are spread over `stripes` independently locked LRU shards, so
+    concurrent requests rarely share a lock and at most `max_keys` keys are
+    kept (the least recently seen are evicted; an evicted key simply starts
+    with a full quota again).
+    """
+
+    def __init__(self, max_keys: int = DEFAULT_LOCAL_MAX_KEYS, stripes: int = DEFAULT_STRIPES) -> None:
+        self.stripes = max(1, stripes)
+        self.max_keys_per_stripe = max(1, max_keys // self.stripes)
+        self._locks = [threading.Lock() for _ in range(self.stripes)]
+        # key -> theoretical arrival time (microseconds)
+        self._tats: list["OrderedDict[str, int]"] = [OrderedDict() for _ in range(self.stripes)]
 
     def check_rate_limit(self, key: str, limit: int, period: int) -> Tuple[bool, int, int]:
-        now = time.time()
-        window_start = now - period
-        window_reset = int(now // period * period + period)
-
-        with self._lock:
-            if now - self._last_cleanup > self._cleanup_interval:
-                self._cleanup(now)
-
-            lst = self._requests.setdefault(key, [])
-            # keep only timestamps within the window
-            i = 0
-            for i, ts in enumerate(lst):
-                if ts >= window_start:
-                    break
-            if lst and (i > 0):
-                lst = lst[i:]
-                self._requests[key] = lst
-            elif not lst:
-                lst = self._requests[key]
-
-            if len(lst) >= limit:
-                remaining = 0
-                return False, remaining, window_reset
-
-            lst.append(now)
-            remaining = max(0, limit - len(lst))
-            return True, remaining, window_reset
+        stripe = hash(key) % self.stripes
+        tats = self._tats[stripe]
+        with self._locks[stripe]:
+            now = _now_us()
+            allowed, remaining, reset_us, new_tat = _gcra(tats.get(key, 0), now, limit, period)
+            tats[key] = new_tat
+            tats.move_to_end(key)
+            if len(tats) > self.max_keys_per_stripe:
+                tats.popitem(last=False)
+        return allowed, remaining, _epoch(reset_us)
+
+    def __len__(self) -> int:
+        return sum(len(tats) for tats in self._tats)
+
+
+# KEYS[1]: the key; ARGV: limit, period (seconds). Mirrors _gcra on the
+# server's clock so every worker agrees on "now". Numbers stay below 2^53
+# microseconds, where Lua doubles are exact; results are strings because
+# Redis truncates Lua numbers.
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2]) * 1000000
+local interval = math.floor(period / limit)
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000000 + tonumber(t[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, '0', string.format('%d', allow_at)}
+end
+redis.call('SET', KEYS[1], string.format('%d', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+return {1, string.format('%d', math.floor((now + period - new_tat) / interval)), string.format('%d', new_tat)}
+"""
 
 
 class RedisLimiter(BaseLimiter):
     """
-    Fixed-window counter using Redis INCR + EXPIRE.
+    GCRA limiter shared by all workers: one atomic Lua script (EVALSHA) per
+    check, one round trip, one key per caller with a TTL of its own.
 
-    Key format: rl:{key}:{window_start}
+    Key format: rl:{key}. If Redis errors, checks fall back to a per-process
+    limiter rather than failing the request.
     """
 
-    def __init__(self, redis: Redis) -> None:
+    def __init__(self, redis: Redis, prefix: str = "rl:", fallback: Optional[BaseLimiter] = None) -> None:
         self.redis = redis
+        self.prefix = prefix
+        self.fallback = fallback if fallback is not None else InMemoryLimiter()
+        self._script = redis.register_script(GCRA_SCRIPT)
 
     def check_rate_limit(self, key: str, limit: int, period: int) -> Tuple[bool, int, int]:
-        now = int(time.time())
-        window_start = now - (now % period)
-        reset_at = window_start + period
-        redis_key = f"rl:{key}:{window_start}"
-
-        # INCR the counter and set expiration to end of window
-        count = self.redis.incr(redis_key)
-        # Only the first caller needs to set expire; harmless to call repeatedly
-        ttl = reset_at - now
-        if ttl > 0:
-            self.redis.expire(redis_key, ttl)
-
-        allowed = count <= limit
-        remaining = max(0, limit - int(count))
-        return allowed, remaining, reset_at
+        try:
+            allowed, remaining, reset_us = self._script(keys=[self.prefix + key], args=[limit, period])
+        except Exception as e:
+            logger.warning(f"Redis rate limit check failed, limiting per process: {e}")
+            return self.fallback.check_rate_limit(key, limit, period)
+        return bool(int(allowed)), int(remaining), _epoch(int(reset_us))
 
 
 # ---------------------------------------------------------------------------
@@ -150,7 +191,7 @@ def _resolve_backend() -> BaseLimiter:
         app.extensions = {}  # type: ignore[attr-defined]
 
     cached = app.extensions.get(ext_key)
-    if cached:
+    if cached is not None:
         return cached  # type: ignore[return-value]
 
     # Try Redis if available and configured
@@ -160,18 +201,22 @@ def _resolve_backend() -> BaseLimiter:
             redis_client = Redis.from_url(storage_uri)  # type: ignore
             # Simple ping to validate connectivity
             redis_client.ping()
-            backend: BaseLimiter = RedisLimiter(redis_client)
+            backend: BaseLimiter = RedisLimiter(redis_client, fallback=_in_memory_backend(app))
             app.extensions[ext_key] = backend
             return backend
         except Exception:
             # Fall back to in-memory silently if Redis is misconfigured
             pass
 
-    backend = InMemoryLimiter()
+    backend = _in_memory_backend(app)
     app.extensions[ext_key] = backend
     return backend
 
 
+def _in_memory_backend(app) -> InMemoryLimiter:
+    return InMemoryLimiter(max_keys=int(app.config.get("RATELIMIT_LOCAL_MAX_KEYS", DEFAULT_LOCAL_MAX_KEYS)))
+
+
 # ---------------------------------------------------------------------------
 # Decorator
 # ---------------------------------------------------------------------------
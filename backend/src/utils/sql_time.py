@@ -0,0 +1,175 @@
+"""
+Dialect-aware SQL date/time expressions.
+
+SQLAlchemy's generic functions do not cover date arithmetic or truncation
+portably, so the constructs here compile to native functions on PostgreSQL
+(production) and SQLite (tests and local development). The time-bucketing
+helpers let analytics group rows in the database and zero-fill the gaps.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+class days_between(FunctionElement):
+    """
+    Whole days from `start` to `end`, ignoring the time of day.
+
+    Matches Python's `(end.date() - start.date()).days`.
+
+    Args:
+        start: Date or datetime column/expression
+        end: Date or datetime column/expression or bound value
+    """
+    type = Integer()
+    name = 'days_between'
+    inherit_cache = True
+
+
+@compiles(days_between)
+def _days_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "(CAST(%s AS DATE) - CAST(%s AS DATE))" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+
+@compiles(days_between, 'sqlite')
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "CAST(julianday(date(%s)) - julianday(date(%s)) AS INTEGER)" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+
+# ----------------------------
+# Time bucketing
+# ----------------------------
+BUCKET_PERIODS = ('daily', 'weekly', 'monthly', 'quarterly')
+
+_PG_TRUNC_UNITS = {
+    'daily': 'day',
+    'weekly': 'week',
+    'monthly': 'month',
+    'quarterly': 'quarter',
+}
+
+
+class date_bucket(FunctionElement):
+    """
+    Start date of the daily, weekly (ISO, Monday-based), monthly or quarterly
+    bucket containing a date/datetime expression.
+
+    Compiles to `date_trunc` on PostgreSQL and to `date`/`strftime` on SQLite.
+    Drivers return either a date or an ISO 'YYYY-MM-DD' string; normalize with
+    `to_bucket_date`.
+
+    Args:
+        period: One of BUCKET_PERIODS
+        expr: Date or datetime column/expression
+    """
+    name = 'date_bucket'
+    inherit_cache = True
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ('period', InternalTraversal.dp_string)
+    ]
+
+    def __init__(self, period, expr, **kw):
+        if period not in BUCKET_PERIODS:
+            raise ValueError(f"Unsupported bucket period: {period}")
+        self.period = period
+        super().__init__(expr, **kw)
+
+
+@compiles(date_bucket)
+def _date_bucket_default(element, compiler, **kw):
+    expr = compiler.process(list(element.clauses)[0], **kw)
+    return "CAST(date_trunc('%s', %s) AS DATE)" % (_PG_TRUNC_UNITS[element.period], expr)
+
+
+@compiles(date_bucket, 'sqlite')
+def _date_bucket_sqlite(element, compiler, **kw):
+    expr = compiler.process(list(element.clauses)[0], **kw)
+    if element.period == 'daily':
+        return "date(%s)" % expr
+    if element.period == 'weekly':
+        # Next-or-same Sunday, then back to that ISO week's Monday
+        return "date(%s, 'weekday 0', '-6 days')" % expr
+    if element.period == 'monthly':
+        return "strftime('%%Y-%%m-01', %s)" % expr
+    return (
+        "strftime('%%Y', %s) || '-' || "
+        "printf('%%02d', ((CAST(strftime('%%m', %s) AS INTEGER) - 1) / 3) * 3 + 1) || '-01'"
+    ) % (expr, expr)
+
+
+def to_bucket_date(value):
+    """
+    Normalize a bucket value returned by the driver to a date.
+
+    Args:
+        value: date, datetime or ISO date string
+
+    Returns:
+        Date object
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def bucket_floor(value, period):
+    """
+    Python counterpart of `date_bucket` for a single date.
+
+    Args:
+        value: Date or datetime object
+        period: One of BUCKET_PERIODS
+
+    Returns:
+        Date object for the start of the bucket
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    if period == 'daily':
+        return value
+    if period == 'weekly':
+        return value - timedelta(days=value.weekday())
+    if period == 'monthly':
+        return value.replace(day=1)
+    if period == 'quarterly':
+        return value.replace(month=((value.month - 1) // 3) * 3 + 1, day=1)
+    raise ValueError(f"Unsupported bucket period: {period}")
+
+
+def bucket_range(start, end, period):
+    """
+    Every bucket start between two dates, inclusive, for zero-filling.
+
+    Args:
+        start: Date or datetime object
+        end: Date or datetime object
+        period: One of BUCKET_PERIODS
+
+    Returns:
+        List of date objects in ascending order
+    """
+    current = bucket_floor(start, period)
+    last = bucket_floor(end, period)
+    buckets = []
+    while current <= last:
+        buckets.append(current)
+        if period == 'daily':
+            current += timedelta(days=1)
+        elif period == 'weekly':
+            current += timedelta(weeks=1)
+        else:
+            step = 1 if period == 'monthly' else 3
+            month = current.month - 1 + step
+            current = current.replace(year=current.year + month // 12, month=month % 12 + 1)
+    return buckets
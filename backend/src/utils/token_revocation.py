@@ -0,0 +1,310 @@
+"""
+Cached JWT revocation checks for the `token_in_blocklist_loader`.
+
+Features
+- `is_token_revoked(jwt_payload)` answers from an in-process cache of
+  known-good JTIs (TOKEN_REVOCATION_NEGATIVE_TTL seconds, never past the
+  token's own `exp`) and of revoked JTIs, so repeated checks in one request
+  and across requests cost no query
+- Redis backend (REDIS_URL): revoked JTIs are keys with a TTL equal to the
+  token's remaining lifetime; revocations are published so every worker
+  drops the JTI from its known-good cache at once
+- Without Redis (or when it errors) cache misses query token_blocklist
+- token_blocklist rows carry `expires_at`; a daemon thread deletes expired
+  rows every TOKEN_BLOCKLIST_PURGE_INTERVAL seconds (0 disables it), and
+  `flask purge-token-blocklist` does the same on demand
+"""
+
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import click
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models.token_blocklist import TokenBlocklist
+
+try:
+    # Optional: redis-py
+    from redis import Redis  # type: ignore
+    _HAS_REDIS = True
+except Exception:
+    _HAS_REDIS = False
+
+
+DEFAULT_NEGATIVE_TTL = 30
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_KEY_PREFIX = "assetanchor-revoked:"
+DEFAULT_CHANNEL = "assetanchor-token-revoked"
+DEFAULT_PURGE_INTERVAL = 60 * 60
+# Token lifetime assumed when JWT_REFRESH_TOKEN_EXPIRES is not configured
+DEFAULT_LEGACY_ROW_MAX_AGE = timedelta(days=30)
+# created_at is local time; this covers any UTC offset
+LEGACY_ROW_SLACK = timedelta(days=1)
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+class RevocationStore:
+    """
+    Revoked-JTI lookups behind two bounded in-process caches.
+
+    `_good` maps JTIs seen not revoked to the time that answer expires;
+    `_revoked` maps revoked JTIs to the token's `exp`, after which the token
+    is rejected by its signature check anyway.
+    """
+
+    def __init__(self, redis=None, prefix: str = DEFAULT_KEY_PREFIX,
+                 negative_ttl: int = DEFAULT_NEGATIVE_TTL, max_entries: int = DEFAULT_CACHE_SIZE,
+                 channel: str = DEFAULT_CHANNEL) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._good: "OrderedDict[str, float]" = OrderedDict()
+        self._revoked: "OrderedDict[str, float]" = OrderedDict()
+        self._listener: Optional[threading.Thread] = None
+
+    # ---- local caches ----
+    def _remember(self, cache: "OrderedDict[str, float]", jti: str, until: float) -> None:
+        with self._lock:
+            cache[jti] = until
+            cache.move_to_end(jti)
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False)
+
+    def _cached(self, jti: str, now: float) -> Optional[bool]:
+        with self._lock:
+            for cache, answer in ((self._revoked, True), (self._good, False)):
+                until = cache.get(jti)
+                if until is None:
+                    continue
+                if until > now:
+                    cache.move_to_end(jti)
+                    return answer
+                del cache[jti]
+        return None
+
+    def forget(self, jti: str) -> None:
+        """Drop a JTI from the known-good cache (it was just revoked)."""
+        with self._lock:
+            self._good.pop(jti, None)
+
+    # ---- lookups ----
+    def is_revoked(self, jti: str, exp: Optional[float] = None) -> bool:
+        now = time.time()
+        cached = self._cached(jti, now)
+        if cached is not None:
+            return cached
+
+        revoked = self._lookup(jti)
+        if revoked:
+            self._remember(self._revoked, jti, exp or now + self.negative_ttl)
+        else:
+            self._remember(self._good, jti, min(now + self.negative_ttl, exp or float("inf")))
+        return revoked
+
+    def _lookup(self, jti: str) -> bool:
+        if self.redis is not None:
+            try:
+                return bool(self.redis.exists(self.prefix + jti))
+            except Exception as e:
+                logger.warning(f"Revocation lookup via Redis failed, using the database: {e}")
+        return db.session.execute(
+            select(TokenBlocklist.id).where(TokenBlocklist.jti == jti).limit(1)
+        ).first() is not None
+
+    # ---- writes ----
+    def revoke(self, jti: str, token_type: Optional[str] = None, exp: Optional[float] = None) -> None:
+        """Record a revocation durably, in Redis, and in every worker's caches."""
+        expires_at = datetime.utcfromtimestamp(exp) if exp else None
+        db.session.add(TokenBlocklist(jti=jti, type=token_type, created_at=datetime.utcnow(),
+                                      expires_at=expires_at))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Already revoked
+
+        now = time.time()
+        self.forget(jti)
+        self._remember(self._revoked, jti, exp or now + self.negative_ttl)
+
+        if self.redis is not None:
+            try:
+                ttl = max(1, int((exp or now + self.negative_ttl) - now))
+                self.redis.set(self.prefix + jti, 1, ex=ttl)
+                self.redis.publish(self.channel, jti)
+            except Exception as e:
+                # Other workers pick it up from the DB once their cache entry expires
+                logger.warning(f"Could not publish revocation of {jti}: {e}")
+
+    def sync_to_redis(self) -> int:
+        """
+        Copy unexpired revocations into Redis, e.g. at startup or after a
+        Redis restart. Rows without `expires_at` (revoked before it existed)
+        are kept for the same `_legacy_row_lifetime` that `purge_expired`
+        waits before deleting them.
+        """
+        if self.redis is None:
+            return 0
+        now = datetime.utcnow()
+        lifetime = _legacy_row_lifetime()
+        rows = db.session.execute(
+            select(TokenBlocklist.jti, TokenBlocklist.expires_at, TokenBlocklist.created_at).where(or_(
+                TokenBlocklist.expires_at > now,
+                and_(TokenBlocklist.expires_at.is_(None),
+                     TokenBlocklist.created_at >= now - lifetime),
+            ))
+        ).all()
+        pipe = self.redis.pipeline()
+        for jti, expires_at, created_at in rows:
+            until = expires_at or (created_at or now) + lifetime
+            pipe.set(self.prefix + jti, 1, ex=max(1, int((until - now).total_seconds())), nx=True)
+        pipe.execute()
+        return len(rows)
+
+    # ---- pub/sub ----
+    def start_listener(self) -> None:
+        if self.redis is None or self._listener is not None:
+            return
+        self._listener = threading.Thread(target=self._listen, name="token-revocations", daemon=True)
+        self._listener.start()
+
+    def _listen(self) -> None:
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            self.handle_message(message.get("data"))
+
+    def handle_message(self, data: Any) -> None:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", "replace")
+        if data:
+            self.forget(data)
+
+
+def _legacy_row_lifetime() -> timedelta:
+    """
+    How long after `created_at` a row without `expires_at` is honored: the
+    refresh token lifetime (JWT_REFRESH_TOKEN_EXPIRES, the longest any token
+    lives) plus LEGACY_ROW_SLACK for local-time `created_at`.
+    """
+    expires = current_app.config.get("JWT_REFRESH_TOKEN_EXPIRES")
+    if isinstance(expires, timedelta):
+        max_age = expires
+    elif expires:
+        max_age = timedelta(seconds=int(expires))
+    else:
+        max_age = DEFAULT_LEGACY_ROW_MAX_AGE
+    return max_age + LEGACY_ROW_SLACK
+
+
+def purge_expired(now: Optional[datetime] = None) -> int:
+    """Delete blocklist rows whose tokens have expired; returns the count."""
+    now = now or datetime.utcnow()
+    count = db.session.execute(
+        delete(TokenBlocklist).where(or_(
+            TokenBlocklist.expires_at < now,
+            and_(TokenBlocklist.expires_at.is_(None),
+                 TokenBlocklist.created_at < now - _legacy_row_lifetime()),
+        ))
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Factory / helpers
+# ---------------------------------------------------------------------------
+def get_revocation_store() -> RevocationStore:
+    """Resolve and memoize the store in app.extensions['assetanchor_revocations']."""
+    app = current_app._get_current_object()
+    ext_key = "assetanchor_revocations"
+
+    store = app.extensions.get(ext_key)
+    if store is not None:
+        return store
+
+    redis_client = None
+    redis_url = app.config.get("REDIS_URL")
+    if _HAS_REDIS and redis_url:
+        try:
+            redis_client = Redis.from_url(redis_url)  # type: ignore
+            redis_client.ping()
+        except Exception as e:
+            app.logger.warning(f"Redis unavailable for token revocations, using the database: {e}")
+            redis_client = None
+
+    store = RevocationStore(
+        redis_client,
+        prefix=app.config.get("TOKEN_REVOCATION_KEY_PREFIX", DEFAULT_KEY_PREFIX),
+        negative_ttl=int(app.config.get("TOKEN_REVOCATION_NEGATIVE_TTL", DEFAULT_NEGATIVE_TTL)),
+        max_entries=int(app.config.get("TOKEN_REVOCATION_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+        channel=app.config.get("TOKEN_REVOCATION_CHANNEL", DEFAULT_CHANNEL),
+    )
+    store.start_listener()
+    app.extensions[ext_key] = store
+
+    if redis_client is not None:
+        # Redis answers alone from here on, so it must hold every live revocation
+        try:
+            store.sync_to_redis()
+        except Exception as e:
+            app.logger.warning(f"Could not load revocations into Redis: {e}")
+
+    interval = int(app.config.get("TOKEN_BLOCKLIST_PURGE_INTERVAL", DEFAULT_PURGE_INTERVAL))
+    if interval > 0:
+        _start_purge_thread(app, store, interval)
+    return store
+
+
+def _start_purge_thread(app, store: RevocationStore, interval: int) -> None:
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    purged = purge_expired()
+                    store.sync_to_redis()
+                if purged:
+                    logger.info(f"Purged {purged} expired token_blocklist rows")
+            except Exception:
+                logger.exception("token_blocklist purge failed")
+
+    threading.Thread(target=run, name="token-blocklist-purge", daemon=True).start()
+
+
+def is_token_revoked(jwt_payload: Dict[str, Any]) -> bool:
+    """Blocklist check for `jwt.token_in_blocklist_loader`; tokens without a JTI are rejected."""
+    jti = jwt_payload.get("jti")
+    if not jti:
+        return True
+    return get_revocation_store().is_revoked(jti, jwt_payload.get("exp"))
+
+
+def revoke_token(jwt_payload: Dict[str, Any]) -> None:
+    """Revoke the token described by `jwt_payload` until its `exp`."""
+    get_revocation_store().revoke(jwt_payload["jti"], jwt_payload.get("type"), jwt_payload.get("exp"))
+
+
+def init_token_revocation(app) -> None:
+    """Register the blocklist maintenance CLI command."""
+
+    @app.cli.command("purge-token-blocklist")
+    def purge_token_blocklist():
+        """Delete token_blocklist rows for tokens that have expired."""
+        count = purge_expired()
+        click.echo(f"Deleted {count} expired token_blocklist rows")
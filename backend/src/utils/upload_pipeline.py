@@ -0,0 +1,190 @@
+# backend/src/utils/upload_pipeline.py
+"""
+Single-pass streaming ingest for uploaded files.
+
+Features:
+- Reads the upload once, in fixed-size chunks (bounded memory), and in that
+  same pass enforces the size limit, sniffs the MIME type from the first
+  chunk, computes the SHA-256 and writes a temp file
+- Temp files live under `<storage_root>/.incoming`, on the same filesystem
+  as the final location, so committing is an atomic `os.replace`
+- Content-addressed layout `<root>/<h[:2]>/<h[2:4]>/<sha256>.<ext>`: an
+  upload whose bytes are already stored is deduplicated (the temp file is
+  dropped and the existing path reused)
+- Oversized or disallowed uploads raise FileValidationError before anything
+  reaches storage; partial temp files are always removed
+"""
+
+import os
+import hashlib
+import tempfile
+from typing import Optional
+
+from werkzeug.utils import secure_filename
+
+from .file_validator import (
+    ALLOWED_EXTENSIONS,
+    ALLOWED_MIME_TYPES,
+    MAX_UPLOAD_SIZE,
+    SNIFF_BYTES,
+    FileValidationError,
+    sniff_mime_type,
+)
+
+CHUNK_SIZE = 64 * 1024
+INCOMING_DIR = ".incoming"
+
+
+# ----------------------------
+# Storage layout
+# ----------------------------
+def storage_relpath(sha256: str, extension: str) -> str:
+    """Content-addressed path of a blob relative to the storage root."""
+    name = f"{sha256}.{extension}" if extension else sha256
+    return os.path.join(sha256[:2], sha256[2:4], name)
+
+
+# ----------------------------
+# Pipeline
+# ----------------------------
+class IngestedUpload:
+    """
+    An upload streamed to a temp file and validated, not yet in storage.
+
+    Call `commit()` to move it into place, or `discard()` to drop it; used as
+    a context manager it is discarded unless committed.
+    """
+
+    def __init__(self, storage_root, temp_path, original_filename, filename,
+                 extension, size, sha256, mime_type):
+        self.storage_root = storage_root
+        self.temp_path = temp_path
+        self.original_filename = original_filename
+        self.filename = filename
+        self.extension = extension
+        self.size = size
+        self.sha256 = sha256
+        self.mime_type = mime_type
+        self.path = None
+        self.relative_path = storage_relpath(sha256, extension)
+        self.deduplicated = False
+
+    def commit(self, relative_path: Optional[str] = None) -> str:
+        """
+        Atomically move the temp file to its content-addressed path, or to
+        `relative_path` when the bytes are already known under another key;
+        returns that path.
+        """
+        if relative_path:
+            self.relative_path = relative_path
+        final_path = os.path.join(self.storage_root, self.relative_path)
+        if os.path.exists(final_path):
+            # Same bytes already stored
+            self.deduplicated = True
+            self.discard()
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(self.temp_path, final_path)
+            self.temp_path = None
+        self.path = final_path
+        return final_path
+
+    def discard(self) -> None:
+        if self.temp_path:
+            try:
+                os.remove(self.temp_path)
+            except FileNotFoundError:
+                pass
+            self.temp_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.path is None:
+            self.discard()
+        return False
+
+
+def _source_stream(file):
+    # FileStorage wraps the spooled request stream; read it directly
+    return getattr(file, "stream", file)
+
+
+def ingest_upload(file, storage_root: str, original_filename: str = None,
+                  max_size: int = MAX_UPLOAD_SIZE,
+                  allowed_extensions=ALLOWED_EXTENSIONS,
+                  allowed_mime_types=ALLOWED_MIME_TYPES,
+                  chunk_size: int = CHUNK_SIZE) -> IngestedUpload:
+    """
+    Stream an upload into a temp file under `storage_root`, validating as it goes.
+
+    Args:
+        file: FileStorage or binary file-like object
+        storage_root: Directory the upload will be committed under
+        original_filename: Client filename (default: file.filename)
+        max_size: Largest accepted size in bytes
+        allowed_extensions: Accepted extensions, or None for any
+        allowed_mime_types: Accepted sniffed MIME types, or None for any
+
+    Returns:
+        IngestedUpload (not yet committed)
+
+    Raises:
+        FileValidationError if any validation fails
+    """
+    original_filename = original_filename or getattr(file, "filename", None) or ""
+    filename = secure_filename(original_filename)
+    if not filename:
+        raise FileValidationError("Invalid filename provided")
+
+    extension = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+    if allowed_extensions is not None and extension not in allowed_extensions:
+        raise FileValidationError(
+            f"File extension not allowed. Allowed: {', '.join(sorted(allowed_extensions))}"
+        )
+
+    incoming = os.path.join(storage_root, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=incoming, suffix=".part")
+
+    stream = _source_stream(file)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise FileValidationError(
+                        f"File too large. Maximum size: {max_size / (1024 * 1024):.1f} MB"
+                    )
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+
+        mime_type = sniff_mime_type(head, filename)
+        if allowed_mime_types is not None and mime_type not in allowed_mime_types:
+            raise FileValidationError("File type not allowed based on MIME type")
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return IngestedUpload(storage_root, temp_path, original_filename, filename,
+                          extension, size, digest.hexdigest(), mime_type)
+
+
+def save_upload(file, storage_root: str, **kwargs) -> IngestedUpload:
+    """Ingest and commit in one call; returns the committed IngestedUpload."""
+    upload = ingest_upload(file, storage_root, **kwargs)
+    with upload:
+        upload.commit()
+    return upload
@@ -10,6 +10,7 @@ from datetime import datetime
 from ..models.user import User
 from ..models.bank_account import BankAccount
 from ..extensions import db
+from ..utils.idempotency import idempotent, IN_PROGRESS
 
 def register_plaid_webhooks(bp):
     """Register Plaid webhook routes with the provided blueprint"""
@@ -23,31 +24,42 @@ def register_plaid_webhooks(bp):
                 current_app.logger.warning("Invalid Plaid webhook signature")
                 return jsonify({"error": "Invalid signature"}), 401
         
-        # Process the webhook
-        try:
-            webhook_data = request.json
-            webhook_type = webhook_data.get("webhook_type")
-            webhook_code = webhook_data.get("webhook_code")
-            
-            current_app.logger.info(f"Received Plaid webhook: {webhook_type}/{webhook_code}")
-            
-            # Process based on webhook type
-            if webhook_type == "ITEM":
-                process_item_webhook(webhook_code, webhook_data)
-            elif webhook_type == "TRANSACTIONS":
-                process_transactions_webhook(webhook_code, webhook_data)
-            elif webhook_type == "AUTH":
-                process_auth_webhook(webhook_code, webhook_data)
-            elif webhook_type == "TRANSFER":
-                process_transfer_webhook(webhook_code, webhook_data)
-            else:
-                current_app.logger.info(f"Unhandled Plaid webhook type: {webhook_type}")
-            
-            return jsonify({"status": "success"}), 200
-            
-        except Exception as e:
-            current_app.logger.error(f"Error processing Plaid webhook: {str(e)}")
-            return jsonify({"error": str(e)}), 500
+        # Plaid deliveries carry no event id; a redelivery repeats the body
+        delivery_id = hashlib.sha256(request.get_data()).hexdigest()
+        with idempotent("plaid", delivery_id) as claim:
+            if claim.status == IN_PROGRESS:
+                return jsonify({"status": "in_progress"}), 409
+            if not claim.acquired:
+                current_app.logger.info(f"Duplicate Plaid webhook ignored: {delivery_id}")
+                return jsonify({"status": "duplicate_ignored"}), 200
+
+            # Process the webhook
+            try:
+                webhook_data = request.json
+                webhook_type = webhook_data.get("webhook_type")
+                webhook_code = webhook_data.get("webhook_code")
+                
+                current_app.logger.info(f"Received Plaid webhook: {webhook_type}/{webhook_code}")
+                
+                # Process based on webhook type
+                if webhook_type == "ITEM":
+                    process_item_webhook(webhook_code, webhook_data)
+                elif webhook_type == "TRANSACTIONS":
+                    process_transactions_webhook(webhook_code, webhook_data)
+                elif webhook_type == "AUTH":
+                    process_auth_webhook(webhook_code, webhook_data)
+                elif webhook_type == "TRANSFER":
+                    process_transfer_webhook(webhook_code, webhook_data)
+                else:
+                    current_app.logger.info(f"Unhandled Plaid webhook type: {webhook_type}")
+                
+                return jsonify({"status": "success"}), 200
+                
+            except Exception as e:
+                # Let Plaid's retry through
+                claim.release()
+                current_app.logger.error(f"Error processing Plaid webhook: {str(e)}")
+                return jsonify({"error": str(e)}), 500
 
 
 def verify_plaid_webhook(request, webhook_secret):
@@ -9,6 +9,8 @@ from ..models.payment import Payment
 from ..models.invoice import Invoice
 from ..models.stripe_event import StripeEvent
 from ..extensions import db
+from ..utils.idempotency import idempotent, IN_PROGRESS
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -21,7 +23,13 @@ def register_stripe_webhooks(app=None):
 
 @bp.route("/", methods=["POST"])
 def webhook():
-    """Handle incoming Stripe webhook events"""
+    """
+    Verify and enqueue an incoming Stripe event.
+
+    The event is stored with status `pending` and acknowledged right away;
+    the workers in stripe_worker.py apply it, so a slow or failing handler
+    never makes Stripe retry the delivery.
+    """
     payload = request.data.decode("utf-8")
     sig_header = request.headers.get("Stripe-Signature")
     
@@ -41,59 +49,46 @@ def webhook():
                 payload, sig_header, webhook_secret
             )
         
-        # Store the event in the database to prevent duplicates and allow audit
-        existing_event = StripeEvent.query.filter_by(event_id=event.id).first()
-        if existing_event:
-            logger.info(f"Duplicate Stripe event received: {event.id}")
-            return jsonify({"message": "Duplicate event"}), 200
-        
-        # Store new event
-        # Convert event data to storable format
-        event_data = None
-        if current_app.config.get('DEBUG'):
+        # Repeats are answered from the idempotency guard (local LRU, then
+        # Redis); without Redis the stripe_events row is the durable check
+        with idempotent("stripe", event.id, durable=False) as claim:
+            if claim.status == IN_PROGRESS:
+                # Another worker is recording it; make Stripe redeliver later
+                return jsonify({"message": "Event is being processed"}), 409
+            if not claim.acquired or (
+                claim.backend is None
+                and StripeEvent.query.filter_by(event_id=event.id).first() is not None
+            ):
+                logger.info(f"Duplicate Stripe event received: {event.id}")
+                return jsonify({"message": "Duplicate event"}), 200
+            
+            # Handle api_version safely (especially for mocks)
+            api_version = None
+            if hasattr(event, 'api_version'):
+                if isinstance(event.api_version, str):
+                    api_version = event.api_version
+            
+            stripe_event = StripeEvent(
+                event_id=event.id,
+                event_type=event.type,
+                api_version=api_version,
+                created_at=datetime.fromtimestamp(event.created),
+                status=StripeEvent.STATUS_PENDING,
+                next_attempt_at=datetime.utcnow(),
+                payload=serialize_event(event, payload)
+            )
+            db.session.add(stripe_event)
             try:
-                if hasattr(event, 'to_dict'):
-                    event_data = json.dumps(event.to_dict())
-                else:
-                    # For tests with mocked events that don't have to_dict
-                    event_data = json.dumps({
-                        'id': event.id,
-                        'type': event.type,
-                        'created': event.created,
-                        'data': {'object': {'id': event.data.object.get('id')}}
-                    })
-            except (TypeError, ValueError) as e:
-                logger.warning(f"Could not serialize event for storage: {e}")
-        
-        # Handle api_version safely (especially for mocks)
-        api_version = None
-        if hasattr(event, 'api_version'):
-            if isinstance(event.api_version, str):
-                api_version = event.api_version
-        
-        stripe_event = StripeEvent(
-            event_id=event.id,
-            event_type=event.type,
-            api_version=api_version,
-            created_at=datetime.fromtimestamp(event.created),
-            processed_at=datetime.utcnow(),
-            payload=event_data  # Only store payload in DEBUG mode
-        )
-        db.session.add(stripe_event)
-        db.session.commit()
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent delivery of the same event won the insert
+                db.session.rollback()
+                logger.info(f"Duplicate Stripe event received: {event.id}")
+                return jsonify({"message": "Duplicate event"}), 200
         
-        # Process different event types
-        if event.type == "checkout.session.completed":
-            return handle_checkout_completed(event)
-        elif event.type == "payment_intent.succeeded":
-            return handle_payment_succeeded(event)
-        elif event.type == "invoice.payment_succeeded":
-            return handle_invoice_payment_succeeded(event)
-        elif event.type == "payment_intent.payment_failed":
-            return handle_payment_failed(event)
-        else:
-            logger.info(f"Unhandled Stripe event type: {event.type}")
-            return jsonify({"message": f"Unhandled event type: {event.type}"}), 200
+        from .stripe_worker import dispatch_event
+        status = dispatch_event(stripe_event)
+        return jsonify({"message": "Event queued", "status": status}), 200
             
     except stripe.error.SignatureVerificationError:
         logger.error("Invalid Stripe signature")
@@ -102,6 +97,27 @@ def webhook():
         logger.exception(f"Error handling Stripe webhook: {str(e)}")
         return jsonify({"error": "Internal error processing webhook"}), 500
 
+def serialize_event(event, raw_payload):
+    """JSON the worker rebuilds the event from; falls back to the raw body"""
+    try:
+        return json.dumps(event.to_dict())
+    except (AttributeError, TypeError, ValueError):
+        return raw_payload
+
+def apply_event(event):
+    """
+    Apply a Stripe event to payments and invoices.
+
+    Handlers only stage changes; the caller commits them together with the
+    event's status so an event is applied exactly when it is marked processed.
+    Returns a short description of the outcome.
+    """
+    handler = EVENT_HANDLERS.get(event.type)
+    if handler is None:
+        logger.info(f"Unhandled Stripe event type: {event.type}")
+        return f"Unhandled event type: {event.type}"
+    return handler(event)
+
 def handle_checkout_completed(event):
     """Handle successful checkout session completion"""
     session = event.data.object
@@ -113,7 +129,6 @@ def handle_checkout_completed(event):
         payment.status = "paid"
         payment.completed_at = datetime.utcnow()
         payment.payment_intent_id = session.get("payment_intent")
-        db.session.commit()
         logger.info(f"Payment marked as paid: {payment.id}")
         
         # If this payment is linked to an invoice, update the invoice status too
@@ -122,12 +137,11 @@ def handle_checkout_completed(event):
             if invoice:
                 invoice.status = "paid"
                 invoice.paid_at = datetime.utcnow()
-                db.session.commit()
                 logger.info(f"Invoice marked as paid: {invoice.id}")
     else:
         logger.error(f"Payment record not found for session: {session_id}")
     
-    return jsonify({"message": "Checkout session processed"}), 200
+    return "Checkout session processed"
 
 def handle_payment_succeeded(event):
     """Handle successful payment intent"""
@@ -139,7 +153,6 @@ def handle_payment_succeeded(event):
     if payment:
         payment.status = "paid"
         payment.completed_at = datetime.utcnow()
-        db.session.commit()
         logger.info(f"Payment intent succeeded for payment: {payment.id}")
         
         # If this payment is linked to an invoice, update the invoice status too
@@ -148,12 +161,11 @@ def handle_payment_succeeded(event):
             if invoice:
                 invoice.status = "paid"
                 invoice.paid_at = datetime.utcnow()
-                db.session.commit()
                 logger.info(f"Invoice marked as paid: {invoice.id}")
     else:
         logger.warning(f"No payment record found for payment intent: {payment_intent_id}")
     
-    return jsonify({"message": "Payment intent succeeded processed"}), 200
+    return "Payment intent succeeded processed"
 
 def handle_invoice_payment_succeeded(event):
     """Handle successful invoice payment"""
@@ -168,12 +180,11 @@ def handle_invoice_payment_succeeded(event):
             if invoice:
                 invoice.status = "paid"
                 invoice.paid_at = datetime.utcnow()
-                db.session.commit()
                 logger.info(f"Invoice marked as paid from invoice event: {invoice.id}")
-                return jsonify({"message": "Invoice payment succeeded processed"}), 200
+                return "Invoice payment succeeded processed"
     
     logger.warning(f"Couldn't process invoice.payment_succeeded: {event.id}")
-    return jsonify({"message": "Invoice payment event processed but no action taken"}), 200
+    return "Invoice payment event processed but no action taken"
 
 def handle_payment_failed(event):
     """Handle failed payment intent"""
@@ -184,9 +195,15 @@ def handle_payment_failed(event):
     payment = Payment.query.filter_by(payment_intent_id=payment_intent_id).first()
     if payment:
         payment.status = "failed"
-        db.session.commit()
         logger.info(f"Payment intent failed for payment: {payment.id}")
     else:
         logger.warning(f"No payment record found for payment intent: {payment_intent_id}")
     
-    return jsonify({"message": "Payment intent failed processed"}), 200
+    return "Payment intent failed processed"
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": handle_checkout_completed,
+    "payment_intent.succeeded": handle_payment_succeeded,
+    "invoice.payment_succeeded": handle_invoice_payment_succeeded,
+    "payment_intent.payment_failed": handle_payment_failed,
+}
@@ -0,0 +1,309 @@
+"""
+Background processing of queued Stripe webhook events.
+
+Features
+- `dispatch_event` is called by the webhook once the event row is committed;
+  it wakes the in-process worker pool, or processes inline when
+  STRIPE_EVENTS_INLINE is set (tests, single-process dev servers)
+- Claims are a compare-and-set UPDATE on the row's status, so any number of
+  threads and processes can drain the table without double-processing
+- Handler changes and the event's outcome commit in one transaction
+- Failures retry with capped exponential backoff and jitter; after
+  STRIPE_EVENTS_MAX_ATTEMPTS the event is parked as `dead`
+- Rows left in `processing` by a crashed worker become claimable again after
+  STRIPE_EVENTS_LEASE_SECONDS
+- The in-process pool starts with the app's first request, so pending and
+  retrying events are polled without waiting for another webhook
+- `flask stripe-events-worker` runs a dedicated pool (set
+  STRIPE_EVENTS_WORKERS=0 on the web nodes to use it exclusively);
+  `flask stripe-events-retry` requeues dead events
+"""
+
+import json
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+
+import click
+import stripe
+from flask import current_app
+from sqlalchemy import and_, or_, update
+
+from ..extensions import db
+from ..models.stripe_event import StripeEvent
+from .stripe import apply_event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_BASE_SECONDS = 30
+DEFAULT_RETRY_MAX_SECONDS = 3600
+DEFAULT_POLL_SECONDS = 5
+DEFAULT_LEASE_SECONDS = 300
+CLAIM_BATCH_SIZE = 20
+MAX_ERROR_LENGTH = 2000
+
+_POOL_KEY = 'stripe_event_workers'
+_STARTED_KEY = 'stripe_event_workers_started'
+_POOL_LOCK = threading.Lock()
+
+
+# ---- scheduling ----
+
+def retry_delay(attempts, base=DEFAULT_RETRY_BASE_SECONDS, cap=DEFAULT_RETRY_MAX_SECONDS):
+    """Seconds to wait before attempt `attempts + 1`: base * 2^(n-1), capped, +10% jitter"""
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def _claimable(now, lease_seconds):
+    """Rows due for an attempt, including expired `processing` leases"""
+    return or_(
+        and_(
+            StripeEvent.status.in_([StripeEvent.STATUS_PENDING, StripeEvent.STATUS_FAILED]),
+            or_(StripeEvent.next_attempt_at.is_(None), StripeEvent.next_attempt_at <= now),
+        ),
+        and_(
+            StripeEvent.status == StripeEvent.STATUS_PROCESSING,
+            StripeEvent.locked_at < now - timedelta(seconds=lease_seconds),
+        ),
+    )
+
+
+def _config(name, default):
+    return current_app.config.get(name, default)
+
+
+# ---- claiming and processing ----
+
+def claim_event(event_pk):
+    """
+    Atomically move one due event to `processing`.
+
+    Returns the claimed row, or None when another worker got there first or
+    the event is not due.
+    """
+    now = datetime.utcnow()
+    lease = _config('STRIPE_EVENTS_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+    result = db.session.execute(
+        update(StripeEvent)
+        .where(StripeEvent.id == event_pk, _claimable(now, lease))
+        .values(status=StripeEvent.STATUS_PROCESSING, locked_at=now, attempts=StripeEvent.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return None
+    return db.session.get(StripeEvent, event_pk, populate_existing=True)
+
+
+def claim_next():
+    """Claim the oldest due event, or return None when the queue is drained"""
+    now = datetime.utcnow()
+    candidates = db.session.execute(
+        db.select(StripeEvent.id)
+        .where(_claimable(now, _config('STRIPE_EVENTS_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)))
+        .order_by(StripeEvent.next_attempt_at, StripeEvent.id)
+        .limit(CLAIM_BATCH_SIZE)
+    ).scalars().all()
+    db.session.rollback()
+
+    for event_pk in candidates:
+        row = claim_event(event_pk)
+        if row is not None:
+            return row
+    return None
+
+
+def process_claimed(row):
+    """
+    Apply a claimed event and record the outcome. Returns the final status.
+    """
+    event_pk = row.id
+    try:
+        event = stripe.Event.construct_from(json.loads(row.payload), stripe.api_key)
+        outcome = apply_event(event)
+        row.status = StripeEvent.STATUS_PROCESSED
+        row.processed_at = datetime.utcnow()
+        row.next_attempt_at = None
+        row.locked_at = None
+        row.last_error = None
+        db.session.commit()
+        logger.info(f"Stripe event {row.event_id} ({row.event_type}) processed: {outcome}")
+        return row.status
+    except Exception as e:
+        db.session.rollback()
+        error = f"{type(e).__name__}: {e}"[:MAX_ERROR_LENGTH]
+
+    row = db.session.get(StripeEvent, event_pk, populate_existing=True)
+    max_attempts = _config('STRIPE_EVENTS_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    row.last_error = error
+    row.locked_at = None
+    if row.attempts >= max_attempts:
+        row.status = StripeEvent.STATUS_DEAD
+        row.next_attempt_at = None
+        logger.error(f"Stripe event {row.event_id} failed {row.attempts} times, giving up: {row.last_error}")
+    else:
+        delay = retry_delay(
+            row.attempts,
+            _config('STRIPE_EVENTS_RETRY_BASE_SECONDS', DEFAULT_RETRY_BASE_SECONDS),
+            _config('STRIPE_EVENTS_RETRY_MAX_SECONDS', DEFAULT_RETRY_MAX_SECONDS),
+        )
+        row.status = StripeEvent.STATUS_FAILED
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logger.warning(f"Stripe event {row.event_id} attempt {row.attempts} failed, "
+                       f"retrying in {delay:.0f}s: {row.last_error}")
+    db.session.commit()
+    return row.status
+
+
+def process_event(event_pk):
+    """Claim and process one specific event; None when it was not claimable"""
+    row = claim_event(event_pk)
+    return process_claimed(row) if row is not None else None
+
+
+def drain(limit=None):
+    """Process due events until the queue is empty or `limit` is reached"""
+    handled = 0
+    while limit is None or handled < limit:
+        row = claim_next()
+        if row is None:
+            break
+        process_claimed(row)
+        handled += 1
+    return handled
+
+
+def dispatch_event(stripe_event):
+    """
+    Hand a freshly committed event to the workers.
+    Returns the event's status as far as the request can tell.
+    """
+    if current_app.config.get('STRIPE_EVENTS_INLINE'):
+        return process_event(stripe_event.id) or stripe_event.status
+
+    pool = get_worker_pool(current_app._get_current_object())
+    if pool is not None:
+        pool.wake()
+    return StripeEvent.STATUS_PENDING
+
+
+# ---- worker pool ----
+
+class StripeEventWorkerPool:
+    """Daemon threads draining the stripe_events queue"""
+
+    def __init__(self, app, threads=DEFAULT_WORKERS, poll_interval=DEFAULT_POLL_SECONDS):
+        self.app = app
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'stripe-events-{i}', daemon=True)
+            for i in range(max(1, threads))
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    handled = drain(CLAIM_BATCH_SIZE)
+            except Exception:
+                logger.exception("Stripe event worker iteration failed")
+                handled = 0
+            if not handled:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+def get_worker_pool(app):
+    """The app's in-process pool, started on first use; None when disabled"""
+    pool = app.extensions.get(_POOL_KEY)
+    if pool is not None:
+        return pool
+
+    threads = app.config.get('STRIPE_EVENTS_WORKERS', DEFAULT_WORKERS)
+    if threads <= 0:
+        return None
+
+    with _POOL_LOCK:
+        pool = app.extensions.get(_POOL_KEY)
+        if pool is None:
+            pool = StripeEventWorkerPool(
+                app, threads, app.config.get('STRIPE_EVENTS_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+            ).start()
+            app.extensions[_POOL_KEY] = pool
+    return pool
+
+
+def _start_on_first_request():
+    """Start the in-process pool once, so queued events are polled without a new webhook"""
+    app = current_app._get_current_object()
+    if app.extensions.get(_STARTED_KEY):
+        return
+    with _POOL_LOCK:
+        if app.extensions.get(_STARTED_KEY):
+            return
+        app.extensions[_STARTED_KEY] = True
+    if not app.config.get('STRIPE_EVENTS_INLINE'):
+        get_worker_pool(app)
+
+
+def init_stripe_events(app):
+    """Start the worker pool with the first request and register the Stripe event queue CLI commands"""
+    app.before_request(_start_on_first_request)
+
+    @app.cli.command('stripe-events-worker')
+    @click.option('--threads', default=DEFAULT_WORKERS, show_default=True,
+                  help='Number of worker threads.')
+    @click.option('--once', is_flag=True, help='Drain the due events and exit.')
+    def stripe_events_worker(threads, once):
+        """Process queued Stripe webhook events."""
+        if once:
+            click.echo(f"Processed {drain()} Stripe events")
+            return
+        pool = StripeEventWorkerPool(
+            current_app._get_current_object(), threads,
+            current_app.config.get('STRIPE_EVENTS_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+        ).start()
+        click.echo(f"Processing Stripe events with {threads} threads")
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            pool.stop(timeout=30)
+
+    @app.cli.command('stripe-events-retry')
+    @click.argument('event_ids', nargs=-1)
+    def stripe_events_retry(event_ids):
+        """Requeue dead Stripe events (all of them when no EVENT_IDS are given)."""
+        stmt = (
+            update(StripeEvent)
+            .where(StripeEvent.status == StripeEvent.STATUS_DEAD)
+            .values(status=StripeEvent.STATUS_PENDING, attempts=0, next_attempt_at=datetime.utcnow())
+        )
+        if event_ids:
+            stmt = stmt.where(StripeEvent.event_id.in_(event_ids))
+        count = db.session.execute(stmt).rowcount
+        db.session.commit()
+        click.echo(f"Requeued {count} Stripe events")
@@ -12,6 +12,8 @@ from typing import Any, Dict, Iterable, Optional
 
 from flask import Blueprint, current_app, jsonify, request
 
+from ..utils.idempotency import idempotent, IN_PROGRESS
+
 try:
     # Optional: Sentry integration if present in the app
     import sentry_sdk  # type: ignore
@@ -40,36 +42,50 @@ def register_system_webhooks(bp: Blueprint) -> None:
                 current_app.logger.warning("Invalid system webhook signature")
                 return jsonify({"error": "Invalid signature"}), 401
 
-        # Basic idempotency (optional): ignore duplicate event_id within a short window
+        # Deliveries carrying an id are processed once across all workers
         event_id = str(payload.get("id") or payload.get("event_id") or "")
-        if event_id and _is_duplicate_event(event_id):
-            current_app.logger.info("Duplicate system webhook ignored: %s", event_id)
-            return jsonify({"status": "duplicate_ignored"}), 200
-
-        # Process the webhook
-        try:
-            event_type = (payload.get("event_type") or "").strip()
-            current_app.logger.info("Received system webhook: %s", event_type or "<unknown>")
-
-            # Route by event type
-            if event_type == "backup_completed":
-                handle_backup_completed(payload)
-            elif event_type == "error_alert":
-                handle_error_alert(payload)
-            elif event_type == "usage_threshold":
-                handle_usage_threshold(payload)
-            elif event_type == "scheduled_maintenance":
-                handle_scheduled_maintenance(payload)
-            else:
-                current_app.logger.info("Unhandled system webhook type: %r", event_type)
-
-            return jsonify({"status": "success"}), 200
-
-        except Exception as e:  # pragma: no cover - defensive
-            current_app.logger.exception("Error processing system webhook")
-            if _HAS_SENTRY:
-                sentry_sdk.capture_exception(e)
-            return jsonify({"error": str(e)}), 500
+        if not event_id:
+            return _process_system_event(payload)
+
+        with idempotent("system", event_id) as claim:
+            if claim.status == IN_PROGRESS:
+                return jsonify({"status": "in_progress"}), 409
+            if not claim.acquired:
+                current_app.logger.info("Duplicate system webhook ignored: %s", event_id)
+                return jsonify({"status": "duplicate_ignored"}), 200
+
+            response, status = _process_system_event(payload)
+            if status >= 500:
+                # Let the sender's retry through
+                claim.release()
+            return response, status
+
+
+def _process_system_event(payload: Dict[str, Any]):
+    """Route a verified system event to its handler."""
+    try:
+        event_type = (payload.get("event_type") or "").strip()
+        current_app.logger.info("Received system webhook: %s", event_type or "<unknown>")
+
+        # Route by event type
+        if event_type == "backup_completed":
+            handle_backup_completed(payload)
+        elif event_type == "error_alert":
+            handle_error_alert(payload)
+        elif event_type == "usage_threshold":
+            handle_usage_threshold(payload)
+        elif event_type == "scheduled_maintenance":
+            handle_scheduled_maintenance(payload)
+        else:
+            current_app.logger.info("Unhandled system webhook type: %r", event_type)
+
+        return jsonify({"status": "success"}), 200
+
+    except Exception as e:  # pragma: no cover - defensive
+        current_app.logger.exception("Error processing system webhook")
+        if _HAS_SENTRY:
+            sentry_sdk.capture_exception(e)
+        return jsonify({"error": str(e)}), 500
 
 
 def verify_system_webhook(data: bytes, signature: str, secret: str) -> bool:
@@ -287,26 +303,3 @@ def schedule_user_maintenance_notice(data: Dict[str, Any]) -> None:
 
     # TODO: integrate with your own notification system (queues, DB notices, etc.)
     # For now, this function at least ensures admins are notified/logged.
-
-
-# ------------------------------------------------------------------------------
-# Idempotency guard (best-effort, in-memory)
-# ------------------------------------------------------------------------------
-_recent_events: set[str] = set()
-_RECENT_EVENTS_MAX = 512  # bounded set size to prevent unbounded memory use
-
-
-def _is_duplicate_event(event_id: str) -> bool:
-    """
-    Very light in-memory dedupe to avoid double-processing the same event id
-    within a single process lifetime. For true dedupe, back this with Redis/DB.
-    """
-    if not event_id:
-        return False
-    if event_id in _recent_events:
-        return True
-    if len(_recent_events) >= _RECENT_EVENTS_MAX:
-        # drop arbitrary item to keep set bounded
-        _recent_events.pop()
-    _recent_events.add(event_id)
-    return False
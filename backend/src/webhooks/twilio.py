@@ -11,6 +11,7 @@ import os
 import logging
 from flask import Blueprint, request, current_app, jsonify
 from ..extensions import db
+from ..utils.idempotency import idempotent, IN_PROGRESS
 
 # Create Blueprint for Twilio webhook routes
 bp = Blueprint("twilio_webhook", __name__)
@@ -93,6 +94,26 @@ def validate_twilio_request(f):
 @validate_twilio_request
 def twilio_webhook():
     """Handle incoming SMS messages from Twilio"""
+    # Twilio repeats the idempotency token on retries; MessageSid identifies the SMS
+    delivery_id = request.headers.get('I-Twilio-Idempotency-Token') or request.values.get('MessageSid', '')
+    if not delivery_id:
+        return handle_incoming_sms()
+
+    with idempotent('twilio', delivery_id) as claim:
+        if claim.status == IN_PROGRESS:
+            return jsonify({'status': 'in_progress'}), 409
+        if not claim.acquired:
+            current_app.logger.info(f"Duplicate Twilio webhook ignored: {delivery_id}")
+            return jsonify({'status': 'duplicate_ignored'}), 200
+
+        response, status = handle_incoming_sms()
+        if status >= 500:
+            # Let Twilio's retry through
+            claim.release()
+        return response, status
+
+def handle_incoming_sms():
+    """Process an incoming SMS payload"""
     try:
         # Log incoming message data
         current_app.logger.info("Received Twilio webhook")